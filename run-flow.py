@@ -1,47 +1,95 @@
 #!/usr/bin/env python3
 
 import os
-import subprocess
 import json
 import shutil
+import sqlite3
 import sys
+import argparse
+import filecmp
 
 # Get the current script directory.
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "scripts"))
 
-def run_command(cmd, cwd=None):
-    """Run the command and print the output."""
+import command_log
+import die_estimate
+import hls_cache
+import macro_cache
+import macro_placement
+import orfs_pool
+import pipeline
+import orfs_metrics
+import profiling
+import results_store
+import setup_configmk
+import stage_graph
+import systolic_array_generator
+
+def run_command(cmd, cwd=None, log_name=None, log_dir=command_log.LOG_DIR, echo=True):
+    """
+    Run the command, streaming its output as it arrives. With log_name the output
+    is also written to the rotating log <log_dir>/<log_name>.log. echo=False only
+    prints the progress markers (ORFS steps). On failure the last lines of the
+    output are printed.
+    """
     print(f"Running: {cmd}")
-    try:
-        process = subprocess.run(cmd, shell=True, check=True, cwd=cwd, 
-                                stderr=subprocess.STDOUT, stdout=subprocess.PIPE, 
-                                universal_newlines=True)
-        print(process.stdout)
-        return True
-    except subprocess.CalledProcessError as e:
+    with command_log.CommandOutput(log_name or "command", log_dir if log_name else None, echo=echo) as output:
+        # The child's CPU time and peak RSS are recorded on the stage running it.
+        returncode = profiling.run_process(cmd, cwd=cwd, on_line=output.write)
+    if returncode != 0:
         print(f"Error executing command: {cmd}")
-        print(f"Error: {e}")
-        print(f"Output: {e.stdout}")
+        print(f"Error: Command '{cmd}' returned non-zero exit status {returncode}.")
+        if output.step:
+            print(f"Last step: {output.step}")
+        log_hint = f", full log in {output.log.path}" if output.log else ""
+        print(f"Last {len(output.tail)} of {output.lines} output lines{log_hint}:")
+        print("".join(output.tail), end="")
         return False
+    return True
 
-def run_hls_commands():
-    """Run HLS-related commands."""
+def run_hls_commands(use_cache=True, cache_dir=hls_cache.DEFAULT_CACHE_DIR,
+                     cache_size=hls_cache.DEFAULT_MAX_BYTES, log_dir=command_log.LOG_DIR, echo=True,
+                     tool_version=None):
+    """
+    Run HLS-related commands, restoring the RTL from the artifact cache when possible.
+    tool_version is the HLS tool version of the cache key, queried once per run by
+    build_stages (hls_cache.get_tool_version when not given).
+    """
     print("==== Running HLS commands ====")
     
     # Switch to the hls directory and execute the command.
     hls_dir = os.path.join(SCRIPT_DIR, "hls")
+    src_dir = os.path.join(SCRIPT_DIR, "src")
     
     # Enter the hls directory.
     if not os.path.exists(hls_dir):
         print(f"Error: HLS directory {hls_dir} does not exist")
         return False
+
+    # Flows running concurrently (see scripts/batch_runner.py) share the hls and
+    # src directories: the first one runs the HLS tool, the others wait for it
+    # and then restore its RTL from the cache.
+    with hls_cache.hls_lock(hls_dir):
+        return _run_hls_locked(hls_dir, src_dir, use_cache, cache_dir, cache_size, log_dir, echo, tool_version)
+
+def _run_hls_locked(hls_dir, src_dir, use_cache, cache_dir, cache_size, log_dir, echo, tool_version):
+    # Look up the HLS sources in the artifact cache before touching the HLS tool.
+    cache_key = None
+    if use_cache:
+        if tool_version is None:
+            tool_version = hls_cache.get_tool_version()
+        cache_key = hls_cache.compute_cache_key(hls_dir, tool_version)
+        if hls_cache.lookup(cache_dir, cache_key, src_dir):
+            print(f"HLS cache hit ({cache_key[:12]}), restored concat_rtl.v to {src_dir}")
+            return True
+        print(f"HLS cache miss ({cache_key[:12]})")
     
     # Load the Catapult module and execute make.
-    if not run_command("module load catapult && make", cwd=hls_dir):
+    if not run_command("module load catapult && make", cwd=hls_dir, log_name="hls", log_dir=log_dir, echo=echo):
         return False
     
     # Copy the generated RTL to the src directory.
-    src_dir = os.path.join(SCRIPT_DIR, "src")
     concat_rtl = os.path.join(hls_dir, "Catapult/pe.v1/concat_rtl.v")
     
     if not os.path.exists(concat_rtl):
@@ -52,13 +100,22 @@ def run_hls_commands():
     os.makedirs(src_dir, exist_ok=True)
     
     # copy file
-    shutil.copy(concat_rtl, os.path.join(src_dir, "concat_rtl.v"))
+    hls_cache.copy_atomic(concat_rtl, os.path.join(src_dir, "concat_rtl.v"))
     print(f"Copied {concat_rtl} to {src_dir}")
     
+    # Save the generated RTL for later flows on the same HLS sources.
+    if cache_key:
+        try:
+            hls_cache.store(cache_dir, cache_key, hls_dir, tool_version, max_bytes=cache_size)
+            print(f"Stored HLS artifacts in cache {cache_dir}")
+        except OSError as e:
+            print(f"Warning: failed to store HLS artifacts in cache: {e}")
+    
     return True
 
-def run_docker_commands(platform, nickname):
-    """在Docker容器中运行命令"""
+def run_docker_commands(platform, nickname, log_dir=command_log.LOG_DIR, echo=True, executor="docker",
+                        headless=False, pool_size=1, orfs_root=None, target=None, log_name="orfs"):
+    """在Docker容器中运行命令, target selects an ORFS make target (default: the whole flow)"""
     print("==== Running commands in Docker container ====")
     
     # Use the correct flow/designs directory path.
@@ -71,49 +128,560 @@ def run_docker_commands(platform, nickname):
         print(f"Warning: Design config file not found at {design_config_path}")
     else:
         print(f"Design config file exists: {design_config_path}")
+
+    # Warm container of the pool, or the same commands run on the host.
+    if executor in ("pool", "local"):
+        if executor == "pool":
+            backend = orfs_pool.DockerPool(flow_dir, size=pool_size)
+        else:
+            backend = orfs_pool.LocalExecutor(orfs_root or os.path.join(SCRIPT_DIR, ".."))
+        with backend.acquire() as slot:
+            if slot is None:
+                print(f"Error: no ORFS {executor} executor available")
+                return False
+            orfs_cmd = backend.command(slot, orfs_pool.make_command(platform, nickname, target))
+            return run_command(orfs_cmd, cwd=os.path.join(SCRIPT_DIR, ".."), log_name=log_name, log_dir=log_dir,
+                               echo=echo)
     
     # Start the Docker container – no need to mount the designs directory separately, 
-    # as the flow directory is already mounted.
-    docker_cmd = (
-        "docker run --rm -it -e DISPLAY=$DISPLAY "
+    # as the flow directory is already mounted. Headless runs (batch jobs without
+    # a terminal) get neither a TTY nor the X11 display.
+    display_opts = "" if headless else (
+        "-it -e DISPLAY=$DISPLAY "
         "-e QT_XCB_FORCE_SOFTWARE_OPENGL=1 -e XDG_RUNTIME_DIR=/tmp/runtime-root "
         "-v /tmp/.X11-unix:/tmp/.X11-unix -v ${HOME}/.Xauthority:/root/.Xauthority "
+    )
+    docker_cmd = (
+        f"docker run --rm {display_opts}{orfs_pool.env_options()}"
         "-v $(pwd)/flow:/OpenROAD-flow-scripts/flow --net=host "
-        "openroad/flow-ubuntu22.04-builder:bb283b "
+        f"{orfs_pool.ORFS_IMAGE} "
         f"/bin/bash -c 'cd /OpenROAD-flow-scripts && "
         f"source ./env.sh && "
         f"cd flow && "
         # f"make clean_all DESIGN_CONFIG=designs/{platform}/{nickname}/config.mk && "
-        f"make DESIGN_CONFIG=designs/{platform}/{nickname}/config.mk'"
+        f"{orfs_pool.make_command(platform, nickname, target)}'"
     )
     
     # Note: Here we start Docker in interactive mode, so the script will wait 
     # at this point until the Docker container finishes running.
-    return run_command(docker_cmd, cwd=os.path.join(SCRIPT_DIR, ".."))
+    return run_command(docker_cmd, cwd=os.path.join(SCRIPT_DIR, ".."), log_name=log_name, log_dir=log_dir, echo=echo)
 
-def main():
-    # Run the HLS command first.
-    if not run_hls_commands():
-        print("Error during HLS commands, stopping execution")
-        sys.exit(1)
-    
-    print("\n==== Running main flow ====")
-    
-    # Run the Python scripts in order.
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the HLS to OpenROAD flow.")
+    parser.add_argument("--setup", default=os.path.join(SCRIPT_DIR, "setup.json"),
+                        help="design setup file (default: setup.json)")
+    parser.add_argument("--build-dir", default=os.path.join(SCRIPT_DIR, "build"),
+                        help="directory receiving the generated files, logs and profiles (default: build)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always run the HLS tool instead of restoring cached RTL")
+    parser.add_argument("--cache-dir", default=hls_cache.DEFAULT_CACHE_DIR,
+                        help=f"HLS artifact cache directory (default: {hls_cache.DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-size", type=int, default=hls_cache.DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="maximum HLS artifact cache size in MB, least recently used entries are evicted")
+    parser.add_argument("--no-macro-cache", action="store_true",
+                        help="always harden the macro blocks instead of restoring them from the macro cache")
+    parser.add_argument("--macro-cache-dir", default=macro_cache.DEFAULT_CACHE_DIR,
+                        help=f"hardened macro cache directory (default: {macro_cache.DEFAULT_CACHE_DIR})")
+    parser.add_argument("--macro-cache-size", type=int, default=macro_cache.DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="maximum macro cache size in MB, least recently used entries are evicted")
+    parser.add_argument("--force", action="store_true",
+                        help="rerun every stage even if its inputs are unchanged")
+    parser.add_argument("--verify", action="store_true",
+                        help="re-parse every Verilog file instead of trusting the parse cache")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="maximum number of stages run concurrently")
+    parser.add_argument("--log-dir", default=None,
+                        help="directory receiving the rotating HLS and ORFS logs (default: <build-dir>/logs)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="only print the progress markers of the HLS and ORFS output, not every line")
+    parser.add_argument("--profile-dir", default=None,
+                        help="directory receiving the per-run profile report and trace (default: <build-dir>/profiles)")
+    parser.add_argument("--compare", nargs="?", const="previous", metavar="REPORT",
+                        help="compare the stage profile with REPORT, or with the previous run")
+    parser.add_argument("--results-db", default=results_store.RESULTS_DB,
+                        help="SQLite store receiving the ORFS metrics of every run (default: build/results.db)")
+    parser.add_argument("--until", choices=orfs_pool.ORFS_STAGE_NAMES, default=None,
+                        help="stop the ORFS flow after this stage")
+    parser.add_argument("--from", dest="from_stage", choices=orfs_pool.ORFS_STAGE_NAMES, default=None,
+                        help="rerun the ORFS flow from this stage on, from the checkpoint of the stage before")
+    parser.add_argument("--orfs-executor", choices=["docker", "pool", "local"], default="docker",
+                        help="run ORFS in a new container, in a warm container of the pool (see "
+                             "scripts/orfs_pool.py), or on the host in --orfs-root")
+    parser.add_argument("--headless", action="store_true",
+                        help="run the ORFS container without a TTY and X11 display, for batch use")
+    parser.add_argument("--pool-size", type=int, default=1,
+                        help="number of warm ORFS containers with --orfs-executor pool")
+    parser.add_argument("--orfs-root", default=None,
+                        help="ORFS checkout (with env.sh and flow/) used by --orfs-executor local "
+                             "(default: the parent directory)")
+    args = parser.parse_args(argv)
+    first, last = orfs_stage_range(args)
+    if first > last:
+        parser.error(f"--from {args.from_stage} comes after --until {args.until}")
+    args.build_dir = os.path.abspath(args.build_dir)
+    args.log_dir = args.log_dir or os.path.join(args.build_dir, "logs")
+    args.profile_dir = args.profile_dir or os.path.join(args.build_dir, "profiles")
+    return args
+
+def copy_if_changed(src, dst):
+    """
+    Copy src to dst only when the contents differ, so that unchanged files keep
+    their timestamps and make in ORFS does not rerun the stages depending on them.
+    """
+    if os.path.exists(dst) and filecmp.cmp(src, dst, shallow=False):
+        return False
+    shutil.copy(src, dst)
+    print(f"Installed {src} -> {dst}")
+    return True
+
+def install_design_files(design_files, design_dir, src_dir):
+    """Copy the generated build files and the RTL into the ORFS design directories."""
+    # Ensure the directory exists.
+    os.makedirs(design_dir, exist_ok=True)
+    os.makedirs(src_dir, exist_ok=True)
+
+    for src, dst in design_files:
+        if not os.path.exists(src):
+            print(f"Error: {src} not found")
+            return False
+        copy_if_changed(src, dst)
+    return True
+
+def build_stages(setup_data, args):
+    """Declare the flow stages with their inputs, configuration values and outputs."""
+    config = setup_data["config_mk"]
+    platform = config["PLATFORM"]
+    design_name = config["DESIGN_NAME"]
+    nickname = config["DESIGN_NICKNAME"]
+    generate_cfg = (setup_data.get("generate_files") or [{}])[0]
+    macro_enabled = setup_data.get("macro_config", {}).get("enable", False)
+
+    hls_dir = os.path.join(SCRIPT_DIR, "hls")
     scripts_dir = os.path.join(SCRIPT_DIR, "scripts")
-    run_command("python3 setup_configmk.py", cwd=scripts_dir)
-    run_command("python3 parse_verilog.py", cwd=scripts_dir)
-    run_command("python3 systolic_array_generator.py", cwd=scripts_dir)
-    run_command("python3 generate_top.py", cwd=scripts_dir)
-    
+    build_dir = args.build_dir
+    src_verilog_dir = os.path.join(SCRIPT_DIR, "src")
+
+    # Create the design directory – modify the path to ../flow/designs/.
+    flow_dir = os.path.join(SCRIPT_DIR, "..", "flow")
+    design_dir = os.path.join(flow_dir, "designs", platform, nickname)
+    src_dir = os.path.join(flow_dir, "designs", "src", nickname)
+
+    # Front-end results shared in memory between the stages of this run.
+    memo = {}
+
+    def setup_output(name):
+        return lambda: pipeline.write_setup_outputs(setup_data, [name], build_dir)
+
+    def script_path(name):
+        return os.path.join(scripts_dir, name)
+
+    def build_path(name):
+        return os.path.join(build_dir, name)
+
+    files = pipeline.frontend_files(setup_data, src_verilog_dir, build_dir)
+    pe_config = files["pe_config"]
+    connection_json = files["array_json"]
+    top_verilog = files["top_verilog"]
+
+    # Everything copied into the ORFS design directories, as (source, destination).
+    design_files = [
+        (build_path("config.mk"), os.path.join(design_dir, "config.mk")),
+        (build_path("constraint.sdc"), os.path.join(design_dir, "constraint.sdc")),
+        (top_verilog, os.path.join(src_dir, f"{design_name}.v"))
+    ]
+    if files["tile_verilog"]:
+        design_files.append((files["tile_verilog"], os.path.join(src_dir, os.path.basename(files["tile_verilog"]))))
+    if macro_enabled:
+        design_files.append((build_path("block.mk"), os.path.join(design_dir, "block.mk")))
+    # Copy all .v files from the src directory, including the RTL HLS is about to write.
+    src_verilog = {"concat_rtl.v"}
+    if os.path.isdir(src_verilog_dir):
+        src_verilog.update(f for f in os.listdir(src_verilog_dir) if f.endswith(".v"))
+    for file in sorted(src_verilog):
+        design_files.append((os.path.join(src_verilog_dir, file), os.path.join(src_dir, file)))
+
+    hls_cache_size = args.cache_size * 1024 * 1024
+    # Part of the fingerprint of the hls stage and of the HLS cache key, queried once.
+    hls_tool_version = hls_cache.get_tool_version()
+    stages = [
+        stage_graph.stage(
+            "hls",
+            lambda: run_hls_commands(use_cache=not args.no_cache, cache_dir=args.cache_dir,
+                                     cache_size=hls_cache_size, log_dir=args.log_dir, echo=not args.quiet,
+                                     tool_version=hls_tool_version),
+            inputs=[os.path.join(hls_dir, name) for name in hls_cache.HLS_INPUT_FILES],
+            outputs=[os.path.join(src_verilog_dir, "concat_rtl.v")],
+            values={"tool_version": hls_tool_version}),
+        stage_graph.stage(
+            "config_mk", setup_output("config.mk"),
+            inputs=[script_path("setup_configmk.py")],
+            outputs=[build_path("config.mk")],
+            values={key: setup_data.get(key) for key in
+                    ("config_mk", "manual_area_config", "macro_config", "add_place_pins_args", "generate_files",
+                     "die_estimate")}),
+        stage_graph.stage(
+            "constraint_sdc", setup_output("constraint.sdc"),
+            inputs=[script_path("setup_configmk.py")],
+            outputs=[build_path("constraint.sdc")],
+            values={"constraint_sdc": setup_data.get("constraint_sdc"),
+                    "reset_tree": generate_cfg.get("reset_tree")}),
+        stage_graph.stage(
+            "generate_files", setup_output("generate_files"),
+            inputs=[script_path("setup_configmk.py")],
+            outputs=[build_path("generate_files")],
+            values=setup_data.get("generate_files")),
+        stage_graph.stage(
+            "parse_verilog",
+            lambda: pipeline.parse_submodules(setup_data, memo, src_verilog_dir, build_dir,
+                                              verify=args.verify),
+            inputs=[script_path("parse_verilog.py"), script_path("verilog_ports.py")] + files["rtl"],
+            outputs=[pe_config],
+            values=generate_cfg,
+            always=args.verify),
+        stage_graph.stage(
+            "systolic_array",
+            lambda: pipeline.build_array(setup_data, memo, src_verilog_dir, build_dir),
+            inputs=[script_path("systolic_array_generator.py"), script_path("connection_dsl.py"),
+                    script_path("reset_tree.py"), script_path("edge_skew.py"), script_path("result_network.py"),
+                    script_path("link_registers.py"), pe_config, files["array_yaml"]],
+            outputs=[connection_json] + [files[key] for key in ("reset_report", "skew_report", "result_report")
+                                         if files[key]],
+            values={key: generate_cfg.get(key) for key in
+                    ("tile_size", "always_ready", "reset_tree", "edge_skew", "result_network")}),
+        stage_graph.stage(
+            "generate_top",
+            lambda: pipeline.build_top(setup_data, memo, src_verilog_dir, build_dir),
+            inputs=[script_path("generate_top.py"), script_path("reset_tree.py"), script_path("edge_skew.py"),
+                    script_path("result_network.py"), script_path("link_registers.py"), connection_json, pe_config,
+                    files["array_yaml"]],
+            outputs=[top_verilog] + ([files["tile_verilog"]] if files["tile_verilog"] else []),
+            values={"design_name": design_name, "generate_files": generate_cfg}),
+        stage_graph.stage(
+            "install", lambda: install_design_files(design_files, design_dir, src_dir),
+            inputs=[src for src, _ in design_files],
+            outputs=[dst for _, dst in design_files]),
+    ]
+    orfs_inputs = [dst for _, dst in design_files]
+    # Blocks to store once ORFS hardened them, None until the macro cache was looked up.
+    macro_state = {"missing": None}
+    if macro_placement.is_enabled(setup_data):
+        placement_files = [os.path.join(design_dir, macro_placement.PLACEMENT_FILE),
+                           os.path.join(design_dir, macro_placement.AREA_FILE)]
+        stages.append(stage_graph.stage(
+            "macro_placement",
+            lambda: place_macros(setup_data, files["array_yaml"], design_dir, macro_state, args),
+            inputs=[script_path("macro_placement.py"), files["array_yaml"]] + orfs_inputs,
+            outputs=placement_files,
+            values={"macro_config": setup_data.get("macro_config"), "config_mk": config,
+                    "generate_files": generate_cfg}))
+        orfs_inputs += placement_files
+    stage_inputs = {}
+    first, last = orfs_stage_range(args)
+    if first <= orfs_pool.ORFS_STAGE_NAMES.index("floorplan") <= last:
+        # The die estimate sits between synthesis and the floorplan.
+        estimate_files = [build_path("die_estimate.json")]
+        if die_estimate.writes_floorplan(setup_data):
+            estimate_files.append(os.path.join(design_dir, die_estimate.ESTIMATE_FILE))
+        results_dir = os.path.join(flow_dir, "results", platform, nickname, "base")
+        stages.append(stage_graph.stage(
+            "die_estimate",
+            lambda: estimate_die(setup_data, files["array_yaml"], design_dir, os.path.join(src_dir, f"{design_name}.v"),
+                                 build_path("die_estimate.json")),
+            inputs=[script_path("die_estimate.py"), os.path.join(results_dir, orfs_pool.ORFS_STAGES[0][1])]
+                   + orfs_inputs,
+            outputs=estimate_files,
+            values={key: setup_data.get(key) for key in
+                    ("config_mk", "die_estimate", "manual_area_config", "macro_config")}))
+        stage_inputs["floorplan"] = estimate_files
+    stages += orfs_stages(setup_data, orfs_inputs, args, macro_state, stage_inputs)
+    if macro_enabled:
+        stages.append(stage_graph.stage(
+            "block_mk", setup_output("block.mk"),
+            inputs=[script_path("setup_configmk.py")],
+            outputs=[build_path("block.mk")],
+            values={key: setup_data.get(key) for key in ("config_mk", "macro_config")}))
+    return stages
+
+def macro_keys(setup_data):
+    """Macro cache keys of the blocks of macro_config, from the installed design files."""
+    config = setup_data["config_mk"]
+    platform, nickname = config["PLATFORM"], config["DESIGN_NICKNAME"]
+    flow_dir = os.path.join(SCRIPT_DIR, "..", "flow")
+    design_dir = os.path.join(flow_dir, "designs", platform, nickname)
+    src_dir = os.path.join(flow_dir, "designs", "src", nickname)
+    top_file = f"{config['DESIGN_NAME']}.v"
+    rtl_files = [os.path.join(src_dir, name) for name in os.listdir(src_dir)
+                 if name.endswith(".v") and name != top_file]
+    with open(os.path.join(design_dir, "block.mk"), "r") as f:
+        block_mk = f.read()
+    with open(os.path.join(design_dir, "constraint.sdc"), "r") as f:
+        constraint_sdc = f.read()
+    return {block: macro_cache.compute_key(platform, nickname, block, rtl_files, block_mk, constraint_sdc,
+                                           orfs_pool.ORFS_IMAGE)
+            for block in setup_configmk.block_names(setup_data)}
+
+def restore_macros(setup_data, args):
+    """
+    Restore the hardened blocks from the macro cache before ORFS runs. Returns the
+    keys of the blocks ORFS has to harden, to be stored once they are built.
+    """
+    config = setup_data["config_mk"]
+    flow_dir = os.path.join(SCRIPT_DIR, "..", "flow")
+    missing = {}
+    for block, key in macro_keys(setup_data).items():
+        block_dir = macro_cache.block_results_dir(flow_dir, config["PLATFORM"], config["DESIGN_NICKNAME"], block)
+        recorded = macro_cache.current_key(block_dir)
+        if recorded == key and all(os.path.exists(os.path.join(block_dir, name))
+                                   for name in macro_cache.artifact_names(block)):
+            print(f"Macro {block} up to date ({key[:12]})")
+        elif macro_cache.lookup(args.macro_cache_dir, key, block_dir):
+            print(f"Macro cache hit for {block} ({key[:12]}), restored to {os.path.normpath(block_dir)}")
+        else:
+            print(f"Macro cache miss for {block} ({key[:12]}), ORFS hardens it")
+            if recorded is not None:
+                # Artifacts of another PE, make must not take them as up to date.
+                shutil.rmtree(block_dir, ignore_errors=True)
+            missing[block] = key
+    return missing
+
+def store_macros(setup_data, missing, args):
+    """Store the blocks ORFS hardened into the macro cache, removing them from missing."""
+    config = setup_data["config_mk"]
+    flow_dir = os.path.join(SCRIPT_DIR, "..", "flow")
+    for block, key in list(missing.items()):
+        block_dir = macro_cache.block_results_dir(flow_dir, config["PLATFORM"], config["DESIGN_NICKNAME"], block)
+        try:
+            stored = macro_cache.store(args.macro_cache_dir, key, block, block_dir,
+                                       max_bytes=args.macro_cache_size * 1024 * 1024)
+        except OSError as e:
+            print(f"Warning: failed to store macro {block} in the macro cache: {e}")
+            continue
+        if stored:
+            print(f"Stored macro {block} in the macro cache {args.macro_cache_dir}")
+            del missing[block]
+
+def place_macros(setup_data, array_yaml, design_dir, macro_state, args):
+    """
+    Write the grid placement of the macros and the matching die and core area into
+    the ORFS design directory (see macro_placement.py). Without a macro_size in
+    macro_config the size is read from the LEF of the hardened block, which is
+    restored from the macro cache or else hardened by ORFS first (its LEF target
+    only), since the top-level floorplan depends on it.
+    """
+    config = setup_data["config_mk"]
+    platform, nickname = config["PLATFORM"], config["DESIGN_NICKNAME"]
+    blocks = setup_configmk.block_names(setup_data)
+    if len(blocks) != 1:
+        print(f"Error: grid placement needs exactly one macro block, found {' '.join(blocks) or 'none'}")
+        return False
+    block = blocks[0]
+
+    macro_size = setup_data["macro_config"].get("macro_size")
+    if not macro_size:
+        flow_dir = os.path.join(SCRIPT_DIR, "..", "flow")
+        lef = os.path.join(macro_cache.block_results_dir(flow_dir, platform, nickname, block), f"{block}.lef")
+        use_macro_cache = not args.no_macro_cache
+        if use_macro_cache and macro_state["missing"] is None:
+            macro_state["missing"] = restore_macros(setup_data, args)
+        if not use_macro_cache or block in macro_state["missing"]:
+            # make rebuilds the block only if its LEF is out of date.
+            if not run_docker_commands(platform, nickname, log_dir=args.log_dir, echo=not args.quiet,
+                                       executor=args.orfs_executor, headless=args.headless,
+                                       pool_size=args.pool_size, orfs_root=args.orfs_root,
+                                       target=os.path.relpath(lef, flow_dir), log_name="orfs_macros"):
+                return False
+            if use_macro_cache:
+                store_macros(setup_data, macro_state["missing"], args)
+        macro_size = macro_placement.lef_macro_size(lef, block)
+        if macro_size is None:
+            print(f"Error: no size of macro {block} found in {os.path.normpath(lef)}")
+            return False
+
+    dimensions = systolic_array_generator.load_array_config(array_yaml)["dimensions"]
+    grid = macro_placement.instance_grid(setup_data, dimensions)
+    if grid is None:
+        return False
+    rows, cols, instance_name = grid
+    channel, margin, site = macro_placement.setup_geometry(setup_data)
+    placement = macro_placement.grid_placement(rows, cols, macro_size, channel, margin, site)
+    os.makedirs(design_dir, exist_ok=True)
+    with open(os.path.join(design_dir, macro_placement.PLACEMENT_FILE), "w") as f:
+        f.write(macro_placement.render_placement_tcl(placement, instance_name, block, macro_size))
+    with open(os.path.join(design_dir, macro_placement.AREA_FILE), "w") as f:
+        f.write(macro_placement.render_area_mk(placement))
+    die = placement["die_area"]
+    print(f"Placed {rows}x{cols} {block} macros ({macro_size[0]} x {macro_size[1]} um) on a grid, "
+          f"die {die[2]} x {die[3]} um")
+    return True
+
+def estimate_die(setup_data, array_yaml, design_dir, top_verilog, report_path):
+    """
+    Estimate the die size from the synthesized area before the floorplan (see
+    die_estimate.py). When the estimate is the floorplan it is written to the ORFS
+    design directory, otherwise the floorplan ORFS is about to use is checked
+    against it, with a warning when the design cannot fit. The estimate and the
+    problems found go to report_path.
+    """
+    config = setup_data["config_mk"]
+    flow_dir = os.path.join(SCRIPT_DIR, "..", "flow")
+    dirs = orfs_metrics.design_dirs(config["PLATFORM"], config["DESIGN_NICKNAME"], flow_dir=flow_dir)
+    cell_area = orfs_metrics.synth_area(dirs["reports"])
+    if cell_area is None:
+        print(f"Error: no synthesized area in {os.path.normpath(dirs['reports'])}/synth_stat.txt")
+        return False
+    rows, cols = systolic_array_generator.load_array_config(array_yaml)["dimensions"][:2]
+    pins = die_estimate.pin_count(top_verilog, config["DESIGN_NAME"])
+    utilization, margin, pin_pitch, aspect_ratio, place_density = die_estimate.setup_parameters(setup_data)
+    result = die_estimate.estimate(cell_area, rows, cols, pins, utilization, margin, pin_pitch, aspect_ratio)
+    die_estimate.print_estimate(result)
+
+    # The floorplan ORFS will use.
+    manual_area_cfg = setup_data.get("manual_area_config", {})
+    if die_estimate.writes_floorplan(setup_data):
+        floorplan = (result["die_area"], result["core_area"])
+        estimate_mk = os.path.join(design_dir, die_estimate.ESTIMATE_FILE)
+        contents = die_estimate.render_area_mk(result)
+        try:
+            with open(estimate_mk, "r") as f:
+                changed = f.read() != contents
+        except OSError:
+            changed = True
+        if changed:
+            with open(estimate_mk, "w") as f:
+                f.write(contents)
+            print(f"Wrote the estimated DIE_AREA and CORE_AREA to {os.path.normpath(estimate_mk)}")
+            # make does not see the new area, make the floorplan out of date.
+            synth_result = os.path.join(dirs["results"], orfs_pool.ORFS_STAGES[0][1])
+            if os.path.exists(os.path.join(dirs["results"], orfs_pool.ORFS_STAGES[1][1])):
+                os.utime(synth_result, None)
+    elif macro_placement.is_enabled(setup_data):
+        floorplan = die_estimate.read_area_mk(os.path.join(design_dir, macro_placement.AREA_FILE))
+    elif manual_area_cfg.get("enable", False):
+        floorplan = (manual_area_cfg.get("DIE_AREA"), manual_area_cfg.get("CORE_AREA"))
+    else:
+        # ORFS sizes the core from CORE_UTILIZATION and CORE_ASPECT_RATIO, without regard to the pins.
+        floorplan = die_estimate.estimate(cell_area, rows, cols, 0, float(config.get("CORE_UTILIZATION", utilization)),
+                                          margin, pin_pitch, config.get("CORE_ASPECT_RATIO", 1))
+        floorplan = (floorplan["die_area"], floorplan["core_area"])
+
+    problems = []
+    if floorplan and all(floorplan) and all(len(box) == 4 for box in floorplan):
+        problems = die_estimate.check_fit(cell_area, pins, pin_pitch, floorplan[0], floorplan[1], place_density)
+    for problem in problems:
+        print(f"Warning: {problem}, the floorplan is unlikely to succeed")
+    with open(report_path, "w") as f:
+        json.dump(dict(result, floorplan={"die_area": floorplan[0], "core_area": floorplan[1]} if floorplan else None,
+                       problems=problems), f, indent=2)
+    return True
+
+def orfs_stages(setup_data, design_files, args, macro_state=None, stage_inputs=None):
+    """
+    One stage per ORFS stage between --from and --until, each reading the checkpoint
+    of the one before. ORFS decides which of its own steps to rerun from the
+    timestamps of the installed files, which the install stage only touches when
+    they change. From --from on the stages always run, with the do-<stage> targets
+    that reuse the earlier checkpoints as they are. With macro_config enabled, the
+    first ORFS stage run restores the hardened blocks from the macro cache (unless
+    macro_state, shared with place_macros, says it was done), and the blocks ORFS
+    hardens itself are stored after the stage that built them. stage_inputs adds
+    inputs to ORFS stages by name, e.g. the die estimate to the floorplan.
+    """
+    config = setup_data["config_mk"]
+    platform, nickname = config["PLATFORM"], config["DESIGN_NICKNAME"]
+    results_dir = os.path.join(SCRIPT_DIR, "..", "flow", "results", platform, nickname, "base")
+    first, last = orfs_stage_range(args)
+    use_macro_cache = setup_data.get("macro_config", {}).get("enable", False) and not args.no_macro_cache
+    # Blocks to store once ORFS hardened them, None until the cache was looked up.
+    macro_state = macro_state if macro_state is not None else {"missing": None}
+    stages = []
+    for index in range(first, last + 1):
+        name, checkpoint = orfs_pool.ORFS_STAGES[index]
+        inputs = list(design_files) + (stage_inputs or {}).get(name, [])
+        if index > 0:
+            inputs.append(os.path.join(results_dir, orfs_pool.ORFS_STAGES[index - 1][1]))
+        target = f"do-{name}" if args.from_stage else name
+
+        def action(target=target, name=name):
+            if use_macro_cache and macro_state["missing"] is None:
+                macro_state["missing"] = restore_macros(setup_data, args)
+            ok = run_docker_commands(platform, nickname, log_dir=args.log_dir, echo=not args.quiet,
+                                     executor=args.orfs_executor, headless=args.headless,
+                                     pool_size=args.pool_size, orfs_root=args.orfs_root,
+                                     target=target, log_name=f"orfs_{name}")
+            if ok and macro_state["missing"]:
+                store_macros(setup_data, macro_state["missing"], args)
+            return ok
+        stages.append(stage_graph.stage(
+            f"orfs_{name}", action,
+            inputs=inputs,
+            outputs=[os.path.join(results_dir, checkpoint)],
+            always=args.from_stage is not None))
+    return stages
+
+def orfs_stage_range(args):
+    """Indices in orfs_pool.ORFS_STAGES of the first and last ORFS stage to run."""
+    first = orfs_pool.ORFS_STAGE_NAMES.index(args.from_stage) if args.from_stage else 0
+    last = orfs_pool.ORFS_STAGE_NAMES.index(args.until) if args.until else len(orfs_pool.ORFS_STAGES) - 1
+    return first, last
+
+def missing_checkpoint(platform, nickname, args):
+    """The checkpoint --from resumes from, if it does not exist."""
+    first, _ = orfs_stage_range(args)
+    if first == 0:
+        return None
+    checkpoint = os.path.join(SCRIPT_DIR, "..", "flow", "results", platform, nickname, "base",
+                              orfs_pool.ORFS_STAGES[first - 1][1])
+    return None if os.path.exists(checkpoint) else checkpoint
+
+def write_profile(profiler, status, setup_data, args):
+    """Write the profile of this run and compare it with an earlier one if requested."""
+    previous = profiling.list_reports(args.profile_dir)
+    config = setup_data.get("config_mk", {})
+    report = profiler.report(status, metadata={
+        "nickname": config.get("DESIGN_NICKNAME"),
+        "platform": config.get("PLATFORM"),
+        "setup_sha256": pipeline.setup_sha256(setup_data),
+        "argv": sys.argv[1:]
+    })
+    report_path, trace_path = profiling.write_report(report, args.profile_dir)
+    profiling.print_summary(report)
+    print(f"Profile written to {report_path}, trace to {trace_path}")
+
+    if args.compare:
+        base_path = previous[-1] if args.compare == "previous" and previous else args.compare
+        if base_path == "previous":
+            print("Warning: no previous run to compare the profile with")
+        else:
+            profiling.print_comparison(profiling.load_report(base_path), report)
+
+def collect_results(setup_data, orfs_status, args):
+    """Parse the ORFS outputs of the design into the results store."""
+    config = setup_data["config_mk"]
+    record = orfs_metrics.collect(config["PLATFORM"], config["DESIGN_NICKNAME"])
+    status = "ok" if orfs_status == "ran" else orfs_status
+    try:
+        conn = results_store.connect(args.results_db)
+        try:
+            results_store.store_run(conn, record, pipeline.setup_sha256(setup_data), status=status, setup=setup_data)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Warning: failed to store the ORFS results in {args.results_db}: {e}")
+        return
+    found = ", ".join(f"{name} {record[name]}" for name in ("wns", "tns", "design_area", "utilization")
+                      if record[name] is not None)
+    print(f"ORFS results stored in {args.results_db}" + (f": {found}" if found else ""))
+
+def main():
+    args = parse_args()
+
     # Parse setup.json.
-    setup_file = os.path.join(SCRIPT_DIR, "setup.json")
+    setup_file = args.setup
     with open(setup_file, 'r') as f:
         setup_data = json.load(f)
     
     # Extract values.
     platform = setup_data.get("config_mk", {}).get("PLATFORM")
-    design_name = setup_data.get("config_mk", {}).get("DESIGN_NAME")
     nickname = setup_data.get("config_mk", {}).get("DESIGN_NICKNAME")
     
     # Check whether the necessary values have been retrieved.
@@ -121,55 +689,32 @@ def main():
         print(f"Error: PLATFORM or DESIGN_NICKNAME not found in {setup_file}")
         sys.exit(1)
     
-    # Create the design directory – modify the path to ../flow/designs/.
-    flow_dir = os.path.join(SCRIPT_DIR, "..", "flow")
-    design_dir = os.path.join(flow_dir, "designs", platform, nickname)
-    src_dir = os.path.join(flow_dir, "designs", "src", nickname)
-    
-    # Ensure the directory exists.
-    os.makedirs(design_dir, exist_ok=True)
-    os.makedirs(src_dir, exist_ok=True)
-    
-    # Check whether the files in the build directory exist.
-    config_mk_path = os.path.join(SCRIPT_DIR, "build", "config.mk")
-    constraint_sdc_path = os.path.join(SCRIPT_DIR, "build", "constraint.sdc")
-    block_mk_path = os.path.join(SCRIPT_DIR, "build", "block.mk")
-    verilog_path = os.path.join(SCRIPT_DIR, "build", f"{design_name}.v")
-    
-    if not os.path.exists(block_mk_path):
-       print(f"Error: {block_mk_path} not found")
-
-    if not os.path.exists(config_mk_path):
-        print(f"Error: {config_mk_path} not found")
-        sys.exit(1)
-    
-    if not os.path.exists(constraint_sdc_path):
-        print(f"Error: {constraint_sdc_path} not found")
-        sys.exit(1)
-    
-    if not os.path.exists(verilog_path):
-        print(f"Error: {verilog_path} not found")
+    checkpoint = missing_checkpoint(platform, nickname, args)
+    if checkpoint:
+        print(f"Error: --from {args.from_stage} needs the checkpoint {os.path.normpath(checkpoint)}, "
+              f"run the earlier stages first")
         sys.exit(1)
+
+    print("\n==== Running main flow ====")
     
-    # Copy the files.
-    shutil.copy(config_mk_path, os.path.join(design_dir, "config.mk"))
-    shutil.copy(block_mk_path, os.path.join(design_dir, "block.mk"))
-    shutil.copy(constraint_sdc_path, os.path.join(design_dir, "constraint.sdc"))
-    
-    # Copy the verilog files.
-    shutil.copy(verilog_path, os.path.join(src_dir, f"{design_name}.v"))
-    
-    # Copy all .v files from the src directory.
-    src_verilog_dir = os.path.join(SCRIPT_DIR, "src")
-    for file in os.listdir(src_verilog_dir):
-        if file.endswith(".v"):
-            shutil.copy(os.path.join(src_verilog_dir, file), 
-                        os.path.join(src_dir, file))
-    
-    # Update the directory mount in the Docker command.
-    if not run_docker_commands(platform, nickname):
-        print("Error during Docker execution, stopping script")
+    # Run the stages whose inputs changed since the last successful run.
+    profiler = profiling.Profiler()
+    stages = build_stages(setup_data, args)
+    for stage_def in stages:
+        stage_def["action"] = profiler.wrap(stage_def["name"], stage_def["action"])
+    status = stage_graph.run_stages(stages, args.build_dir, force=args.force,
+                                    max_workers=args.jobs)
+    write_profile(profiler, status, setup_data, args)
+    orfs_status = [result for name, result in status.items() if name.startswith("orfs_")]
+    if "failed" in orfs_status:
+        collect_results(setup_data, "failed", args)
+    elif "ran" in orfs_status:
+        collect_results(setup_data, "ran", args)
+
+    failed = sorted(name for name, result in status.items() if result in ("failed", "blocked"))
+    if failed:
+        print(f"Error during stages: {', '.join(failed)}, stopping script")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
+    main()
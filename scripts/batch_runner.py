@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Run several design setups concurrently.
+
+Usage: python3 batch_runner.py [-j N] [--cpus-per-job N] [--max-memory MB] [SETUP ...] [-- RUN_FLOW_OPTIONS]
+
+Every setup (example*/setup.json by default) becomes a job named after the
+directory of its setup file, with its own directory <batch-dir>/<name>/ holding
+a copy of the setup, the build files, logs and profiles. run-flow.py runs the
+job with --setup and --build-dir pointing there, headless and quiet, its output
+going to <batch-dir>/<name>/run-flow.log. Jobs which would share an ORFS design
+directory (same PLATFORM and DESIGN_NICKNAME) get their name appended to the
+nickname. The HLS sources are shared: run-flow.py serializes the HLS runs and
+the later jobs restore the RTL from the HLS cache.
+
+Jobs run as separate processes, at most --jobs at a time, longest first by the
+wall time of their last profiled run (jobs without history go first). A job only
+starts when its memory estimate (the peak of its last run, at least --job-memory)
+fits under --max-memory next to the running jobs, a smaller job may go ahead of
+one that does not fit. Each job gets NUM_CORES=--cpus-per-job, which bounds the
+ORFS threads and is forwarded into the ORFS container.
+
+run_jobs takes an optional monitor, called for every running job while it polls;
+when it returns a reason the job is stopped and reported as pruned (see sweep.py).
+"""
+import argparse
+import glob
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import profiling
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.normpath(os.path.join(SCRIPT_DIR, ".."))
+RUN_FLOW = os.path.join(PROJECT_DIR, "run-flow.py")
+BATCH_DIR = os.path.join(PROJECT_DIR, "build", "batch")
+DEFAULT_SETUPS = os.path.join(PROJECT_DIR, "example*", "setup.json")
+DEFAULT_JOB_MEMORY_MB = 4096
+POLL_INTERVAL = 1.0
+
+def physical_memory_mb():
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (ValueError, OSError):
+        return None
+
+def job_history(profile_dir):
+    """(wall s, peak memory MB) of the last profiled run in profile_dir, or (None, None)."""
+    reports = profiling.list_reports(profile_dir)
+    if not reports:
+        return None, None
+    try:
+        report = profiling.load_report(reports[-1])
+    except (OSError, ValueError):
+        return None, None
+    peak_kb = max([report.get("max_rss_kb", 0)] +
+                  [stage.get("max_rss_kb", 0) for stage in report.get("stages", [])])
+    return report.get("wall_s"), peak_kb / 1024
+
+def prepare_jobs(setup_files, batch_dir, job_memory_mb):
+    """Create the job directories with their setup copies, returns the list of jobs."""
+    jobs = []
+    names = set()
+    designs = set()
+    for setup_file in setup_files:
+        with open(setup_file, "r") as f:
+            setup_data = json.load(f)
+        config = setup_data.setdefault("config_mk", {})
+        if not config.get("PLATFORM") or not config.get("DESIGN_NICKNAME"):
+            print(f"Error: PLATFORM or DESIGN_NICKNAME not found in {setup_file}")
+            return None
+
+        name = os.path.basename(os.path.dirname(os.path.abspath(setup_file)))
+        base_name, index = name, 1
+        while name in names:
+            index += 1
+            name = f"{base_name}_{index}"
+        names.add(name)
+        # Separate ORFS design directories for designs with the same nickname.
+        if (config["PLATFORM"], config["DESIGN_NICKNAME"]) in designs:
+            config["DESIGN_NICKNAME"] = f"{config['DESIGN_NICKNAME']}_{name}"
+            print(f"Warning: {setup_file} shares its nickname with an earlier job, "
+                  f"using {config['DESIGN_NICKNAME']}")
+        designs.add((config["PLATFORM"], config["DESIGN_NICKNAME"]))
+
+        job_dir = os.path.join(batch_dir, name)
+        os.makedirs(job_dir, exist_ok=True)
+        job_setup = os.path.join(job_dir, "setup.json")
+        with open(job_setup, "w") as f:
+            json.dump(setup_data, f, indent=2)
+        expected_s, peak_mb = job_history(os.path.join(job_dir, "profiles"))
+        jobs.append({
+            "name": name,
+            "dir": job_dir,
+            "setup": job_setup,
+            "nickname": config["DESIGN_NICKNAME"],
+            "expected_s": expected_s,
+            "memory_mb": max(job_memory_mb, peak_mb or 0)
+        })
+    return jobs
+
+def resolve_limits(job_count, jobs=None, cpus_per_job=None, max_memory_mb=None):
+    """
+    (concurrent jobs, CPUs per job, memory budget in MB) from the given limits,
+    defaulting to all CPUs and 80% of the physical memory.
+    """
+    cpu_count = os.cpu_count() or 1
+    cpus_per_job = cpus_per_job or max(1, cpu_count // (jobs or job_count))
+    jobs = jobs or max(1, min(job_count, cpu_count // cpus_per_job))
+    if max_memory_mb is None:
+        physical = physical_memory_mb()
+        max_memory_mb = physical * 8 // 10 if physical else None
+    return jobs, cpus_per_job, max_memory_mb
+
+def schedule_order(jobs):
+    """Longest job first, jobs without history ahead of all others."""
+    return sorted(jobs, key=lambda job: (job["expected_s"] is not None, -(job["expected_s"] or 0)))
+
+def start_job(job, run_flow_args, cpus_per_job):
+    cmd = [sys.executable, RUN_FLOW, "--setup", job["setup"], "--build-dir", job["dir"],
+           "--headless", "--quiet"] + run_flow_args
+    env = dict(os.environ, NUM_CORES=str(cpus_per_job))
+    job["log"] = os.path.join(job["dir"], "run-flow.log")
+    with open(job["log"], "w") as log_file:
+        # A session of its own, so that stopping the job also stops make and the tools.
+        job["process"] = subprocess.Popen(cmd, stdout=log_file, stderr=subprocess.STDOUT,
+                                          stdin=subprocess.DEVNULL, env=env, start_new_session=True)
+    job["start"] = time.perf_counter()
+    job["started_at"] = time.time()
+    expected = f"{job['expected_s']:.0f} s" if job["expected_s"] is not None else "unknown"
+    print(f"[{job['name']}] started {job['nickname']} (expected {expected}, "
+          f"reserved {job['memory_mb']:.0f} MB)", flush=True)
+
+def stop_job(job):
+    """Terminate the process group of a running job and wait for it."""
+    try:
+        os.killpg(job["process"].pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    job["process"].wait()
+
+def run_jobs(jobs, run_flow_args, max_jobs, cpus_per_job, max_memory_mb, monitor=None):
+    """
+    Run the jobs on up to max_jobs processes within max_memory_mb, returns the failed
+    ones. monitor(job) may return a reason to stop a running job early.
+    """
+    pending = schedule_order(jobs)
+    running = []
+    failed = []
+    try:
+        while pending or running:
+            for job in list(pending):
+                if len(running) >= max_jobs:
+                    break
+                reserved = sum(other["memory_mb"] for other in running)
+                # A job larger than the whole budget still runs, alone.
+                if running and max_memory_mb and reserved + job["memory_mb"] > max_memory_mb:
+                    continue
+                start_job(job, run_flow_args, cpus_per_job)
+                pending.remove(job)
+                running.append(job)
+
+            if monitor:
+                for job in running:
+                    reason = job["process"].poll() is None and monitor(job)
+                    if reason:
+                        job["pruned"] = reason
+                        stop_job(job)
+                        print(f"[{job['name']}] pruned: {reason}", flush=True)
+            finished = [job for job in running if job["process"].poll() is not None]
+            if not finished:
+                time.sleep(POLL_INTERVAL)
+                continue
+            for job in finished:
+                running.remove(job)
+                job["wall_s"] = time.perf_counter() - job["start"]
+                job["returncode"] = job["process"].returncode
+                if job.get("pruned"):
+                    continue
+                if job["returncode"] == 0:
+                    print(f"[{job['name']}] done in {job['wall_s']:.1f} s", flush=True)
+                else:
+                    failed.append(job)
+                    print(f"[{job['name']}] failed (exit status {job['returncode']}) after "
+                          f"{job['wall_s']:.1f} s, see {job['log']}", flush=True)
+    except KeyboardInterrupt:
+        for job in running:
+            stop_job(job)
+        print("Interrupted, stopped the running jobs")
+        sys.exit(130)
+    return failed
+
+def print_summary(jobs):
+    print(f"{'job':<28} {'nickname':<32} {'status':<8} {'wall s':>9} {'expected s':>11}")
+    for job in jobs:
+        if "returncode" not in job:
+            status = "skipped"
+        elif job.get("pruned"):
+            status = "pruned"
+        else:
+            status = "ok" if job["returncode"] == 0 else "failed"
+        wall = f"{job['wall_s']:9.1f}" if "wall_s" in job else f"{'-':>9}"
+        expected = f"{job['expected_s']:11.1f}" if job["expected_s"] is not None else f"{'-':>11}"
+        print(f"{job['name']:<28} {job['nickname']:<32} {status:<8} {wall} {expected}")
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    run_flow_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, run_flow_args = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description="Run several design setups concurrently.",
+                                     epilog="Options after -- are passed on to run-flow.py.")
+    parser.add_argument("setups", nargs="*", help="setup files (default: example*/setup.json)")
+    parser.add_argument("--batch-dir", default=BATCH_DIR, help="directory receiving the job directories")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="maximum number of concurrent jobs (default: CPUs / --cpus-per-job)")
+    parser.add_argument("--cpus-per-job", type=int, default=None,
+                        help="NUM_CORES given to every job (default: CPUs / jobs)")
+    parser.add_argument("--max-memory", type=int, default=None,
+                        help="memory budget in MB of the running jobs (default: 80%% of the physical memory)")
+    parser.add_argument("--job-memory", type=int, default=DEFAULT_JOB_MEMORY_MB,
+                        help="memory estimate in MB of a job, the minimum when it has history")
+    args = parser.parse_args(argv)
+
+    setup_files = args.setups or sorted(glob.glob(DEFAULT_SETUPS))
+    if not setup_files:
+        print("Error: no setup files given")
+        sys.exit(1)
+    jobs = prepare_jobs(setup_files, args.batch_dir, args.job_memory)
+    if jobs is None:
+        sys.exit(1)
+
+    max_jobs, cpus_per_job, max_memory = resolve_limits(len(jobs), args.jobs, args.cpus_per_job, args.max_memory)
+    print(f"Running {len(jobs)} jobs, {max_jobs} at a time with {cpus_per_job} CPUs each"
+          + (f", within {max_memory} MB" if max_memory else ""))
+
+    failed = run_jobs(jobs, run_flow_args, max_jobs, cpus_per_job, max_memory)
+    print_summary(jobs)
+    if failed:
+        print(f"Error: {len(failed)} of {len(jobs)} jobs failed: {', '.join(job['name'] for job in failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark the compiled YAML connections (connection_dsl.py) against the
+hardcoded standard grid (systolic_array_generator.build_grid_netlist).
+
+Usage: python3 bench_connection_dsl.py [--sizes 16 64 256] [--topologies grid diagonal broadcast chain]
+
+For each NxN size and topology the netlist is compiled with NumPy and in pure
+Python, and both netlists must be identical. The grid topology is the standard
+grid written as rules, the hardcoded builder is timed next to it. The others are
+only expressible as rules:
+
+    diagonal  - PE (i, j) feeds PE (i, j+1) and PE (i+1, j+1)
+    broadcast - one top-level input per row drives the left inputs of all its PEs
+    chain     - a 1-D chain through the PEs in row-major order, {k/cols}_{k%cols}
+"""
+import argparse
+import time
+
+import connection_dsl
+import systolic_array_generator
+from bench_generate_top import synthetic_array_config, synthetic_connections, synthetic_pe_config
+
+def topology_connections(topology):
+    """Connections rules of a benchmark topology, see the module docstring."""
+    if topology == "grid":
+        return synthetic_connections()
+    every_pe = {"i": "rows", "j": "cols"}
+    rules = [{"for": every_pe, "connect": {"signal": name, "to": [f"C-{{i}}_{{j}}.{name}"]}} for name in ("clk", "rst")]
+    if topology == "diagonal":
+        rules += [
+            {"for": every_pe, "connect_handshake": {"from": "C-{i}_{j}.right", "to": "C-{i}_{j+1}.left"}},
+            {"for": every_pe, "connect_handshake": {"from": "C-{i}_{j}.down", "to": "C-{i+1}_{j+1}.up"}},
+            {"for": {"i": "rows"}, "connect_handshake": {"from": "left_in_rsc{i}", "to": "C-{i}_0.left"}},
+            {"for": {"j": "cols"}, "connect_handshake": {"from": "up_in_rsc{j}", "to": "C-0_{j}.up"}},
+            {"for": {"i": [1, "rows"]}, "connect_handshake": {"from": "up_in_rsc{cols+i-1}", "to": "C-{i}_0.up"}}
+        ]
+    elif topology == "broadcast":
+        rules += [
+            {"for": every_pe, "connect": {"signal": f"row_in_rsc{{i}}{suffix}",
+                                          "to": [f"C-{{i}}_{{j}}.left_in_rsc{suffix}"]}}
+            for suffix in ("_dat", "_vld")
+        ] + [
+            {"for": every_pe, "connect_handshake": {"from": "C-{i}_{j}.down", "to": "C-{i+1}_{j}.up"}},
+            {"for": {"j": "cols"}, "connect_handshake": {"from": "up_in_rsc{j}", "to": "C-0_{j}.up"}}
+        ]
+    else:
+        rules += [
+            {"for": {"k": "rows*cols-1"},
+             "connect_handshake": {"from": "C-{k/cols}_{k%cols}.right", "to": "C-{(k+1)/cols}_{(k+1)%cols}.left"}},
+            {"for": {}, "connect_handshake": {"from": "chain_in_rsc", "to": "C-0_0.left"}},
+            {"for": {}, "connect_handshake": {"from": "C-{rows-1}_{cols-1}.right", "to": "chain_out_rsc"}}
+        ]
+    return rules
+
+def same_netlist(a, b):
+    return (a.net_kind == b.net_kind and a.net_args == b.net_args and a.top_ports == b.top_ports
+            and a.connections == b.connections and a.link_stems == b.link_stems and a.templates == b.templates)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 64, 128, 256],
+                        help="array sizes N, each run builds an NxN array")
+    parser.add_argument("--topologies", nargs="+", default=["grid", "diagonal", "broadcast", "chain"],
+                        choices=["grid", "diagonal", "broadcast", "chain"])
+    args = parser.parse_args(argv)
+
+    pe_config = synthetic_pe_config()
+    if connection_dsl.numpy is None:
+        print("NumPy is not installed, only the pure Python expansion is timed")
+    print(f"{'topology':>10} {'size':>9} {'nets':>8} {'ports':>7} {'numpy s':>9} {'python s':>9} {'grid s':>9}  match")
+    for topology in args.topologies:
+        for n in args.sizes:
+            config = synthetic_array_config(n, n)
+            config["connections"] = topology_connections(topology)
+
+            netlists = {}
+            times = {}
+            for use_numpy in ((True, False) if connection_dsl.numpy is not None else (False,)):
+                start = time.perf_counter()
+                netlists[use_numpy] = connection_dsl.build_connection_netlist(config, pe_config, use_numpy)
+                times[use_numpy] = time.perf_counter() - start
+            grid_time = None
+            if topology == "grid":
+                start = time.perf_counter()
+                systolic_array_generator.build_grid_netlist(synthetic_array_config(n, n), pe_config)
+                grid_time = time.perf_counter() - start
+
+            netlist = netlists[False]
+            match = "-" if len(netlists) == 1 else ("yes" if same_netlist(netlists[True], netlist) else "NO")
+            numpy_time = f"{times[True]:9.3f}" if True in times else f"{'-':>9}"
+            grid = f"{grid_time:9.3f}" if grid_time is not None else f"{'-':>9}"
+            print(f"{topology:>10} {f'{n}x{n}':>9} {len(netlist.net_kind):8d} {len(netlist.top_ports):7d} "
+                  f"{numpy_time} {times[False]:9.3f} {grid}  {match}")
+
+if __name__ == "__main__":
+    main()
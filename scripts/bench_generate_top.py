@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for top-level Verilog generation.
+
+Usage: python3 bench_generate_top.py [--sizes 2 4 8 16 32 64 128 256] [--legacy-max 32]
+
+For each NxN size the compact array netlist is built from a synthetic
+Catapult-style PE port table, then turned into Verilog by generate_top.py. Up to
+--legacy-max the previous implementation, which built a dict of formatted
+connections per PE and rescanned the whole wire list for every output
+connection, is timed as well and its output compared.
+"""
+import argparse
+import time
+
+import generate_top
+import systolic_array_generator
+
+def synthetic_pe_config(data_width=32):
+    """Port table of the Catapult PE (see hls/pe.cpp)."""
+    ports = {
+        "clk": {"direction": "input", "type": "wire", "width": 1},
+        "rst": {"direction": "input", "type": "wire", "width": 1}
+    }
+    for channel, direction in (("left_in", "input"), ("up_in", "input"), ("right_out", "output"),
+                               ("down_out", "output"), ("result_out", "output")):
+        flipped = "output" if direction == "input" else "input"
+        ports[f"{channel}_rsc_dat"] = {"direction": direction, "type": "wire", "width": data_width}
+        ports[f"{channel}_rsc_vld"] = {"direction": direction, "type": "wire", "width": 1}
+        ports[f"{channel}_rsc_rdy"] = {"direction": flipped, "type": "wire", "width": 1}
+    return {"submodule": "pe", "ports": ports}
+
+def synthetic_array_config(rows, cols):
+    return {
+        "top_module": "SystolicArray",
+        "dimensions": [rows, cols],
+        "top_ports": [{"name": "clk", "direction": "input", "width": 1},
+                      {"name": "rst", "direction": "input", "width": 1}],
+        "instances": [{"name": "C", "module": "pe", "array": [rows, cols], "use_macro": True}]
+    }
+
+def synthetic_connections():
+    """The standard grid of build_grid_netlist as YAML connections rules (see connection_dsl.py)."""
+    every_pe = {"i": "rows", "j": "cols"}
+    rules = [{"for": every_pe, "connect": {"signal": name, "to": [f"C-{{i}}_{{j}}.{name}"]}} for name in ("clk", "rst")]
+    rules += [
+        {"for": every_pe, "connect_handshake": {"from": "C-{i}_{j}.right", "to": "C-{i}_{j+1}.left"}},
+        {"for": every_pe, "connect_handshake": {"from": "C-{i}_{j}.down", "to": "C-{i+1}_{j}.up"}},
+        {"for": {"i": "rows"}, "connect_handshake": {"from": "left_in_rsc{i}", "to": "C-{i}_0.left"}},
+        {"for": {"i": "rows"}, "connect_handshake": {"from": "C-{i}_{cols-1}.right", "to": "right_out_rsc{i}"}},
+        {"for": {"j": "cols"}, "connect_handshake": {"from": "up_in_rsc{j}", "to": "C-0_{j}.up"}},
+        {"for": {"j": "cols"}, "connect_handshake": {"from": "C-{rows-1}_{j}.down", "to": "down_out_rsc{j}"}}
+    ]
+    rules += [{"for": every_pe, "connect": {"signal": f"result_out_rsc{suffix}{{i*cols+j}}",
+                                            "to": [f"C-{{i}}_{{j}}.result_out_rsc{suffix}"]}}
+              for suffix in ("_dat", "_vld", "_rdy")]
+    return rules
+
+def generate_systolic_array_json_legacy(config, pe_config):
+    """Previous implementation of systolic_array_generator.generate_systolic_array_json(), kept as the benchmark reference."""
+    # Initialize JSON structure
+    json_data = {
+        "top_module": config["top_module"],
+        "top_ports": {},
+        "instances": {}
+    }
+    
+    # Process top ports
+    for port in config.get("top_ports", []):
+        json_data["top_ports"][port["name"]] = {
+            "direction": port["direction"],
+            "width": port["width"]
+        }
+    
+    # Get dimensions from YAML
+    dimensions = config["dimensions"]
+    rows, cols = dimensions[0], dimensions[1]
+    
+    # Extract port names and info from PE config
+    pe_ports = pe_config["ports"]
+    
+    # Copy all fields from the original port definitions
+    def create_port_copy(port_info):
+        return {key: value for key, value in port_info.items()}
+    
+    # Standard port groupings
+    port_groups = systolic_array_generator.group_pe_ports(pe_ports)
+    
+    # Basic control ports
+    control_ports = ["clk", "rst"]
+    
+    # Add top-level ports for the systolic array
+    for i in range(rows):
+        # Left edge input ports
+        for port in port_groups["left"]:
+            suffix = port.split("_rsc")[1] if "_rsc" in port else ""
+            port_info = create_port_copy(pe_ports[port])
+            
+            # Create port with index
+            port_name = f"{port.split('_rsc')[0]}_rsc{i}{suffix}"
+            json_data["top_ports"][port_name] = port_info
+        
+        # Right edge output ports
+        for port in port_groups["right"]:
+            suffix = port.split("_rsc")[1] if "_rsc" in port else ""
+            port_info = create_port_copy(pe_ports[port])
+            
+            # Correction: ensure the directions are correct.
+            # The previous inversion logic was incorrect: 
+            # for output ports, dat and vld should remain as output, 
+            # while rdy should remain as input.
+            # port_info["direction"] = "input" if port_info["direction"] == "output" else "output"
+            
+            port_name = f"{port.split('_rsc')[0]}_rsc{i}{suffix}"
+            json_data["top_ports"][port_name] = port_info
+    
+    for j in range(cols):
+        # Top edge input ports
+        for port in port_groups["up"]:
+            suffix = port.split("_rsc")[1] if "_rsc" in port else ""
+            port_info = create_port_copy(pe_ports[port])
+            
+            port_name = f"{port.split('_rsc')[0]}_rsc{j}{suffix}"
+            json_data["top_ports"][port_name] = port_info
+        
+        # Bottom edge output ports
+        for port in port_groups["down"]:
+            suffix = port.split("_rsc")[1] if "_rsc" in port else ""
+            port_info = create_port_copy(pe_ports[port])
+            
+            # Correction: ensure the directions are correct.
+            #The previous inversion logic was incorrect: for output ports, 
+            # dat and vld should remain as output, while rdy should remain as input.
+            # port_info["direction"] = "input" if port_info["direction"] == "output" else "output"
+            
+            port_name = f"{port.split('_rsc')[0]}_rsc{j}{suffix}"
+            json_data["top_ports"][port_name] = port_info
+    
+    # Add result ports
+    for port in port_groups["result"]:
+        if port.endswith("_dat") or port.endswith("_vld") or port.endswith("_rdy"):
+            # Create separate dat, vld, and rdy ports for each PE
+            for k in range(rows * cols):
+                port_info = create_port_copy(pe_ports[port])
+                json_data["top_ports"][f"{port}{k}"] = port_info
+    
+    # Process instances
+    # Look for array instances in the YAML
+    for instance in config.get("instances", []):
+        if "array" in instance:
+            module_name = instance["module"]
+            array_dims = instance["array"]
+            array_rows, array_cols = array_dims[0], array_dims[1]
+            
+            # Create PE instances in the array
+            for i in range(array_rows):
+                for j in range(array_cols):
+                    pe_name = f"PE_{i}_{j}"
+                    json_data["instances"][pe_name] = {
+                        "module": module_name,
+                        "connect": {}
+                    }
+    
+    # Process connections
+    # Create internal wires for PE connections
+    for i in range(rows):
+        for j in range(cols):
+            # Basic connections for all PEs
+            for ctrl_port in control_ports:
+                json_data["instances"][f"PE_{i}_{j}"]["connect"][ctrl_port] = ctrl_port
+            
+            # Skip rightmost column for horizontal connections
+            if j < cols - 1:
+                # Horizontal connections (right to left)
+                for port in port_groups["right"]:
+                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
+                    
+                    if suffix == "_dat":
+                        wire_name = f"data_PE_{i}_{j}_to_PE_{i}_{j+1}"
+                    elif suffix == "_vld":
+                        wire_name = f"val_PE_{i}_{j}_to_PE_{i}_{j+1}"
+                    elif suffix == "_rdy":
+                        wire_name = f"rdy_PE_{i}_{j}_to_PE_{i}_{j+1}"
+                    else:
+                        wire_name = f"{port}_PE_{i}_{j}_to_PE_{i}_{j+1}"
+                    
+                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = wire_name
+                
+                # Connect to the left inputs of the next PE
+                for port in port_groups["left"]:
+                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
+                    
+                    if suffix == "_dat":
+                        wire_name = f"data_PE_{i}_{j}_to_PE_{i}_{j+1}"
+                    elif suffix == "_vld":
+                        wire_name = f"val_PE_{i}_{j}_to_PE_{i}_{j+1}"
+                    elif suffix == "_rdy":
+                        wire_name = f"rdy_PE_{i}_{j}_to_PE_{i}_{j+1}"
+                    else:
+                        wire_name = f"{port}_PE_{i}_{j}_to_PE_{i}_{j+1}"
+                    
+                    json_data["instances"][f"PE_{i}_{j+1}"]["connect"][port] = wire_name
+            else:
+                # Right edge
+                for port in port_groups["right"]:
+                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
+                    prefix = port.split("_rsc")[0] if "_rsc" in port else port
+                    top_port_name = f"{prefix}_rsc{i}{suffix}"
+                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = top_port_name
+            
+            # Skip bottom row for vertical connections
+            if i < rows - 1:
+                # Vertical connections (down to up)
+                for port in port_groups["down"]:
+                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
+                    
+                    if suffix == "_dat":
+                        wire_name = f"data_PE_{i}_{j}_to_PE_{i+1}_{j}"
+                    elif suffix == "_vld":
+                        wire_name = f"val_PE_{i}_{j}_to_PE_{i+1}_{j}"
+                    elif suffix == "_rdy":
+                        wire_name = f"rdy_PE_{i}_{j}_to_PE_{i+1}_{j}"
+                    else:
+                        wire_name = f"{port}_PE_{i}_{j}_to_PE_{i+1}_{j}"
+                    
+                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = wire_name
+                
+                # Connect to the up inputs of the PE below
+                for port in port_groups["up"]:
+                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
+                    
+                    if suffix == "_dat":
+                        wire_name = f"data_PE_{i}_{j}_to_PE_{i+1}_{j}"
+                    elif suffix == "_vld":
+                        wire_name = f"val_PE_{i}_{j}_to_PE_{i+1}_{j}"
+                    elif suffix == "_rdy":
+                        wire_name = f"rdy_PE_{i}_{j}_to_PE_{i+1}_{j}"
+                    else:
+                        wire_name = f"{port}_PE_{i}_{j}_to_PE_{i+1}_{j}"
+                    
+                    json_data["instances"][f"PE_{i+1}_{j}"]["connect"][port] = wire_name
+            else:
+                # Bottom edge
+                for port in port_groups["down"]:
+                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
+                    prefix = port.split("_rsc")[0] if "_rsc" in port else port
+                    top_port_name = f"{prefix}_rsc{j}{suffix}"
+                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = top_port_name
+            
+            # Left edge
+            if j == 0:
+                for port in port_groups["left"]:
+                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
+                    prefix = port.split("_rsc")[0] if "_rsc" in port else port
+                    top_port_name = f"{prefix}_rsc{i}{suffix}"
+                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = top_port_name
+            
+            # Top edge
+            if i == 0:
+                for port in port_groups["up"]:
+                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
+                    prefix = port.split("_rsc")[0] if "_rsc" in port else port
+                    top_port_name = f"{prefix}_rsc{j}{suffix}"
+                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = top_port_name
+            
+            # Add result connections - Use the PE index to connect to the corresponding top-level port.
+            pe_index = i * cols + j
+            for port in port_groups["result"]:
+                if port.endswith("_dat"):
+                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = f"{port}{pe_index}"
+                elif port.endswith("_vld"):
+                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = f"{port}{pe_index}"
+                elif port.endswith("_rdy"):
+                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = f"{port}{pe_index}"
+    
+    return json_data
+
+def generate_top_verilog_legacy(connection_config, submodule_ports):
+    """Previous implementation of generate_top_verilog(), kept as the benchmark reference."""
+    top_module = connection_config["top_module"]
+    instances = connection_config["instances"]
+    top_ports = connection_config["top_ports"]
+
+    port_definitions = []
+    internal_wires = []
+
+    for port_name, port_info in top_ports.items():
+        port_definitions.append(generate_top.format_signal(port_info["direction"], port_info["width"], port_name))
+
+    for instance_name, instance_data in instances.items():
+        module_name = instance_data["module"].lower()
+        module_ports = submodule_ports[module_name]
+        for port, signal in instance_data.get("connect", {}).items():
+            if port in module_ports and module_ports[port]["direction"] == "output":
+                if signal in top_ports:
+                    continue
+                if signal not in ["0", "1"] and signal not in [wire.split(" ")[-1].strip(";") for wire in internal_wires]:
+                    internal_wires.append(generate_top.format_wire(module_ports[port]["width"], signal))
+
+    verilog_code = f"// Auto-generated top module\nmodule {top_module}(\n"
+    verilog_code += "\n".join(port_definitions).rstrip(",") + "\n);\n\n"
+
+    if internal_wires:
+        verilog_code += "// Internal nets\n" + "\n".join(internal_wires) + "\n\n"
+
+    for instance_name, instance_data in instances.items():
+        module_name = instance_data["module"]
+        module_ports = submodule_ports[module_name.lower()]
+        verilog_code += f"  // Instance of {module_name}\n"
+        verilog_code += f"  {module_name} {instance_name} (\n"
+
+        port_connections = []
+        for port, port_info in module_ports.items():
+            mapped_signal = instance_data["connect"].get(port, port)
+            port_connections.append(f"    .{port}({mapped_signal})")
+        verilog_code += ",\n".join(port_connections) + "\n  );\n\n"
+
+    verilog_code += "endmodule\n"
+    return verilog_code
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 4, 8, 16, 32, 64, 128, 256],
+                        help="array sizes N, each run builds an NxN array")
+    parser.add_argument("--legacy-max", type=int, default=32,
+                        help="largest size the previous quadratic implementation is run on")
+    args = parser.parse_args(argv)
+
+    pe_config = synthetic_pe_config()
+    submodule_ports = generate_top.index_submodule_configs([pe_config])
+
+    print(f"{'size':>9} {'nets':>8} {'array s':>9} {'model MB':>9} {'top s':>9} {'MB':>8} {'legacy s':>9}  match")
+    for n in args.sizes:
+        start = time.perf_counter()
+        netlist = systolic_array_generator.build_array_netlist(synthetic_array_config(n, n), pe_config)
+        array_time = time.perf_counter() - start
+        model_mb = sum(len(a) * a.itemsize for a in (netlist.net_kind, netlist.net_args,
+                                                     netlist.top_ports, netlist.connections)) / (1024 * 1024)
+
+        start = time.perf_counter()
+        verilog_code = "".join(generate_top.iter_top_verilog_netlist(netlist))
+        top_time = time.perf_counter() - start
+        nets = verilog_code.count("\n  wire ")
+        size_mb = len(verilog_code) / (1024 * 1024)
+
+        legacy = f"{'-':>9}  -"
+        if n <= args.legacy_max:
+            start = time.perf_counter()
+            array_json = generate_systolic_array_json_legacy(synthetic_array_config(n, n), pe_config)
+            legacy_code = generate_top_verilog_legacy(array_json, submodule_ports)
+            legacy_time = time.perf_counter() - start
+            legacy = f"{legacy_time:9.3f}  {'yes' if legacy_code == verilog_code else 'NO'}"
+        print(f"{f'{n}x{n}':>9} {nets:8d} {array_time:9.3f} {model_mb:9.2f} {top_time:9.3f} {size_mb:8.2f} {legacy}")
+
+if __name__ == "__main__":
+    main()
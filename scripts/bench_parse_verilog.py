@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark the streaming port extractor (verilog_ports.py) against the previous
+regex-based parse_verilog() on synthetic Catapult-style netlists.
+
+Usage: python3 bench_parse_verilog.py [--sizes 1 4 16] [--keep DIR]
+
+Each size is the approximate netlist size in MB. The netlist contains modules
+with non-ANSI headers, port declarations and long bodies of wires, assignments,
+always blocks and instances, like the concat_rtl.v files Catapult produces.
+"""
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import verilog_ports
+
+def parse_verilog_regex(file_path):
+    """Previous implementation of parse_verilog(), kept as the benchmark reference."""
+    modules = {}
+
+    with open(file_path, "r") as f:
+        verilog_code = f.read()
+
+    module_pattern = re.compile(r"module\s+(\w+)\s*\((.*?)\);\s*(.*?)endmodule", re.DOTALL)
+    port_pattern = re.compile(r"(input|output)\s*(?:(logic|wire|reg)\s*)?(\[\d+:\d+\])?\s*(\w+)")
+    internal_port_pattern = re.compile(r"(input|output)\s*(?:(logic|wire|reg)\s*)?(\[\d+:\d+\])?\s*(\w+)\s*;", re.MULTILINE)
+    reg_pattern = re.compile(r"reg\s*(\[\d+:\d+\])?\s*(\w+)\s*;")
+
+    for match in module_pattern.finditer(verilog_code):
+        module_name = match.group(1)
+        header = match.group(2)
+        body = match.group(3)
+        module_ports = {}
+
+        for port_match in port_pattern.finditer(header):
+            direction = port_match.group(1)
+            type_token = port_match.group(2)
+            width = port_match.group(3)
+            port_name = port_match.group(4)
+            port_type = "reg" if type_token and type_token.strip() == "reg" else "wire"
+            module_ports[port_name] = {
+                "direction": direction,
+                "type": port_type,
+                "width": int(width[1:-1].split(":")[0]) + 1 if width else 1
+            }
+
+        for port_match in internal_port_pattern.finditer(body):
+            direction = port_match.group(1)
+            type_token = port_match.group(2)
+            width = port_match.group(3)
+            port_name = port_match.group(4)
+            port_type = "reg" if type_token and type_token.strip() == "reg" else "wire"
+            if port_name in module_ports:
+                if type_token and type_token.strip() == "reg":
+                    module_ports[port_name]["type"] = "reg"
+            else:
+                module_ports[port_name] = {
+                    "direction": direction,
+                    "type": port_type,
+                    "width": int(width[1:-1].split(":")[0]) + 1 if width else 1
+                }
+        for reg_match in reg_pattern.finditer(body):
+            width = reg_match.group(1)
+            port_name = reg_match.group(2)
+            if port_name in module_ports:
+                module_ports[port_name]["type"] = "reg"
+
+        modules[module_name] = module_ports
+
+    return modules
+
+def write_module(f, index, body_lines):
+    """Write one synthetic Catapult-style module with body_lines lines of logic."""
+    name = f"pe_core_{index}"
+    ports = [("input", 1, "clk"), ("input", 1, "rst")]
+    for channel in ("left_in", "up_in"):
+        ports += [("input", 32, f"{channel}_rsc_dat"), ("input", 1, f"{channel}_rsc_vld"),
+                  ("output", 1, f"{channel}_rsc_rdy")]
+    for channel in ("right_out", "down_out", "result_out"):
+        ports += [("output", 32, f"{channel}_rsc_dat"), ("output", 1, f"{channel}_rsc_vld"),
+                  ("input", 1, f"{channel}_rsc_rdy")]
+
+    f.write("// ------------------------------------------------------------------\n")
+    f.write(f"//  Design Unit:    {name}\n")
+    f.write("// ------------------------------------------------------------------\n\n")
+    f.write(f"module {name} (\n  " + ", ".join(p[2] for p in ports) + "\n);\n")
+    for direction, width, port in ports:
+        width_str = f"[{width-1}:0] " if width > 1 else ""
+        f.write(f"  {direction} {width_str}{port};\n")
+    f.write("  reg [31:0] result_out_rsc_dat;\n\n")
+    f.write("  // Interconnect Declarations\n")
+    for k in range(body_lines):
+        kind = k % 4
+        if kind == 0:
+            f.write(f"  wire [31:0] nl_acc_{k};\n")
+        elif kind == 1:
+            f.write(f"  assign nl_acc_{k-1} = left_in_rsc_dat + up_in_rsc_dat * {k}; // acc update\n")
+        elif kind == 2:
+            f.write(f"  always @(posedge clk) begin : seq_{k}\n"
+                    f"    if (rst) result_out_rsc_dat <= 32'b0; else result_out_rsc_dat <= nl_acc_{k-2};\n"
+                    "  end\n")
+        else:
+            f.write(f"  {name}_mul_{k} mul_{k} (.a(left_in_rsc_dat), .b(up_in_rsc_dat), .z(nl_acc_{k-3}));\n")
+    if index % 2:
+        # A port made a reg after the logic, which must not be missed.
+        f.write("  reg down_out_rsc_vld;\n")
+    f.write("endmodule\n\n")
+
+def generate_netlist(path, size_mb, body_lines=2000):
+    """Write a synthetic netlist of roughly size_mb megabytes to path."""
+    target = size_mb * 1024 * 1024
+    index = 0
+    with open(path, "w") as f:
+        f.write("// Synthetic benchmark netlist\n`timescale 1ns / 1ps\n\n")
+        while f.tell() < target:
+            write_module(f, index, body_lines)
+            index += 1
+    return index
+
+def time_call(func, *args, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16],
+                        help="netlist sizes in MB")
+    parser.add_argument("--body-lines", type=int, default=2000,
+                        help="lines of logic in each module body")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the best is reported")
+    parser.add_argument("--keep", help="directory to keep the generated netlists in")
+    args = parser.parse_args(argv)
+
+    work_dir = args.keep or tempfile.mkdtemp(prefix="bench_parse_verilog_")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        print(f"{'size MB':>8} {'modules':>8} {'regex s':>9} {'stream s':>9} {'speedup':>8}  match")
+        for size in args.sizes:
+            path = os.path.join(work_dir, f"netlist_{size:g}mb.v")
+            modules = generate_netlist(path, size, args.body_lines)
+            actual_mb = os.path.getsize(path) / (1024 * 1024)
+            regex_time, regex_result = time_call(parse_verilog_regex, path, repeat=args.repeat)
+            stream_time, stream_result = time_call(verilog_ports.extract_ports_from_file, path,
+                                                   repeat=args.repeat)
+            match = "yes" if regex_result == stream_result else "NO"
+            print(f"{actual_mb:8.1f} {modules:8d} {regex_time:9.3f} {stream_time:9.3f} "
+                  f"{regex_time / stream_time:7.1f}x  {match}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,717 @@
+#!/usr/bin/env python3
+"""
+Check that the generate-style top module is equivalent to the flat one.
+
+Usage: python3 check_top_equivalence.py [--sizes 1x1 2x2 3x4] [--tile-sizes 2 3 1x2] [--no-connections]
+                                        [--reset-fanouts 2 4] [--result-modes row_chain column_bus fifo]
+                                        [--no-edge-skew] [--always-ready left_in up_in]
+                                        [--pe-config build/submodule_pe_config.json]
+
+For every ROWSxCOLS size both outputs of generate_top.py are elaborated down to
+bit-level connectivity: every group of connected bits becomes the set of PE pins
+and top-level port bits on it. The groups of both netlists must be identical
+once the generate-style names are mapped to the flat ones (row[i].col[j].PE is
+PE_i_j, bit k of element i of the bus left_in_rsc_dat is bit k of left_in_rsc<i>_dat).
+The generate-style module emitted for the first size is also elaborated with
+ROWS/COLS overridden to every other size, to check the parameterization.
+
+With --tile-sizes, the tiled output (an RxC tile module and a top of tiles, see
+systolic_array_generator.build_tiled_netlists) is checked as well for every size
+the tile divides, K being a KxK tile: the tile is elaborated into every TILE_ti_tj of
+the top, and the result must have the groups of the flat netlist, PE_a_b of
+TILE_ti_tj being PE_<ti*R+a>_<tj*C+b>. With --always-ready, it is checked again
+with the links of those PE input channels registered inside the tiles (see
+link_registers.py, the synthetic PE is taken to tie their rdy to 1): with the
+registers replaced by wires the groups must be those of the flat netlist without
+the rdy of the links inside a tile, every link must have one register, and every
+PE driving such a link must have its rdy input tied to 1'b1.
+
+The standard grid written as YAML connections rules (bench_generate_top.synthetic_connections)
+is compiled by connection_dsl.py for every size as well, with NumPy when it is
+installed and in pure Python. Both must give the groups of the flat netlist, and
+the same Verilog whether it is written from the netlist or from its JSON.
+
+With --reset-fanouts, the top with a reset tree (see reset_tree.py) is checked for
+every fanout and group: every PE rst pin must reach rst through exactly latency
+registers, no net of the tree may drive more than fanout registers or PEs, and with
+the registers replaced by wires the groups must be those of the flat netlist.
+
+With --result-modes, the top with a result network (see result_network.py) is
+checked for every mode: every result pin of a PE must be on exactly one collector
+input, and without the result ports and the collectors the groups must be those of
+the flat netlist. How the collectors move the results is not covered.
+
+Unless --no-edge-skew, the top with an edge skew (see edge_skew.py) is checked as
+well: every edge pin of a PE must be on the lane of its row or column of the skew
+module of its edge and on no top-level port, the host side of every skew module
+must be the streaming interface of its edge, and without the edge ports and the
+skew modules the groups must be those of the flat netlist. The FIFOs are not
+elaborated, only the wiring of the lanes.
+
+The elaborator covers the structural subset generate_top.py emits: port and wire
+declarations, continuous assignments, instances and named generate for loops.
+"""
+import argparse
+import json
+import re
+import sys
+
+import connection_dsl
+import edge_skew
+import generate_top
+import reset_tree
+import result_network
+import systolic_array_generator
+import verilog_ports
+from bench_generate_top import synthetic_array_config, synthetic_connections, synthetic_pe_config
+
+# Flat names of the top-level port elements: left_in_rsc3_dat, result_out_rsc_dat5.
+_EDGE_PORT = re.compile(r"^(\w*_rsc)(\d+)(_\w+)?$")
+_RESULT_PORT = re.compile(r"^(\w*\D)(\d+)$")
+_GENERATE_INSTANCE = re.compile(r"^row\[(\d+)\]\.col\[(\d+)\]\.PE$")
+_TILE_INSTANCE = re.compile(r"^TILE_(\d+)_(\d+)$")
+_PE_INSTANCE = re.compile(r"^PE_(\d+)_(\d+)$")
+_TREE_INSTANCE = re.compile(r"^RST_TREE_\d+_\d+$")
+_SKEW_INSTANCE = re.compile(r"^\w+_(SKEW|DESKEW)$")
+_LANE_PORT = re.compile(r"^(in|out)(\d+)(_\w+)$")
+
+class Netlist:
+    """Bit-level connectivity of one elaborated module, as a union-find over bits."""
+
+    def __init__(self):
+        self.parent = {}
+        self.ports = {}
+        self.widths = {}
+
+    def find(self, node):
+        root = node
+        while self.parent.setdefault(root, root) != root:
+            root = self.parent[root]
+        while node != root:
+            self.parent[node], node = root, self.parent[node]
+        return root
+
+    def union(self, a, b):
+        self.parent[self.find(a)] = self.find(b)
+
+    def groups(self, rename_pin, rename_port):
+        """Connected groups as frozensets of (pin or port) endpoints, in flat naming."""
+        groups = {}
+        for node in list(self.parent):
+            if node[0] == "pin":
+                endpoint = rename_pin(node)
+            elif node[1] in self.ports:
+                endpoint = rename_port(node)
+            else:
+                continue
+            groups.setdefault(self.find(node), set()).add(endpoint)
+        return {frozenset(group) for group in groups.values()}
+
+def _expect(lexer, expected):
+    token = lexer.next()
+    if token != expected:
+        raise ValueError(f"expected {expected!r}, found {token!r}")
+
+def _read_until(lexer, terminators):
+    tokens, terminator = verilog_ports._read_until(lexer, terminators)
+    if terminator is None:
+        raise ValueError(f"unexpected end of input, expected one of {sorted(terminators)}")
+    return tokens, terminator
+
+def _value(tokens, env):
+    value = verilog_ports.evaluate(tokens, env)
+    if value is None:
+        raise ValueError(f"cannot evaluate {' '.join(tokens)!r}")
+    return value
+
+def _declared_width(tokens, env):
+    """Width of a declaration such as input signed [ROWS*32-1:0] name, name is the last token."""
+    if "[" not in tokens:
+        return 1
+    start = tokens.index("[")
+    end = len(tokens) - 1 - tokens[::-1].index("]")
+    msb, lsb = verilog_ports._split_top_level(tokens[start + 1:end], ":")
+    return abs(_value(msb, env) - _value(lsb, env)) + 1
+
+def _parse_items(lexer, end_tokens):
+    """Parse module or generate block items up to one of end_tokens into a list of statements."""
+    items = []
+    while True:
+        token = lexer.next()
+        if token in end_tokens:
+            return items
+        if token is None:
+            raise ValueError("unexpected end of input")
+        if token in ("generate", "endgenerate"):
+            continue
+        if token == "genvar":
+            _read_until(lexer, {";"})
+        elif token == "wire":
+            tokens, _ = _read_until(lexer, {";"})
+            names = verilog_ports._split_top_level(tokens, ",")
+            items.append(("wire", names[0][:-1], [name[-1] for name in names]))
+        elif token == "assign":
+            lhs, _ = _read_until(lexer, {"="})
+            rhs, _ = _read_until(lexer, {";"})
+            items.append(("assign", lhs, rhs))
+        elif token == "for":
+            _expect(lexer, "(")
+            init, _ = _read_until(lexer, {";"})
+            condition, _ = _read_until(lexer, {";"})
+            step, _ = _read_until(lexer, {")"})
+            _expect(lexer, "begin")
+            _expect(lexer, ":")
+            label = lexer.next()
+            body = _parse_items(lexer, {"end"})
+            items.append(("for", init, condition, step, label, body))
+        else:
+            instance_name = lexer.next()
+            _expect(lexer, "(")
+            tokens, _ = _read_until(lexer, {")"})
+            _expect(lexer, ";")
+            connections = {}
+            for connection in verilog_ports._split_top_level(tokens, ","):
+                if connection[0] != "." or connection[2] != "(" or connection[-1] != ")":
+                    raise ValueError(f"unsupported port connection {' '.join(connection)!r}")
+                connections[connection[1]] = connection[3:-1]
+            items.append(("instance", token, instance_name, connections))
+
+def _bits(netlist, tokens, env):
+    """
+    Bits of a reference name, name[index], name[msb:lsb], name[base +: width], a sized
+    constant or a concatenation of those, LSB first. Constant bits are None.
+    """
+    name = tokens[0]
+    if name == "{" and tokens[-1] == "}":
+        bits = []
+        for part in reversed(verilog_ports._split_top_level(tokens[1:-1], ",")):
+            bits.extend(_bits(netlist, part, env))
+        return bits
+    if "'" in name and len(tokens) == 1:
+        return [None] * int(name.split("'")[0])
+    width = netlist.widths.setdefault(name, 1)  # Undeclared names are implicit 1-bit nets.
+    if len(tokens) == 1:
+        return [("net", name, bit) for bit in range(width)]
+    if tokens[1] != "[" or tokens[-1] != "]":
+        raise ValueError(f"unsupported expression {' '.join(tokens)!r}")
+    select = tokens[2:-1]
+    for index, token in enumerate(select):
+        if token == "+" and index + 1 < len(select) and select[index + 1] == ":":
+            base = _value(select[:index], env)
+            count = _value(select[index + 2:], env)
+            return [("net", name, bit) for bit in range(base, base + count)]
+    bounds = verilog_ports._split_top_level(select, ":")
+    if len(bounds) == 2:
+        msb, lsb = _value(bounds[0], env), _value(bounds[1], env)
+        return [("net", name, bit) for bit in range(lsb, msb + 1)]
+    return [("net", name, _value(select, env))]
+
+def _execute(netlist, items, env, scope):
+    for item in items:
+        kind = item[0]
+        if kind == "wire":
+            width = _declared_width(item[1] + ["_"], env)
+            for name in item[2]:
+                netlist.widths[name] = width
+        elif kind == "assign":
+            lhs, rhs = _bits(netlist, item[1], env), _bits(netlist, item[2], env)
+            if len(lhs) != len(rhs):
+                raise ValueError(f"width mismatch in assign {' '.join(item[1])} = {' '.join(item[2])}")
+            for a, b in zip(lhs, rhs):
+                if a is not None and b is not None:
+                    netlist.union(a, b)
+        elif kind == "for":
+            _, init, condition, step, label, body = item
+            var = init[0]
+            loop_env = dict(env)
+            loop_env[var] = _value(init[2:], env)
+            if condition[0] != var or condition[1] not in ("<", "<="):
+                raise ValueError(f"unsupported loop condition {' '.join(condition)!r}")
+            inclusive = condition[1] == "<="
+            while loop_env[var] < _value(condition[2:], loop_env) + inclusive:
+                _execute(netlist, body, loop_env, scope + (f"{label}[{loop_env[var]}]",))
+                loop_env[var] = _value(step[2:], loop_env)
+        else:
+            _, module_name, instance_name, connections = item
+            path = ".".join(scope + (instance_name,))
+            for port, expression in connections.items():
+                if not expression:
+                    continue
+                for bit, node in enumerate(_bits(netlist, expression, env)):
+                    if node is not None:
+                        netlist.union(("pin", path, port, bit), node)
+
+def elaborate(lines, overrides=None):
+    """Elaborate the single module in lines (an iterable of source lines) into a Netlist."""
+    lexer = verilog_ports.Lexer(lines)
+    if not lexer.skip_to("module"):
+        raise ValueError("no module found")
+    lexer.next()
+    env = {}
+    token = lexer.next()
+    if token == "#":
+        _expect(lexer, "(")
+        tokens, _ = _read_until(lexer, {")"})
+        for declaration in verilog_ports._split_top_level(tokens, ","):
+            name = declaration[1]
+            env[name] = _value(declaration[3:], env)
+        env.update(overrides or {})
+        token = lexer.next()
+    if token != "(":
+        raise ValueError(f"expected '(', found {token!r}")
+
+    netlist = Netlist()
+    tokens, _ = _read_until(lexer, {")"})
+    _expect(lexer, ";")
+    for declaration in verilog_ports._split_top_level(tokens, ","):
+        name = declaration[-1]
+        netlist.ports[name] = declaration[0]
+        netlist.widths[name] = _declared_width(declaration, env)
+    _execute(netlist, _parse_items(lexer, {"endmodule"}), env, ())
+    return netlist
+
+def flat_port_bit(name, bit, widths):
+    """Map a flat top-level port bit to (bus name, bus bit) of the generate style."""
+    match = _EDGE_PORT.match(name)
+    if match:
+        return (match.group(1) + (match.group(3) or ""), int(match.group(2)) * widths[name] + bit)
+    match = _RESULT_PORT.match(name)
+    if match:
+        return (match.group(1), int(match.group(2)) * widths[name] + bit)
+    return (name, bit)
+
+def compare(flat, generate):
+    """Return a list of differences between the flat and the generate-style netlist."""
+    def flat_pin(node):
+        return node[1:]
+
+    def generate_pin(node):
+        match = _GENERATE_INSTANCE.match(node[1])
+        name = f"PE_{match.group(1)}_{match.group(2)}" if match else node[1]
+        return (name,) + node[2:]
+
+    def flat_port(node):
+        return ("port",) + flat_port_bit(node[1], node[2], flat.widths)
+
+    def generate_port(node):
+        return ("port",) + node[1:]
+
+    differences = []
+    flat_directions = {}
+    for name, direction in flat.ports.items():
+        bus = flat_port_bit(name, 0, flat.widths)[0]
+        if flat_directions.setdefault(bus, direction) != direction:
+            differences.append(f"mixed directions on {bus}")
+    if flat_directions != generate.ports:
+        differences.append(f"port directions differ: {flat_directions} vs {generate.ports}")
+
+    flat_groups = flat.groups(flat_pin, flat_port)
+    generate_groups = generate.groups(generate_pin, generate_port)
+    for group in flat_groups - generate_groups:
+        differences.append(f"only in flat: {sorted(group)}")
+    for group in generate_groups - flat_groups:
+        differences.append(f"only in generate: {sorted(group)}")
+    return differences
+
+def flatten_tiles(top, tile, tile_size):
+    """
+    Elaborate the tile netlist into every tile instance of the top netlist, the PE
+    pins of tile (ti, tj) are renamed to their flat names.
+    """
+    tile_rows, tile_cols = systolic_array_generator.tile_shape(tile_size)
+    flat = Netlist()
+    flat.ports, flat.widths = top.ports, top.widths
+    tiles = set()
+
+    def inner(path, node):
+        # A node of the tile elaborated into the tile instance path, other instances than PEs are path/name.
+        if node[0] == "pin":
+            match = _PE_INSTANCE.match(node[1])
+            if not match:
+                return ("pin", f"{path}/{node[1]}") + node[2:]
+            ti, tj = map(int, _TILE_INSTANCE.match(path).groups())
+            a, b = map(int, match.groups())
+            return ("pin", f"PE_{ti * tile_rows + a}_{tj * tile_cols + b}") + node[2:]
+        return ("tile", path) + node[1:]
+
+    for node in list(top.parent):
+        flat.union(node, top.find(node))
+        if node[0] == "pin" and _TILE_INSTANCE.match(node[1]):
+            # The tile pin is the port of the same name inside the tile.
+            tiles.add(node[1])
+            flat.union(node, inner(node[1], ("net",) + node[2:]))
+    for path in tiles:
+        for node in list(tile.parent):
+            flat.union(inner(path, node), inner(path, tile.find(node)))
+    return flat
+
+def compare_tiled(flat, tiled, wired=frozenset()):
+    """
+    Return a list of differences between the flat netlist and the flattened tiled one.
+    The flat groups with a pin of wired, the (instance, port, bit) of the rdy pins of
+    links wired without their handshake, are not expected in the tiled netlist.
+    """
+    def same(node):
+        return node[1:] if node[0] == "pin" else ("port",) + node[1:]
+
+    differences = []
+    if flat.ports != tiled.ports:
+        differences.append(f"port directions differ: {flat.ports} vs {tiled.ports}")
+    flat_groups = {group for group in flat.groups(same, same) if not group & wired}
+    tiled_groups = {frozenset(endpoint for endpoint in group
+                              if not (_TILE_INSTANCE.match(str(endpoint[0])) or "/" in str(endpoint[0])))
+                    for group in tiled.groups(same, same)}
+    for group in flat_groups - tiled_groups:
+        differences.append(f"only in flat: {sorted(group)}")
+    for group in tiled_groups - flat_groups:
+        differences.append(f"only in tiled: {sorted(group)}")
+    return differences
+
+def check_always_ready(flat, array_config, pe_config, tile_size, always_ready):
+    """
+    Return a list of differences between the flat netlist and the tiled one with the
+    links of the always_ready channels registered inside the tiles, and the number of
+    registered links. The PE is taken to tie the rdy of the channels to 1.
+    """
+    tile_rows, tile_cols = systolic_array_generator.tile_shape(tile_size)
+    proven = dict(pe_config, constant_outputs={f"{channel}_rsc_rdy": 1 for channel in always_ready})
+    tile, top = systolic_array_generator.build_tiled_netlists(array_config, proven, tile_size,
+                                                              always_ready=always_ready)
+    tile_code = "".join(generate_top.iter_top_verilog_netlist(tile, "tile"))
+    top_code = "".join(generate_top.iter_top_verilog_netlist(top))
+    tiled = flatten_tiles(elaborate(top_code.splitlines()), elaborate(tile_code.splitlines()), tile_size)
+
+    # The registers replaced by wires.
+    registers = [pin for pin in tiled.parent if pin[0] == "pin" and "/" in pin[1] and pin[2] == "in_dat"]
+    for _, instance, _, bit in registers:
+        tiled.union(("pin", instance, "in_dat", bit), ("pin", instance, "out_dat", bit))
+        tiled.union(("pin", instance, "in_vld", 0), ("pin", instance, "out_vld", 0))
+
+    # The rdy pins of the consumers of the links inside a tile, and the producers they face.
+    rows, cols = array_config["dimensions"]
+    wired = set()
+    producers = []
+    for channel in always_ready:
+        group = "left" if systolic_array_generator.group_pe_ports([channel])["left"] else "up"
+        facing = "right_out_rsc_rdy" if group == "left" else "down_out_rsc_rdy"
+        for i in range(rows):
+            for j in range(cols):
+                if (j % tile_cols if group == "left" else i % tile_rows) == 0:
+                    continue
+                wired.add((f"PE_{i}_{j}", f"{channel}_rsc_rdy", 0))
+                producer = (f"PE_{i}_{j - 1}" if group == "left" else f"PE_{i - 1}_{j}", facing, 0)
+                wired.add(producer)
+                producers.append(producer)
+
+    differences = compare_tiled(flat, tiled, frozenset(wired))
+    instances = {pin[1] for pin in registers}
+    if len(instances) != len(producers):
+        differences.append(f"{len(instances)} link registers, expected {len(producers)}")
+    ties = sum(tile_code.count(f".{port}(1'b1)") for port in ("right_out_rsc_rdy", "down_out_rsc_rdy"))
+    if ties * top.rows * top.cols != len(producers):
+        differences.append(f"{ties} rdy inputs tied to 1'b1 per tile, expected "
+                           f"{len(producers) // (top.rows * top.cols)}")
+    return differences, len(producers)
+
+def check_connections(flat, array_config, pe_config, submodule_ports):
+    """Return a list of differences between the flat netlist and the standard grid compiled from rules."""
+    config = dict(array_config, connections=synthetic_connections())
+    differences = []
+    codes = {}
+    for use_numpy in ((True, False) if connection_dsl.numpy is not None else (False,)):
+        netlist = connection_dsl.build_connection_netlist(config, pe_config, use_numpy)
+        if netlist is None:
+            return ["the rules do not compile"]
+        code = "".join(generate_top.iter_top_verilog_netlist(netlist))
+        if generate_top.generate_top_verilog(netlist.to_json(), submodule_ports) != code:
+            differences.append("the Verilog written from the JSON differs from the one written from the netlist")
+        codes[use_numpy] = code
+    if len(set(codes.values())) > 1:
+        differences.append("NumPy and pure Python expansion give different Verilog")
+    return differences + compare_tiled(flat, elaborate(codes[False].splitlines()))
+
+def check_reset_tree(flat, array_config, pe_config, submodule_ports, fanout, group):
+    """Return a list of differences between the flat netlist and the top with a reset tree."""
+    netlist = systolic_array_generator.build_array_netlist(array_config, pe_config)
+    tree = reset_tree.attach(netlist, {"fanout": fanout, "group": group, "ports": ["rst"]})
+    code = "".join(generate_top.iter_top_verilog_netlist(netlist))
+    differences = []
+    if generate_top.generate_top_verilog(netlist.to_json(), submodule_ports) != code:
+        differences.append("the Verilog written from the JSON differs from the one written from the netlist")
+    elaborated = elaborate(code.splitlines())
+
+    # Loads of every net (group root) and the register driving it.
+    loads = {}
+    driver = {}
+    for node in list(elaborated.parent):
+        if node[0] != "pin" or node[2] == "clk":
+            continue
+        root = elaborated.find(node)
+        if _TREE_INSTANCE.match(node[1]) and node[2] == "q":
+            driver[root] = node[1]
+        elif node[2] in ("d", "rst"):
+            loads.setdefault(root, []).append(node)
+    for root, pins in loads.items():
+        if root in driver and len(pins) > fanout:
+            differences.append(f"{driver[root]} drives {len(pins)} loads")
+    rst_root = elaborated.find(("net", "rst", 0))
+    for root, pins in loads.items():
+        for pin in pins:
+            if pin[2] != "rst":
+                continue
+            depth, net = 0, root
+            while net in driver and depth <= tree.latency:
+                depth, net = depth + 1, elaborated.find(("pin", driver[net], "d", 0))
+            if net != rst_root or depth != tree.latency:
+                differences.append(f"{pin[1]}.rst is {depth} registers from {'rst' if net == rst_root else 'no port'}")
+
+    # The registers replaced by wires.
+    for instance, _ in tree.iter_stages():
+        elaborated.union(("pin", instance, "d", 0), ("pin", instance, "q", 0))
+
+    def same(node):
+        return node[1:] if node[0] == "pin" else ("port",) + node[1:]
+
+    groups = {frozenset(endpoint for endpoint in group if not _TREE_INSTANCE.match(str(endpoint[0])))
+              for group in elaborated.groups(same, same)}
+    flat_groups = flat.groups(same, same)
+    for group in flat_groups - groups:
+        differences.append(f"only in flat: {sorted(group)}")
+    for group in groups - flat_groups:
+        differences.append(f"only with the reset tree: {sorted(group)}")
+    return differences, tree
+
+def check_result_network(flat, array_config, pe_config, submodule_ports, mode):
+    """Return a list of differences between the flat netlist and the top with a result network."""
+    netlist = systolic_array_generator.build_array_netlist(array_config, pe_config)
+    network = result_network.attach(netlist, {"mode": mode, "tag": True, "fifo_width": 8, "fifo_depth": 4})
+    code = "".join(generate_top.iter_top_verilog_netlist(netlist))
+    differences = []
+    if generate_top.generate_top_verilog(netlist.to_json(), submodule_ports) != code:
+        differences.append("the Verilog written from the JSON differs from the one written from the netlist")
+
+    def same(node):
+        return node[1:] if node[0] == "pin" else ("port",) + node[1:]
+
+    def is_result(endpoint):
+        return str(endpoint[1]).startswith(network.channel)
+
+    def is_collector(endpoint):
+        return str(endpoint[0]).startswith("RESULT_")
+
+    groups = set()
+    for group in elaborate(code.splitlines()).groups(same, same):
+        pe_results = [endpoint for endpoint in group if _PE_INSTANCE.match(str(endpoint[0])) and is_result(endpoint)]
+        collectors = [endpoint for endpoint in group if is_collector(endpoint)]
+        if pe_results and len([pin for pin in collectors if pin[1].startswith("in")]) != 1:
+            differences.append(f"{sorted(pe_results)} is on the collector inputs {sorted(collectors)}")
+        group = frozenset(endpoint for endpoint in group if not (is_result(endpoint) or is_collector(endpoint)))
+        if group:
+            groups.add(group)
+    flat_groups = {frozenset(endpoint for endpoint in group if not is_result(endpoint))
+                   for group in flat.groups(same, same)} - {frozenset()}
+    for group in flat_groups - groups:
+        differences.append(f"only in flat: {sorted(group)}")
+    for group in groups - flat_groups:
+        differences.append(f"only with the result network: {sorted(group)}")
+    return differences, network
+
+def check_edge_skew(flat, array_config, pe_config, submodule_ports):
+    """Return a list of differences between the flat netlist and the top with an edge skew."""
+    netlist = systolic_array_generator.build_array_netlist(array_config, pe_config)
+    skew = edge_skew.attach(netlist, {"pe_latency": 1, "deskew": True})
+    code = "".join(generate_top.iter_top_verilog_netlist(netlist))
+    differences = []
+    if generate_top.generate_top_verilog(netlist.to_json(), submodule_ports) != code:
+        differences.append("the Verilog written from the JSON differs from the one written from the netlist")
+    elaborated = elaborate(code.splitlines())
+    instances = dict(skew.iter_instances(netlist))
+    modules = edge_skew.render_modules(skew.report())
+
+    def same(node):
+        return node[1:] if node[0] == "pin" else ("port",) + node[1:]
+
+    def is_edge(endpoint):
+        # A top-level port of a skewed edge, or the pin of a PE on it.
+        if not str(endpoint[1]).startswith(tuple(skew.edges)):
+            return False
+        if endpoint[0] == "port":
+            return True
+        match = _PE_INSTANCE.match(str(endpoint[0]))
+        if not match:
+            return False
+        i, j = int(match.group(1)), int(match.group(2))
+        prefix, _ = systolic_array_generator.split_port_name(endpoint[1])
+        return skew.pe_at(prefix, i if skew.along_rows[skew.edges[prefix][0]] else j) == (i, j)
+
+    # The host side of every skew module is the streaming interface of its edge, lanes x W data bits.
+    for instance, data in instances.items():
+        ports = modules[data["module"]][0]
+        host = "in" if "in_dat" in ports else "out"
+        prefix = next(prefix for prefix in skew.edges if data["connect"][f"{host}_dat"].startswith(prefix))
+        _, lanes, width = skew.edges[prefix]
+        for suffix in edge_skew.SUFFIXES:
+            name = skew.top_port_name(prefix, suffix)
+            bits = lanes * width if suffix == "_dat" else 1
+            if elaborated.widths.get(name) != bits or name not in elaborated.ports:
+                differences.append(f"{name} is not a top-level port of {bits} bits")
+            elif any(elaborated.find(("pin", instance, f"{host}{suffix}", bit)) != elaborated.find(("net", name, bit))
+                     for bit in range(bits)):
+                differences.append(f"{instance}.{host}{suffix} is not connected to {name}")
+
+    def lane_of(endpoint):
+        # The lane pin of the skew module an edge pin of a PE must be on.
+        i, j = map(int, _PE_INSTANCE.match(endpoint[0]).groups())
+        prefix, suffix = systolic_array_generator.split_port_name(endpoint[1])
+        group = skew.edges[prefix][0]
+        k = i if skew.along_rows[group] else j
+        if skew.feeds[group]:
+            return (f"{prefix.upper()}_SKEW", f"out{k}{suffix}", endpoint[2])
+        return (f"{prefix.upper()}_DESKEW", f"in{k}{suffix}", endpoint[2])
+
+    groups = set()
+    for group in elaborated.groups(same, same):
+        edges = [endpoint for endpoint in group if _PE_INSTANCE.match(str(endpoint[0])) and is_edge(endpoint)]
+        lanes = [endpoint for endpoint in group
+                 if _SKEW_INSTANCE.match(str(endpoint[0])) and _LANE_PORT.match(endpoint[1])]
+        ports = [endpoint for endpoint in group if endpoint[0] == "port"]
+        if edges and (lanes != [lane_of(edges[0])] or ports):
+            differences.append(f"{sorted(edges)} is on the lanes {sorted(lanes)} and the ports {sorted(ports)}")
+        group = frozenset(endpoint for endpoint in group
+                          if not (is_edge(endpoint) or _SKEW_INSTANCE.match(str(endpoint[0]))))
+        if group:
+            groups.add(group)
+    flat_groups = {frozenset(endpoint for endpoint in group if not is_edge(endpoint))
+                   for group in flat.groups(same, same)} - {frozenset()}
+    for group in flat_groups - groups:
+        differences.append(f"only in flat: {sorted(group)}")
+    for group in groups - flat_groups:
+        differences.append(f"only with the edge skew: {sorted(group)}")
+    return differences, skew
+
+def parse_size(text):
+    rows, cols = text.lower().split("x")
+    return int(rows), int(cols)
+
+def parse_tile_size(text):
+    """Tile size K or RxC."""
+    return parse_size(text) if "x" in text.lower() else int(text)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=parse_size, nargs="+",
+                        default=[(1, 1), (1, 3), (3, 1), (2, 2), (2, 3), (3, 2), (4, 4)],
+                        help="array sizes as ROWSxCOLS")
+    parser.add_argument("--tile-sizes", type=parse_tile_size, nargs="*", default=[2, 3, (1, 2), (2, 3)],
+                        help="tile sizes K to check the tiled output with, on the sizes K divides")
+    parser.add_argument("--no-connections", action="store_true",
+                        help="do not check the standard grid compiled from YAML connections rules")
+    parser.add_argument("--reset-fanouts", type=int, nargs="*", default=[2, 4],
+                        help="fanouts to check the reset tree with, grouped by row and by tile")
+    parser.add_argument("--result-modes", nargs="*", default=list(result_network.MODES[1:]),
+                        choices=result_network.MODES[1:], help="result network modes to check the top with")
+    parser.add_argument("--no-edge-skew", action="store_true", help="do not check the top with an edge skew")
+    parser.add_argument("--always-ready", nargs="*", default=["left_in", "up_in"],
+                        help="PE input channels to register without their handshake inside the tiles")
+    parser.add_argument("--pe-config", help="PE port table to use instead of the synthetic Catapult PE")
+    args = parser.parse_args(argv)
+
+    if args.pe_config:
+        with open(args.pe_config, "r") as f:
+            pe_config = json.load(f)
+    else:
+        pe_config = synthetic_pe_config()
+    submodule_ports = generate_top.index_submodule_configs([pe_config])
+
+    template = None
+    failed = False
+    for rows, cols in args.sizes:
+        array_config = synthetic_array_config(rows, cols)
+        array_config["instances"][0]["module"] = pe_config["submodule"]
+        array_json = systolic_array_generator.generate_systolic_array_json(array_config, pe_config)
+        flat_code = generate_top.generate_top_verilog(array_json, submodule_ports)
+        generate_code = "".join(generate_top.iter_top_verilog_generate(array_config, pe_config))
+        if template is None:
+            template = generate_code
+
+        flat = elaborate(flat_code.splitlines())
+        checks = [("emitted", elaborate(generate_code.splitlines())),
+                  ("overridden", elaborate(template.splitlines(), {"ROWS": rows, "COLS": cols}))]
+        for label, netlist in checks:
+            differences = compare(flat, netlist)
+            status = "ok" if not differences else f"{len(differences)} differences"
+            print(f"{f'{rows}x{cols}':>7} {label:>10}: {status} "
+                  f"(flat {len(flat_code)} bytes, generate {len(generate_code)} bytes)")
+            for difference in differences[:10]:
+                print(f"    {difference}")
+            failed = failed or bool(differences)
+
+        if not args.no_connections:
+            differences = check_connections(flat, array_config, pe_config, submodule_ports)
+            status = "ok" if not differences else f"{len(differences)} differences"
+            print(f"{f'{rows}x{cols}':>7} {'rules':>10}: {status} ({len(synthetic_connections())} rules, "
+                  f"{'NumPy and pure Python' if connection_dsl.numpy is not None else 'pure Python'})")
+            for difference in differences[:10]:
+                print(f"    {difference}")
+            failed = failed or bool(differences)
+
+        for fanout in args.reset_fanouts:
+            for group in reset_tree.GROUPS:
+                differences, tree = check_reset_tree(flat, array_config, pe_config, submodule_ports, fanout, group)
+                status = "ok" if not differences else f"{len(differences)} differences"
+                print(f"{f'{rows}x{cols}':>7} {f'rst/{group}{fanout}':>10}: {status} "
+                      f"(latency {tree.latency}, levels {'/'.join(map(str, tree.sizes))})")
+                for difference in differences[:10]:
+                    print(f"    {difference}")
+                failed = failed or bool(differences)
+
+        for mode in args.result_modes:
+            differences, network = check_result_network(flat, array_config, pe_config, submodule_ports, mode)
+            status = "ok" if not differences else f"{len(differences)} differences"
+            print(f"{f'{rows}x{cols}':>7} {mode:>10}: {status} ({network.estimate['pins']} result pins, "
+                  f"{rows * cols * (network.result_width + 2)} without the network)")
+            for difference in differences[:10]:
+                print(f"    {difference}")
+            failed = failed or bool(differences)
+
+        if not args.no_edge_skew:
+            differences, skew = check_edge_skew(flat, array_config, pe_config, submodule_ports)
+            status = "ok" if not differences else f"{len(differences)} differences"
+            print(f"{f'{rows}x{cols}':>7} {'edge skew':>10}: {status} "
+                  f"({skew.report()['fifo_bits']} FIFO bits, {len(skew.edges)} streaming interfaces)")
+            for difference in differences[:10]:
+                print(f"    {difference}")
+            failed = failed or bool(differences)
+
+        for tile_size in args.tile_sizes:
+            tile_rows, tile_cols = systolic_array_generator.tile_shape(tile_size)
+            if rows % tile_rows or cols % tile_cols:
+                continue
+            tile, top = systolic_array_generator.build_tiled_netlists(array_config, pe_config, tile_size)
+            tile_code = "".join(generate_top.iter_top_verilog_netlist(tile, "tile"))
+            top_code = "".join(generate_top.iter_top_verilog_netlist(top))
+            tiled = flatten_tiles(elaborate(top_code.splitlines()), elaborate(tile_code.splitlines()), tile_size)
+            differences = compare_tiled(flat, tiled)
+            status = "ok" if not differences else f"{len(differences)} differences"
+            print(f"{f'{rows}x{cols}':>7} {f'tile {tile_rows}x{tile_cols}':>10}: {status} "
+                  f"(top {top_code.count(chr(10) + '  wire ')} wires, {top.rows * top.cols} instances; "
+                  f"flat {flat_code.count(chr(10) + '  wire ')} wires, {rows * cols} instances)")
+            for difference in differences[:10]:
+                print(f"    {difference}")
+            failed = failed or bool(differences)
+            if args.always_ready:
+                differences, wired = check_always_ready(flat, array_config, pe_config, tile_size, args.always_ready)
+                status = "ok" if not differences else f"{len(differences)} differences"
+                print(f"{f'{rows}x{cols}':>7} {f'wired {tile_rows}x{tile_cols}':>10}: {status} "
+                      f"({wired} registered links without rdy)")
+                for difference in differences[:10]:
+                    print(f"    {difference}")
+                failed = failed or bool(differences)
+
+    if failed:
+        print("Error: the generate-style, tiled, wired, compiled, reset tree, result network or edge skew top module "
+              "is not equivalent to the flat one")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Streaming output handling of long-running commands (HLS make, ORFS in Docker).
+
+The output of a command is consumed line by line while it runs:
+- echoed to the console live, or with echo=False only its progress markers;
+- written to a rotating log file per stage, <log_dir>/<name>.log. When a log
+  grows past max_bytes, or at the start of the next run of the stage, it is
+  gzip-compressed to <name>.log.1.gz and the older segments shift to .2.gz, ...
+  up to the given number of backups;
+- kept in a bounded ring buffer of recent lines, printed when the command fails.
+
+Progress markers are the ORFS steps (the log file each step tees to, e.g.
+2_1_floorplan) and the elapsed time and peak memory reported at the end of each.
+"""
+import collections
+import gzip
+import os
+import re
+import shutil
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = os.path.normpath(os.path.join(SCRIPT_DIR, "../build/logs"))
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_BACKUPS = 20
+TAIL_LINES = 50
+
+# Console output is flushed at least this often (in seconds) while echoing.
+FLUSH_INTERVAL = 0.5
+
+# ORFS runs every step as "... | tee ./logs/<platform>/<design>/<variant>/<step>.log".
+_ORFS_STEP = re.compile(r"\blogs/\S+/(\d+_\d*_?\w+)\.log\b")
+# Printed by /usr/bin/time at the end of each ORFS step.
+_ORFS_ELAPSED = re.compile(r"Elapsed time: (\S+?)\[h:\]min:sec\..*Peak memory: (\d+)KB")
+_ERROR = re.compile(r"^\s*(\[ERROR\b|ERROR:|Error:)")
+
+class RotatingLog:
+    """Log file rotated into gzip-compressed segments, <path>.1.gz being the newest."""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Keep the log of the previous run as the first backup.
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.rotate()
+        self._file = open(path, "w", buffering=1 << 16)
+        self._size = 0
+
+    def rotate(self):
+        """Compress the current log into <path>.1.gz, shifting the older segments."""
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        oldest = f"{self.path}.{self.backups}.gz"
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for index in range(self.backups - 1, 0, -1):
+            segment = f"{self.path}.{index}.gz"
+            if os.path.exists(segment):
+                os.replace(segment, f"{self.path}.{index + 1}.gz")
+        with open(self.path, "rb") as src, gzip.open(f"{self.path}.1.gz", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        os.remove(self.path)
+
+    def write(self, line):
+        self._file.write(line)
+        self._size += len(line)
+        if self._size >= self.max_bytes:
+            self._file.close()
+            self.rotate()
+            self._file = open(self.path, "w", buffering=1 << 16)
+            self._size = 0
+
+    def close(self):
+        self._file.close()
+
+def progress_marker(line, state):
+    """
+    Return the progress message carried by an output line, or None. state is a
+    dict kept across the lines of one command (the current ORFS step).
+    """
+    match = _ORFS_STEP.search(line)
+    if match and match.group(1) != state.get("step"):
+        state["step"] = match.group(1)
+        return f"step {state['step']}"
+    match = _ORFS_ELAPSED.search(line)
+    if match:
+        peak_mb = int(match.group(2)) / 1024
+        return f"step {state.get('step', '?')} done, elapsed {match.group(1)}, peak memory {peak_mb:.0f} MB"
+    if _ERROR.match(line):
+        return line.strip()
+    return None
+
+class CommandOutput:
+    """
+    Consumer of the output lines of one command (see profiling.run_process).
+    name labels the progress markers and names the log file, no log is written
+    when log_dir is None.
+    """
+
+    def __init__(self, name, log_dir=LOG_DIR, echo=True, tail_lines=TAIL_LINES,
+                 max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS):
+        self.name = name
+        self.echo = echo
+        self.tail = collections.deque(maxlen=tail_lines)
+        self.log = RotatingLog(os.path.join(log_dir, f"{name}.log"), max_bytes, backups) if log_dir else None
+        self.lines = 0
+        self._state = {}
+        self._flushed = time.monotonic()
+
+    def write(self, line):
+        self.lines += 1
+        self.tail.append(line)
+        if self.log:
+            self.log.write(line)
+        marker = progress_marker(line, self._state)
+        if self.echo:
+            sys.stdout.write(line)
+            now = time.monotonic()
+            if now - self._flushed >= FLUSH_INTERVAL:
+                sys.stdout.flush()
+                self._flushed = now
+        elif marker:
+            print(f"[{self.name}] {marker}", flush=True)
+
+    @property
+    def step(self):
+        """The last ORFS step seen in the output, or None."""
+        return self._state.get("step")
+
+    def close(self):
+        if self.echo:
+            sys.stdout.flush()
+        if self.log:
+            self.log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""
+Compiler of the connections: section of systolic_array.yaml (see doc/systolic_array_doc.md).
+
+Every rule is parsed once. The ranges of its for loop are evaluated, and its
+endpoints are split into PE ports (C-{i}_{j+1}.left) and top-level name templates
+(left_in_rsc{i}). The {...} index expressions are compiled into Python functions
+of the loop variables. The bindings of the loop variables are then expanded in
+bulk:
+
+- with NumPy, every function is called once on the arrays of all bindings. The
+  connections are scattered into the ArrayNetlist as array index arithmetic.
+- without it, the same compiled functions are mapped over the bindings.
+
+Both give the same netlist. No name is formatted during the expansion. A net is
+stored as the ArrayNetlist net it becomes: NET_TEMPLATE (a template and its
+field values) for a top-level name, NET_LINK for a net between PEs, or the YAML
+top port of the same name.
+
+Rules, loop variables bound in the order given, the last one varying fastest:
+
+    - for: {VAR: RANGE, ...}
+      connect: {signal: ENDPOINT, to: [ENDPOINT, ...]}
+    - for: {VAR: RANGE, ...}
+      connect_handshake: {from: ENDPOINT, to: ENDPOINT}
+
+    RANGE    - N for 0..N-1, or [START, STOP] or [START, STOP, STEP]. Each bound is
+               an integer or an expression over rows and cols (columns), e.g. cols-1
+    ENDPOINT - INSTANCE-I_J.PORT, a port of a PE, I and J integers or {expressions},
+               INSTANCE the name of the array instance; anything else is a top-level
+               name, with {expressions} in it
+
+A binding where an index of a PE falls outside the array is dropped from its
+rule, e.g. "C-{i}_{j+1}.left" with j over all columns skips the last column.
+
+The forms of the earlier documentation are rejected rather than read another
+way: a loop range 0, which fixed a row or column (the index goes in the endpoint
+instead, C-{i}_0.left), and a top-level handshake side named after a PE channel
+without _rsc, left_in_{i} for left_in_rsc{i}.
+
+Usage: python3 connection_dsl.py [YAML] [PE_CONFIG] [--python]
+"""
+import argparse
+import ast
+import itertools
+import json
+import os
+import re
+import sys
+
+import systolic_array_generator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_PE_ENDPOINT = re.compile(r"^(\w+)-(\{[^{}]*\}|\d+)_(\{[^{}]*\}|\d+)\.(\w+)$")
+_FIELD = re.compile(r"\{([^{}]*)\}")
+_IDENTIFIER = re.compile(r"^[A-Za-z_]\w*$")
+
+# Names every index expression may use besides the loop variables.
+ARRAY_NAMES = ("rows", "cols", "columns")
+
+_EXPRESSION_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Name, ast.Load, ast.Add, ast.Sub, ast.Mult,
+                     ast.Div, ast.FloorDiv, ast.Mod, ast.USub, ast.UAdd)
+
+def compile_expression(text, variables, rows, cols):
+    """
+    Compile an index expression into a function of the loop variables. Integer
+    literals, the variables, rows and cols, + - * / // % and parentheses are
+    allowed. / is integer division.
+    """
+    try:
+        tree = ast.parse(text.strip(), mode="eval")
+    except SyntaxError:
+        raise ValueError(f"invalid index expression {{{text}}}")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant):
+            if type(node.value) is not int:
+                raise ValueError(f"invalid index expression {{{text}}}: {node.value!r} is not an integer")
+        elif not isinstance(node, _EXPRESSION_NODES):
+            raise ValueError(f"invalid index expression {{{text}}}: {type(node).__name__} is not supported")
+        elif isinstance(node, ast.Name) and node.id not in variables and node.id not in ARRAY_NAMES:
+            raise ValueError(f"invalid index expression {{{text}}}: unknown name {node.id}")
+        elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.Div):
+            node.op = ast.FloorDiv()
+    function = ast.Expression(ast.Lambda(
+        ast.arguments(posonlyargs=[], args=[ast.arg(name) for name in variables], kwonlyargs=[],
+                      kw_defaults=[], defaults=[]),
+        tree.body))
+    ast.fix_missing_locations(function)
+    return eval(compile(function, "<connections>", "eval"),
+                {"__builtins__": {}, "rows": rows, "cols": cols, "columns": cols})
+
+def _bound(value, rows, cols):
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"invalid loop bound {value!r}")
+    if isinstance(value, int):
+        return value
+    try:
+        return compile_expression(value, (), rows, cols)()
+    except ArithmeticError:
+        raise ValueError(f"invalid loop bound {value!r}")
+
+def parse_range(value, rows, cols):
+    """The values of a loop variable, see the module docstring."""
+    if isinstance(value, list):
+        if len(value) not in (2, 3):
+            raise ValueError(f"a loop range needs [start, stop] or [start, stop, step], got {value!r}")
+        bounds = [_bound(item, rows, cols) for item in value]
+        if len(bounds) == 3 and bounds[2] == 0:
+            raise ValueError(f"a loop range step cannot be 0, got {value!r}")
+        return range(*bounds)
+    return range(_bound(value, rows, cols))
+
+def parse_template(text, variables, rows, cols):
+    """
+    Split a top-level name into a str.format string and the compiled functions of
+    its {...} fields, e.g. left_in_rsc{i} -> ("left_in_rsc{}", [i]).
+    """
+    if not _IDENTIFIER.match(_FIELD.sub("0", text)):
+        raise ValueError(f"{text!r} is neither a PE port (INSTANCE-I_J.PORT) nor a valid top-level name")
+    fields = [compile_expression(field, variables, rows, cols) for field in _FIELD.findall(text)]
+    if len(fields) > systolic_array_generator.NET_ARGS - 1:
+        raise ValueError(f"{text!r} has more than {systolic_array_generator.NET_ARGS - 1} {{...}} fields")
+    return _FIELD.sub("{}", text), fields
+
+def parse_endpoint(text, variables, instance, rows, cols):
+    """
+    ("pe", i function, j function, port) for a PE port, ("top", format string,
+    field functions) for a top-level name.
+    """
+    if not isinstance(text, str):
+        raise ValueError(f"invalid endpoint {text!r}")
+    match = _PE_ENDPOINT.match(text.strip())
+    if not match:
+        return ("top",) + parse_template(text.strip(), variables, rows, cols)
+    name, i, j, port = match.groups()
+    if name != instance:
+        raise ValueError(f"{text!r} does not name the array instance {instance}")
+    indices = [compile_expression(index[1:-1] if index.startswith("{") else index, variables, rows, cols)
+               for index in (i, j)]
+    return ("pe", indices[0], indices[1], port)
+
+def interface_slots(netlist, interface):
+    """
+    PE ports of a handshake interface by suffix: the ports of a port group (left,
+    right, up, down, result, see group_pe_ports) or of a channel such as left_in.
+    """
+    groups = systolic_array_generator.group_pe_ports(netlist.port_names)
+    names = groups.get(interface) or [name for name in netlist.port_names
+                                      if systolic_array_generator.split_port_name(name)[0] == interface]
+    slots = {}
+    for name in names:
+        slots[systolic_array_generator.split_port_name(name)[1]] = netlist.slot_of[name]
+    return slots
+
+class Compiler:
+    """Compiles the rules into an ArrayNetlist, see the module docstring."""
+
+    def __init__(self, netlist, instance, use_numpy):
+        self.netlist = netlist
+        self.instance = instance
+        self.use_numpy = use_numpy
+        self.rows, self.cols = netlist.rows, netlist.cols
+        self.slots = len(netlist.port_names)
+        # Template of every top-level name, and the net of every (template, field values).
+        self.template_of = {}
+        self.template_nets = []
+        if use_numpy:
+            self.connections = numpy.frombuffer(netlist.connections, dtype=numpy.intc)
+
+    def template(self, text, info):
+        """Index of the ArrayNetlist template of a format string, the first info given wins."""
+        if text not in self.template_of:
+            self.template_of[text] = len(self.netlist.templates)
+            self.netlist.templates.append((text, info))
+            self.template_nets.append({})
+        return self.template_of[text]
+
+    # Expansion of the bindings: a rule is a list of columns, one per PE position
+    # and template field, with one entry per binding.
+
+    def bind(self, loops, endpoints):
+        """
+        Expand the bindings of the loops and evaluate the endpoints on them. Returns,
+        for every endpoint, (PE position column, port) or (format string, field
+        columns), without the bindings that fall outside the array.
+        """
+        ranges = list(loops.values())
+        if self.use_numpy:
+            grids = numpy.meshgrid(*[numpy.asarray(r, dtype=numpy.int64) for r in ranges], indexing="ij")
+            values = [grid.ravel() for grid in grids]
+            count = values[0].size if values else 1
+
+            def evaluate(function):
+                try:
+                    with numpy.errstate(divide="raise"):
+                        column = function(*values)
+                except ArithmeticError:
+                    raise ValueError("division by zero in an index expression")
+                return numpy.broadcast_to(numpy.asarray(column, dtype=numpy.int64), (count,))
+        else:
+            bindings = list(itertools.product(*ranges))
+
+            def evaluate(function):
+                try:
+                    return [function(*binding) for binding in bindings]
+                except ArithmeticError:
+                    raise ValueError("division by zero in an index expression")
+
+        evaluated = []
+        keep = None
+        for endpoint in endpoints:
+            if endpoint[0] == "top":
+                evaluated.append(("top", endpoint[1], [evaluate(field) for field in endpoint[2]]))
+                continue
+            i, j = evaluate(endpoint[1]), evaluate(endpoint[2])
+            if self.use_numpy:
+                inside = (i >= 0) & (i < self.rows) & (j >= 0) & (j < self.cols)
+                keep = inside if keep is None else keep & inside
+                evaluated.append(("pe", i * self.cols + j, endpoint[3]))
+            else:
+                inside = [0 <= a < self.rows and 0 <= b < self.cols for a, b in zip(i, j)]
+                keep = inside if keep is None else [x and y for x, y in zip(keep, inside)]
+                evaluated.append(("pe", [a * self.cols + b for a, b in zip(i, j)], endpoint[3]))
+        if keep is None:
+            return evaluated
+
+        def select(column):
+            if self.use_numpy:
+                return column[keep]
+            return [value for value, kept in zip(column, keep) if kept]
+        return [("pe", select(item[1]), item[2]) if item[0] == "pe" else ("top", item[1], [select(c) for c in item[2]])
+                for item in evaluated]
+
+    def top_nets(self, template, fields, count):
+        """Nets of a template for every binding, one per distinct field values, in order of first appearance."""
+        netlist = self.netlist
+        nets = self.template_nets[template]
+        text = netlist.templates[template][0]
+        if not fields and text in netlist.top_port_names:
+            # A YAML top port.
+            net = netlist.top_ports[netlist.top_port_names.index(text)]
+            return numpy.full(count, net, dtype=numpy.int64) if self.use_numpy else [net] * count
+
+        def net_of(key):
+            if key not in nets:
+                nets[key] = netlist.add_top_port(systolic_array_generator.NET_TEMPLATE, template, *key)
+            return nets[key]
+
+        if not self.use_numpy:
+            return [net_of(key) for key in zip(*fields)] if fields else [net_of(())] * count
+        if not fields:
+            return numpy.full(count, net_of(()), dtype=numpy.int64)
+        keys, first, inverse = numpy.unique(numpy.stack(fields, axis=1), axis=0, return_index=True,
+                                            return_inverse=True)
+        order = numpy.argsort(first, kind="stable")
+        ids = numpy.empty(len(keys), dtype=numpy.int64)
+        if nets:
+            for index in order:
+                ids[index] = net_of(tuple(keys[index].tolist()))
+        else:
+            # First use of the template: all its nets are new, create them at once.
+            args = numpy.zeros((len(keys), systolic_array_generator.NET_ARGS), dtype=numpy.intc)
+            args[:, 0] = template
+            args[:, 1:1 + len(fields)] = keys[order]
+            start = netlist.add_nets(systolic_array_generator.NET_TEMPLATE, args.tobytes(), top_ports=True)
+            ids[order] = numpy.arange(start, start + len(keys))
+            nets.update(zip(map(tuple, keys[order].tolist()), range(start, start + len(keys))))
+        return ids[inverse.ravel()]
+
+    def link_nets(self, stem, first, second):
+        """A new NET_LINK net for every binding, from PE position first to second."""
+        cols = self.cols
+        if self.use_numpy:
+            args = numpy.zeros((first.size, systolic_array_generator.NET_ARGS), dtype=numpy.intc)
+            args[:, 0] = stem
+            args[:, 1], args[:, 2] = first // cols, first % cols
+            args[:, 3], args[:, 4] = second // cols, second % cols
+            start = self.netlist.add_nets(systolic_array_generator.NET_LINK, args.tobytes())
+            return numpy.arange(start, start + first.size, dtype=numpy.int64)
+        return [self.netlist.add_net(systolic_array_generator.NET_LINK, stem, a // cols, a % cols, b // cols,
+                                     b % cols) for a, b in zip(first, second)]
+
+    def source_nets(self, stem, source, slot, target):
+        """
+        Nets of the source PE port of every binding of a connect rule: its current
+        net, or a new one linking it to the first target, shared by all bindings of
+        the same source.
+        """
+        if self.use_numpy:
+            index = source * self.slots + slot
+            nets = self.connections[index].astype(numpy.int64)
+            missing = numpy.flatnonzero(nets < 0)
+            if missing.size:
+                _, first, inverse = numpy.unique(index[missing], return_index=True, return_inverse=True)
+                order = numpy.argsort(first, kind="stable")
+                created = self.link_nets(stem, source[missing][first[order]], target[missing][first[order]])
+                rank = numpy.empty(len(order), dtype=numpy.int64)
+                rank[order] = numpy.arange(len(order))
+                nets[missing] = created[rank[inverse.ravel()]]
+            return nets
+        created = {}
+        nets = [self.netlist.connections[position * self.slots + slot] for position in source]
+        for k, (position, net) in enumerate(zip(source, nets)):
+            if net < 0:
+                if position not in created:
+                    created[position] = self.link_nets(stem, [position], [target[k]])[0]
+                nets[k] = created[position]
+        return nets
+
+    def scatter(self, positions, slot, nets):
+        """Connect port slot of the PE at every position to the net of its binding."""
+        netlist = self.netlist
+        if self.use_numpy:
+            index = positions * self.slots + slot
+            existing = self.connections[index]
+            clash = numpy.flatnonzero((existing >= 0) & (existing != nets))
+            if clash.size:
+                self._clash(positions[clash[0]], slot, existing[clash[0]], nets[clash[0]])
+            order = numpy.argsort(index, kind="stable")
+            index_sorted, nets_sorted = index[order], nets[order]
+            repeated = numpy.flatnonzero((index_sorted[1:] == index_sorted[:-1]) & (nets_sorted[1:] != nets_sorted[:-1]))
+            if repeated.size:
+                k = repeated[0]
+                self._clash(positions[order[k]], slot, nets[order[k]], nets[order[k + 1]])
+            self.connections[index] = nets
+            return
+        for position, net in zip(positions, nets):
+            index = position * self.slots + slot
+            if netlist.connections[index] >= 0 and netlist.connections[index] != net:
+                self._clash(position, slot, netlist.connections[index], net)
+            netlist.connections[index] = net
+
+    def _clash(self, position, slot, net, other):
+        netlist = self.netlist
+        raise ValueError(f"{netlist.instance_name(int(position) // self.cols, int(position) % self.cols)}."
+                         f"{netlist.port_names[slot]} is connected to both {netlist.net_name(int(net))} "
+                         f"and {netlist.net_name(int(other))}")
+
+    def _slot(self, port):
+        if port not in self.netlist.slot_of:
+            raise ValueError(f"{self.netlist.module_name} has no port {port}")
+        return self.netlist.slot_of[port]
+
+    def connect(self, loops, rule):
+        """Expand a connect rule: every binding joins its endpoints into one net."""
+        targets = rule.get("to", [])
+        if "signal" not in rule or not targets:
+            raise ValueError("connect needs a signal and a list of endpoints to connect it to")
+        variables = list(loops)
+        endpoints = [parse_endpoint(text, variables, self.instance, self.rows, self.cols)
+                     for text in [rule["signal"]] + (targets if isinstance(targets, list) else [targets])]
+        if sum(endpoint[0] == "top" for endpoint in endpoints) > 1:
+            raise ValueError("connect can join at most one top-level name")
+        slots = [self._slot(endpoint[3]) if endpoint[0] == "pe" else None for endpoint in endpoints]
+        bound = self.bind(loops, endpoints)
+        pe_ports = [(item[1], slot) for item, slot in zip(bound, slots) if item[0] == "pe"]
+        if not pe_ports:
+            raise ValueError("connect needs at least one PE port")
+        top = [item for item in bound if item[0] == "top"]
+        if top:
+            info = self.netlist.port_info[pe_ports[0][1]]
+            nets = self.top_nets(self.template(top[0][1], info), top[0][2], len(pe_ports[0][0]))
+        else:
+            # The net of the signal port, named after it and its first target.
+            source, slot = pe_ports[0]
+            port = self.netlist.port_names[slot]
+            nets = self.source_nets(self.netlist.stem(port), source, slot, pe_ports[1][0])
+        for positions, slot in pe_ports:
+            self.scatter(positions, slot, nets)
+
+    def connect_handshake(self, loops, rule):
+        """Expand a connect_handshake rule: the ports of both interfaces are paired by suffix."""
+        if "from" not in rule or "to" not in rule:
+            raise ValueError("connect_handshake needs from and to")
+        variables = list(loops)
+        endpoints = [parse_endpoint(rule[side], variables, self.instance, self.rows, self.cols)
+                     for side in ("from", "to")]
+        if endpoints[0][0] == endpoints[1][0] == "top":
+            raise ValueError("connect_handshake needs a PE interface on at least one side")
+        channels = {systolic_array_generator.split_port_name(name)[0] for name in self.netlist.port_names
+                    if "_rsc" in name}
+        for endpoint, side in zip(endpoints, ("from", "to")):
+            stem = rule[side].strip()
+            channel = next((channel for channel in channels if stem.startswith(channel + "_")), None)
+            if endpoint[0] == "top" and channel and not stem.startswith(channel + "_rsc"):
+                raise ValueError(f"the top-level side {stem!r} is named after the channel {channel} without _rsc, "
+                                 f"write {channel}_rsc{stem[len(channel) + 1:]} for the ports "
+                                 f"{channel}_rsc<k>_dat, ...")
+        interfaces = []
+        for endpoint, side in zip(endpoints, ("from", "to")):
+            if endpoint[0] == "top":
+                interfaces.append(None)
+                continue
+            slots = interface_slots(self.netlist, endpoint[3])
+            if not slots:
+                raise ValueError(f"{self.netlist.module_name} has no handshake interface {endpoint[3]}")
+            interfaces.append(slots)
+        pe_interfaces = [slots for slots in interfaces if slots is not None]
+        if len(pe_interfaces) == 2 and set(pe_interfaces[0]) != set(pe_interfaces[1]):
+            raise ValueError(f"the interfaces {endpoints[0][3]} and {endpoints[1][3]} have different ports: "
+                             f"{sorted(pe_interfaces[0])} and {sorted(pe_interfaces[1])}")
+        bound = self.bind(loops, endpoints)
+        port_names = self.netlist.port_names
+        for suffix, slot in pe_interfaces[0].items():
+            if len(pe_interfaces) == 2:
+                stem = systolic_array_generator.LINK_STEMS.get(suffix, port_names[interfaces[0][suffix]])
+                nets = self.link_nets(self.netlist.stem(stem), bound[0][1], bound[1][1])
+            else:
+                top = bound[0] if bound[0][0] == "top" else bound[1]
+                template = self.template(top[1] + suffix, self.netlist.port_info[slot])
+                pe = bound[1] if bound[0][0] == "top" else bound[0]
+                nets = self.top_nets(template, top[2], len(pe[1]))
+            for item, slots in zip(bound, interfaces):
+                if slots is not None:
+                    self.scatter(item[1], slots[suffix], nets)
+
+    def compile(self, rules):
+        for number, rule in enumerate(rules, 1):
+            try:
+                if not isinstance(rule, dict):
+                    raise ValueError("a rule must be a mapping")
+                loops = {}
+                for name, value in (rule.get("for") or {}).items():
+                    if not _IDENTIFIER.match(str(name)) or name in ARRAY_NAMES:
+                        raise ValueError(f"invalid loop variable {name!r}")
+                    if type(value) is int and value == 0:
+                        raise ValueError(f"{name}: 0 is an empty loop range, a range N runs over 0..N-1; "
+                                         f"to fix a row or column, put its index in the endpoint, e.g. C-{{i}}_0.left")
+                    loops[name] = parse_range(value, self.rows, self.cols)
+                kinds = [kind for kind in ("connect", "connect_handshake") if kind in rule]
+                if len(kinds) != 1:
+                    raise ValueError("a rule needs one of connect or connect_handshake")
+                if not isinstance(rule[kinds[0]], dict):
+                    raise ValueError(f"{kinds[0]} must be a mapping")
+                getattr(self, kinds[0])(loops, rule[kinds[0]])
+            except ValueError as error:
+                raise ValueError(f"connections rule {number}: {error}")
+
+def build_connection_netlist(config, pe_config, use_numpy=None):
+    """
+        Build the netlist of the systolic array from the connections: section of the YAML
+        configuration (see the module docstring).
+
+        Parameters:
+
+        -config - High-level configuration loaded from the YAML file
+        -pe_config - PE module port definitions, as produced by parse_verilog.generate_submodule_configs
+        -use_numpy - Expand with NumPy (default: when it is installed) or in pure Python
+
+        Returns an ArrayNetlist of the YAML dimensions whose PEs are connected as the rules
+        say, ports no rule connects are left open. None on an error in the rules.
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    rows, cols = config["dimensions"][0], config["dimensions"][1]
+    module_name = systolic_array_generator.array_module_name(config, pe_config)
+    instance = next((instance["name"] for instance in config.get("instances", []) if "array" in instance), "PE")
+    netlist = systolic_array_generator.ArrayNetlist(config["top_module"], rows, cols, module_name,
+                                                    pe_config["ports"], config.get("top_ports", []))
+    for index in range(len(netlist.top_port_names)):
+        netlist.add_top_port(systolic_array_generator.NET_TOP, index)
+    try:
+        Compiler(netlist, instance, use_numpy).compile(config["connections"])
+    except ValueError as error:
+        print(f"Error: {error}")
+        return None
+    # Ports are connected in their declaration order.
+    order = list(range(len(netlist.port_names)))
+    for key in ((False, False), (False, True), (True, False), (True, True)):
+        netlist.slot_orders[key] = order
+    return netlist
+
+def main(argv=None):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Compile the connections of a systolic array YAML and summarize them.")
+    parser.add_argument("yaml", nargs="?", default=os.path.join(script_dir, "../src/systolic_array.yaml"))
+    parser.add_argument("pe_config", nargs="?", default=os.path.join(script_dir, "../build/submodule_pe_config.json"))
+    parser.add_argument("--python", action="store_true", help="expand in pure Python even if NumPy is installed")
+    args = parser.parse_args(argv)
+
+    for path in (args.yaml, args.pe_config):
+        if not os.path.exists(path):
+            print(f"Error: {path} does not exist")
+            sys.exit(1)
+    config = systolic_array_generator.load_array_config(args.yaml)
+    if not config.get("connections"):
+        print(f"Error: {args.yaml} has no connections: section")
+        sys.exit(1)
+    with open(args.pe_config, "r") as f:
+        pe_config = json.load(f)
+    netlist = build_connection_netlist(config, pe_config, False if args.python else None)
+    if netlist is None:
+        sys.exit(1)
+    connected = sum(1 for net in netlist.connections if net >= 0)
+    print(f"{len(config['connections'])} rules: {netlist.rows}x{netlist.cols} PEs, {len(netlist.top_ports)} top-level "
+          f"ports, {len(netlist.net_kind) - len(netlist.top_ports)} internal nets, "
+          f"{len(netlist.connections) - connected} of {len(netlist.connections)} PE ports open")
+
+if __name__ == "__main__":
+    main()
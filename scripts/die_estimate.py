@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Analytic die size estimate of the array, from its synthesized area.
+
+The synthesized area is the Chip area of the top module in synth_stat.txt, which
+counts the hardened macros through their LIB, so the same estimate covers flat
+and macro designs. With it and the array dimensions:
+
+- core area = synthesized area / utilization, the die_estimate "utilization" or
+  the CORE_UTILIZATION of config_mk, in percent;
+- core aspect ratio (height / width) = rows / cols, the shape of the array, unless
+  die_estimate "aspect_ratio" is given;
+- pins: every bit of a top-level port needs PIN_PITCH of the die boundary (two
+  routing tracks of the pin layers), rows x cols x width for the result ports
+  alone. A die whose perimeter is too short is widened until the pins fit;
+- die area = core area plus CORE_MARGIN on every side.
+
+With die_estimate "enable", run-flow.py writes the estimate into the ORFS design
+directory as die_estimate.mk (DIE_AREA and CORE_AREA, included by config.mk in
+place of CORE_UTILIZATION) after synthesis. A fixed floorplan (manual_area_config
+or the macro grid placement) takes precedence; it and CORE_UTILIZATION runs are
+checked against the estimate instead (check_fit), with a warning before the
+floorplan when the cells cannot be placed at PLACE_DENSITY or the pins do not fit.
+
+Usage: python3 die_estimate.py AREA ROWSxCOLS --pins N [--utilization U] [--margin M] [--platform P]
+"""
+import argparse
+import math
+import os
+import re
+import sys
+
+import macro_placement
+import verilog_ports
+
+ESTIMATE_FILE = "die_estimate.mk"
+DEFAULT_UTILIZATION = 50
+DEFAULT_CORE_MARGIN = 2
+
+# Boundary length in um used by one pin: two tracks of the pin layers.
+PIN_PITCH = {
+    "asap7": 0.096,
+    "nangate45": 0.28,
+    "sky130hd": 0.92,
+    "sky130hs": 0.96,
+    "gf180": 1.12,
+    "ihp-sg13g2": 0.96
+}
+DEFAULT_PIN_PITCH = 0.2
+
+_AREA = re.compile(r"^export\s+(DIE_AREA|CORE_AREA)\s*=\s*(.+)$", re.MULTILINE)
+
+def is_enabled(setup):
+    """Whether the estimate sets the floorplan, die_estimate "enable"."""
+    return setup.get("die_estimate", {}).get("enable", False)
+
+def writes_floorplan(setup):
+    """Whether the estimate becomes the floorplan: enabled, without manual area or grid placement."""
+    return (is_enabled(setup) and not macro_placement.is_enabled(setup)
+            and not setup.get("manual_area_config", {}).get("enable", False))
+
+def pin_count(top_verilog, top_module=None):
+    """Number of top-level port bits of the top module (the first one if None) of a Verilog file."""
+    modules = verilog_ports.extract_ports_from_file(top_verilog)
+    if not modules:
+        return 0
+    ports = modules.get(top_module) or next(iter(modules.values()))
+    return sum(port["width"] if isinstance(port["width"], int) else 1 for port in ports.values())
+
+def estimate(cell_area, rows, cols, pins, utilization=DEFAULT_UTILIZATION, margin=DEFAULT_CORE_MARGIN,
+             pin_pitch=DEFAULT_PIN_PITCH, aspect_ratio=None):
+    """
+    Die and core area of an array of rows x cols PEs with cell_area um^2 of
+    synthesized area and pins top-level pin bits, see the module docstring.
+    """
+    aspect_ratio = aspect_ratio or rows / cols
+    core_area = cell_area / (utilization / 100)
+    core_width = math.sqrt(core_area / aspect_ratio)
+    core_height = core_width * aspect_ratio
+    pin_perimeter = pins * pin_pitch
+    die_perimeter = 2 * (core_width + core_height + 4 * margin)
+    pin_limited = die_perimeter < pin_perimeter
+    if pin_limited:
+        # Grow the core at the same aspect ratio until the die boundary holds the pins.
+        scale = (pin_perimeter / 2 - 4 * margin) / (core_width + core_height)
+        core_width, core_height = core_width * scale, core_height * scale
+        die_perimeter = pin_perimeter
+    core_width, core_height = round(core_width, 3), round(core_height, 3)
+    return {
+        "cell_area": cell_area,
+        "pe_area": cell_area / (rows * cols),
+        "utilization": round(100 * cell_area / (core_width * core_height), 2),
+        "aspect_ratio": round(core_height / core_width, 4),
+        "pins": pins,
+        "pin_perimeter": round(pin_perimeter, 3),
+        "pin_limited": pin_limited,
+        "core_area": [margin, margin, round(margin + core_width, 3), round(margin + core_height, 3)],
+        "die_area": [0, 0, round(2 * margin + core_width, 3), round(2 * margin + core_height, 3)]
+    }
+
+def _area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+def _perimeter(box):
+    return 2 * ((box[2] - box[0]) + (box[3] - box[1]))
+
+def read_area_mk(path):
+    """(die_area, core_area) of a makefile fragment exporting DIE_AREA and CORE_AREA, or None."""
+    try:
+        with open(path, "r") as f:
+            values = dict(_AREA.findall(f.read()))
+    except OSError:
+        return None
+    if "DIE_AREA" not in values or "CORE_AREA" not in values:
+        return None
+    return [float(v) for v in values["DIE_AREA"].split()], [float(v) for v in values["CORE_AREA"].split()]
+
+def check_fit(cell_area, pins, pin_pitch, die_area, core_area, place_density):
+    """Reasons a floorplan of die_area and core_area cannot hold the design, as a list of messages."""
+    problems = []
+    utilization = cell_area / _area(core_area)
+    if utilization > place_density:
+        problems.append(f"the core of {_area(core_area):.1f} um^2 is {100 * utilization:.1f}% utilized by "
+                        f"{cell_area:.1f} um^2 of cells, above PLACE_DENSITY {place_density}: placement needs "
+                        f"at least {cell_area / place_density:.1f} um^2")
+    if _perimeter(die_area) < pins * pin_pitch:
+        problems.append(f"the die perimeter of {_perimeter(die_area):.1f} um is shorter than the "
+                        f"{pins * pin_pitch:.1f} um the {pins} pins need")
+    return problems
+
+def render_area_mk(result):
+    """DIE_AREA and CORE_AREA of an estimate, as included by config.mk."""
+    return (f"export DIE_AREA  = {' '.join(map(str, result['die_area']))}\n"
+            f"export CORE_AREA = {' '.join(map(str, result['core_area']))}\n")
+
+def print_estimate(result):
+    die, core = result["die_area"], result["core_area"]
+    print(f"Die estimate: {result['cell_area']:.1f} um^2 of cells ({result['pe_area']:.1f} um^2 per PE), "
+          f"core {core[2] - core[0]:.3f} x {core[3] - core[1]:.3f} um at {result['utilization']}% utilization, "
+          f"die {die[2]:.3f} x {die[3]:.3f} um, {result['pins']} pins needing {result['pin_perimeter']} um"
+          + (" (pin limited)" if result["pin_limited"] else ""))
+
+def setup_parameters(setup):
+    """(utilization, CORE_MARGIN, pin pitch, aspect ratio or None, PLACE_DENSITY) of a setup."""
+    config = setup.get("config_mk", {})
+    estimate_cfg = setup.get("die_estimate", {})
+    utilization = estimate_cfg.get("utilization", config.get("CORE_UTILIZATION", DEFAULT_UTILIZATION))
+    pin_pitch = estimate_cfg.get("pin_pitch", PIN_PITCH.get(config.get("PLATFORM"), DEFAULT_PIN_PITCH))
+    return (float(utilization), config.get("CORE_MARGIN", DEFAULT_CORE_MARGIN), pin_pitch,
+            estimate_cfg.get("aspect_ratio"), float(config.get("PLACE_DENSITY", 1.0)))
+
+def parse_size(text):
+    rows, cols = text.lower().split("x")
+    return int(rows), int(cols)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate the die size of the array from its synthesized area.")
+    parser.add_argument("area", type=float, help="synthesized area in um^2")
+    parser.add_argument("size", type=parse_size, help="array dimensions as ROWSxCOLS")
+    parser.add_argument("--pins", type=int, default=None, help="top-level pin bits (default: from --top-verilog)")
+    parser.add_argument("--top-verilog", help="top-level Verilog to count the pins of")
+    parser.add_argument("--utilization", type=float, default=DEFAULT_UTILIZATION, help="core utilization in percent")
+    parser.add_argument("--margin", type=float, default=DEFAULT_CORE_MARGIN, help="CORE_MARGIN in um")
+    parser.add_argument("--platform", default=None, help="platform whose pin pitch to use")
+    args = parser.parse_args(argv)
+
+    pins = args.pins
+    if pins is None:
+        if not args.top_verilog or not os.path.exists(args.top_verilog):
+            print("Error: give the pin count with --pins or an existing --top-verilog")
+            sys.exit(1)
+        pins = pin_count(args.top_verilog)
+    rows, cols = args.size
+    result = estimate(args.area, rows, cols, pins, args.utilization, args.margin,
+                      PIN_PITCH.get(args.platform, DEFAULT_PIN_PITCH))
+    print_estimate(result)
+    sys.stdout.write(render_area_mk(result))
+
+if __name__ == "__main__":
+    main()
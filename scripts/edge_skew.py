@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Skew buffers at the edges of the generated top module, so that the host streams
+unskewed matrices at full rate.
+
+By default every row and column edge of the standard grid is a handshake of its
+own (left_in_rsc<i>_dat/_vld/_rdy, up_in_rsc<j>_*, ...), and to keep every PE
+busy the host has to feed row i about i cycles after row 0, column j about j
+cycles after column 0. With the generate_files entry
+
+    "edge_skew": {"pe_latency": 1, "deskew": true}
+
+each input edge becomes a single streaming interface instead: left_in_rsc_dat
+holds the data of all rows (row i in bits [i*W +: W], as the bus of the generate
+top style), with one left_in_rsc_vld and left_in_rsc_rdy, and likewise up_in_rsc_*
+for the columns. A vector is accepted when every lane has room, and each lane
+feeds its row or column through a FIFO. The PEs skew the lanes themselves: lane k
+waits in its FIFO until the data from the PEs above or to the left arrives, about
+k*pe_latency cycles, so the FIFO of lane k holds k*pe_latency+2 entries and the
+interface moves one vector per cycle once the array is filled. With deskew
+(default) the right_out and down_out edges are gathered the same way: lane k
+arrives (lanes-1-k)*pe_latency cycles before the last one and waits in a FIFO of
+that depth plus 2, and a vector is valid when every lane is.
+
+The skew modules are generated after the top module, one per edge, with the
+FIFOs of their lanes in a generate loop, and take their clock and reset from the
+PE at the corner they sit next to. Each adds one cycle to the path through the
+array. They need the standard grid of PEs.
+
+Usage: python3 edge_skew.py ROWS COLS [--width 32] [--pe-latency 1] [--no-deskew]
+prints the lanes and FIFO depths of the edges of an array of ROWS x COLS PEs.
+"""
+import argparse
+import json
+import os
+
+import systolic_array_generator
+
+DEFAULT_PE_LATENCY = 1
+SUFFIXES = ("_dat", "_vld", "_rdy")
+
+# Edges of the array: port group, whether the lanes are rows, and whether the group feeds the array.
+EDGES = (("left", True, True), ("up", False, True), ("right", True, False), ("down", False, False))
+
+REPORT_FILE = "edge_skew.json"
+
+def is_enabled(setup_data):
+    """Whether the edges of the top are skewed, generate_files "edge_skew"."""
+    options = (setup_data.get("generate_files") or [{}])[0].get("edge_skew")
+    return bool(options) and options.get("enable", True)
+
+def parse_edge_skew(setup_data):
+    """
+    Options of the edge skew, the generate_files "edge_skew" entry: a dict with the
+    pe_latency and deskew, {} without skew, or None on an error.
+    """
+    if not is_enabled(setup_data):
+        return {}
+    options = setup_data["generate_files"][0]["edge_skew"]
+    pe_latency = options.get("pe_latency", DEFAULT_PE_LATENCY)
+    if isinstance(pe_latency, bool) or not isinstance(pe_latency, int) or pe_latency < 1:
+        print(f"Error: edge_skew pe_latency must be a positive integer in setup.json, found {pe_latency!r}")
+        return None
+    return {"pe_latency": pe_latency, "deskew": bool(options.get("deskew", True))}
+
+def lane_depths(lanes, pe_latency, feeds_array):
+    """FIFO depth of every lane of an edge: the cycles the lane waits for the others, plus 2."""
+    if feeds_array:
+        return [k * pe_latency + 2 for k in range(lanes)]
+    return [(lanes - 1 - k) * pe_latency + 2 for k in range(lanes)]
+
+def fifo_module_name(top_module):
+    return f"{top_module}_skew_fifo"
+
+def edge_module_name(top_module, prefix, feeds_array):
+    """Module of the skew of an edge, e.g. SystolicArray_left_in_skew or SystolicArray_right_out_deskew."""
+    return f"{top_module}_{prefix}_{'skew' if feeds_array else 'deskew'}"
+
+def fifo_ports():
+    """Port table of the lane FIFO, its width is the WIDTH parameter."""
+    return {
+        "clk": {"direction": "input", "width": 1},
+        "rst": {"direction": "input", "width": 1},
+        "in_dat": {"direction": "input", "width": "WIDTH"},
+        "in_vld": {"direction": "input", "width": 1},
+        "in_rdy": {"direction": "output", "width": 1},
+        "out_dat": {"direction": "output", "width": "WIDTH"},
+        "out_vld": {"direction": "output", "width": 1},
+        "out_rdy": {"direction": "input", "width": 1}
+    }
+
+def edge_ports(lanes, width, feeds_array):
+    """
+    Port table of the skew of an edge: the streaming interface on the host side
+    (in_* when the edge feeds the array, out_* otherwise) and one handshake per lane.
+    """
+    ports = {"clk": {"direction": "input", "width": 1}, "rst": {"direction": "input", "width": 1}}
+    host, lane = ("in", "out") if feeds_array else ("out", "in")
+    host_ports = {f"{host}_dat": {"direction": "input" if feeds_array else "output", "width": lanes * width},
+                  f"{host}_vld": {"direction": "input" if feeds_array else "output", "width": 1},
+                  f"{host}_rdy": {"direction": "output" if feeds_array else "input", "width": 1}}
+    lane_ports = {}
+    for k in range(lanes):
+        lane_ports[f"{lane}{k}_dat"] = {"direction": "output" if feeds_array else "input", "width": width}
+        lane_ports[f"{lane}{k}_vld"] = {"direction": "output" if feeds_array else "input", "width": 1}
+        lane_ports[f"{lane}{k}_rdy"] = {"direction": "input" if feeds_array else "output", "width": 1}
+    if feeds_array:
+        ports.update(host_ports, **lane_ports)
+    else:
+        ports.update(lane_ports, **host_ports)
+    return ports
+
+def _port_list(ports):
+    lines = []
+    for name, info in ports.items():
+        width = info["width"]
+        if isinstance(width, str):
+            lines.append(f"  {info['direction']} [{width}-1:0] {name}")
+        else:
+            lines.append(f"  {info['direction']} {f'[{width - 1}:0] ' if width > 1 else ''}{name}")
+    return ",\n".join(lines)
+
+def render_fifo(name):
+    """Verilog of the lane FIFO, DEPTH entries of WIDTH bits."""
+    return ("// Auto-generated lane FIFO of the edge skew\n"
+            f"module {name} #(\n"
+            "  parameter WIDTH = 32,\n"
+            "  parameter DEPTH = 2\n"
+            ") (\n"
+            f"{_port_list(fifo_ports())}\n"
+            ");\n\n"
+            "  localparam ADDRESS = DEPTH > 1 ? $clog2(DEPTH) : 1;\n"
+            "  localparam COUNTER = $clog2(DEPTH + 1);\n\n"
+            "  reg [WIDTH-1:0] mem [0:DEPTH-1];\n"
+            "  reg [ADDRESS-1:0] head;\n"
+            "  reg [ADDRESS-1:0] tail;\n"
+            "  reg [COUNTER-1:0] count;\n"
+            "  wire push = in_vld && in_rdy;\n"
+            "  wire pop = out_vld && out_rdy;\n\n"
+            "  assign in_rdy = count != DEPTH;\n"
+            "  assign out_vld = count != 0;\n"
+            "  assign out_dat = mem[head];\n\n"
+            "  always @(posedge clk)\n"
+            "    if (push)\n"
+            "      mem[tail] <= in_dat;\n\n"
+            "  always @(posedge clk) begin\n"
+            "    if (rst) begin\n"
+            "      head <= 0;\n"
+            "      tail <= 0;\n"
+            "      count <= 0;\n"
+            "    end else begin\n"
+            "      if (push)\n"
+            "        tail <= tail == DEPTH - 1 ? 0 : tail + 1;\n"
+            "      if (pop)\n"
+            "        head <= head == DEPTH - 1 ? 0 : head + 1;\n"
+            "      count <= count + push - pop;\n"
+            "    end\n"
+            "  end\n\n"
+            "endmodule\n")
+
+def render_edge(name, fifo, lanes, width, pe_latency, feeds_array):
+    """Verilog of the skew of an edge of lanes handshakes of width bits."""
+    if feeds_array:
+        kind, depth = "skew", f"k * {pe_latency} + 2"
+        # A vector is accepted when every lane has room.
+        wires = ("dat", lanes * width), ("vld", lanes), ("rdy", lanes), ("room", lanes)
+        handshake = ("  assign in_rdy = &room;\n"
+                     f"  assign rdy = {{{', '.join(f'out{k}_rdy' for k in reversed(range(lanes)))}}};\n"
+                     + "".join(f"  assign out{k}_dat = dat[{k * width} +: {width}];\n"
+                               f"  assign out{k}_vld = vld[{k}];\n" for k in range(lanes)))
+        fifo_io = (f"in_dat[k * {width} +: {width}]", "in_vld && in_rdy", "room[k]",
+                   f"dat[k * {width} +: {width}]", "vld[k]", "rdy[k]")
+    else:
+        kind, depth = "de-skew", f"({lanes - 1} - k) * {pe_latency} + 2"
+        # A vector is valid when every lane is.
+        wires = ("dat", lanes * width), ("vld", lanes), ("room", lanes), ("ready", lanes)
+        handshake = (f"  assign dat = {{{', '.join(f'in{k}_dat' for k in reversed(range(lanes)))}}};\n"
+                     f"  assign vld = {{{', '.join(f'in{k}_vld' for k in reversed(range(lanes)))}}};\n"
+                     + "".join(f"  assign in{k}_rdy = room[{k}];\n" for k in range(lanes))
+                     + "  assign out_vld = &ready;\n")
+        fifo_io = (f"dat[k * {width} +: {width}]", "vld[k]", "room[k]",
+                   f"out_dat[k * {width} +: {width}]", "ready[k]", "out_vld && out_rdy")
+    connections = ",\n".join(f"        .{port}({signal})" for port, signal in
+                             zip(("clk", "rst", "in_dat", "in_vld", "in_rdy", "out_dat", "out_vld", "out_rdy"),
+                                 ("clk", "rst") + fifo_io))
+    return (f"// Auto-generated {kind} of {lanes} lanes of {width} bits, lane k in a FIFO of {depth} entries\n"
+            f"module {name}(\n"
+            f"{_port_list(edge_ports(lanes, width, feeds_array))}\n"
+            ");\n\n"
+            + "".join(f"  wire [{bits - 1}:0] {wire};\n" for wire, bits in wires)
+            + "\n"
+            f"{handshake}\n"
+            "  genvar k;\n"
+            "  generate\n"
+            f"    for (k = 0; k < {lanes}; k = k + 1) begin : lane\n"
+            f"      {fifo} #(.WIDTH({width}), .DEPTH({depth})) FIFO (\n"
+            f"{connections}\n"
+            "      );\n"
+            "    end\n"
+            "  endgenerate\n\n"
+            "endmodule\n")
+
+def render_modules(info):
+    """
+    Port tables and Verilog of the skew modules, info being the report of the edge
+    skew (see EdgeSkew.report): {module name: (port table, Verilog)}.
+    """
+    fifo = info["fifo_module"]
+    modules = {fifo: (fifo_ports(), render_fifo(fifo))}
+    for edge in info["edges"].values():
+        feeds_array = edge["direction"] == "input"
+        modules[edge["module"]] = (edge_ports(edge["lanes"], edge["width"], feeds_array),
+                                   render_edge(edge["module"], fifo, edge["lanes"], edge["width"],
+                                               info["pe_latency"], feeds_array))
+    return modules
+
+class EdgeSkew:
+    """
+    Skew of the edges of one array netlist. edges maps the channel prefix of every
+    skewed edge (left_in, up_in, right_out, down_out) to (group, lanes, width). The
+    edge nets of the PEs become internal nets, named like left_in_rsc_dat_PE_3_0, and
+    the skew modules are only formatted when the netlist is serialized (see iter_instances).
+    """
+
+    def __init__(self, top_module, rows, cols, edges, pe_latency=DEFAULT_PE_LATENCY, deskew=True, tile_size=1):
+        self.top_module = top_module
+        self.rows = rows
+        self.cols = cols
+        self.edges = edges
+        self.pe_latency = pe_latency
+        self.deskew = deskew
+        self.tile_rows, self.tile_cols = systolic_array_generator.tile_shape(tile_size)
+        self.feeds = {group: feeds_array for group, _, feeds_array in EDGES}
+        self.along_rows = {group: along_rows for group, along_rows, _ in EDGES}
+
+    def pe_at(self, prefix, index):
+        """Row and column of the PE on lane index of an edge."""
+        group = self.edges[prefix][0]
+        if self.along_rows[group]:
+            return index, 0 if group == "left" else self.cols - 1
+        return 0 if group == "up" else self.rows - 1, index
+
+    def net_name(self, port, index):
+        """Name of the internal net of edge port of lane index."""
+        prefix, _ = systolic_array_generator.split_port_name(port)
+        i, j = self.pe_at(prefix, index)
+        return f"{port}_PE_{i}_{j}"
+
+    def top_port_name(self, prefix, suffix):
+        return f"{prefix}_rsc{suffix}"
+
+    def report(self):
+        """Summary of the edge skew, written to edge_skew.json for the host side."""
+        edges = {}
+        for prefix, (group, lanes, width) in self.edges.items():
+            feeds_array = self.feeds[group]
+            depths = lane_depths(lanes, self.pe_latency, feeds_array)
+            edges[prefix] = {
+                "direction": "input" if feeds_array else "output",
+                "interface": self.top_port_name(prefix, ""),
+                "module": edge_module_name(self.top_module, prefix, feeds_array),
+                "lanes": lanes,
+                "width": width,
+                "depths": depths,
+                "fifo_bits": sum(depths) * width
+            }
+        return {
+            "top_module": self.top_module,
+            "rows": self.rows,
+            "cols": self.cols,
+            "pe_latency": self.pe_latency,
+            "deskew": self.deskew,
+            "latency": 1,
+            "fifo_module": fifo_module_name(self.top_module),
+            "fifo_bits": sum(edge["fifo_bits"] for edge in edges.values()),
+            "edges": edges
+        }
+
+    def iter_instances(self, netlist):
+        """(instance name, instance data) of the skew of every edge, in the form of the array JSON."""
+        slots = len(netlist.port_names)
+        for prefix, (group, lanes, _) in self.edges.items():
+            feeds_array = self.feeds[group]
+            # Clock and reset of the instance holding the PE of the first lane.
+            i, j = self.pe_at(prefix, 0)
+            base = ((i // self.tile_rows) * netlist.cols + j // self.tile_cols) * slots
+            connect = {port: netlist.net_name(netlist.connections[base + netlist.slot_of[port]])
+                       for port in ("clk", "rst")}
+            host, lane = ("in", "out") if feeds_array else ("out", "in")
+            for k in range(lanes):
+                for suffix in SUFFIXES:
+                    connect[f"{lane}{k}{suffix}"] = self.net_name(self.top_port_name(prefix, suffix), k)
+            for suffix in SUFFIXES:
+                connect[f"{host}{suffix}"] = self.top_port_name(prefix, suffix)
+            name = f"{prefix.upper()}_{'SKEW' if feeds_array else 'DESKEW'}"
+            yield name, {"module": edge_module_name(self.top_module, prefix, feeds_array), "connect": connect}
+
+def attach(netlist, options, tile_size=1):
+    """
+    Skew the edges of an ArrayNetlist of the standard grid (or its top of tiles of
+    tile_size, K or (R, C)) by options (see parse_edge_skew): the edge ports of the rows and
+    columns become internal nets, and every skewed edge one streaming interface of
+    top-level ports. Returns the EdgeSkew, also netlist.edge_skew, or None on an error.
+    """
+    port_groups = systolic_array_generator.group_pe_ports(netlist.net_port_names)
+    tile_rows, tile_cols = systolic_array_generator.tile_shape(tile_size)
+    rows, cols = netlist.rows * tile_rows, netlist.cols * tile_cols
+    groups = [edge for edge in EDGES if edge[2] or options["deskew"]]
+    edges = {}
+    for group, along_rows, _ in groups:
+        names = port_groups[group]
+        prefixes = {systolic_array_generator.split_port_name(name)[0] for name in names}
+        if len(prefixes) != 1 or {systolic_array_generator.split_port_name(name)[1] for name in names} != set(SUFFIXES):
+            print(f"Error: edge_skew needs a single _dat/_vld/_rdy {group} channel per PE")
+            return None
+        prefix = prefixes.pop()
+        width = netlist.net_port_info[netlist.net_port_names.index(prefix + "_rsc_dat")]["width"]
+        if not isinstance(width, int):
+            print(f"Error: edge_skew needs a fixed width of {prefix}_rsc_dat, found {width!r}")
+            return None
+        edges[prefix] = (group, rows if along_rows else cols, width)
+
+    skewed = {netlist.net_port_names.index(f"{prefix}_rsc{suffix}") for prefix in edges for suffix in SUFFIXES}
+    edge_nets = [net for net in netlist.top_ports if netlist.net_kind[net] == systolic_array_generator.NET_EDGE
+                 and netlist.net_args[net * systolic_array_generator.NET_ARGS] in skewed]
+    if len(edge_nets) != sum(lanes * len(SUFFIXES) for _, lanes, _ in edges.values()):
+        print("Error: edge_skew needs the edge ports of the standard grid")
+        return None
+
+    skew = EdgeSkew(netlist.top_module, rows, cols, edges, options["pe_latency"], options["deskew"], tile_size)
+    for net in edge_nets:
+        netlist.net_kind[net] = systolic_array_generator.NET_STREAM
+    edge_set = set(edge_nets)
+    netlist.top_ports = type(netlist.top_ports)("i", (net for net in netlist.top_ports if net not in edge_set))
+    for prefix, (group, lanes, width) in edges.items():
+        for suffix in SUFFIXES:
+            info = dict(netlist.net_port_info[netlist.net_port_names.index(f"{prefix}_rsc{suffix}")])
+            if suffix == "_dat":
+                info["width"] = lanes * width
+            template = len(netlist.templates)
+            netlist.templates.append((skew.top_port_name(prefix, suffix), info))
+            netlist.add_top_port(systolic_array_generator.NET_TEMPLATE, template)
+    netlist.edge_skew = skew
+    return skew
+
+def write_report(skew, report_file):
+    """Write the report of the edge skew to report_file."""
+    os.makedirs(os.path.dirname(report_file) or ".", exist_ok=True)
+    info = skew.report()
+    with open(report_file, "w") as f:
+        json.dump(info, f, indent=4)
+    print(f"Edge skew: {', '.join(edge['interface'] for edge in info['edges'].values())} streamed "
+          f"with FIFOs of {info['fifo_bits']} bits for a PE latency of {skew.pe_latency}, "
+          f"see {os.path.basename(report_file)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the edge skew of an array of ROWS x COLS PEs.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("cols", type=int)
+    parser.add_argument("--width", type=int, default=32, help="data width of the edge channels")
+    parser.add_argument("--pe-latency", type=int, default=DEFAULT_PE_LATENCY,
+                        help="cycles from the inputs of a PE to its right_out and down_out")
+    parser.add_argument("--no-deskew", action="store_true", help="keep the right_out and down_out edges per lane")
+    args = parser.parse_args(argv)
+
+    edges = {f"{group}_{'in' if feeds_array else 'out'}": (group, args.rows if along_rows else args.cols, args.width)
+             for group, along_rows, feeds_array in EDGES if feeds_array or not args.no_deskew}
+    skew = EdgeSkew("top", args.rows, args.cols, edges, args.pe_latency, not args.no_deskew)
+    print(json.dumps(skew.report(), indent=4))
+
+if __name__ == "__main__":
+    main()
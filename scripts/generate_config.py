@@ -136,17 +136,20 @@ def parse_setup_file(file_path):
     return connection, submodules, top_submodule
 
 SETUP_FILE = "../setup.json"  
-connection_json_file, submodule_files, top_submodule = parse_setup_file(SETUP_FILE)
 
-print("Connection JSON file:", connection_json_file)
-print("Submodule config files (from submodules field):", submodule_files)
-print("Top submodule:", top_submodule)
+def main():
+    connection_json_file, submodule_files, top_submodule = parse_setup_file(SETUP_FILE)
 
-if top_submodule:
-    top_submodule_file = f"submodule_{top_submodule.lower()}_config.json"
-else:
-    top_submodule_file = None
+    print("Connection JSON file:", connection_json_file)
+    print("Submodule config files (from submodules field):", submodule_files)
+    print("Top submodule:", top_submodule)
 
-generate_submodule_config(connection_json_file, top_submodule_file)
+    if top_submodule:
+        top_submodule_file = f"submodule_{top_submodule.lower()}_config.json"
+    else:
+        top_submodule_file = None
 
+    generate_submodule_config(connection_json_file, top_submodule_file)
 
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,94 @@
+import argparse
+import gzip
+import itertools
 import json
 import os
 
+import edge_skew
+import link_registers
+import pipeline
+import reset_tree
+import result_network
+import systolic_array_generator
+
 # Directory Paths
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 SRC_DIR = os.path.join(SCRIPT_DIR, "../src")
 OUT_DIR = os.path.join(SCRIPT_DIR, "../build")
 
-def load_submodule_configs(submodule_files):
+# Buffer size of the generated Verilog file.
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Output styles of the top module: one instance and wire per PE and link, or
+# nested generate loops over the ROWS and COLS parameters.
+TOP_STYLES = ("flat", "generate")
+
+def index_submodule_configs(submodule_configs):
+    """Index submodule configurations by module name (in lower-case), keeping only the ports."""
+    return {config["submodule"].lower(): config["ports"] for config in submodule_configs}
+
+def load_submodule_configs(submodule_files, out_dir=OUT_DIR):
     """Load submodule JSON files into a dictionary keyed by module name (in lower-case)."""
-    submodules = {}
+    submodule_configs = []
     for file in submodule_files:
-        file_path = os.path.join(OUT_DIR, file)
+        file_path = os.path.join(out_dir, file)
         with open(file_path, "r") as json_file:
-            submodule_data = json.load(json_file)
-            submodules[submodule_data["submodule"].lower()] = submodule_data["ports"]
-    return submodules
+            submodule_configs.append(json.load(json_file))
+    return index_submodule_configs(submodule_configs)
 
-def format_signal(direction, width, name):
+def format_width(width, signed=False):
+    """Format the packed range of a signal, widths may be integers or parameter expressions."""
+    signed_str = "signed " if signed else ""
+    if isinstance(width, str):
+        return f"{signed_str}[{width}-1:0] "
+    return f"{signed_str}[{width-1}:0] " if width > 1 else signed_str
+
+def format_signal(direction, width, name, signed=False):
     """Format signal declaration without 'logic', e.g., 'input [3:0] clk,'."""
-    width_str = f"[{width-1}:0] " if width > 1 else ""
-    return f"  {direction} {width_str}{name},"
+    return f"  {direction} {format_width(width, signed)}{name},"
 
-def format_wire(width, name):
+def format_wire(width, name, signed=False):
     """Format wire declaration with width."""
-    width_str = f"[{width-1}:0] " if width > 1 else ""
-    return f"  wire {width_str}{name};"
+    return f"  wire {format_width(width, signed)}{name};"
 
-def generate_top_verilog(connection_config_file, submodule_files, design_name):
+def add_net(nets, signal, port_info):
     """
-    Generate top-level Verilog code based on connection_config.json and submodule configs.
-    - connection_config_file is read from OUT_DIR.
-    - submodule_files is a list of submodule configuration file names (located in OUT_DIR).
-    - design_name is used for naming the generated top-level Verilog file.
+    Record signal in the net table unless it is already there. nets maps net names to
+    the port info of their first driver (shared, not copied), in order of first appearance.
     """
-    # read connection JSON file
-    with open(os.path.join(OUT_DIR, connection_config_file), "r") as json_file:
-        connection_config = json.load(json_file)
+    if signal not in nets:
+        nets[signal] = port_info
 
-    top_module = connection_config["top_module"]
-    instances = connection_config["instances"]
-    top_ports = connection_config["top_ports"]
-
-    # read submodule ports
-    submodule_ports = load_submodule_configs(submodule_files)
+def format_instance(instance_name, instance_data, module_ports):
+    """Format the instantiation of one submodule, ports in submodule declaration order."""
+    module_name = instance_data["module"]
+    connect = instance_data.get("connect", {})
+    output_map = instance_data.get("output_map", {})
 
-    port_definitions = []
-    internal_wires = []
+    port_connections = []
+    for port in module_ports:
+        if port in connect:
+            mapped_signal = connect[port]
+        elif port in output_map:
+            mapping = output_map[port]
+            mapped_signal = mapping["signal"] if isinstance(mapping, dict) else mapping
+        else:
+            mapped_signal = port
+        port_connections.append(f"    .{port}({mapped_signal})")
+    return (f"  // Instance of {module_name}\n"
+            f"  {module_name} {instance_name} (\n"
+            + ",\n".join(port_connections) + "\n  );\n\n")
 
-    # Generate top-level port declarations (directly based on connection_config's top_ports)
-    for port_name, port_info in top_ports.items():
-        port_definitions.append(format_signal(port_info["direction"], port_info["width"], port_name))
+def collect_nets(connection_config, submodule_ports):
+    """
+    Build the net table of the top module and the extra top-level outputs from output_map.
+    Returns (nets, output_definitions), both in order of first appearance.
+    """
+    instances = connection_config["instances"]
+    top_ports = connection_config["top_ports"]
 
-    # Process the connect field of each instance to generate internal wires (only for output ports)
+    nets = {}
+    output_definitions = []
     for instance_name, instance_data in instances.items():
         module_name = instance_data["module"].lower()  # 统一小写匹配
         module_ports = submodule_ports[module_name]
@@ -60,10 +97,9 @@ def generate_top_verilog(connection_config_file, submodule_files, design_name):
         for port, signal in instance_data.get("connect", {}).items():
             if port in module_ports and module_ports[port]["direction"] == "output":
                 # If the signal name appears in top_ports (top-level interfaces), it is considered directly connected externally, and no internal wire is needed.
-                if signal in top_ports:
+                if not signal or signal in top_ports or signal in ("0", "1"):
                     continue
-                if signal not in ["0", "1"] and signal not in [wire.split(" ")[-1].strip(";") for wire in internal_wires]:
-                    internal_wires.append(format_wire(module_ports[port]["width"], signal))
+                add_net(nets, signal, module_ports[port])
 
         # For output_map, map the corresponding output to the top-level interface.
         for port, mapping in instance_data.get("output_map", {}).items():
@@ -74,64 +110,341 @@ def generate_top_verilog(connection_config_file, submodule_files, design_name):
                 else:
                     mapped_signal = mapping
                     mapped_width = module_ports[port]["width"]
-                port_definitions.append(format_signal("output", mapped_width, mapped_signal))
+                output_definitions.append(format_signal("output", mapped_width, mapped_signal))
+    return nets, output_definitions
 
-    # Assemble the top-level module code.
-    verilog_code = f"// Auto-generated top module\nmodule {top_module}(\n"
-    verilog_code += "\n".join(port_definitions).rstrip(",") + "\n);\n\n"
+def generated_modules(reports):
+    """
+    Modules generated with the top, from the reports of the array description (see
+    ArrayNetlist.generated_reports): the registers of a reset tree, the skew FIFOs of
+    the edges, the collectors of a result network and the registers of the links inside
+    a tile. Returns {module name: (port table, Verilog)}.
+    """
+    modules = {}
+    if reports.get("reset_tree"):
+        info = reports["reset_tree"]
+        modules[info["module"]] = (reset_tree.STAGE_PORTS, reset_tree.render_stage_module(info))
+    if reports.get("edge_skew"):
+        modules.update(edge_skew.render_modules(reports["edge_skew"]))
+    if reports.get("result_network"):
+        modules.update(result_network.render_modules(reports["result_network"]))
+    if reports.get("link_registers"):
+        modules.update(link_registers.render_modules(reports["link_registers"]))
+    return modules
+
+def _iter_port_list(port_definitions):
+    """
+    Yield the port declarations and the closing of the port list. Each declaration
+    is held back by one so that the comma of the last one can be dropped.
+    """
+    previous = None
+    for definition in port_definitions:
+        if previous is not None:
+            yield previous + "\n"
+        previous = definition
+    yield (previous.rstrip(",") if previous is not None else "") + "\n);\n\n"
+
+def iter_top_verilog(connection_config, submodule_ports):
+    """
+    Generate the top-level Verilog as a stream of text chunks: the port list, the 
+    wire declarations and one chunk per instance.
+    - connection_config is the systolic array description (see systolic_array_generator.py).
+    - submodule_ports maps lower-case module names to their port tables (see index_submodule_configs).
+
+    The net table is built first (see collect_nets), so only the table and not the 
+    generated text is held in memory. Wires are declared in order of first appearance, 
+    so the output is deterministic. The generated modules (see generated_modules) are
+    emitted after the top module.
+    """
+    top_module = connection_config["top_module"]
+    instances = connection_config["instances"]
+    top_ports = connection_config["top_ports"]
+    modules = generated_modules(connection_config)
+    if modules:
+        submodule_ports = dict(submodule_ports, **{name.lower(): ports for name, (ports, _) in modules.items()})
 
-    if internal_wires:
-        verilog_code += "// Internal nets\n" + "\n".join(internal_wires) + "\n\n"
+    nets, output_definitions = collect_nets(connection_config, submodule_ports)
+
+    # Generate top-level port declarations (directly based on connection_config's top_ports).
+    yield f"// Auto-generated top module\nmodule {top_module}(\n"
+    port_definitions = (format_signal(port_info["direction"], port_info["width"], port_name,
+                                      port_info.get("signed", False))
+                        for port_name, port_info in top_ports.items())
+    yield from _iter_port_list(itertools.chain(port_definitions, output_definitions))
+
+    if nets:
+        yield "// Internal nets\n"
+        first = True
+        for name, net in nets.items():
+            yield ("" if first else "\n") + format_wire(net["width"], name, net.get("signed", False))
+            first = False
+        yield "\n\n"
 
     # Generate the instantiation code for each instance.
     for instance_name, instance_data in instances.items():
-        module_name = instance_data["module"]
-        module_ports = submodule_ports[module_name.lower()]
-        verilog_code += f"  // Instance of {module_name}\n"
-        verilog_code += f"  {module_name} {instance_name} (\n"
-
-        port_connections = []
-        for port, port_info in module_ports.items():
-            if port in instance_data.get("connect", {}):
-                mapped_signal = instance_data["connect"][port]
-            elif port in instance_data.get("output_map", {}):
-                mapping = instance_data["output_map"][port]
-                mapped_signal = mapping["signal"] if isinstance(mapping, dict) else mapping
-            else:
-                mapped_signal = port
-            port_connections.append(f"    .{port}({mapped_signal})")
-        verilog_code += ",\n".join(port_connections) + "\n  );\n\n"
-
-    verilog_code += "endmodule\n"
-
-    # Write the final generated top-level Verilog to OUT_DIR, with the filename DESIGN_NAME.v.
-    output_filename = os.path.join(OUT_DIR, f"{design_name}.v")
-    with open(output_filename, "w") as verilog_file:
-        verilog_file.write(verilog_code)
-
-    print(f"Saved {design_name}.v")
+        module_ports = submodule_ports[instance_data["module"].lower()]
+        yield format_instance(instance_name, instance_data, module_ports)
 
-def parse_setup_file(file_path):
+    yield "endmodule\n"
+    for _, verilog in modules.values():
+        yield "\n" + verilog
+
+def iter_top_verilog_netlist(netlist, kind="top"):
+    """
+    Generate the top-level Verilog straight from a systolic_array_generator.ArrayNetlist,
+    without building the JSON description first. The text is the same as that of
+    iter_top_verilog on netlist.to_json(): wires are declared in order of first
+    appearance of their driving output port, open ports are left unconnected. kind
+    names the module in the header comment ("tile" for the tile module of a tiled array).
+    The generated instances of a reset tree, an edge skew or a result network come first.
+    """
+    port_names = netlist.port_names
+    port_info = netlist.port_info
+    net_name = netlist.net_name
+    modules = generated_modules(netlist.generated_reports())
+    generated = dict(netlist.iter_generated_instances())
+
+    yield f"// Auto-generated {kind} module\nmodule {netlist.top_module}(\n"
+    port_definitions = (format_signal(info["direction"], info["width"], net_name(net), info.get("signed", False))
+                        for net, info in ((net, netlist.net_info(net)) for net in netlist.top_ports))
+    yield from _iter_port_list(port_definitions)
+
+    declared = bytearray(len(netlist.net_kind))
+    outputs = [info["direction"] == "output" for info in port_info]
+    first = True
+    if generated:
+        # The outputs of the generated instances, as collect_nets declares them.
+        generated_nets, _ = collect_nets({"instances": generated,
+                                          "top_ports": {net_name(net) for net in netlist.top_ports}},
+                                         {name.lower(): ports for name, (ports, _) in modules.items()})
+        for name, net in generated_nets.items():
+            yield ("// Internal nets\n" if first else "\n") + format_wire(net["width"], name)
+            first = False
+    for i in range(netlist.rows):
+        for j in range(netlist.cols):
+            for slot, net in netlist.iter_connections(i, j):
+                if outputs[slot] and not declared[net] and not netlist.is_top_port(net):
+                    declared[net] = 1
+                    if first:
+                        yield "// Internal nets\n"
+                    yield ("" if first else "\n") + format_wire(port_info[slot]["width"], net_name(net),
+                                                                port_info[slot].get("signed", False))
+                    first = False
+    if not first:
+        yield "\n\n"
+
+    for instance_name, instance_data in generated.items():
+        yield format_instance(instance_name, instance_data, modules[instance_data["module"]][0])
+    slots = len(port_names)
+    for i in range(netlist.rows):
+        for j in range(netlist.cols):
+            base = (i * netlist.cols + j) * slots
+            connections = netlist.connections[base:base + slots]
+            yield (f"  // Instance of {netlist.module_name}\n"
+                   f"  {netlist.module_name} {netlist.instance_name(i, j)} (\n"
+                   + ",\n".join(f"    .{port}({net_name(net) if net >= 0 else ''})"
+                                 for port, net in zip(port_names, connections))
+                   + "\n  );\n\n")
+
+    yield "endmodule\n"
+    for _, verilog in modules.values():
+        yield "\n" + verilog
+
+def generate_top_verilog(connection_config, submodule_ports):
+    """Generate the top-level Verilog code as a single string (see iter_top_verilog)."""
+    return "".join(iter_top_verilog(connection_config, submodule_ports))
+
+def _element_width(width):
+    """Width of one array element, parameter expressions are parenthesized."""
+    return width if isinstance(width, int) else f"({width})"
+
+def _parenthesize(expression):
+    """Parenthesize a compound index expression."""
+    return expression if expression.isidentifier() or expression.isdigit() else f"({expression})"
+
+def _select(name, index, width):
+    """Select element index of the flattened array name, whose elements are width bits wide."""
+    width = _element_width(width)
+    if width == 1:
+        return f"{name}[{index}]"
+    return f"{name}[{_parenthesize(index)}*{width} +: {width}]"
+
+def _array_width(count, width):
+    """Total width of count elements of the given width, as a Verilog expression."""
+    width = _element_width(width)
+    return count if width == 1 else f"{count}*{width}"
+
+def _grid_index(row, stride, col):
+    """Flattened index row*stride+col of a 2-D array, without the zero terms."""
+    terms = [] if row == "0" else [f"{_parenthesize(row)}*{stride}"]
+    if col != "0" or not terms:
+        terms.append(col)
+    return "+".join(terms)
+
+def _pair_links(kind, port_groups, first, second):
+    """
+    Pair the PE ports of two opposite array sides by their suffix (_dat, _vld, _rdy):
+    returns {link wire name: [first side port, second side port]}, a side may be None.
     """
-    Parse setup.json file to extract:
+    links = {}
+    for side, group in enumerate((first, second)):
+        for port in port_groups[group]:
+            _, suffix = systolic_array_generator.split_port_name(port)
+            name = f"{kind}{suffix}" if suffix else f"{kind}_{port}"
+            links.setdefault(name, [None, None])[side] = port
+    return links
+
+def iter_top_verilog_generate(array_config, pe_config):
+    """
+    Generate a parameterized top-level Verilog as a stream of text chunks: the PE
+    grid is built by nested generate loops over the ROWS and COLS parameters, so the
+    output size does not depend on the array dimensions.
+    - array_config is the high-level configuration (see systolic_array_generator.load_array_config).
+    - pe_config is the PE port table, as in submodule_pe_config.json.
+
+    The PE links are 2-D wire arrays, flattened into packed vectors for Verilog-2001:
+    h_<suffix> holds ROWS x (COLS+1) horizontal links, element i*(COLS+1)+j feeding
+    the left side of PE (i, j); v_<suffix> holds (ROWS+1) x COLS vertical links,
+    element i*COLS+j feeding the top side of PE (i, j). The edge ports of the flat
+    output become buses, e.g. left_in_rsc3_dat is left_in_rsc_dat[3*32 +: 32] and
+    result_out_rsc_dat5 is result_out_rsc_dat[5*32 +: 32]. PE (i, j) is instantiated
+    as row[i].col[j].PE instead of PE_i_j.
+    """
+    top_module = array_config["top_module"]
+    rows, cols = array_config["dimensions"][0], array_config["dimensions"][1]
+    pe_ports = pe_config["ports"]
+    module_name = next((instance["module"] for instance in array_config.get("instances", [])
+                        if "array" in instance), pe_config["submodule"])
+    port_groups = systolic_array_generator.group_pe_ports(pe_ports)
+
+    horizontal = _pair_links("h", port_groups, "left", "right")
+    vertical = _pair_links("v", port_groups, "up", "down")
+    result_ports = [port for port in port_groups["result"] if port.endswith(("_dat", "_vld", "_rdy"))]
+
+    def bus_name(port):
+        prefix, suffix = systolic_array_generator.split_port_name(port)
+        return f"{prefix}_rsc{suffix}"
+
+    def link_width(ports):
+        port_info = pe_ports[ports[0] or ports[1]]
+        return port_info["width"], port_info.get("signed", False)
+
+    # Port list: the control ports of the YAML, then one bus per edge and result port.
+    port_definitions = [format_signal(port["direction"], port["width"], port["name"])
+                        for port in array_config.get("top_ports", [])]
+    for group, count in (("left", "ROWS"), ("right", "ROWS"), ("up", "COLS"), ("down", "COLS")):
+        for port in port_groups[group]:
+            port_info = pe_ports[port]
+            port_definitions.append(format_signal(port_info["direction"], _array_width(count, port_info["width"]),
+                                                  bus_name(port), port_info.get("signed", False)))
+    for port in result_ports:
+        port_info = pe_ports[port]
+        port_definitions.append(format_signal(port_info["direction"], _array_width("ROWS*COLS", port_info["width"]),
+                                              port, port_info.get("signed", False)))
+
+    yield (f"// Auto-generated top module (generate style)\n"
+           f"module {top_module} #(\n"
+           f"  parameter ROWS = {rows},\n"
+           f"  parameter COLS = {cols}\n"
+           ") (\n")
+    yield "\n".join(port_definitions).rstrip(",") + "\n);\n\n"
+
+    if horizontal:
+        yield "  // Horizontal links: element i*(COLS+1)+j feeds the left side of PE (i, j)\n"
+        for name, ports in horizontal.items():
+            width, signed = link_width(ports)
+            yield format_wire(_array_width("ROWS*(COLS+1)", width), name, signed) + "\n"
+    if vertical:
+        yield "  // Vertical links: element i*COLS+j feeds the top side of PE (i, j)\n"
+        for name, ports in vertical.items():
+            width, signed = link_width(ports)
+            yield format_wire(_array_width("(ROWS+1)*COLS", width), name, signed) + "\n"
+
+    def edge_assign(port, link, index, bus_index, width):
+        # PE inputs are driven from the top-level bus, PE outputs drive it.
+        wire_select = _select(link, index, width)
+        bus_select = _select(bus_name(port), bus_index, pe_ports[port]["width"])
+        if pe_ports[port]["direction"] == "input":
+            return f"      assign {wire_select} = {bus_select};\n"
+        return f"      assign {bus_select} = {wire_select};\n"
+
+    yield "\n  genvar i, j;\n  generate\n"
+    if horizontal:
+        yield "    // Left and right edges\n    for (i = 0; i < ROWS; i = i + 1) begin : row_edge\n"
+        for name, (left, right) in horizontal.items():
+            width, _ = link_width((left, right))
+            if left:
+                yield edge_assign(left, name, _grid_index("i", "(COLS+1)", "0"), "i", width)
+            if right:
+                yield edge_assign(right, name, _grid_index("i", "(COLS+1)", "COLS"), "i", width)
+        yield "    end\n"
+    if vertical:
+        yield "    // Top and bottom edges\n    for (j = 0; j < COLS; j = j + 1) begin : col_edge\n"
+        for name, (up, down) in vertical.items():
+            width, _ = link_width((up, down))
+            if up:
+                yield edge_assign(up, name, _grid_index("0", "COLS", "j"), "j", width)
+            if down:
+                yield edge_assign(down, name, _grid_index("ROWS", "COLS", "j"), "j", width)
+        yield "    end\n"
+
+    # Connection of every PE port, in declaration order.
+    connections = {}
+    for links, stride, sides in ((horizontal, "(COLS+1)", (("i", "j"), ("i", "j+1"))),
+                                 (vertical, "COLS", (("i", "j"), ("i+1", "j")))):
+        for name, ports in links.items():
+            width, _ = link_width(ports)
+            for port, (row, col) in zip(ports, sides):
+                if port:
+                    connections[port] = _select(name, _grid_index(row, stride, col), width)
+    for port in result_ports:
+        connections[port] = _select(port, "i*COLS+j", pe_ports[port]["width"])
+
+    yield ("    // PE grid\n"
+           "    for (i = 0; i < ROWS; i = i + 1) begin : row\n"
+           "      for (j = 0; j < COLS; j = j + 1) begin : col\n"
+           f"        {module_name} PE (\n")
+    yield ",\n".join(f"          .{port}({connections.get(port, port)})" for port in pe_ports)
+    yield "\n        );\n      end\n    end\n  endgenerate\n\nendmodule\n"
+
+def top_verilog_path(design_name, out_dir=OUT_DIR, compress=False):
+    """Path of the generated top-level Verilog, DESIGN_NAME.v or DESIGN_NAME.v.gz."""
+    return os.path.join(out_dir, f"{design_name}.v" + (".gz" if compress else ""))
+
+def write_top_verilog(verilog_code, design_name, out_dir=OUT_DIR, compress=False):
+    """
+    Write the final generated top-level Verilog to out_dir, with the filename DESIGN_NAME.v.
+    verilog_code is either a string or an iterable of chunks (see iter_top_verilog),
+    which is streamed to a buffered file handle. compress writes DESIGN_NAME.v.gz instead.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    output_filename = top_verilog_path(design_name, out_dir, compress)
+    if isinstance(verilog_code, str):
+        verilog_code = [verilog_code]
+    if compress:
+        verilog_file = gzip.open(output_filename, "wt", compresslevel=6)
+    else:
+        verilog_file = open(output_filename, "w", buffering=WRITE_BUFFER_SIZE)
+    with verilog_file:
+        verilog_file.writelines(verilog_code)
+
+    print(f"Saved {os.path.basename(output_filename)}")
+    return output_filename
+
+def parse_setup(setup_data):
+    """
+    Extract from the loaded setup.json:
       - DESIGN_NAME: used for naming the generated top-level Verilog file.
       - connection: the connection JSON file.
       - top_submodule: the name of the top submodule to use.
     """
-    if not os.path.exists(file_path):
-        print(f"File {file_path} does not exist.")
-        return None, None, []
-
-    with open(file_path, "r") as f:
-        setup_data = json.load(f)
-    
     # Retrieve DESIGN_NAME from config_mk.
     design_name = setup_data.get("config_mk", {}).get("DESIGN_NAME")
     
     # Retrieve configuration from generate_files.
     generate_files = setup_data.get("generate_files", [])
     if not generate_files:
-        print(f"Error: 'generate_files' section missing or empty in {file_path}")
+        print("Error: 'generate_files' section missing or empty in setup.json")
         return design_name, None, []
 
     # Use the first configuration item.
@@ -149,15 +462,119 @@ def parse_setup_file(file_path):
     
     return design_name, connection_file, submodules
 
-# Main flow
+def parse_top_style(setup_data):
+    """Output style of the top module, generate_files "top_style": "flat" (default) or "generate"."""
+    generate_files = setup_data.get("generate_files") or [{}]
+    style = generate_files[0].get("top_style", "flat")
+    if style not in TOP_STYLES:
+        print(f"Error: unknown top_style '{style}' in setup.json, expected one of {', '.join(TOP_STYLES)}")
+        return None
+    return style
+
+def _tile_shape(tile_size):
+    """(R, C) of a tile_size setting K or [R, C] of positive integers, None when it is not one."""
+    sizes = tile_size if isinstance(tile_size, list) and len(tile_size) == 2 else [tile_size, tile_size]
+    if any(isinstance(size, bool) or not isinstance(size, int) or size < 1 for size in sizes):
+        return None
+    return tuple(sizes)
+
+def parse_tile_size(setup_data):
+    """
+    Tile shape (R, C), generate_files "tile_size": K or [R, C]. Unless it is (1, 1) the
+    PEs are grouped into RxC tile modules hardened as the macro block, and the top
+    instantiates the tiles (see systolic_array_generator.build_tiled_netlists).
+    Default 1, no tiles.
+    """
+    generate_files = setup_data.get("generate_files") or [{}]
+    tile_size = generate_files[0].get("tile_size", 1)
+    shape = _tile_shape(tile_size)
+    if shape is None:
+        print(f"Error: tile_size must be a positive integer or a [rows, cols] pair in setup.json, found {tile_size!r}")
+    return shape
+
+def parse_tile_module(setup_data):
+    """Module name of the tiles, <top_submodule>_tile, or None when the array is not tiled."""
+    generate_files = setup_data.get("generate_files") or [{}]
+    if _tile_shape(generate_files[0].get("tile_size", 1)) in (None, (1, 1)):
+        return None
+    return systolic_array_generator.tile_module_name(generate_files[0].get("top_submodule", "pe").lower())
+
+def parse_always_ready(setup_data):
+    """
+    PE input channels that accept data on every cycle, generate_files "always_ready",
+    e.g. ["left_in", "up_in"] when the HLS schedule of the PE reads them with an
+    initiation interval of 1 and never stalls. Their links inside a tile are registered
+    data and vld wires without the rdy handshake, once the RTL of the PE proves it (see
+    link_registers.py). Default none, None on an error.
+    """
+    generate_files = setup_data.get("generate_files") or [{}]
+    always_ready = generate_files[0].get("always_ready", [])
+    if not isinstance(always_ready, list) or not all(isinstance(channel, str) for channel in always_ready):
+        print(f"Error: always_ready must be a list of PE input channels in setup.json, found {always_ready!r}")
+        return None
+    if always_ready and parse_tile_module(setup_data) is None:
+        print("Error: always_ready only applies to the links inside a tile, it needs a tile_size")
+        return None
+    return always_ready
+
+def uses_generated_modules(setup_data):
+    """Whether the top has generated instances: a reset tree, an edge skew or a result network."""
+    return (reset_tree.is_enabled(setup_data) or edge_skew.is_enabled(setup_data)
+            or result_network.is_enabled(setup_data))
+
+def attach_generated(netlist, setup_data, tile_size=(1, 1)):
+    """
+    Attach the edge skew, the result network and the reset tree of setup.json to an
+    ArrayNetlist, the top of tiles of shape tile_size (see parse_tile_size) unless it
+    is (1, 1). Returns False on an error.
+    """
+    skew_options = edge_skew.parse_edge_skew(setup_data)
+    network_options = result_network.parse_result_network(setup_data)
+    tree_options = reset_tree.parse_reset_tree(setup_data)
+    if skew_options is None or network_options is None or tree_options is None:
+        return False
+    if skew_options and edge_skew.attach(netlist, skew_options, tile_size) is None:
+        return False
+    if network_options and result_network.attach(netlist, network_options, tile_size) is None:
+        return False
+    if tree_options and reset_tree.attach(netlist, tree_options, tile_size) is None:
+        return False
+    return True
+
+def parse_setup_file(file_path):
+    """Load setup.json from file_path and extract DESIGN_NAME, the connection file and the submodule files."""
+    if not os.path.exists(file_path):
+        print(f"File {file_path} does not exist.")
+        return None, None, []
+
+    with open(file_path, "r") as f:
+        setup_data = json.load(f)
+
+    return parse_setup(setup_data)
+
 SETUP_FILE = os.path.join(SCRIPT_DIR, "../setup.json")
-design_name, connection_config_file, submodule_files = parse_setup_file(SETUP_FILE)
 
-print("DESIGN_NAME:", design_name)
-print("Connection JSON file:", connection_config_file)
-print("Submodule config files:", submodule_files)
+def main(argv=None):
+    """Generate the top-level Verilog from setup.json, a thin wrapper around pipeline.build_top."""
+    parser = argparse.ArgumentParser(description="Generate the top-level Verilog module.")
+    parser.add_argument("--gzip", action="store_true", help="write a gzip-compressed DESIGN_NAME.v.gz")
+    parser.add_argument("--style", choices=TOP_STYLES,
+                        help="output style of the top module, overrides top_style in setup.json")
+    args = parser.parse_args(argv)
+
+    design_name, connection_config_file, submodule_files = parse_setup_file(SETUP_FILE)
+
+    print("DESIGN_NAME:", design_name)
+    print("Connection JSON file:", connection_config_file)
+    print("Submodule config files:", submodule_files)
+
+    if not (design_name and connection_config_file and submodule_files):
+        print("Error: Failed to extract necessary information from setup.json")
+        return
+
+    # As in the in-process flow: the array comes from the JSON of systolic_array_generator.py,
+    # a tiled array is rebuilt from the YAML by pipeline.build_array.
+    pipeline.build_top(pipeline.load_setup(SETUP_FILE), {}, SRC_DIR, OUT_DIR, compress=args.gzip, style=args.style)
 
-if design_name and connection_config_file and submodule_files:
-    generate_top_verilog(connection_config_file, submodule_files, design_name)
-else:
-    print("Error: Failed to extract necessary information from setup.json")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
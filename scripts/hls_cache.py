@@ -0,0 +1,174 @@
+"""
+Content-addressed cache for HLS artifacts.
+
+Each entry is stored under <cache_dir>/<key>/, where the key is a SHA-256 over
+the HLS sources (pe.cpp, pe.tcl, makefile) and the HLS tool version string.
+An entry holds the generated concat_rtl.v and an entry.json describing it.
+The modification time of entry.json records the last use and drives the LRU
+eviction policy.
+"""
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+# Files in the hls directory whose contents determine the generated RTL.
+HLS_INPUT_FILES = ["pe.cpp", "pe.tcl", "makefile"]
+
+# Artifacts restored from the cache, as (path relative to the hls directory, cached name).
+HLS_ARTIFACTS = [("Catapult/pe.v1/concat_rtl.v", "concat_rtl.v")]
+
+ENTRY_FILE = "entry.json"
+LOCK_FILE = ".hls.lock"
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "hls-openroad-flow", "hls")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+def get_tool_version(version_cmd="module load catapult && catapult -version"):
+    """
+    Return the HLS tool version string used as part of the cache key and of the
+    fingerprint of the hls stage. The tool is slow to start, run-flow.py queries it
+    once per run. The HLS_TOOL_VERSION environment variable overrides the tool query.
+    """
+    version = os.environ.get("HLS_TOOL_VERSION")
+    if version:
+        return version.strip()
+    try:
+        process = subprocess.run(version_cmd, shell=True, stderr=subprocess.STDOUT,
+                                 stdout=subprocess.PIPE, universal_newlines=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return "unknown"
+    if process.returncode != 0:
+        return "unknown"
+    # Keep only the first non-empty line, banners below it may contain dates.
+    for line in process.stdout.splitlines():
+        if line.strip():
+            return line.strip()
+    return "unknown"
+
+def compute_cache_key(hls_dir, tool_version):
+    """Hash the HLS input files and the tool version into a cache key."""
+    digest = hashlib.sha256()
+    digest.update(f"tool={tool_version}\n".encode())
+    for name in HLS_INPUT_FILES:
+        path = os.path.join(hls_dir, name)
+        digest.update(f"file={name}\n".encode())
+        if not os.path.exists(path):
+            digest.update(b"<missing>\n")
+            continue
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+@contextlib.contextmanager
+def hls_lock(hls_dir):
+    """Hold an exclusive lock on hls_dir, serializing the HLS runs of concurrent flows."""
+    with open(os.path.join(hls_dir, LOCK_FILE), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+def copy_atomic(src, dst):
+    """Copy src to dst through a temporary file, so that readers never see a partial dst."""
+    tmp_path = f"{dst}.tmp{os.getpid()}"
+    try:
+        shutil.copy(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def lookup(cache_dir, key, dest_dir):
+    """
+    Restore the cached artifacts for key into dest_dir.
+    Returns True on a hit. The entry is marked as most recently used.
+    """
+    entry_dir = os.path.join(cache_dir, key)
+    entry_file = os.path.join(entry_dir, ENTRY_FILE)
+    if not os.path.exists(entry_file):
+        return False
+    for _, cached_name in HLS_ARTIFACTS:
+        if not os.path.exists(os.path.join(entry_dir, cached_name)):
+            # Incomplete entry, drop it so that the next store rebuilds it.
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return False
+
+    os.makedirs(dest_dir, exist_ok=True)
+    for _, cached_name in HLS_ARTIFACTS:
+        copy_atomic(os.path.join(entry_dir, cached_name), os.path.join(dest_dir, cached_name))
+    os.utime(entry_file, None)
+    return True
+
+def store(cache_dir, key, hls_dir, tool_version, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Copy the artifacts produced in hls_dir into the cache under key, then evict
+    least recently used entries until the cache fits in max_bytes.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    entry_dir = os.path.join(cache_dir, key)
+
+    # Build the entry in a temporary directory and rename it into place, so that
+    # concurrent flows never observe a partially written entry.
+    tmp_dir = tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=cache_dir)
+    try:
+        size = 0
+        for rel_path, cached_name in HLS_ARTIFACTS:
+            src = os.path.join(hls_dir, rel_path)
+            shutil.copy(src, os.path.join(tmp_dir, cached_name))
+            size += os.path.getsize(src)
+        with open(os.path.join(tmp_dir, ENTRY_FILE), "w") as f:
+            json.dump({
+                "key": key,
+                "tool_version": tool_version,
+                "inputs": HLS_INPUT_FILES,
+                "size": size,
+                "created": time.time()
+            }, f, indent=2)
+        if os.path.exists(entry_dir):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    evict(cache_dir, max_bytes, keep=key)
+
+def _entry_size(entry_dir):
+    total = 0
+    for name in os.listdir(entry_dir):
+        path = os.path.join(entry_dir, name)
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+    return total
+
+def evict(cache_dir, max_bytes, keep=None):
+    """Remove least recently used entries until the cache size is at most max_bytes."""
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, name)
+        entry_file = os.path.join(entry_dir, ENTRY_FILE)
+        if name.startswith(".") or not os.path.exists(entry_file):
+            continue
+        entries.append((os.path.getmtime(entry_file), name, _entry_size(entry_dir)))
+
+    total = sum(size for _, _, size in entries)
+    removed = []
+    for _, name, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        total -= size
+        removed.append(name)
+    return removed
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Registered links between the PEs of a tile.
+
+Every link of the standard grid is a handshake: data and vld from the producer,
+rdy back from the consumer. Inside a tile (see systolic_array_generator.build_tiled_netlists)
+the generate_files entry
+
+    "always_ready": ["left_in", "up_in"]
+
+lists the PE input channels whose links drop the handshake. A link is only safe
+without it when the consumer never stalls the channel, so the PE schedule must
+prove it: the RTL of the PE has to tie the rdy output of the channel to 1, through
+continuous assignments and the outputs of its submodules (see
+parse_verilog.constant_outputs), as an HLS schedule with an initiation interval of
+1 that never stalls does. A channel whose rdy depends on any logic, e.g. the
+back-pressure of a blocking ac_channel write, is refused with an error, since the
+data of a link without a handshake would be lost whenever the consumer stalls.
+
+Each link of a proven channel inside a tile becomes a registered wire: the data
+and vld of the producer go through a register of the tile into the consumer, the
+rdy input of the producer is tied to 1'b1 and the rdy output of the consumer is
+left open. The register cuts the path between the two PEs and adds one cycle to
+the link. The register modules are generated after the tile module, one per
+channel, and the links at the edges of the tile keep their handshake.
+"""
+import systolic_array_generator
+
+SUFFIXES = ("_dat", "_vld", "_rdy")
+
+# Groups of the consumers of a channel: the group facing it and the step from producer to consumer.
+CHANNEL_GROUPS = (("left", "right", 0, 1), ("up", "down", 1, 0))
+
+def register_module_name(tile_module, channel):
+    """Module of the registers of the links of channel, e.g. pe_tile_left_in_link."""
+    return f"{tile_module}_{channel}_link"
+
+def register_ports(width):
+    """Port table of the register of a link of width data bits."""
+    return {
+        "clk": {"direction": "input", "width": 1},
+        "rst": {"direction": "input", "width": 1},
+        "in_dat": {"direction": "input", "width": width},
+        "in_vld": {"direction": "input", "width": 1},
+        "out_dat": {"direction": "output", "width": width},
+        "out_vld": {"direction": "output", "width": 1}
+    }
+
+def render_register(name, channel, width):
+    """Verilog of the register of a link of channel, width data bits."""
+    return (f"// Auto-generated register of the {channel} links inside a tile\n"
+            f"module {name}(\n"
+            "  input clk,\n"
+            "  input rst,\n"
+            f"  input {f'[{width - 1}:0] ' if width > 1 else ''}in_dat,\n"
+            "  input in_vld,\n"
+            f"  output reg {f'[{width - 1}:0] ' if width > 1 else ''}out_dat,\n"
+            "  output reg out_vld\n"
+            ");\n\n"
+            "  always @(posedge clk) begin\n"
+            "    if (rst)\n"
+            "      out_vld <= 1'b0;\n"
+            "    else\n"
+            "      out_vld <= in_vld;\n"
+            "    if (in_vld)\n"
+            "      out_dat <= in_dat;\n"
+            "  end\n\n"
+            "endmodule\n")
+
+def render_modules(info):
+    """
+    Port tables and Verilog of the register modules, info being the report of the
+    registered links (see LinkRegisters.report): {module name: (port table, Verilog)}.
+    """
+    return {channel["module"]: (register_ports(channel["width"]),
+                                render_register(channel["module"], name, channel["width"]))
+            for name, channel in info["channels"].items()}
+
+class LinkRegisters:
+    """
+    Registered links of one tile netlist. channels maps every registered PE input
+    channel to (module, width), links holds (channel, in_dat, in_vld, out_dat,
+    out_vld, clk, rst) nets of every link. The outputs of the registers are named
+    after the link, e.g. data_PE_0_0_to_PE_0_1_q (see net_name).
+    """
+
+    def __init__(self, channels):
+        self.channels = channels
+        self.links = []
+
+    def net_name(self, stem, i, j, i2, j2):
+        return f"{stem}_PE_{i}_{j}_to_PE_{i2}_{j2}_q"
+
+    def report(self):
+        """Summary of the registered links, by channel."""
+        counts = {}
+        for link in self.links:
+            counts[link[0]] = counts.get(link[0], 0) + 1
+        return {"channels": {channel: {"module": module, "width": width, "links": counts.get(channel, 0)}
+                             for channel, (module, width) in self.channels.items()}}
+
+    def iter_instances(self, netlist):
+        """(instance name, instance data) of the register of every link, in the form of the array JSON."""
+        net_name = netlist.net_name
+        args = netlist.net_args
+        for channel, in_dat, in_vld, out_dat, out_vld, clk, rst in self.links:
+            _, _, _, i2, j2 = args[out_dat * systolic_array_generator.NET_ARGS:
+                                   (out_dat + 1) * systolic_array_generator.NET_ARGS]
+            connect = {"clk": net_name(clk), "rst": net_name(rst), "in_dat": net_name(in_dat),
+                       "in_vld": net_name(in_vld), "out_dat": net_name(out_dat), "out_vld": net_name(out_vld)}
+            yield f"{channel.upper()}_REG_{i2}_{j2}", {"module": self.channels[channel][0], "connect": connect}
+
+def attach(netlist, channels, constant_outputs):
+    """
+    Register the links between the PEs of the tile netlist into the input channels
+    (e.g. ["left_in", "up_in"]). constant_outputs are the outputs the PE ties to a
+    constant (see parse_verilog.constant_outputs), the rdy output of every channel
+    must be one of them at 1. Returns the LinkRegisters, also netlist.link_registers,
+    or None on an error.
+    """
+    port_groups = systolic_array_generator.group_pe_ports(netlist.port_names)
+    slot_of = netlist.slot_of
+    if "clk" not in slot_of or "rst" not in slot_of:
+        print("Error: always_ready needs the clk and rst ports of the PE for the link registers")
+        return None
+
+    plans = []
+    registers = LinkRegisters({})
+    for channel in channels:
+        for group, facing, di, dj in CHANNEL_GROUPS:
+            ports = {f"{channel}_rsc{suffix}" for suffix in SUFFIXES}
+            if ports <= set(port_groups[group]):
+                break
+        else:
+            print(f"Error: always_ready channel {channel} is not a left_in or up_in channel "
+                  f"with _dat, _vld and _rdy ports")
+            return None
+        producers = {systolic_array_generator.split_port_name(name)[1]: name for name in port_groups[facing]}
+        if sorted(producers) != sorted(SUFFIXES) or len(port_groups[facing]) != len(SUFFIXES):
+            print(f"Error: always_ready channel {channel} does not face a single _dat/_vld/_rdy {facing} channel")
+            return None
+        if constant_outputs.get(f"{channel}_rsc_rdy") != 1:
+            print(f"Error: always_ready channel {channel}: the PE schedule does not prove that it accepts "
+                  f"{channel} on every cycle, {channel}_rsc_rdy is driven by logic and not tied to 1 in "
+                  f"the RTL of the PE. The consumer may stall, e.g. on a blocking ac_channel write, and a "
+                  f"link without its handshake would lose data: keep the handshake by leaving {channel} "
+                  f"out of always_ready, or schedule the channel with an initiation interval of 1 and no stall")
+            return None
+        width = netlist.port_info[slot_of[f"{channel}_rsc_dat"]]["width"]
+        registers.channels[channel] = (register_module_name(netlist.top_module, channel), width)
+        plans.append((channel, [slot_of[f"{channel}_rsc{suffix}"] for suffix in SUFFIXES],
+                      [slot_of[producers[suffix]] for suffix in SUFFIXES], di, dj))
+
+    slots = len(netlist.port_names)
+    connections = netlist.connections
+    const = None
+    for channel, consumer, producer, di, dj in plans:
+        for i in range(di, netlist.rows):
+            for j in range(dj, netlist.cols):
+                base = (i * netlist.cols + j) * slots
+                nets = [connections[base + slot] for slot in consumer]
+                if any(net < 0 or netlist.net_kind[net] != systolic_array_generator.NET_LINK for net in nets):
+                    continue
+                if const is None:
+                    const = netlist.add_net(systolic_array_generator.NET_CONST, 1)
+                # The consumer reads the register outputs, named after the links they register.
+                outputs = []
+                for net in nets[:2]:
+                    args = netlist.net_args[net * systolic_array_generator.NET_ARGS:
+                                            (net + 1) * systolic_array_generator.NET_ARGS]
+                    outputs.append(netlist.add_net(systolic_array_generator.NET_REGISTERED, *args))
+                connections[base + consumer[0]], connections[base + consumer[1]] = outputs
+                connections[base + consumer[2]] = -1
+                netlist.connect(i - di, j - dj, producer[2], const)
+                registers.links.append((channel, nets[0], nets[1], outputs[0], outputs[1],
+                                        connections[base + slot_of["clk"]], connections[base + slot_of["rst"]]))
+    netlist.link_registers = registers
+    return registers
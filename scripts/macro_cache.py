@@ -0,0 +1,140 @@
+"""
+Content-addressed cache of hardened macros (the PE or tile blocks, see
+setup_configmk.block_names).
+
+ORFS hardens every block of BLOCKS into results/<platform>/<nickname>_<block>/base/
+before the top-level flow uses its abstract. An entry stores the artifacts the
+top level needs (ARTIFACTS: LEF, LIB, GDS and ODB) under <cache_dir>/<key>/, the
+key being a SHA-256 over everything the hardened block depends on:
+- the platform, the block name and the ORFS image;
+- the RTL of the design except the top module, which the block does not contain
+  (the tile module of a tiled array is in a file of its own, so it is hashed);
+- block.mk and constraint.sdc, with the design nickname taken out of the paths.
+
+Designs and sweep points with the same PE therefore share one entry whatever
+their nickname, array size or top-level floorplan. Entries are laid out like the
+HLS cache (entry.json, LRU eviction by its modification time, see hls_cache.py).
+A restored block directory records its key in STAMP_FILE, so that artifacts of a
+different PE are not reused.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import hls_cache
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "hls-openroad-flow", "macros")
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024 * 1024
+
+# Artifacts of a hardened block, {block} is the block name. The optional ones
+# are stored when ORFS wrote them.
+ARTIFACTS = ["{block}.lef", "{block}.lib", "6_final.gds", "6_final.odb"]
+OPTIONAL_ARTIFACTS = ["6_final.v", "6_final.sdc"]
+
+STAMP_FILE = ".macro_cache_key"
+
+def block_results_dir(flow_dir, platform, nickname, block, variant="base"):
+    return os.path.join(flow_dir, "results", platform, f"{nickname}_{block}", variant)
+
+def compute_key(platform, nickname, block, rtl_files, block_mk, constraint_sdc, image):
+    """Hash the inputs of a hardened block, see the module docstring."""
+    digest = hashlib.sha256()
+    digest.update(f"platform={platform}\nblock={block}\nimage={image}\n".encode())
+    for path in sorted(rtl_files, key=os.path.basename):
+        digest.update(f"file={os.path.basename(path)}\n".encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    for name, text in (("block.mk", block_mk), ("constraint.sdc", constraint_sdc)):
+        digest.update(f"{name}=\n{text.replace(nickname, '<nickname>')}\n".encode())
+    return digest.hexdigest()
+
+def artifact_names(block, dest_dir=None):
+    """Required artifacts, plus the optional ones present in dest_dir."""
+    names = [name.format(block=block) for name in ARTIFACTS]
+    if dest_dir:
+        names += [name for name in OPTIONAL_ARTIFACTS if os.path.exists(os.path.join(dest_dir, name))]
+    return names
+
+def current_key(block_dir):
+    """Key of the artifacts restored into or stored from block_dir, or None."""
+    try:
+        with open(os.path.join(block_dir, STAMP_FILE), "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _write_stamp(block_dir, key):
+    with open(os.path.join(block_dir, STAMP_FILE), "w") as f:
+        f.write(key + "\n")
+
+def lookup(cache_dir, key, block_dir):
+    """
+    Restore the cached artifacts for key into block_dir. Returns True on a hit. The
+    restored files are newer than the installed design files, so make treats the
+    block as up to date. The entry is marked as most recently used.
+    """
+    entry_dir = os.path.join(cache_dir, key)
+    entry_file = os.path.join(entry_dir, hls_cache.ENTRY_FILE)
+    try:
+        with open(entry_file, "r") as f:
+            names = json.load(f)["artifacts"]
+    except (OSError, ValueError, KeyError):
+        return False
+    if not all(os.path.exists(os.path.join(entry_dir, name)) for name in names):
+        # Incomplete entry, drop it so that the next store rebuilds it.
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return False
+
+    os.makedirs(block_dir, exist_ok=True)
+    for name in names:
+        hls_cache.copy_atomic(os.path.join(entry_dir, name), os.path.join(block_dir, name))
+    _write_stamp(block_dir, key)
+    os.utime(entry_file, None)
+    return True
+
+def store(cache_dir, key, block, block_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Copy the artifacts of a block hardened by ORFS in block_dir into the cache under
+    key, then evict least recently used entries. Returns False when the block is
+    incomplete.
+    """
+    names = artifact_names(block, block_dir)
+    if not all(os.path.exists(os.path.join(block_dir, name)) for name in names):
+        return False
+    _write_stamp(block_dir, key)
+    if os.path.exists(os.path.join(cache_dir, key, hls_cache.ENTRY_FILE)):
+        return True
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Build the entry in a temporary directory and rename it into place, so that
+    # concurrent flows never observe a partially written entry.
+    tmp_dir = tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=cache_dir)
+    try:
+        size = 0
+        for name in names:
+            shutil.copy(os.path.join(block_dir, name), os.path.join(tmp_dir, name))
+            size += os.path.getsize(os.path.join(block_dir, name))
+        with open(os.path.join(tmp_dir, hls_cache.ENTRY_FILE), "w") as f:
+            json.dump({
+                "key": key,
+                "block": block,
+                "artifacts": names,
+                "size": size,
+                "created": time.time()
+            }, f, indent=2)
+        entry_dir = os.path.join(cache_dir, key)
+        if os.path.exists(entry_dir):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    hls_cache.evict(cache_dir, max_bytes, keep=key)
+    return True
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Regular grid placement of the hardened PE (or tile) macros.
+
+With macro_config "placement": "grid", the macros are not placed by the ORFS
+macro placer but on a grid following the array: instance (i, j) sits in row i
+from the top and column j from the left, so that every PE is next to the ones it
+is linked to. Between the macros, and between the macros and the core boundary,
+runs a routing channel of macro_config "channel_spacing" [x, y] um. The core is
+the grid plus the channels, the die the core plus CORE_MARGIN of config_mk on
+every side. Origins and pitches are rounded up to the placement site of the
+platform (PLACEMENT_GRID).
+
+The macro size is macro_config "macro_size" [w, h] um if given, else the SIZE of
+the hardened block's LEF (see lef_macro_size). run-flow.py writes into the ORFS
+design directory:
+
+    macro_placement.tcl - place_macro commands, MACRO_PLACEMENT_TCL of config.mk
+    macro_placement.mk  - DIE_AREA and CORE_AREA, included by config.mk
+
+Usage: python3 macro_placement.py ROWSxCOLS --macro-size W H [--channel X Y] [--margin M] [--platform P]
+"""
+import argparse
+import math
+import re
+import sys
+
+import generate_top
+
+PLACEMENT_FILE = "macro_placement.tcl"
+AREA_FILE = "macro_placement.mk"
+DEFAULT_CHANNEL = [5, 5]
+DEFAULT_CORE_MARGIN = 2
+
+# Placement site width and row height in um of the platforms.
+PLACEMENT_GRID = {
+    "asap7": (0.054, 0.27),
+    "nangate45": (0.19, 1.4),
+    "sky130hd": (0.46, 2.72),
+    "sky130hs": (0.48, 3.33),
+    "gf180": (0.56, 3.92),
+    "ihp-sg13g2": (0.48, 3.78)
+}
+# Manufacturing grid used for platforms not listed above.
+DEFAULT_GRID = (0.001, 0.001)
+
+_SIZE = re.compile(r"^\s*SIZE\s+([\d.]+)\s+BY\s+([\d.]+)\s*;", re.MULTILINE)
+
+def is_enabled(setup):
+    """Whether the macros are placed on the grid, macro_config "placement": "grid"."""
+    macro_cfg = setup.get("macro_config", {})
+    return macro_cfg.get("enable", False) and macro_cfg.get("placement") == "grid"
+
+def lef_macro_size(lef_path, macro=None):
+    """(width, height) in um of the macro (the first one if None) of a LEF file, or None."""
+    try:
+        with open(lef_path, "r", errors="replace") as f:
+            text = f.read()
+    except OSError:
+        return None
+    if macro is not None:
+        start = re.search(rf"^\s*MACRO\s+{re.escape(macro)}\s*$", text, re.MULTILINE)
+        if not start:
+            return None
+        text = text[start.end():]
+    match = _SIZE.search(text)
+    return (float(match.group(1)), float(match.group(2))) if match else None
+
+def _snap(value, pitch):
+    """Round value up to a multiple of pitch."""
+    return round(math.ceil(round(value / pitch, 6)) * pitch, 6)
+
+def _format(value):
+    return f"{value:.3f}".rstrip("0").rstrip(".")
+
+def grid_placement(rows, cols, macro_size, channel=DEFAULT_CHANNEL, margin=DEFAULT_CORE_MARGIN,
+                   grid=DEFAULT_GRID):
+    """
+    Place rows x cols macros of macro_size (w, h) on a grid. Returns a dict with
+    die_area and core_area ([x0, y0, x1, y1]) and locations, the lower-left corner
+    of macro (i, j) by (i, j), row 0 at the top.
+    """
+    width, height = macro_size
+    channel_x, channel_y = channel
+    site_x, site_y = grid
+    origin_x, origin_y = _snap(margin + channel_x, site_x), _snap(margin + channel_y, site_y)
+    pitch_x, pitch_y = _snap(width + channel_x, site_x), _snap(height + channel_y, site_y)
+    core_x1 = _snap(origin_x + (cols - 1) * pitch_x + width + channel_x, site_x)
+    core_y1 = _snap(origin_y + (rows - 1) * pitch_y + height + channel_y, site_y)
+    locations = {}
+    for i in range(rows):
+        for j in range(cols):
+            locations[i, j] = (round(origin_x + j * pitch_x, 6), round(origin_y + (rows - 1 - i) * pitch_y, 6))
+    return {
+        "die_area": [0, 0, round(core_x1 + margin, 6), round(core_y1 + margin, 6)],
+        "core_area": [margin, margin, core_x1, core_y1],
+        "locations": locations
+    }
+
+def render_placement_tcl(placement, instance_name, block, macro_size):
+    """place_macro commands for every macro, instance_name(i, j) naming the instances."""
+    locations = placement["locations"]
+    rows = max(i for i, _ in locations) + 1
+    cols = max(j for _, j in locations) + 1
+    lines = [f"# Auto-generated grid placement of {rows}x{cols} {block} macros "
+             f"({_format(macro_size[0])} x {_format(macro_size[1])} um)"]
+    for (i, j), (x, y) in sorted(locations.items()):
+        lines.append(f"place_macro -macro_name {{{instance_name(i, j)}}} "
+                     f"-location {{{_format(x)} {_format(y)}}} -orientation R0")
+    return "\n".join(lines) + "\n"
+
+def render_area_mk(placement):
+    """DIE_AREA and CORE_AREA of the placement, as included by config.mk."""
+    return (f"export DIE_AREA  = {' '.join(map(_format, placement['die_area']))}\n"
+            f"export CORE_AREA = {' '.join(map(_format, placement['core_area']))}\n")
+
+def instance_grid(setup, dimensions):
+    """
+    (rows, cols, instance_name) of the macro instances of the top module for the
+    array dimensions: the PEs, or the tiles of a tiled array. None on a setup error.
+    """
+    rows, cols = dimensions[0], dimensions[1]
+    tile_size = generate_top.parse_tile_size(setup)
+    style = generate_top.parse_top_style(setup)
+    if tile_size is None or style is None:
+        return None
+    if tile_size != (1, 1):
+        return rows // tile_size[0], cols // tile_size[1], lambda i, j: f"TILE_{i}_{j}"
+    if style == "generate":
+        return rows, cols, lambda i, j: f"row[{i}].col[{j}].PE"
+    return rows, cols, lambda i, j: f"PE_{i}_{j}"
+
+def setup_geometry(setup):
+    """(channel [x, y], CORE_MARGIN, placement grid) of a setup."""
+    macro_cfg = setup.get("macro_config", {})
+    channel = macro_cfg.get("channel_spacing", DEFAULT_CHANNEL)
+    if not isinstance(channel, list):
+        channel = [channel, channel]
+    margin = setup.get("config_mk", {}).get("CORE_MARGIN", DEFAULT_CORE_MARGIN)
+    platform = setup.get("config_mk", {}).get("PLATFORM")
+    return channel, margin, PLACEMENT_GRID.get(platform, DEFAULT_GRID)
+
+def parse_size(text):
+    rows, cols = text.lower().split("x")
+    return int(rows), int(cols)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the grid placement of the array macros.")
+    parser.add_argument("size", type=parse_size, help="macro grid as ROWSxCOLS")
+    parser.add_argument("--macro-size", type=float, nargs=2, required=True, metavar=("W", "H"),
+                        help="macro width and height in um")
+    parser.add_argument("--channel", type=float, nargs=2, default=DEFAULT_CHANNEL, metavar=("X", "Y"),
+                        help="routing channel between the macros in um")
+    parser.add_argument("--margin", type=float, default=DEFAULT_CORE_MARGIN, help="CORE_MARGIN in um")
+    parser.add_argument("--platform", default=None, help="platform whose placement grid to snap to")
+    parser.add_argument("--block", default="pe", help="name of the macro")
+    args = parser.parse_args(argv)
+
+    rows, cols = args.size
+    if rows < 1 or cols < 1:
+        print("Error: the grid needs at least one row and one column")
+        sys.exit(1)
+    placement = grid_placement(rows, cols, args.macro_size, args.channel, args.margin,
+                               PLACEMENT_GRID.get(args.platform, DEFAULT_GRID))
+    sys.stdout.write(render_area_mk(placement))
+    sys.stdout.write(render_placement_tcl(placement, lambda i, j: f"PE_{i}_{j}", args.block, args.macro_size))
+
+if __name__ == "__main__":
+    main()
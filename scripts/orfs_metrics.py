@@ -0,0 +1,180 @@
+"""
+Reading the metrics ORFS leaves behind for a design.
+
+ORFS writes per design and flow variant (base by default):
+- logs/<platform>/<nickname>/<variant>/<step>.log, and next to most of them a
+  <step>.json of metrics named <stage>__<metric>, e.g. floorplan__timing__setup__ws;
+- reports/<platform>/<nickname>/<variant>/, among them synth_stat.txt, the Yosys
+  statistics of the synthesized netlist, the <step>.rpt timing and area reports
+  of the later stages and metadata.json (written by make metadata);
+- results/<platform>/<nickname>/<variant>/, the netlists and layouts of each stage.
+
+Every step log ends with the elapsed time and peak memory of the step. collect()
+gathers all of it into one record, stored by results_store.py.
+"""
+import glob
+import json
+import os
+import re
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FLOW_DIR = os.path.normpath(os.path.join(SCRIPT_DIR, "../../flow"))
+
+# Last "Chip area" line of the Yosys statistics is the one of the top module.
+_CHIP_AREA = re.compile(r"Chip area(?: for (?:top )?module '[^']*')?:\s*([-+\d.eE]+)")
+# Printed by /usr/bin/time at the end of each step log.
+_ELAPSED = re.compile(r"Elapsed time: ([\d:.]+)\[h:\]min:sec\. CPU time: user ([\d.]+) sys ([\d.]+)"
+                      r".*Peak memory: (\d+)KB")
+# report_tns / report_wns / report_worst_slack sections of the stage reports. Current
+# OpenSTA names the path group, e.g. "tns max -1.25", older versions print "tns -1.25".
+_SLACK = re.compile(r"^(tns|wns|worst slack)(?:\s+(min|max))?\s+(-?[\d.]+(?:[eE][-+]?\d+)?)\s*$", re.MULTILINE)
+_DESIGN_AREA = re.compile(r"Design area ([\d.]+) u\^2 ([\d.]+)% utilization")
+
+# Stages whose metrics describe the whole design, latest first.
+LATEST_STAGES = ["finish", "detailedroute", "globalroute", "cts", "placeopt", "floorplan"]
+
+def design_dirs(platform, nickname, variant="base", flow_dir=FLOW_DIR):
+    """The logs, reports and results directories of a design."""
+    return {kind: os.path.join(flow_dir, kind, platform, nickname, variant)
+            for kind in ("logs", "reports", "results")}
+
+def load_step_metrics(logs_dir, step):
+    """Metrics of one ORFS step (e.g. 2_1_floorplan) as a dict, empty if the step wrote none."""
+    try:
+        with open(os.path.join(logs_dir, f"{step}.json"), "r") as f:
+            metrics = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return metrics if isinstance(metrics, dict) else {}
+
+def load_metrics(logs_dir):
+    """Metrics of all steps of a design merged into one dict, later steps last."""
+    metrics = {}
+    for path in sorted(glob.glob(os.path.join(logs_dir, "*.json"))):
+        metrics.update(load_step_metrics(logs_dir, os.path.basename(path)[:-len(".json")]))
+    return metrics
+
+def synth_area(reports_dir):
+    """Chip area of the synthesized top module from synth_stat.txt, or None."""
+    try:
+        with open(os.path.join(reports_dir, "synth_stat.txt"), "r", errors="replace") as f:
+            matches = _CHIP_AREA.findall(f.read())
+    except OSError:
+        return None
+    return float(matches[-1]) if matches else None
+
+def stage_metric(metrics, stage, names):
+    """First metric <stage>__<name> present for names in order of preference, or None."""
+    for name in names:
+        value = metrics.get(f"{stage}__{name}")
+        if isinstance(value, (int, float)):
+            return value
+    return None
+
+def parse_elapsed(text):
+    """Seconds of an [h:]min:sec duration."""
+    seconds = 0.0
+    for part in text.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def step_runtimes(logs_dir):
+    """
+    Per-step runtime of the step logs, as a list of dicts with step, elapsed_s,
+    cpu_s and peak_memory_kb in step order. Steps without a summary line (still
+    running or failed) have None values.
+    """
+    steps = []
+    for path in sorted(glob.glob(os.path.join(logs_dir, "*.log"))):
+        step = {"step": os.path.basename(path)[:-len(".log")], "elapsed_s": None, "cpu_s": None,
+                "peak_memory_kb": None}
+        with open(path, "r", errors="replace") as f:
+            for line in f:
+                match = _ELAPSED.search(line)
+                if match:
+                    step["elapsed_s"] = parse_elapsed(match.group(1))
+                    step["cpu_s"] = float(match.group(2)) + float(match.group(3))
+                    step["peak_memory_kb"] = int(match.group(4))
+        steps.append(step)
+    return steps
+
+def report_values(reports_dir):
+    """
+    wns, tns, worst_slack, design_area and utilization from the last stage
+    report that has them, as (value, report file name). The slacks are those of
+    setup (max), hold (min) values are left out.
+    """
+    values = {}
+    for path in sorted(glob.glob(os.path.join(reports_dir, "*.rpt"))):
+        with open(path, "r", errors="replace") as f:
+            text = f.read()
+        report = os.path.basename(path)
+        for name, kind, value in _SLACK.findall(text):
+            if kind != "min":
+                values[name.replace(" ", "_")] = (float(value), report)
+        match = None
+        for match in _DESIGN_AREA.finditer(text):
+            pass
+        if match:
+            values["design_area"] = (float(match.group(1)), report)
+            values["utilization"] = (float(match.group(2)), report)
+    return values
+
+def load_metadata(reports_dir):
+    """The metadata.json of make metadata, or an empty dict."""
+    try:
+        with open(os.path.join(reports_dir, "metadata.json"), "r") as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return metadata if isinstance(metadata, dict) else {}
+
+def collect(platform, nickname, variant="base", flow_dir=FLOW_DIR):
+    """
+    Everything known about a design run: the merged metrics of the steps and
+    metadata.json (metrics), the step runtimes (steps) and the headline values
+    wns, tns, design_area, utilization, synth_area, die_area, elapsed_s and
+    peak_memory_kb (None when not found).
+    """
+    dirs = design_dirs(platform, nickname, variant, flow_dir)
+    metrics = load_metrics(dirs["logs"])
+    metrics.update(load_metadata(dirs["reports"]))
+    steps = step_runtimes(dirs["logs"])
+    reports = report_values(dirs["reports"])
+
+    def metric(names):
+        # The latest stage reporting one of the names.
+        for stage in LATEST_STAGES:
+            value = stage_metric(metrics, stage, names)
+            if value is not None:
+                return value
+        return None
+
+    def reported(names, metric_names):
+        # The reports first, the metrics when no report has the value.
+        for name in names:
+            if name in reports:
+                return reports[name][0]
+        return metric(metric_names)
+
+    elapsed = [step["elapsed_s"] for step in steps if step["elapsed_s"] is not None]
+    peaks = [step["peak_memory_kb"] for step in steps if step["peak_memory_kb"] is not None]
+    return {
+        "platform": platform,
+        "nickname": nickname,
+        "variant": variant,
+        "collected_at": time.time(),
+        "final": os.path.exists(os.path.join(dirs["results"], "6_final.gds")),
+        "wns": reported(["wns", "worst_slack"], ["timing__setup__ws"]),
+        "tns": reported(["tns"], ["timing__setup__tns"]),
+        "design_area": reported(["design_area"], ["design__instance__area"]),
+        "utilization": reported(["utilization"], ["design__instance__utilization"]),
+        "synth_area": synth_area(dirs["reports"]),
+        "die_area": metric(["design__die__area"]),
+        "elapsed_s": sum(elapsed) if elapsed else None,
+        "peak_memory_kb": max(peaks) if peaks else None,
+        "report": max((report for _, report in reports.values()), default=None),
+        "metrics": metrics,
+        "steps": steps
+    }
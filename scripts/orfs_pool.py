@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Executors for the ORFS make runs.
+
+- DockerPool keeps warm containers of the ORFS image and sends the make commands
+  to them with `docker exec`, headless and without a TTY, so that batch runs do
+  not pay for a container start and the env.sh setup per design. The containers
+  are named after the mounted flow directory (<prefix>-<hash>-<index>), so every
+  flow directory has its own pool. A container is taken from the pool by locking
+  its lock file, health-checked, and recreated if it is gone or not responding.
+- LocalExecutor runs the same commands on the host, against an ORFS checkout
+  (or a stand-in with an env.sh and a flow/Makefile), so the flow can be tested
+  without Docker.
+
+Both provide acquire(), a context manager yielding a slot (None on failure),
+and command(slot, make_cmd), the shell command running make_cmd in the flow
+directory. The commands are executed by the caller (see run-flow.py).
+
+Usage: python3 orfs_pool.py [--flow-dir DIR] [--size N] status|start|check|stop
+"""
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FLOW_DIR = os.path.normpath(os.path.join(SCRIPT_DIR, "../../flow"))
+ORFS_IMAGE = "openroad/flow-ubuntu22.04-builder:bb283b"
+# ORFS checkout inside the image.
+ORFS_ROOT = "/OpenROAD-flow-scripts"
+CONTAINER_PREFIX = "hls-orfs"
+POOL_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+                        "hls-openroad-flow", "orfs-pool")
+# Environment of env.sh, exported once when a container is started.
+ENV_FILE = "/tmp/orfs_env.sh"
+# Host variables forwarded into the container, NUM_CORES bounds the ORFS threads.
+PASSED_ENV = ("NUM_CORES",)
+HEALTH_TIMEOUT = 30
+START_TIMEOUT = 300
+ACQUIRE_POLL = 5
+
+# ORFS flow stages in order, with the checkpoint each leaves in the results directory.
+# Every stage is a make target, do-<stage> runs it without checking the earlier stages.
+ORFS_STAGES = [
+    ("synth", "1_synth.v"),
+    ("floorplan", "2_floorplan.odb"),
+    ("place", "3_place.odb"),
+    ("cts", "4_cts.odb"),
+    ("route", "5_route.odb"),
+    ("finish", "6_final.gds")
+]
+ORFS_STAGE_NAMES = [name for name, _ in ORFS_STAGES]
+
+def make_command(platform, nickname, target=None):
+    """The ORFS make command of a design, optionally for a single target."""
+    make_cmd = f"make DESIGN_CONFIG=designs/{platform}/{nickname}/config.mk"
+    return f"{make_cmd} {target}" if target else make_cmd
+
+def env_options():
+    """docker run/exec options forwarding the PASSED_ENV variables set on the host."""
+    return "".join(f"-e {name} " for name in PASSED_ENV if name in os.environ)
+
+def _docker(args, timeout=HEALTH_TIMEOUT):
+    """Run a docker CLI command, returns the CompletedProcess or None if docker is missing or timed out."""
+    try:
+        return subprocess.run(["docker"] + args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              universal_newlines=True, timeout=timeout)
+    except FileNotFoundError:
+        print("Error: docker not found")
+    except subprocess.TimeoutExpired:
+        print(f"Error: docker {' '.join(args[:2])} timed out after {timeout} s")
+    return None
+
+class DockerPool:
+    """Pool of warm ORFS containers sharing one mounted flow directory."""
+
+    def __init__(self, flow_dir=FLOW_DIR, size=1, image=ORFS_IMAGE, prefix=CONTAINER_PREFIX, pool_dir=POOL_DIR):
+        self.flow_dir = os.path.abspath(flow_dir)
+        self.size = max(1, size)
+        self.image = image
+        self.pool_dir = pool_dir
+        flow_hash = hashlib.sha256(f"{self.flow_dir}\n{image}".encode()).hexdigest()[:8]
+        self.names = [f"{prefix}-{flow_hash}-{index}" for index in range(self.size)]
+
+    def is_running(self, name):
+        result = _docker(["inspect", "--format", "{{.State.Running}}", name])
+        return result is not None and result.returncode == 0 and result.stdout.strip() == "true"
+
+    def is_healthy(self, name):
+        """The container is running, responds to exec and has the ORFS environment exported."""
+        if not self.is_running(name):
+            return False
+        result = _docker(["exec", name, "test", "-s", ENV_FILE])
+        return result is not None and result.returncode == 0
+
+    def start(self, name):
+        """(Re)create a container and export the env.sh environment in it, returns True on success."""
+        _docker(["rm", "-f", name])
+        print(f"Starting ORFS container {name} ({self.image})")
+        result = _docker(["run", "-d", "--name", name, "--net=host",
+                          "-v", f"{self.flow_dir}:{ORFS_ROOT}/flow", self.image, "sleep", "infinity"],
+                         timeout=START_TIMEOUT)
+        if result is None or result.returncode != 0:
+            print(f"Error: failed to start container {name}: {result.stdout.strip() if result else ''}")
+            return False
+        setup = f"cd {ORFS_ROOT} && source ./env.sh > /dev/null && export -p > {ENV_FILE}"
+        result = _docker(["exec", name, "/bin/bash", "-c", setup], timeout=START_TIMEOUT)
+        if result is None or result.returncode != 0:
+            print(f"Error: failed to set up the ORFS environment in {name}: {result.stdout.strip() if result else ''}")
+            return False
+        return True
+
+    def ensure(self, name):
+        """Health-check a container, recreating it if needed. Returns True when it is usable."""
+        if self.is_healthy(name):
+            return True
+        if self.is_running(name):
+            print(f"Warning: ORFS container {name} is not responding, recreating it")
+        return self.start(name)
+
+    @contextlib.contextmanager
+    def acquire(self, timeout=None):
+        """
+        Take an idle container of the pool for the duration of the block, waiting
+        while all of them are busy. Yields the container name, or None if no
+        container could be started or timeout (in seconds) expired.
+        """
+        os.makedirs(self.pool_dir, exist_ok=True)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            for name in self.names:
+                lock_file = open(os.path.join(self.pool_dir, f"{name}.lock"), "w")
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    lock_file.close()
+                    continue
+                try:
+                    yield name if self.ensure(name) else None
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
+                return
+            if deadline is not None and time.monotonic() >= deadline:
+                print(f"Error: all {self.size} ORFS containers stayed busy for {timeout} s")
+                yield None
+                return
+            time.sleep(ACQUIRE_POLL)
+
+    def command(self, name, make_cmd):
+        """Shell command running make_cmd in the flow directory of container name, without a TTY."""
+        script = f"source {ENV_FILE} && cd {ORFS_ROOT}/flow && {make_cmd}"
+        return f"docker exec {env_options()}{shlex.quote(name)} /bin/bash -c {shlex.quote(script)}"
+
+    def status(self):
+        """(name, state) of every container of the pool."""
+        states = []
+        for name in self.names:
+            if self.is_healthy(name):
+                states.append((name, "healthy"))
+            elif self.is_running(name):
+                states.append((name, "unhealthy"))
+            else:
+                states.append((name, "stopped"))
+        return states
+
+    def stop(self):
+        for name in self.names:
+            _docker(["rm", "-f", name])
+
+class LocalExecutor:
+    """Runs the ORFS commands on the host against orfs_root (containing env.sh and flow/)."""
+
+    def __init__(self, orfs_root):
+        self.orfs_root = os.path.abspath(orfs_root)
+
+    @contextlib.contextmanager
+    def acquire(self, timeout=None):
+        if not os.path.isdir(os.path.join(self.orfs_root, "flow")):
+            print(f"Error: {self.orfs_root} has no flow directory")
+            yield None
+            return
+        yield self.orfs_root
+
+    def command(self, orfs_root, make_cmd):
+        """The command run in the containers, with the host ORFS checkout as the root."""
+        script = f"cd {shlex.quote(orfs_root)} && source ./env.sh && cd flow && {make_cmd}"
+        return f"/bin/bash -c {shlex.quote(script)}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the pool of warm ORFS containers.")
+    parser.add_argument("--flow-dir", default=FLOW_DIR, help="flow directory mounted in the containers")
+    parser.add_argument("--size", type=int, default=1, help="number of containers in the pool")
+    parser.add_argument("--image", default=ORFS_IMAGE, help="ORFS Docker image")
+    parser.add_argument("command", choices=["status", "start", "check", "stop"],
+                        help="show the containers, start them, health-check and repair them, or remove them")
+    args = parser.parse_args(argv)
+
+    pool = DockerPool(args.flow_dir, size=args.size, image=args.image)
+    if args.command == "stop":
+        pool.stop()
+        return
+    if args.command in ("start", "check"):
+        failed = [name for name in pool.names if not pool.ensure(name)]
+        if failed:
+            print(f"Error: failed to start {', '.join(failed)}")
+            sys.exit(1)
+    for name, state in pool.status():
+        print(f"{name}  {state}")
+
+if __name__ == "__main__":
+    main()
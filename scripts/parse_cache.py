@@ -0,0 +1,87 @@
+"""
+Persistent cache of parsed module -> port tables, one entry per Verilog file.
+
+The index lives in the build directory (.parse_cache.json). An entry is keyed by
+the file path and validated in two steps:
+
+1. size and modification time match the recorded ones: the entry is used after
+   a single stat call;
+2. otherwise the content hash is compared: on a match only the recorded stat is
+   refreshed (e.g. after a touch or a copy), else the file is re-parsed.
+"""
+import hashlib
+import json
+import os
+
+import verilog_ports
+
+INDEX_FILE = ".parse_cache.json"
+
+# Bump when the parser output changes, so that stale entries are discarded.
+PARSER_VERSION = 3
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_index(cache_dir):
+    path = os.path.join(cache_dir, INDEX_FILE)
+    try:
+        with open(path, "r") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if index.get("parser_version") != PARSER_VERSION:
+        return {}
+    return index.get("files", {})
+
+def save_index(cache_dir, files):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, INDEX_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"parser_version": PARSER_VERSION, "files": files}, f)
+    os.replace(tmp_path, path)
+
+def parse_files(file_paths, cache_dir, verify=False, parse=verilog_ports.extract_ports_from_file):
+    """
+    Return {file_path: {module_name: ports}} for the given Verilog files, parsing
+    only the files that changed since they were cached. With verify, every file
+    is re-parsed and the cache refreshed. Missing files raise FileNotFoundError.
+    """
+    files = load_index(cache_dir)
+    results = {}
+    dirty = False
+    for file_path in file_paths:
+        key = os.path.abspath(file_path)
+        st = os.stat(key)
+        entry = files.get(key)
+
+        if not verify and entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            results[file_path] = entry["modules"]
+            continue
+
+        digest = _hash_file(key)
+        if not verify and entry and entry["sha256"] == digest:
+            entry["size"] = st.st_size
+            entry["mtime_ns"] = st.st_mtime_ns
+            results[file_path] = entry["modules"]
+            dirty = True
+            continue
+
+        modules = parse(key)
+        files[key] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": digest,
+            "modules": modules
+        }
+        results[file_path] = modules
+        dirty = True
+
+    if dirty:
+        save_index(cache_dir, files)
+    return results
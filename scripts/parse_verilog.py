@@ -1,103 +1,58 @@
-import re
+import argparse
 import json
 import os
 
-SRC_DIR = "../src"
-OUT_DIR = "../build"
-SETUP_FILE = "../setup.json"
+import parse_cache
+import verilog_ports
+
+# Directory Paths
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(SCRIPT_DIR, "../src")
+OUT_DIR = os.path.join(SCRIPT_DIR, "../build")
+SETUP_FILE = os.path.join(SCRIPT_DIR, "../setup.json")
 
 def parse_verilog(file_path):
     """
         Parse a Verilog file to extract the port information of each module.
-        To avoid interference from the contents of other modules, use regular 
-        expressions to capture the section from `module` to the corresponding `endmodule`.
+        The file is streamed through a tokenizer (see verilog_ports.py) that skips 
+        comments and strings and stops scanning a module once its port declarations end.
 
+        Returns {module_name: {port_name: {"direction", "type", "width"}}}. Widths are 
+        integers, or expression strings when they depend on unresolved parameters, 
+        and signed ports carry "signed": true.
     """
-    modules = {}
+    return verilog_ports.extract_ports_from_file(file_path)
 
-    with open(file_path, "r") as f:
-        verilog_code = f.read()
-
-    # Modified module regex: capture the module name, the header (port list), and the module body (up to `endmodule`).
-    module_pattern = re.compile(r"module\s+(\w+)\s*\((.*?)\);\s*(.*?)endmodule", re.DOTALL)
-    # Capture port declarations: direction + optional type (`logic` | `wire` | `reg`) + optional bit width + port name.
-    port_pattern = re.compile(r"(input|output)\s*(?:(logic|wire|reg)\s*)?(\[\d+:\d+\])?\s*(\w+)")
-    # Must start with `input` or `output` in internal declarations.
-    internal_port_pattern = re.compile(r"(input|output)\s*(?:(logic|wire|reg)\s*)?(\[\d+:\d+\])?\s*(\w+)\s*;", re.MULTILINE)
-    # Standalone `reg` declarations (without `input`/`output`) are used to update the port type.
-    reg_pattern = re.compile(r"reg\s*(\[\d+:\d+\])?\s*(\w+)\s*;")
-
-    for match in module_pattern.finditer(verilog_code):
-        module_name = match.group(1)
-        header = match.group(2)
-        body = match.group(3)
-        module_ports = {}
-
-        # First attempt to parse the ports in the header (which usually only contains port names).
-        # If the header does not contain direction or other information, it may not match anything here.
-        for port_match in port_pattern.finditer(header):
-            direction = port_match.group(1)
-            type_token = port_match.group(2)
-            width = port_match.group(3)
-            port_name = port_match.group(4)
-            port_type = "reg" if type_token and type_token.strip() == "reg" else "wire"
-            module_ports[port_name] = {
-                "direction": direction,
-                "type": port_type,
-                "width": int(width[1:-1].split(":")[0]) + 1 if width else 1
-            }
-
-        # Parse port declarations in the module body.
-        for port_match in internal_port_pattern.finditer(body):
-            direction = port_match.group(1)
-            type_token = port_match.group(2)
-            width = port_match.group(3)
-            port_name = port_match.group(4)
-            port_type = "reg" if type_token and type_token.strip() == "reg" else "wire"
-            # If already present, update the type to reg when applicable.
-            if port_name in module_ports:
-                if type_token and type_token.strip() == "reg":
-                    module_ports[port_name]["type"] = "reg"
-            else:
-                module_ports[port_name] = {
-                    "direction": direction,
-                    "type": port_type,
-                    "width": int(width[1:-1].split(":")[0]) + 1 if width else 1
-                }
-        # For declarations that start with reg alone, use reg_pattern to update the type of existing ports to reg.
-        for reg_match in reg_pattern.finditer(body):
-            width = reg_match.group(1)
-            port_name = reg_match.group(2)
-            if port_name in module_ports:
-                module_ports[port_name]["type"] = "reg"
-
-        modules[module_name] = module_ports
-
-    return modules
+def constant_outputs(file_paths, module):
+    """
+    Output ports of module tied to a constant in the RTL of file_paths, followed down
+    its hierarchy (see verilog_ports.constant_outputs): {port: value}. Unlike the
+    port tables these are not cached, the files are tokenized as a whole.
+    """
+    drivers = {}
+    ports = {}
+    for file_path in file_paths:
+        with open(file_path, "r", errors="replace") as f:
+            drivers.update(verilog_ports.extract_drivers(f))
+        ports.update(parse_verilog(file_path))
+    return verilog_ports.constant_outputs(drivers, ports, module)
 
 ################################################################################
 # The following section is used to parse setup.json and generate the top-level 
 # submodule configuration (named submodule_<top_submodule>_config.json).
 ################################################################################
 
-def parse_setup_file(file_path):
+def parse_setup(setup_data):
     """
-    Parse the setup.json file to extract the following information:
+    Extract the following information from the loaded setup.json:
 
     -top_submodule: the name of the top-level submodule that forms the final top module
     -submodules: the list of Verilog files to be processed
     """
-    if not os.path.exists(file_path):
-        print(f"File {file_path} does not exist.")
-        return None, []
-
-    with open(file_path, "r") as f:
-        setup_data = json.load(f)
-    
     # Retrieve the configuration from generate_files.
     generate_files = setup_data.get("generate_files", [])
     if not generate_files:
-        print(f"Error: 'generate_files' section missing or empty in {file_path}")
+        print("Error: 'generate_files' section missing or empty in setup.json")
         return None, []
 
     # Use the first configuration item (can be adjusted as needed).
@@ -110,45 +65,108 @@ def parse_setup_file(file_path):
     
     return top_submodule, [verilog_file]
 
-def generate_submodule_configs(verilog_files, top_submodule):
-    parsed_modules = {}
+def parse_setup_file(file_path):
+    """Load setup.json from file_path and extract the top-level submodule and the Verilog files."""
+    if not os.path.exists(file_path):
+        print(f"File {file_path} does not exist.")
+        return None, []
+
+    with open(file_path, "r") as f:
+        setup_data = json.load(f)
+
+    return parse_setup(setup_data)
+
+def generate_submodule_configs(verilog_files, top_submodule, src_dir=SRC_DIR, cache_dir=None, verify=False,
+                               constants=False):
+    """
+    Parse the Verilog files and return the port configuration of top_submodule
+    as {"submodule": ..., "ports": {...}}, or None if it cannot be found or the
+    width of one of its ports depends on a parameter without a value or an undefined
+    macro: the top instantiates it with its default parameters and declares no
+    parameters or macros itself.
+    With constants, "constant_outputs" holds the outputs tied to a constant (see
+    constant_outputs), which prove the always_ready channels of a tile.
+
+    With cache_dir, parsed port tables are kept in a per-file cache there (see 
+    parse_cache.py) and only changed files are re-parsed. verify forces a full re-parse.
+    """
+    file_paths = []
     for v_file in verilog_files:
-        try:
-            parsed_modules.update(parse_verilog(os.path.join(SRC_DIR, v_file)))
-        except FileNotFoundError:
-            print(f"Warning: Verilog file {v_file} not found in {SRC_DIR}")
+        file_path = os.path.join(src_dir, v_file)
+        if not os.path.exists(file_path):
+            print(f"Warning: Verilog file {v_file} not found in {src_dir}")
             continue
+        file_paths.append(file_path)
+
+    parsed_modules = {}
+    if cache_dir:
+        for modules in parse_cache.parse_files(file_paths, cache_dir, verify=verify).values():
+            parsed_modules.update(modules)
+    else:
+        for file_path in file_paths:
+            parsed_modules.update(parse_verilog(file_path))
     
     if not top_submodule:
         print("Error: top_submodule not specified in setup.json")
-        return
+        return None
 
     if top_submodule not in parsed_modules:
         print(f"Error: Top-level submodule '{top_submodule}' not found in parsed Verilog files.")
-        return
+        return None
 
     ports = parsed_modules[top_submodule]
+    for name, port in ports.items():
+        if not isinstance(port["width"], int):
+            print(f"Error: the width of port {name} of '{top_submodule}' is {port['width']}, "
+                  f"which depends on a parameter without a default value or an undefined macro")
+            return None
     module_config = {
         "submodule": top_submodule,
         "ports": ports
     }
-
-    # Generate the standard configuration file.
-    filename = os.path.join(OUT_DIR, f"submodule_{top_submodule}_config.json")
+    if constants:
+        module_config["constant_outputs"] = constant_outputs(file_paths, top_submodule)
+    return module_config
+
+def submodule_config_path(top_submodule, out_dir=OUT_DIR):
+    """Path of the standard configuration file, submodule_<top_submodule>_config.json."""
+    return os.path.join(out_dir, f"submodule_{top_submodule.lower()}_config.json")
+
+def write_submodule_config(module_config, out_dir=OUT_DIR):
+    """Save the submodule configuration as submodule_<top_submodule>_config.json."""
+    os.makedirs(out_dir, exist_ok=True)
+    filename = submodule_config_path(module_config["submodule"], out_dir)
     with open(filename, "w") as json_file:
         json.dump(module_config, json_file, indent=2)
     print(f"Saved {filename}")
+    return filename
 
-# Main flow: parse setup.json, output the top-level submodule and the list of files to process, 
-# then generate the configuration file.
-# Ensure that OUT_DIR exists.
-os.makedirs(OUT_DIR, exist_ok=True)
+def main(argv=None):
+    """
+    Main flow: parse setup.json, output the top-level submodule and the list of files to process, 
+    then generate the configuration file.
+    """
+    parser = argparse.ArgumentParser(description="Extract the top-level submodule ports from the RTL.")
+    parser.add_argument("--verify", action="store_true",
+                        help="re-parse every Verilog file instead of trusting the parse cache")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the parse cache")
+    args = parser.parse_args(argv)
+
+    top_submodule, verilog_files = parse_setup_file(SETUP_FILE)
+    print("Top-level submodule:", top_submodule)
+    print("Verilog files to process:", verilog_files)
+
+    if not (top_submodule and verilog_files):
+        print("Error: Failed to extract necessary information from setup.json")
+        return
 
-top_submodule, verilog_files = parse_setup_file(SETUP_FILE)
-print("Top-level submodule:", top_submodule)
-print("Verilog files to process:", verilog_files)
+    with open(SETUP_FILE, "r") as f:
+        always_ready = (json.load(f).get("generate_files") or [{}])[0].get("always_ready")
+    module_config = generate_submodule_configs(verilog_files, top_submodule,
+                                               cache_dir=None if args.no_cache else OUT_DIR,
+                                               verify=args.verify, constants=bool(always_ready))
+    if module_config:
+        write_submodule_config(module_config)
 
-if top_submodule and verilog_files:
-    generate_submodule_configs(verilog_files, top_submodule)
-else:
-    print("Error: Failed to extract necessary information from setup.json")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+In-process front-end of the flow.
+
+setup.json is loaded once, and the generated data passes between the steps as
+in-memory objects:
+
+    setup.json -> config.mk / constraint.sdc / generate_files / block.mk
+    src/<submodules>.v -> PE port table -> systolic array netlist -> <DESIGN_NAME>.v
+
+The individual scripts (setup_configmk.py, parse_verilog.py,
+systolic_array_generator.py, generate_top.py) remain usable as thin CLI wrappers.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import setup_configmk
+import parse_verilog
+import systolic_array_generator
+import generate_top
+import edge_skew
+import reset_tree
+import result_network
+
+# Directory Paths
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(SCRIPT_DIR, "../src")
+BUILD_DIR = os.path.join(SCRIPT_DIR, "../build")
+SETUP_FILE = os.path.join(SCRIPT_DIR, "../setup.json")
+
+def load_setup(setup_file=SETUP_FILE):
+    """Load setup.json."""
+    with open(setup_file, "r") as f:
+        return json.load(f)
+
+def setup_sha256(setup):
+    """Hash of the setup contents, identifying the runs of one configuration."""
+    return hashlib.sha256(json.dumps(setup, sort_keys=True).encode()).hexdigest()
+
+def frontend_files(setup, src_dir=SRC_DIR, build_dir=BUILD_DIR):
+    """
+    Paths of the front-end inputs and outputs:
+
+    -rtl - Verilog files parsed for the submodule ports
+    -array_yaml - High-level systolic array configuration, the generate_files "array_yaml"
+                  entry relative to src_dir (default systolic_array.yaml)
+    -pe_config - PE port table, submodule_<top_submodule>_config.json
+    -array_json - Systolic array description, <connection>.json
+    -top_verilog - Generated top-level module, <DESIGN_NAME>.v
+    -tile_verilog - Generated tile module of a tiled array, <tile module>.v (None when not tiled)
+    -reset_report - Shape and latency of the reset tree, reset_tree.json (None without a tree)
+    -skew_report - Lanes and FIFO depths of the edge skew, edge_skew.json (None without skew)
+    -result_report - Interfaces and readout of the result network, result_network.json (None without one)
+    """
+    top_submodule, verilog_files = parse_verilog.parse_setup(setup)
+    design_name, connection_file, _ = generate_top.parse_setup(setup)
+    generate_cfg = (setup.get("generate_files") or [{}])[0]
+    tile_module = generate_top.parse_tile_module(setup)
+    return {
+        "rtl": [os.path.join(src_dir, v_file) for v_file in verilog_files],
+        "array_yaml": os.path.join(src_dir, generate_cfg.get("array_yaml", "systolic_array.yaml")),
+        "pe_config": parse_verilog.submodule_config_path(top_submodule or "", build_dir),
+        "array_json": os.path.join(build_dir, connection_file or "systolic_array_standard.json"),
+        "top_verilog": os.path.join(build_dir, f"{design_name}.v"),
+        "tile_verilog": os.path.join(build_dir, f"{tile_module}.v") if tile_module else None,
+        "reset_report": os.path.join(build_dir, reset_tree.REPORT_FILE) if reset_tree.is_enabled(setup) else None,
+        "skew_report": os.path.join(build_dir, edge_skew.REPORT_FILE) if edge_skew.is_enabled(setup) else None,
+        "result_report": (os.path.join(build_dir, result_network.REPORT_FILE)
+                          if result_network.is_enabled(setup) else None)
+    }
+
+def _load_json(memo, key, path):
+    """Return the in-memory result of an earlier step, or load it from disk if that step was skipped."""
+    if memo.get(key) is None:
+        with open(path, "r") as f:
+            memo[key] = json.load(f)
+    return memo[key]
+
+def write_setup_outputs(setup, outputs, build_dir=BUILD_DIR):
+    """Render the given setup_configmk outputs (config.mk, constraint.sdc, ...) and write them."""
+    setup_configmk.write_outputs(setup_configmk.render_outputs(setup, outputs), build_dir)
+    return True
+
+def parse_submodules(setup, memo, src_dir=SRC_DIR, build_dir=BUILD_DIR, write=True, verify=False):
+    """
+    Extract the PE port table from the RTL into memo["pe_config"]. Parsed files are
+    cached in build_dir, verify forces them to be re-parsed. With always_ready channels
+    the table also holds the outputs the PE ties to a constant, which prove them.
+    """
+    top_submodule, verilog_files = parse_verilog.parse_setup(setup)
+    if not (top_submodule and verilog_files):
+        print("Error: Failed to extract necessary information from setup.json")
+        return False
+    always_ready = generate_top.parse_always_ready(setup)
+    if always_ready is None:
+        return False
+    memo["pe_config"] = parse_verilog.generate_submodule_configs(verilog_files, top_submodule, src_dir,
+                                                                 cache_dir=build_dir, verify=verify,
+                                                                 constants=bool(always_ready))
+    if memo["pe_config"] is None:
+        return False
+    if write:
+        parse_verilog.write_submodule_config(memo["pe_config"], build_dir)
+    return True
+
+def build_array(setup, memo, src_dir=SRC_DIR, build_dir=BUILD_DIR, write=True):
+    """
+    Build the compact netlist of the systolic array into memo["array_netlist"]. The
+    JSON description is only produced when it is written. For a tiled array (see
+    generate_top.parse_tile_size) memo["array_netlist"] is the top of tiles and
+    memo["tile_netlist"] the tile. The top gets the reset tree, the edge skew and the
+    result network of setup.json (see generate_top.attach_generated), their reports
+    are written next to the JSON.
+    """
+    files = frontend_files(setup, src_dir, build_dir)
+    tile_size = generate_top.parse_tile_size(setup)
+    always_ready = generate_top.parse_always_ready(setup)
+    if tile_size is None or always_ready is None:
+        return False
+    pe_config = _load_json(memo, "pe_config", files["pe_config"])
+    array_config = systolic_array_generator.load_array_config(files["array_yaml"])
+    if tile_size != (1, 1):
+        netlists = systolic_array_generator.build_tiled_netlists(array_config, pe_config, tile_size,
+                                                                 generate_top.parse_tile_module(setup), always_ready)
+        if netlists is None:
+            return False
+        memo["tile_netlist"], memo["array_netlist"] = netlists
+    else:
+        memo["tile_netlist"] = None
+        if edge_skew.is_enabled(setup) or result_network.is_enabled(setup):
+            # Both are built on the edge and result ports of the standard grid.
+            if not systolic_array_generator.is_standard_grid(array_config, pe_config,
+                                                             "an array with edge_skew or result_network"):
+                return False
+            memo["array_netlist"] = systolic_array_generator.build_grid_netlist(array_config, pe_config)
+        else:
+            memo["array_netlist"] = systolic_array_generator.build_array_netlist(array_config, pe_config)
+        if memo["array_netlist"] is None:
+            return False
+    if not generate_top.attach_generated(memo["array_netlist"], setup, tile_size):
+        return False
+    if write:
+        write_array(memo["array_netlist"], files)
+    return True
+
+def write_array(netlist, files):
+    """Write the JSON description of the array netlist, and the reports of its generated instances."""
+    systolic_array_generator.write_systolic_array_json(netlist.to_json(), files["array_json"])
+    if netlist.reset_tree is not None:
+        reset_tree.write_report(netlist.reset_tree, files["reset_report"])
+    if netlist.edge_skew is not None:
+        edge_skew.write_report(netlist.edge_skew, files["skew_report"])
+    if netlist.result_network is not None:
+        result_network.write_report(netlist.result_network, files["result_report"])
+
+def build_top(setup, memo, src_dir=SRC_DIR, build_dir=BUILD_DIR, compress=False, style=None):
+    """
+    Stream the top-level Verilog to build_dir, memo["top_verilog"] receives its path.
+    The generated text is never held in memory as a whole. style overrides the
+    top_style of setup.json ("flat" or "generate", see generate_top.TOP_STYLES).
+    A tiled array also gets its tile module, memo["tile_verilog"] receives its path.
+    """
+    files = frontend_files(setup, src_dir, build_dir)
+    design_name, _, _ = generate_top.parse_setup(setup)
+    style = style or generate_top.parse_top_style(setup)
+    if style is None or generate_top.parse_tile_size(setup) is None:
+        return False
+    if generate_top.uses_generated_modules(setup) and style == "generate":
+        print("Error: reset_tree, edge_skew and result_network are only supported with the flat top_style")
+        return False
+    if files["tile_verilog"]:
+        if style == "generate":
+            print("Error: tile_size is only supported with the flat top_style")
+            return False
+        # The top of tiles is only held in memory, rebuild it if the array stage was skipped.
+        if memo.get("tile_netlist") is None and not build_array(setup, memo, src_dir, build_dir, write=False):
+            return False
+        tile = memo["tile_netlist"]
+        memo["tile_verilog"] = generate_top.write_top_verilog(generate_top.iter_top_verilog_netlist(tile, "tile"),
+                                                              tile.top_module, build_dir, compress=compress)
+    pe_config = _load_json(memo, "pe_config", files["pe_config"])
+    if style == "generate":
+        array_config = systolic_array_generator.load_array_config(files["array_yaml"])
+        if not systolic_array_generator.is_standard_grid(array_config, pe_config, "the generate top_style"):
+            return False
+        chunks = generate_top.iter_top_verilog_generate(array_config, pe_config)
+    elif memo.get("array_netlist") is not None:
+        chunks = generate_top.iter_top_verilog_netlist(memo["array_netlist"])
+    else:
+        # The array stage was skipped, start from the description it wrote.
+        array_json = _load_json(memo, "array_json", files["array_json"])
+        chunks = generate_top.iter_top_verilog(array_json, generate_top.index_submodule_configs([pe_config]))
+    memo["top_verilog"] = generate_top.write_top_verilog(chunks, design_name, build_dir, compress=compress)
+    return True
+
+def run_frontend(setup, src_dir=SRC_DIR, build_dir=BUILD_DIR, verify=False, compress=False, style=None):
+    """
+    Run the whole front-end in memory and write all outputs to build_dir at the end,
+    the top-level Verilog last since it is streamed straight from the array description.
+    Returns the in-memory results, or None on failure.
+    """
+    memo = {}
+    rendered = setup_configmk.render_outputs(setup)
+    if not (parse_submodules(setup, memo, src_dir, build_dir, write=False, verify=verify)
+            and build_array(setup, memo, src_dir, build_dir, write=False)):
+        return None
+
+    files = frontend_files(setup, src_dir, build_dir)
+    setup_configmk.write_outputs(rendered, build_dir)
+    parse_verilog.write_submodule_config(memo["pe_config"], build_dir)
+    write_array(memo["array_netlist"], files)
+    if not build_top(setup, memo, src_dir, build_dir, compress=compress, style=style):
+        return None
+    return memo
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the front-end of the flow in a single process.")
+    parser.add_argument("--setup", default=SETUP_FILE, help="setup.json to use")
+    parser.add_argument("--src-dir", default=SRC_DIR, help="directory containing the RTL and systolic_array.yaml")
+    parser.add_argument("--build-dir", default=BUILD_DIR, help="directory receiving the generated files")
+    parser.add_argument("--verify", action="store_true",
+                        help="re-parse every Verilog file instead of trusting the parse cache")
+    parser.add_argument("--gzip", action="store_true",
+                        help="write the top-level Verilog gzip-compressed, as DESIGN_NAME.v.gz")
+    parser.add_argument("--style", choices=generate_top.TOP_STYLES,
+                        help="output style of the top module, overrides top_style in setup.json")
+    args = parser.parse_args(argv)
+
+    if run_frontend(load_setup(args.setup), args.src_dir, args.build_dir,
+                    verify=args.verify, compress=args.gzip, style=args.style) is None:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
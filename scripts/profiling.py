@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing and resource profiling of a flow run.
+
+Every stage action is measured for wall time, the CPU time of the thread running
+it and the peak RSS of the flow process. Commands started through run_process()
+are reaped with os.wait4, so their CPU time and peak RSS (including the processes
+they waited for, e.g. make and its recipes) are added to the stage that ran them.
+Work done outside the process tree, such as the ORFS run inside the Docker daemon,
+is only visible as wall time.
+
+Each run writes to the profile directory (build/profiles by default):
+- <run_id>.json - the per-run report
+- <run_id>.trace.json - Chrome trace events, open in chrome://tracing or ui.perfetto.dev
+
+Usage: python3 profiling.py [--dir DIR] list
+       python3 profiling.py [--dir DIR] show [REPORT]
+       python3 profiling.py [--dir DIR] compare [BASE] [NEW] [--threshold PCT]
+
+compare defaults to the two latest reports and flags the stages whose wall time,
+CPU time or peak RSS grew by more than the threshold.
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.path.normpath(os.path.join(SCRIPT_DIR, "../build/profiles"))
+REPORT_VERSION = 1
+
+# Metrics compared between runs, as (report key, column title, smallest change
+# reported as a regression), so that noise on short stages is not flagged.
+COMPARED_METRICS = [("wall_s", "wall s", 0.5), ("cpu_s", "cpu s", 0.5), ("max_rss_kb", "rss KB", 10240)]
+
+# Stage record of the action running on the current thread, if any.
+_current = threading.local()
+
+def _max_rss_kb():
+    """Peak RSS of the flow process in KB (ru_maxrss is in bytes on macOS)."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss // 1024 if sys.platform == "darwin" else max_rss
+
+def run_process(cmd, cwd=None, on_line=None):
+    """
+    Run a shell command to completion with stderr merged into stdout, passing
+    every output line to on_line as it arrives. Returns the exit code. The child
+    is reaped with os.wait4 and its resource usage is recorded on the stage
+    running on this thread. If reading the output or on_line raises, the child is
+    killed and reaped before the exception propagates.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, shell=True, cwd=cwd, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, universal_newlines=True,
+                               errors="replace", bufsize=1)
+    try:
+        with process.stdout:
+            for line in process.stdout:
+                if on_line is not None:
+                    on_line(line)
+    except BaseException:
+        # Not process.kill(): it polls first, and a child reaped by poll() has no rusage left for os.wait4.
+        os.kill(process.pid, signal.SIGKILL)
+        raise
+    finally:
+        _, wait_status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(wait_status)
+        record_child(cmd, time.perf_counter() - start, usage, start)
+    return process.returncode
+
+def record_child(cmd, wall, usage, start=None):
+    """Add the rusage of a finished child process to the stage running on this thread."""
+    record = getattr(_current, "record", None)
+    if record is None:
+        return
+    max_rss = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    record["children"].append({
+        "cmd": cmd,
+        "start_s": (start - record["_t0"]) + record["start_s"] if start is not None else None,
+        "wall_s": wall,
+        "user_s": usage.ru_utime,
+        "sys_s": usage.ru_stime,
+        "max_rss_kb": max_rss
+    })
+
+class Profiler:
+    """Measurements of the stages of one run."""
+
+    def __init__(self):
+        self.run_id = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._threads = {}
+        self.stages = {}
+
+    def _thread_index(self):
+        ident = threading.get_ident()
+        with self._lock:
+            return self._threads.setdefault(ident, len(self._threads) + 1)
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        """Measure the block as stage name, children started in it are added to the stage."""
+        record = {
+            "name": name,
+            "thread": self._thread_index(),
+            "start_s": time.perf_counter() - self._t0,
+            "children": [],
+            "_t0": time.perf_counter()
+        }
+        thread_cpu = time.thread_time()
+        _current.record = record
+        try:
+            yield record
+        finally:
+            _current.record = None
+            record["wall_s"] = time.perf_counter() - record.pop("_t0")
+            record["thread_cpu_s"] = time.thread_time() - thread_cpu
+            record["children_cpu_s"] = sum(c["user_s"] + c["sys_s"] for c in record["children"])
+            record["cpu_s"] = record["thread_cpu_s"] + record["children_cpu_s"]
+            record["max_rss_kb"] = max([_max_rss_kb()] + [c["max_rss_kb"] for c in record["children"]])
+            with self._lock:
+                self.stages[name] = record
+
+    def wrap(self, name, action):
+        """Return action measured as stage name."""
+        def profiled():
+            with self.measure(name):
+                return action()
+        return profiled
+
+    def report(self, status=None, metadata=None):
+        """
+        Build the run report. status maps stage names to their result (see
+        stage_graph.run_stages), stages that did not run are listed without measurements.
+        """
+        status = status or {}
+        stages = []
+        for name in sorted(set(self.stages) | set(status),
+                           key=lambda n: self.stages[n]["start_s"] if n in self.stages else float("inf")):
+            record = dict(self.stages.get(name, {"name": name}))
+            record["status"] = status.get(name, "ran")
+            stages.append(record)
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {
+            "version": REPORT_VERSION,
+            "run_id": self.run_id,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "metadata": metadata or {},
+            "wall_s": time.perf_counter() - self._t0,
+            "cpu_s": usage.ru_utime + usage.ru_stime + sum(s.get("children_cpu_s", 0) for s in stages),
+            "max_rss_kb": _max_rss_kb(),
+            "stages": stages
+        }
+
+def trace_events(report):
+    """Chrome trace-event representation of a run report: one complete event per stage and command."""
+    events = [{"name": "process_name", "ph": "M", "pid": 1, "tid": 0,
+               "args": {"name": f"flow {report['run_id']}"}}]
+    threads = set()
+    for stage_record in report["stages"]:
+        if "wall_s" not in stage_record:
+            continue
+        tid = stage_record["thread"]
+        threads.add(tid)
+        events.append({
+            "name": stage_record["name"], "cat": "stage", "ph": "X", "pid": 1, "tid": tid,
+            "ts": stage_record["start_s"] * 1e6, "dur": stage_record["wall_s"] * 1e6,
+            "args": {key: stage_record[key] for key in ("status", "cpu_s", "thread_cpu_s",
+                                                        "children_cpu_s", "max_rss_kb")}
+        })
+        for child in stage_record["children"]:
+            if child["start_s"] is None:
+                continue
+            events.append({
+                "name": child["cmd"][:80], "cat": "command", "ph": "X", "pid": 1, "tid": tid,
+                "ts": child["start_s"] * 1e6, "dur": child["wall_s"] * 1e6,
+                "args": {key: child[key] for key in ("cmd", "user_s", "sys_s", "max_rss_kb")}
+            })
+    for tid in sorted(threads):
+        events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+                       "args": {"name": f"worker {tid}"}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+def write_report(report, profile_dir=PROFILE_DIR):
+    """Write the report and its trace to profile_dir, returns (report path, trace path)."""
+    os.makedirs(profile_dir, exist_ok=True)
+    report_path = os.path.join(profile_dir, f"{report['run_id']}.json")
+    trace_path = os.path.join(profile_dir, f"{report['run_id']}.trace.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    with open(trace_path, "w") as f:
+        json.dump(trace_events(report), f)
+    return report_path, trace_path
+
+def list_reports(profile_dir=PROFILE_DIR):
+    """Paths of the run reports in profile_dir, oldest first."""
+    if not os.path.isdir(profile_dir):
+        return []
+    names = [name for name in os.listdir(profile_dir)
+             if name.endswith(".json") and not name.endswith(".trace.json")]
+    return [os.path.join(profile_dir, name) for name in sorted(names)]
+
+def load_report(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+def print_summary(report):
+    """Print the stage table of a run report."""
+    print(f"==== Profile of run {report['run_id']} ====")
+    print(f"{'stage':<16} {'status':<8} {'wall s':>9} {'cpu s':>9} {'rss KB':>10}")
+    for stage_record in report["stages"]:
+        if "wall_s" in stage_record:
+            print(f"{stage_record['name']:<16} {stage_record['status']:<8} {stage_record['wall_s']:9.3f} "
+                  f"{stage_record['cpu_s']:9.3f} {stage_record['max_rss_kb']:10d}")
+        else:
+            print(f"{stage_record['name']:<16} {stage_record['status']:<8} {'-':>9} {'-':>9} {'-':>10}")
+    print(f"{'total':<16} {'':<8} {report['wall_s']:9.3f} {report['cpu_s']:9.3f} {report['max_rss_kb']:10d}")
+
+def compare_reports(base, new, threshold=10.0):
+    """
+    Compare two run reports stage by stage. Returns rows of
+    (stage, metric, base value, new value, change in percent or None, regressed).
+    A metric regressed when it grew by more than threshold percent and by more than
+    its smallest reported change. Stages that did not run in both reports are not compared.
+    """
+    base_stages = {s["name"]: s for s in base["stages"] if "wall_s" in s}
+    rows = []
+    for stage_record in new["stages"]:
+        previous = base_stages.get(stage_record["name"])
+        if previous is None or "wall_s" not in stage_record:
+            continue
+        for key, _, min_delta in COMPARED_METRICS:
+            old_value, new_value = previous[key], stage_record[key]
+            change = (new_value - old_value) / old_value * 100 if old_value else None
+            regressed = new_value - old_value > min_delta and (change is None or change > threshold)
+            rows.append((stage_record["name"], key, old_value, new_value, change, regressed))
+    return rows
+
+def print_comparison(base, new, threshold=10.0):
+    """Print the comparison of two reports, returns the number of regressed metrics."""
+    print(f"==== {base['run_id']} -> {new['run_id']} ====")
+    titles = {key: title for key, title, _ in COMPARED_METRICS}
+    print(f"{'stage':<16} {'metric':<8} {'base':>12} {'new':>12} {'change':>9}")
+    regressions = 0
+    for name, key, old_value, new_value, change, regressed in compare_reports(base, new, threshold):
+        change_str = f"{change:+8.1f}%" if change is not None else f"{'-':>9}"
+        value_format = "12d" if isinstance(new_value, int) else "12.3f"
+        print(f"{name:<16} {titles[key]:<8} {old_value:{value_format}} {new_value:{value_format}} {change_str}"
+              + ("  REGRESSION" if regressed else ""))
+        regressions += regressed
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and compare the profiles of flow runs.")
+    parser.add_argument("--dir", default=PROFILE_DIR, help="profile directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="list the run reports")
+    show = subparsers.add_parser("show", help="print the stage table of a report")
+    show.add_argument("report", nargs="?", help="report to show, the latest by default")
+    compare = subparsers.add_parser("compare", help="compare two run reports")
+    compare.add_argument("base", nargs="?", help="base report, the second latest by default")
+    compare.add_argument("new", nargs="?", help="new report, the latest by default")
+    compare.add_argument("--threshold", type=float, default=10.0,
+                         help="percentage increase reported as a regression")
+    args = parser.parse_args(argv)
+
+    reports = list_reports(args.dir)
+    if args.command == "list":
+        for path in reports:
+            report = load_report(path)
+            print(f"{report['run_id']}  {report['metadata'].get('nickname', '-'):<28} {report['wall_s']:9.3f} s")
+        return
+
+    if args.command == "show":
+        if not (args.report or reports):
+            print(f"Error: no run reports in {args.dir}")
+            sys.exit(1)
+        print_summary(load_report(args.report or reports[-1]))
+        return
+
+    paths = [args.base, args.new]
+    if paths[1] is None:
+        paths = [paths[0], reports[-1] if reports else None]
+    if paths[0] is None:
+        paths[0] = reports[-2] if len(reports) >= 2 else None
+    if None in paths:
+        print(f"Error: two run reports are needed for a comparison, found {len(reports)} in {args.dir}")
+        sys.exit(1)
+    if print_comparison(load_report(paths[0]), load_report(paths[1]), args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Pipelined, fanout-bounded distribution of the reset (and other broadcast control
+ports, e.g. a clock enable) in the generated top module.
+
+By default the top-level rst drives the rst port of every PE, or of every tile of
+a tiled array, on a single net. With the generate_files entry
+
+    "reset_tree": {"fanout": 16, "group": "row", "ports": ["rst"]}
+
+the port goes through a tree of registers instead:
+
+- the instances are split into groups, by "row" in runs of up to fanout instances
+  of a row, by "tile" in square blocks of up to fanout instances, or one group per
+  tile of a tiled array;
+- every group is driven by a leaf register, the registers of a level by the level
+  above in runs of up to fanout, up to a single root register fed by the top-level
+  port. No net of the tree drives more than fanout loads.
+
+The tree stops at the tiles of a tiled array: the tile module drives the port of
+all its PEs on one net. A tile of more PEs than fanout is refused, since that
+net would break the bound; reset_tree.json reports it as tile_load.
+
+Every register is an instance of the <top>_tree_stage module, emitted after the top
+module and kept as a hierarchy of its own so that synthesis does not merge the
+registers of a level back into one. The tree delays the port by one clock cycle
+per level, assertion and release alike: this latency is reported next to the
+array description (reset_tree.json) and the host has to wait for it after
+releasing the reset. Asynchronous resets are not supported.
+
+Usage: python3 reset_tree.py ROWS COLS [--fanout 16] [--group row] [--tile-size 1]
+prints the tree and its latency for an array of ROWS x COLS PEs.
+"""
+import argparse
+import json
+import math
+import os
+from array import array
+
+import systolic_array_generator
+
+GROUPS = ("row", "tile")
+DEFAULT_FANOUT = 16
+
+# Port table of the stage module, in declaration order (see render_stage_module).
+STAGE_PORTS = {
+    "clk": {"direction": "input", "width": 1},
+    "d": {"direction": "input", "width": 1},
+    "q": {"direction": "output", "width": 1}
+}
+
+REPORT_FILE = "reset_tree.json"
+
+def is_enabled(setup_data):
+    """Whether the top distributes the reset through a tree, generate_files "reset_tree"."""
+    options = (setup_data.get("generate_files") or [{}])[0].get("reset_tree")
+    return bool(options) and options.get("enable", True)
+
+def parse_reset_tree(setup_data):
+    """
+    Options of the reset tree, the generate_files "reset_tree" entry: a dict with
+    the fanout, group and ports, {} when the tree is disabled, or None on an error.
+    """
+    if not is_enabled(setup_data):
+        return {}
+    options = setup_data["generate_files"][0]["reset_tree"]
+    fanout = options.get("fanout", DEFAULT_FANOUT)
+    if isinstance(fanout, bool) or not isinstance(fanout, int) or fanout < 2:
+        print(f"Error: reset_tree fanout must be an integer of at least 2 in setup.json, found {fanout!r}")
+        return None
+    group = options.get("group", "row")
+    if group not in GROUPS:
+        print(f"Error: unknown reset_tree group '{group}' in setup.json, expected one of {', '.join(GROUPS)}")
+        return None
+    ports = options.get("ports", ["rst"])
+    if not ports or not all(isinstance(port, str) for port in ports) or "clk" in ports:
+        print(f"Error: reset_tree ports must be a list of control port names other than clk, found {ports!r}")
+        return None
+    return {"fanout": fanout, "group": group, "ports": list(ports)}
+
+def group_instances(rows, cols, group, fanout, tiled=False):
+    """
+    Leaf group of every instance of a rows x cols array, row-major, as an array of
+    group indices, one group per instance for the tiles of a tiled array grouped
+    by "tile". Returns (groups, group count).
+    """
+    if group == "row":
+        runs = -(-cols // fanout)
+        groups = array("i", (i * runs + j // fanout for i in range(rows) for j in range(cols)))
+        return groups, rows * runs
+    side = 1 if tiled else math.isqrt(fanout)
+    blocks = -(-cols // side)
+    groups = array("i", ((i // side) * blocks + j // side for i in range(rows) for j in range(cols)))
+    return groups, -(-rows // side) * blocks
+
+def level_sizes(leaves, fanout):
+    """Register count of every level of the tree, from the root down to the leaves."""
+    sizes = [leaves]
+    while sizes[-1] > 1:
+        sizes.append(-(-sizes[-1] // fanout))
+    return sizes[::-1]
+
+class ResetTree:
+    """
+    Register tree of one array netlist. Register k of level l (the root is level 0)
+    drives registers k*fanout to k*fanout+fanout-1 of level l+1, the leaves drive
+    their group of instances. Every port gets a tree of the same shape. The
+    instances are tiles of tile_size PEs unless it is (1, 1).
+    """
+
+    def __init__(self, module, ports, fanout, group, rows, cols, tile_size=(1, 1)):
+        self.module = module
+        self.ports = ports
+        self.fanout = fanout
+        self.group = group
+        self.tile_size = tile_size
+        self.tiled = tile_size != (1, 1)
+        self.groups, leaves = group_instances(rows, cols, group, fanout, self.tiled)
+        self.sizes = level_sizes(leaves, fanout)
+        # Names of the nets the roots and the registers are fed by, set by attach.
+        self.sources = {}
+        self.clock = None
+
+    @property
+    def latency(self):
+        return len(self.sizes)
+
+    @property
+    def tile_load(self):
+        """PEs the port net of a tile drives, None when the instances are PEs."""
+        return self.tile_size[0] * self.tile_size[1] if self.tiled else None
+
+    def net_name(self, port, level, index):
+        return f"{port}_tree_{level}_{index}"
+
+    def instance_name(self, port, level, index):
+        return f"{port.upper()}_TREE_{level}_{index}"
+
+    def iter_stages(self):
+        """(instance name, instance data) of every register, root first, in the form of the array JSON."""
+        for port in self.ports:
+            for level, size in enumerate(self.sizes):
+                for index in range(size):
+                    source = (self.sources[port] if level == 0
+                              else self.net_name(port, level - 1, index // self.fanout))
+                    yield self.instance_name(port, level, index), {
+                        "module": self.module,
+                        "connect": {"clk": self.clock, "d": source, "q": self.net_name(port, level, index)}
+                    }
+
+    def report(self):
+        """Summary of the tree, written to reset_tree.json for the host side."""
+        loads = array("i", [0]) * self.sizes[-1]
+        for group in self.groups:
+            loads[group] += 1
+        return {
+            "module": self.module,
+            "ports": self.ports,
+            "fanout": self.fanout,
+            "group": self.group,
+            "latency": self.latency,
+            "levels": self.sizes,
+            "registers": sum(self.sizes) * len(self.ports),
+            "max_leaf_load": max(loads),
+            "leaf_load_unit": "tile" if self.tiled else "PE",
+            "tile_load": self.tile_load
+        }
+
+def stage_module_name(top_module):
+    """Module name of the registers of the tree of top_module."""
+    return f"{top_module}_tree_stage"
+
+def attach(netlist, options, tile_size=(1, 1)):
+    """
+    Build the reset tree of options (see parse_reset_tree) for an ArrayNetlist, the
+    top of tiles of shape tile_size unless it is (1, 1), and reconnect the tree ports
+    of every instance to their leaf register. Each port must be a 1-bit input on one
+    net shared by all instances, and a tile may not hold more PEs than the fanout.
+    Returns the ResetTree, also netlist.reset_tree, or None on an error.
+    """
+    tree = ResetTree(stage_module_name(netlist.top_module), options["ports"], options["fanout"], options["group"],
+                     netlist.rows, netlist.cols, tile_size)
+    if tree.tiled and tree.tile_load > tree.fanout:
+        print(f"Error: reset_tree fanout {tree.fanout} is below the {tree.tile_load} PEs of a "
+              f"{tile_size[0]}x{tile_size[1]} tile, which drives {', '.join(tree.ports)} of all its PEs on one net: "
+              f"use tiles of at most {tree.fanout} PEs or a fanout of at least {tree.tile_load}")
+        return None
+    slots = len(netlist.port_names)
+    sources = {}
+    for port in ["clk"] + tree.ports:
+        slot = netlist.slot_of.get(port)
+        info = netlist.port_info[slot] if slot is not None else None
+        if info is None or info["direction"] != "input" or info["width"] != 1:
+            print(f"Error: reset_tree port {port} is not a 1-bit input of {netlist.module_name}")
+            return None
+        nets = set(netlist.connections[slot::slots])
+        if len(nets) != 1 or -1 in nets:
+            print(f"Error: reset_tree port {port} is not driven by one net shared by every {netlist.module_name}")
+            return None
+        sources[port] = (slot, nets.pop())
+    tree.clock = netlist.net_name(sources.pop("clk")[1])
+
+    leaves = tree.sizes[-1]
+    for index, port in enumerate(tree.ports):
+        slot, source = sources[port]
+        tree.sources[port] = netlist.net_name(source)
+        first = len(netlist.net_kind)
+        for leaf in range(leaves):
+            netlist.add_net(systolic_array_generator.NET_TREE, index, tree.latency - 1, leaf)
+        for instance, leaf in enumerate(tree.groups):
+            netlist.connections[instance * slots + slot] = first + leaf
+    netlist.reset_tree = tree
+    return tree
+
+def render_stage_module(info):
+    """Verilog of the stage module, info is the report of the tree (see ResetTree.report)."""
+    return (f"// Auto-generated register of the {', '.join(info['ports'])} tree, "
+            f"latency in cycles: {info['latency']}\n"
+            "(* keep_hierarchy *)\n"
+            f"module {info['module']}(\n"
+            "  input clk,\n"
+            "  input d,\n"
+            "  output reg q\n"
+            ");\n\n"
+            "  always @(posedge clk)\n"
+            "    q <= d;\n\n"
+            "endmodule\n")
+
+def write_report(tree, report_file):
+    """Write the report of the tree to report_file."""
+    os.makedirs(os.path.dirname(report_file) or ".", exist_ok=True)
+    with open(report_file, "w") as f:
+        json.dump(tree.report(), f, indent=4)
+    print(f"Reset tree: {', '.join(tree.ports)} through registers of fanout <= {tree.fanout} by {tree.group} "
+          f"(levels {'/'.join(map(str, tree.sizes))}), latency in cycles: {tree.latency}, "
+          f"see {os.path.basename(report_file)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the reset tree of an array of ROWS x COLS PEs.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("cols", type=int)
+    parser.add_argument("--fanout", type=int, default=DEFAULT_FANOUT)
+    parser.add_argument("--group", choices=GROUPS, default="row")
+    parser.add_argument("--tile-size", type=int, default=1, help="tile size K of a tiled array")
+    args = parser.parse_args(argv)
+
+    k = args.tile_size
+    tree = ResetTree(stage_module_name("top"), ["rst"], args.fanout, args.group,
+                     -(-args.rows // k), -(-args.cols // k), (k, k))
+    if tree.tiled and tree.tile_load > tree.fanout:
+        print(f"Error: a {k}x{k} tile drives its {tree.tile_load} PEs on one net, more than the fanout {tree.fanout}")
+        return
+    print(json.dumps(tree.report(), indent=4))
+
+if __name__ == "__main__":
+    main()
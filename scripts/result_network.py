@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Result-collection network of the generated top module.
+
+By default the result channel of every PE (result_out_rsc_dat/_vld/_rdy) is a
+triplet of top-level ports, rows x cols x (width + 2) pins. With the generate_files
+entry
+
+    "result_network": {"mode": "column_bus", "tag": true}
+
+the results are collected over fewer, shared interfaces instead:
+
+- row_chain: the PEs of a row form a daisy chain shifting the results out to the
+  right edge, one interface per row (result_out_rsc<i>_dat/_vld/_rdy). Every stage
+  is a registered round-robin merge of its PE and the stage to its left.
+- column_bus: the PEs of a column share a bus with a registered round-robin
+  arbiter at the bottom edge, one interface per column (result_out_rsc<j>_*).
+- fifo: the column arbiters are merged by one more arbiter into an output FIFO of
+  fifo_depth entries, one interface (result_out_rsc_*) of fifo_width data bits. A
+  result wider than fifo_width is read in several beats, least significant first.
+
+With tag (default) the upper bits of the collected data hold the source of the
+result: its column for row_chain, its row for column_bus, its index i*cols+j for
+fifo. Every interface moves at most one result (or beat) per cycle, so fewer pins
+cost readout cycles: estimate() gives both for every mode, see also the CLI below.
+The collectors are registered, generated after the top module, and take their
+clock and reset from the PE they sit next to. They need the standard grid of PEs.
+
+Usage: python3 result_network.py ROWS COLS [--width 32] [--fifo-width 16]
+prints the pin count and readout cycles of every mode for an array of ROWS x COLS PEs.
+"""
+import argparse
+import json
+import os
+
+import systolic_array_generator
+
+# Result collection modes, "ports" being one interface per PE (no network).
+MODES = ("ports", "row_chain", "column_bus", "fifo")
+DEFAULT_FIFO_DEPTH = 16
+SUFFIXES = ("_dat", "_vld", "_rdy")
+
+REPORT_FILE = "result_network.json"
+
+def is_enabled(setup_data):
+    """Whether the results are collected by a network, generate_files "result_network"."""
+    options = (setup_data.get("generate_files") or [{}])[0].get("result_network")
+    return bool(options) and options.get("mode", "ports") != "ports"
+
+def parse_result_network(setup_data):
+    """
+    Options of the result network, the generate_files "result_network" entry: a dict
+    with the mode, tag, fifo_width and fifo_depth, {} without a network, or None on an error.
+    """
+    if not is_enabled(setup_data):
+        return {}
+    options = setup_data["generate_files"][0]["result_network"]
+    mode = options["mode"]
+    if mode not in MODES:
+        print(f"Error: unknown result_network mode '{mode}' in setup.json, expected one of {', '.join(MODES)}")
+        return None
+    for key, default in (("fifo_width", None), ("fifo_depth", DEFAULT_FIFO_DEPTH)):
+        value = options.get(key, default)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 1):
+            print(f"Error: result_network {key} must be a positive integer in setup.json, found {value!r}")
+            return None
+    return {"mode": mode, "tag": bool(options.get("tag", True)), "fifo_width": options.get("fifo_width"),
+            "fifo_depth": options.get("fifo_depth", DEFAULT_FIFO_DEPTH)}
+
+def index_bits(count):
+    """Bits of an index into count items, 0 for a single one."""
+    return (count - 1).bit_length() if count > 1 else 0
+
+def estimate(mode, rows, cols, width, tag=True, fifo_width=None, fifo_depth=DEFAULT_FIFO_DEPTH):
+    """
+    Interfaces, pins and readout of the results of a rows x cols array of width-bit
+    results: readout_cycles is the number of cycles from all results being valid to
+    the last one read, with the host always ready.
+    """
+    if mode == "ports":
+        interfaces, tag_bits, results, latency = rows * cols, 0, 1, 0
+    elif mode == "row_chain":
+        interfaces, tag_bits, results, latency = rows, index_bits(cols) if tag else 0, cols, 1
+    elif mode == "column_bus":
+        interfaces, tag_bits, results, latency = cols, index_bits(rows) if tag else 0, rows, 1
+    else:
+        interfaces, tag_bits, results, latency = 1, index_bits(rows * cols) if tag else 0, rows * cols, 3
+    data_width = width + tag_bits
+    beats = 1
+    if mode == "fifo":
+        beats = -(-data_width // fifo_width) if fifo_width else 1
+        data_width = fifo_width or data_width
+    return {
+        "mode": mode,
+        "interfaces": interfaces,
+        "data_width": data_width,
+        "tag_bits": tag_bits,
+        "beats": beats,
+        "pins": interfaces * (data_width + 2),
+        "readout_cycles": results * beats + latency
+    }
+
+def arbiter_name(top_module, inputs, width):
+    return f"{top_module}_result_arbiter_{inputs}x{width}"
+
+def arbiter_ports(inputs, width):
+    """Port table of a round-robin arbiter of inputs handshakes of width bits."""
+    ports = {"clk": {"direction": "input", "width": 1}, "rst": {"direction": "input", "width": 1}}
+    for k in range(inputs):
+        ports[f"in{k}_dat"] = {"direction": "input", "width": width}
+        ports[f"in{k}_vld"] = {"direction": "input", "width": 1}
+        ports[f"in{k}_rdy"] = {"direction": "output", "width": 1}
+    ports["out_dat"] = {"direction": "output", "width": width}
+    ports["out_vld"] = {"direction": "output", "width": 1}
+    ports["out_rdy"] = {"direction": "input", "width": 1}
+    return ports
+
+def fifo_ports(in_width, out_width):
+    """Port table of the output FIFO."""
+    return {
+        "clk": {"direction": "input", "width": 1},
+        "rst": {"direction": "input", "width": 1},
+        "in_dat": {"direction": "input", "width": in_width},
+        "in_vld": {"direction": "input", "width": 1},
+        "in_rdy": {"direction": "output", "width": 1},
+        "out_dat": {"direction": "output", "width": out_width},
+        "out_vld": {"direction": "output", "width": 1},
+        "out_rdy": {"direction": "input", "width": 1}
+    }
+
+def _range(width):
+    return f"[{width - 1}:0] " if width > 1 else ""
+
+def _vector(width):
+    """Range of a vector that is indexed or part-selected, [0:0] for a single bit."""
+    return f"[{width - 1}:0] "
+
+def _port_list(ports, output_regs=()):
+    lines = []
+    for name, info in ports.items():
+        kind = "reg " if name in output_regs else ""
+        lines.append(f"  {info['direction']} {kind}{_range(info['width'])}{name}")
+    return ",\n".join(lines)
+
+def render_arbiter(name, inputs, width):
+    """Verilog of a registered round-robin arbiter of inputs handshakes of width bits."""
+    bits = max(1, index_bits(inputs))
+    rdys = "".join(f"  assign in{k}_rdy = load && found && grant == {bits}'d{k};\n" for k in range(inputs))
+    return (f"// Auto-generated round-robin arbiter of the result network: {inputs} inputs of {width} bits\n"
+            f"module {name}(\n"
+            f"{_port_list(arbiter_ports(inputs, width), ('out_dat', 'out_vld'))}\n"
+            ");\n\n"
+            f"  wire {_vector(inputs)}vld = {{{', '.join(f'in{k}_vld' for k in reversed(range(inputs)))}}};\n"
+            f"  wire {_vector(inputs * width)}dat = {{{', '.join(f'in{k}_dat' for k in reversed(range(inputs)))}}};\n"
+            "  wire load = !out_vld || out_rdy;\n"
+            f"  reg {_range(bits)}last;\n"
+            f"  reg {_range(bits)}grant;\n"
+            "  reg found;\n"
+            "  integer k;\n"
+            "  integer index;\n\n"
+            "  // The first valid input after the last one granted.\n"
+            "  always @(*) begin\n"
+            "    grant = last;\n"
+            "    found = 1'b0;\n"
+            f"    for (k = {inputs}; k > 0; k = k - 1) begin\n"
+            "      index = last + k;\n"
+            f"      if (index >= {inputs})\n"
+            f"        index = index - {inputs};\n"
+            "      if (vld[index]) begin\n"
+            "        grant = index;\n"
+            "        found = 1'b1;\n"
+            "      end\n"
+            "    end\n"
+            "  end\n\n"
+            f"{rdys}\n"
+            "  always @(posedge clk) begin\n"
+            "    if (rst) begin\n"
+            "      out_vld <= 1'b0;\n"
+            f"      last <= {bits}'d{inputs - 1};\n"
+            "    end else if (load) begin\n"
+            "      out_vld <= found;\n"
+            "      if (found) begin\n"
+            f"        out_dat <= dat[grant * {width} +: {width}];\n"
+            "        last <= grant;\n"
+            "      end\n"
+            "    end\n"
+            "  end\n\n"
+            "endmodule\n")
+
+def render_fifo(name, in_width, out_width, depth):
+    """
+    Verilog of the output FIFO of depth entries of in_width bits, read in beats of
+    out_width bits, least significant first.
+    """
+    beats = -(-in_width // out_width)
+    address, counter, beat = max(1, index_bits(depth)), index_bits(depth + 1), max(1, index_bits(beats))
+    padding = beats * out_width - in_width
+    entry = f"{{{{{padding}{{1'b0}}}}, mem[head]}}" if padding else "mem[head]"
+    return (f"// Auto-generated output FIFO of the result network: {depth} entries of {in_width} bits, "
+            f"read in {beats} beats of {out_width} bits\n"
+            f"module {name}(\n"
+            f"{_port_list(fifo_ports(in_width, out_width))}\n"
+            ");\n\n"
+            f"  reg {_range(in_width)}mem [0:{depth - 1}];\n"
+            f"  reg {_range(address)}head;\n"
+            f"  reg {_range(address)}tail;\n"
+            f"  reg {_range(counter)}count;\n"
+            f"  reg {_range(beat)}beat;\n"
+            "  wire push = in_vld && in_rdy;\n"
+            f"  wire pop = out_vld && out_rdy && beat == {beat}'d{beats - 1};\n"
+            f"  wire {_vector(beats * out_width)}entry = {entry};\n\n"
+            f"  assign in_rdy = count != {counter}'d{depth};\n"
+            f"  assign out_vld = count != {counter}'d0;\n"
+            f"  assign out_dat = entry[beat * {out_width} +: {out_width}];\n\n"
+            "  always @(posedge clk)\n"
+            "    if (push)\n"
+            "      mem[tail] <= in_dat;\n\n"
+            "  always @(posedge clk) begin\n"
+            "    if (rst) begin\n"
+            f"      head <= {address}'d0;\n"
+            f"      tail <= {address}'d0;\n"
+            f"      count <= {counter}'d0;\n"
+            f"      beat <= {beat}'d0;\n"
+            "    end else begin\n"
+            "      if (push)\n"
+            f"        tail <= tail == {address}'d{depth - 1} ? {address}'d0 : tail + {address}'d1;\n"
+            "      if (out_vld && out_rdy)\n"
+            f"        beat <= beat == {beat}'d{beats - 1} ? {beat}'d0 : beat + {beat}'d1;\n"
+            "      if (pop)\n"
+            f"        head <= head == {address}'d{depth - 1} ? {address}'d0 : head + {address}'d1;\n"
+            "      count <= count + push - pop;\n"
+            "    end\n"
+            "  end\n\n"
+            "endmodule\n")
+
+def render_modules(info):
+    """
+    Port tables and Verilog of the collector modules of a network, info being its
+    report (see ResultNetwork.report): {module name: (port table, Verilog)}.
+    """
+    top, rows, cols = info["top_module"], info["rows"], info["cols"]
+    width = info["result_width"] + info["tag_bits"]
+    counts = {"row_chain": [1, 2] if cols > 1 else [1], "column_bus": [rows], "fifo": [rows, cols]}[info["mode"]]
+    modules = {}
+    for inputs in counts:
+        name = arbiter_name(top, inputs, width)
+        modules[name] = (arbiter_ports(inputs, width), render_arbiter(name, inputs, width))
+    if info["mode"] == "fifo":
+        name = f"{top}_result_fifo"
+        modules[name] = (fifo_ports(width, info["data_width"]),
+                         render_fifo(name, width, info["data_width"], info["fifo_depth"]))
+    return modules
+
+class ResultNetwork:
+    """
+    Collectors of the results of one array netlist. The result nets of the PEs become
+    internal nets, named like result_out_rsc_dat_PE_0_1, and the collectors are only
+    formatted when the netlist is serialized (see iter_instances).
+    """
+
+    def __init__(self, top_module, channel, mode, rows, cols, result_width, tag=True, fifo_width=None,
+                 fifo_depth=DEFAULT_FIFO_DEPTH, tile_size=1):
+        self.top_module = top_module
+        self.channel = channel
+        self.mode = mode
+        self.rows = rows
+        self.cols = cols
+        self.result_width = result_width
+        self.tile_rows, self.tile_cols = systolic_array_generator.tile_shape(tile_size)
+        self.fifo_depth = fifo_depth
+        self.estimate = estimate(mode, rows, cols, result_width, tag, fifo_width, fifo_depth)
+        self.tag_bits = self.estimate["tag_bits"]
+        self.width = result_width + self.tag_bits
+        self.prefix, _ = systolic_array_generator.split_port_name(channel + "_dat")
+
+    def net_name(self, port, pe):
+        """Name of the internal net of result port of PE index pe (i*cols+j)."""
+        i, j = divmod(pe, self.cols)
+        return f"{port}_PE_{i}_{j}"
+
+    def top_port_templates(self):
+        """Name format of the top-level ports by suffix and their number."""
+        if self.mode == "fifo":
+            return {suffix: f"{self.channel}{suffix}" for suffix in SUFFIXES}, 1
+        count = self.rows if self.mode == "row_chain" else self.cols
+        return {suffix: f"{self.channel}{{}}{suffix}" for suffix in SUFFIXES}, count
+
+    def report(self):
+        """Summary of the network, written to result_network.json for the host side."""
+        tag = {"row_chain": "column", "column_bus": "row", "fifo": "i*cols+j"}[self.mode]
+        return dict(self.estimate, top_module=self.top_module, channel=self.channel, rows=self.rows,
+                    cols=self.cols, result_width=self.result_width, fifo_depth=self.fifo_depth,
+                    tag=tag if self.tag_bits else None)
+
+    def _input(self, k, tag, i, j):
+        """Connections of input k of an arbiter to the result of PE (i, j), with its tag."""
+        dat = self.net_name(self.channel + "_dat", i * self.cols + j)
+        if self.tag_bits:
+            dat = f"{{{self.tag_bits}'d{tag}, {dat}}}"
+        return {f"in{k}_dat": dat, f"in{k}_vld": self.net_name(self.channel + "_vld", i * self.cols + j),
+                f"in{k}_rdy": self.net_name(self.channel + "_rdy", i * self.cols + j)}
+
+    def _handshake(self, side, name):
+        return {f"{side}{suffix}": f"{name}{suffix}" for suffix in SUFFIXES}
+
+    def iter_instances(self, netlist):
+        """(instance name, instance data) of every collector, in the form of the array JSON."""
+        slots = len(netlist.port_names)
+
+        def control(i, j):
+            # Clock and reset of the instance holding PE (i, j).
+            base = ((i // self.tile_rows) * netlist.cols + j // self.tile_cols) * slots
+            return {port: netlist.net_name(netlist.connections[base + netlist.slot_of[port]])
+                    for port in ("clk", "rst")}
+
+        top = self.top_module
+        if self.mode == "row_chain":
+            for i in range(self.rows):
+                for j in range(self.cols):
+                    connect = dict(control(i, j), **self._input(0, j, i, j))
+                    if j > 0:
+                        connect.update(self._handshake("in1", f"{self.prefix}_chain_{i}_{j - 1}"))
+                    out = (f"{self.channel}{i}" if j == self.cols - 1 else f"{self.prefix}_chain_{i}_{j}")
+                    connect.update(self._handshake("out", out))
+                    yield f"RESULT_CHAIN_{i}_{j}", {"module": arbiter_name(top, 2 if j else 1, self.width),
+                                                    "connect": connect}
+            return
+
+        for j in range(self.cols):
+            connect = control(self.rows - 1, j)
+            for i in range(self.rows):
+                connect.update(self._input(i, i if self.mode == "column_bus" else i * self.cols + j, i, j))
+            out = f"{self.channel}{j}" if self.mode == "column_bus" else f"{self.prefix}_column_{j}"
+            connect.update(self._handshake("out", out))
+            yield f"RESULT_BUS_{j}", {"module": arbiter_name(top, self.rows, self.width), "connect": connect}
+        if self.mode == "fifo":
+            connect = control(self.rows - 1, self.cols - 1)
+            for j in range(self.cols):
+                connect.update(self._handshake(f"in{j}", f"{self.prefix}_column_{j}"))
+            connect.update(self._handshake("out", f"{self.prefix}_merged"))
+            yield "RESULT_MERGE", {"module": arbiter_name(top, self.cols, self.width), "connect": connect}
+            connect = dict(control(self.rows - 1, self.cols - 1), **self._handshake("in", f"{self.prefix}_merged"))
+            connect.update(self._handshake("out", self.channel))
+            yield "RESULT_FIFO", {"module": f"{top}_result_fifo", "connect": connect}
+
+def attach(netlist, options, tile_size=1):
+    """
+    Collect the results of an ArrayNetlist of the standard grid (or its top of tiles
+    of tile_size, K or (R, C)) by the network of options (see parse_result_network): the per-PE
+    result ports become internal nets and the interfaces of the network top-level
+    ports. Returns the ResultNetwork, also netlist.result_network, or None on an error.
+    """
+    result_nets = [net for net in netlist.top_ports if netlist.net_kind[net] == systolic_array_generator.NET_RESULT]
+    names = {netlist.net_port_names[netlist.net_args[net * systolic_array_generator.NET_ARGS]]
+             for net in result_nets}
+    channels = {systolic_array_generator.split_port_name(name)[0] for name in names}
+    if len(channels) != 1 or {systolic_array_generator.split_port_name(name)[1] for name in names} != set(SUFFIXES):
+        print("Error: result_network needs the result ports of the standard grid, "
+              "a single _dat/_vld/_rdy result channel per PE")
+        return None
+    channel = channels.pop() + "_rsc"
+    width = netlist.net_port_info[netlist.net_port_names.index(channel + "_dat")]["width"]
+    if not isinstance(width, int):
+        print(f"Error: result_network needs a fixed width of {channel}_dat, found {width!r}")
+        return None
+
+    tile_rows, tile_cols = systolic_array_generator.tile_shape(tile_size)
+    network = ResultNetwork(netlist.top_module, channel, options["mode"], netlist.rows * tile_rows,
+                            netlist.cols * tile_cols, width, options["tag"], options["fifo_width"],
+                            options["fifo_depth"], tile_size)
+    for net in result_nets:
+        netlist.net_kind[net] = systolic_array_generator.NET_GATHER
+    result_set = set(result_nets)
+    netlist.top_ports = type(netlist.top_ports)("i", (net for net in netlist.top_ports if net not in result_set))
+    templates, count = network.top_port_templates()
+    for suffix in SUFFIXES:
+        info = {"direction": "input" if suffix == "_rdy" else "output",
+                "width": network.estimate["data_width"] if suffix == "_dat" else 1}
+        template = len(netlist.templates)
+        netlist.templates.append((templates[suffix], info))
+        for k in range(count):
+            netlist.add_top_port(systolic_array_generator.NET_TEMPLATE, template, k)
+    netlist.result_network = network
+    return network
+
+def write_report(network, report_file):
+    """Write the report of the network to report_file."""
+    os.makedirs(os.path.dirname(report_file) or ".", exist_ok=True)
+    with open(report_file, "w") as f:
+        json.dump(network.report(), f, indent=4)
+    info = network.estimate
+    print(f"Result network: {network.mode}, {info['interfaces']} interfaces of {info['data_width']} bits, "
+          f"{info['pins']} pins, readout in about {info['readout_cycles']} cycles, "
+          f"see {os.path.basename(report_file)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the result collection modes of an array of ROWS x COLS PEs.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("cols", type=int)
+    parser.add_argument("--width", type=int, default=32, help="data width of the PE results")
+    parser.add_argument("--no-tag", action="store_true", help="do not tag the results with their source")
+    parser.add_argument("--fifo-width", type=int, help="data width of the fifo mode interface")
+    parser.add_argument("--fifo-depth", type=int, default=DEFAULT_FIFO_DEPTH)
+    args = parser.parse_args(argv)
+
+    print(f"{'mode':>11} {'interfaces':>10} {'data bits':>9} {'pins':>7} {'readout cycles':>14}")
+    for mode in MODES:
+        info = estimate(mode, args.rows, args.cols, args.width, not args.no_tag, args.fifo_width, args.fifo_depth)
+        print(f"{mode:>11} {info['interfaces']:10d} {info['data_width']:9d} {info['pins']:7d} "
+              f"{info['readout_cycles']:14d}")
+
+if __name__ == "__main__":
+    main()
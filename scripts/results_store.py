@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+SQLite store of the ORFS results of the design runs.
+
+A run is keyed by the design nickname and the SHA-256 of its setup.json, and
+collecting the same key again replaces the earlier entry. Tables:
+
+    runs    - one row per run, with the headline values of orfs_metrics.collect()
+              (wns, tns, design_area, utilization, synth_area, die_area,
+              elapsed_s, peak_memory_kb) and the run status
+    metrics - every ORFS metric of a run, (run_id, name, value or text)
+    steps   - runtime and peak memory of every ORFS step of a run
+
+run-flow.py collects into build/results.db after each ORFS run. The database
+runs in WAL mode, so concurrent batch and sweep jobs can write to it.
+
+Usage: python3 results_store.py [--db DB] list [--nickname N]
+       python3 results_store.py [--db DB] show NICKNAME [--setup HASH]
+       python3 results_store.py [--db DB] metric NAME [--nickname N]
+       python3 results_store.py [--db DB] collect PLATFORM NICKNAME --setup HASH [--flow-dir DIR]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+import orfs_metrics
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DB = os.path.normpath(os.path.join(SCRIPT_DIR, "../build/results.db"))
+
+# Headline columns of the runs table, filled from the collected record.
+RUN_VALUES = ["wns", "tns", "design_area", "utilization", "synth_area", "die_area", "elapsed_s", "peak_memory_kb"]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    nickname TEXT NOT NULL,
+    setup_sha256 TEXT NOT NULL,
+    platform TEXT,
+    variant TEXT,
+    status TEXT,
+    final INTEGER,
+    collected_at REAL,
+    report TEXT,
+    setup TEXT,
+    {", ".join(f"{name} REAL" for name in RUN_VALUES)},
+    UNIQUE (nickname, setup_sha256)
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    text TEXT,
+    PRIMARY KEY (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS steps (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    step TEXT NOT NULL,
+    elapsed_s REAL,
+    cpu_s REAL,
+    peak_memory_kb INTEGER,
+    PRIMARY KEY (run_id, step)
+);
+CREATE INDEX IF NOT EXISTS metrics_name ON metrics (name);
+"""
+
+def connect(db_path=RESULTS_DB):
+    """Open (and create if needed) the results store."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+def store_run(conn, record, setup_sha256, status=None, setup=None):
+    """Store a record of orfs_metrics.collect(), replacing the run with the same key. Returns the run id."""
+    with conn:
+        conn.execute("DELETE FROM runs WHERE nickname = ? AND setup_sha256 = ?",
+                     (record["nickname"], setup_sha256))
+        columns = ["nickname", "setup_sha256", "platform", "variant", "status", "final", "collected_at",
+                   "report", "setup"] + RUN_VALUES
+        values = [record["nickname"], setup_sha256, record["platform"], record["variant"], status,
+                  int(record["final"]), record["collected_at"], record["report"],
+                  json.dumps(setup, sort_keys=True) if setup is not None else None]
+        values += [record[name] for name in RUN_VALUES]
+        cursor = conn.execute(f"INSERT INTO runs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                              values)
+        run_id = cursor.lastrowid
+        conn.executemany("INSERT INTO metrics (run_id, name, value, text) VALUES (?, ?, ?, ?)", [
+            (run_id, name, value if isinstance(value, (int, float)) and not isinstance(value, bool) else None,
+             None if isinstance(value, (int, float)) and not isinstance(value, bool) else json.dumps(value))
+            for name, value in record["metrics"].items()])
+        conn.executemany("INSERT INTO steps (run_id, step, elapsed_s, cpu_s, peak_memory_kb) VALUES (?, ?, ?, ?, ?)",
+                         [(run_id, step["step"], step["elapsed_s"], step["cpu_s"], step["peak_memory_kb"])
+                          for step in record["steps"]])
+    return run_id
+
+def find_runs(conn, nickname=None, setup_sha256=None):
+    """Runs as dicts, most recent first. setup_sha256 may be a prefix."""
+    query = "SELECT * FROM runs WHERE 1"
+    params = []
+    if nickname:
+        query += " AND nickname = ?"
+        params.append(nickname)
+    if setup_sha256:
+        query += " AND setup_sha256 LIKE ?"
+        params.append(f"{setup_sha256}%")
+    return [dict(row) for row in conn.execute(query + " ORDER BY collected_at DESC", params)]
+
+def run_metrics(conn, run_id):
+    """All metrics of a run as a dict."""
+    return {row["name"]: row["value"] if row["text"] is None else json.loads(row["text"])
+            for row in conn.execute("SELECT name, value, text FROM metrics WHERE run_id = ? ORDER BY name",
+                                    (run_id,))}
+
+def run_steps(conn, run_id):
+    return [dict(row) for row in conn.execute(
+        "SELECT step, elapsed_s, cpu_s, peak_memory_kb FROM steps WHERE run_id = ? ORDER BY step", (run_id,))]
+
+def metric_values(conn, name, nickname=None):
+    """(nickname, setup_sha256, value) of one metric across the runs, most recent first."""
+    query = ("SELECT runs.nickname, runs.setup_sha256, metrics.value FROM metrics "
+             "JOIN runs ON runs.id = metrics.run_id WHERE metrics.name = ?")
+    params = [name]
+    if nickname:
+        query += " AND runs.nickname = ?"
+        params.append(nickname)
+    return [tuple(row) for row in conn.execute(query + " ORDER BY runs.collected_at DESC", params)]
+
+def _format(value, spec):
+    return f"{value:{spec}}" if value is not None else f"{'-':>{spec.split('.')[0].lstrip('>')}}"
+
+def print_runs(runs):
+    print(f"{'nickname':<32} {'setup':<12} {'status':<7} {'wns':>9} {'tns':>11} {'area':>12} {'util %':>7} "
+          f"{'elapsed s':>10} {'peak MB':>8}")
+    for run in runs:
+        peak_mb = run["peak_memory_kb"] / 1024 if run["peak_memory_kb"] is not None else None
+        print(f"{run['nickname']:<32} {run['setup_sha256'][:12]:<12} {run['status'] or '-':<7} "
+              f"{_format(run['wns'], '9.3f')} {_format(run['tns'], '11.3f')} {_format(run['design_area'], '12.1f')} "
+              f"{_format(run['utilization'], '7.1f')} {_format(run['elapsed_s'], '10.1f')} {_format(peak_mb, '8.0f')}")
+
+def print_run(conn, run):
+    print_runs([run])
+    print(f"\nsetup {run['setup_sha256']}, {'final layout' if run['final'] else 'no final layout'}, "
+          f"reports up to {run['report'] or '-'}, synth area {_format(run['synth_area'], '.1f')}, "
+          f"die area {_format(run['die_area'], '.1f')}")
+    print(f"\n{'step':<28} {'elapsed s':>10} {'cpu s':>10} {'peak MB':>8}")
+    for step in run_steps(conn, run["id"]):
+        peak_mb = step["peak_memory_kb"] / 1024 if step["peak_memory_kb"] is not None else None
+        print(f"{step['step']:<28} {_format(step['elapsed_s'], '10.1f')} {_format(step['cpu_s'], '10.1f')} "
+              f"{_format(peak_mb, '8.0f')}")
+    metrics = run_metrics(conn, run["id"])
+    if metrics:
+        print(f"\n{len(metrics)} metrics:")
+        for name, value in metrics.items():
+            print(f"  {name} = {value}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the ORFS results store.")
+    parser.add_argument("--db", default=RESULTS_DB, help=f"results database (default: {RESULTS_DB})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    list_parser = subparsers.add_parser("list", help="list the stored runs")
+    list_parser.add_argument("--nickname")
+    show_parser = subparsers.add_parser("show", help="show the steps and metrics of a run")
+    show_parser.add_argument("nickname")
+    show_parser.add_argument("--setup", help="setup hash or prefix (default: the latest run)")
+    metric_parser = subparsers.add_parser("metric", help="show one metric across the runs")
+    metric_parser.add_argument("name")
+    metric_parser.add_argument("--nickname")
+    collect_parser = subparsers.add_parser("collect", help="collect the ORFS outputs of a design into the store")
+    collect_parser.add_argument("platform")
+    collect_parser.add_argument("nickname")
+    collect_parser.add_argument("--setup", required=True, help="setup hash the run is stored under")
+    collect_parser.add_argument("--variant", default="base")
+    collect_parser.add_argument("--flow-dir", default=orfs_metrics.FLOW_DIR)
+    collect_parser.add_argument("--status", default=None)
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    if args.command == "list":
+        print_runs(find_runs(conn, args.nickname))
+    elif args.command == "show":
+        runs = find_runs(conn, args.nickname, args.setup)
+        if not runs:
+            print(f"Error: no run of {args.nickname} in {args.db}")
+            sys.exit(1)
+        print_run(conn, runs[0])
+    elif args.command == "metric":
+        for nickname, setup_sha256, value in metric_values(conn, args.name, args.nickname):
+            print(f"{nickname:<32} {setup_sha256[:12]:<12} {value}")
+    else:
+        record = orfs_metrics.collect(args.platform, args.nickname, args.variant, args.flow_dir)
+        store_run(conn, record, args.setup, status=args.status)
+        print_runs(find_runs(conn, args.nickname, args.setup))
+    conn.close()
+
+if __name__ == "__main__":
+    main()
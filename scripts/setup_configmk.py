@@ -1,40 +1,65 @@
+import io
 import json
 import os
+import sys
 
-# Ensure build directory exists
-os.makedirs('../build', exist_ok=True)
+import die_estimate
+import generate_top
+import macro_placement
+import reset_tree
 
-# Load setup.json
-with open('../setup.json', 'r') as f:
-    setup = json.load(f)
+# Directory Paths
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SETUP_FILE = os.path.join(SCRIPT_DIR, '../setup.json')
+OUT_DIR = os.path.join(SCRIPT_DIR, '../build')
 
-# Extract configuration sections
-config = setup["config_mk"]
-platform = config["PLATFORM"]
-design_name = config["DESIGN_NAME"]
-design_nickname = config["DESIGN_NICKNAME"]
-
-constraint_sdc = setup.get("constraint_sdc", {})
-macro_cfg = setup.get("macro_config", {})
-manual_area_cfg = setup.get("manual_area_config", {})
-generate_files = setup.get("generate_files", [])
-
-# Flags
-macro_enabled = macro_cfg.get("enable", False)
-macro_add_annealing = macro_cfg.get("add_place_pins_args", False)
-top_add_annealing = setup.get("add_place_pins_args", False)
-manual_area_enabled = manual_area_cfg.get("enable", False)
+# Output files this script can write, selectable on the command line.
+OUTPUTS = ["config.mk", "constraint.sdc", "generate_files", "block.mk"]
 
 # -----------------------------------------------------------------------------
 # Write to config.mk
 # -----------------------------------------------------------------------------
 
-with open('../build/config.mk', 'w') as f:
+def block_names(setup):
+    """Blocks hardened as macros: the tile module of a tiled array, else the macro_names of macro_config."""
+    tile_module = generate_top.parse_tile_module(setup)
+    if tile_module:
+        return [tile_module]
+    return (setup.get("macro_config", {}).get("macro_names") or "").split()
+
+def render_config_mk(setup):
+    config = setup["config_mk"]
+    platform = config["PLATFORM"]
+    design_nickname = config["DESIGN_NICKNAME"]
+    macro_cfg = setup.get("macro_config", {})
+    manual_area_cfg = setup.get("manual_area_config", {})
+
+    # Flags
+    macro_enabled = macro_cfg.get("enable", False)
+    macro_add_annealing = macro_cfg.get("add_place_pins_args", False)
+    top_add_annealing = setup.get("add_place_pins_args", False)
+    # Grid placement of the macros sets the die and core area itself, then the
+    # manual area, then the die estimate.
+    grid_placement = macro_placement.is_enabled(setup)
+    manual_area_enabled = manual_area_cfg.get("enable", False) and not grid_placement
+    estimated_area = die_estimate.writes_floorplan(setup)
+    design_dir = f"./designs/{platform}/{design_nickname}"
+
+    f = io.StringIO()
     for key, value in config.items():
-        if manual_area_enabled and key == "CORE_UTILIZATION":
+        if (manual_area_enabled or grid_placement or estimated_area) and key == "CORE_UTILIZATION":
             continue  # Skip writing CORE_UTILIZATION if manual area is enabled
         f.write(f"export {key} = {value}\n")
 
+    if grid_placement:
+        # Written by run-flow.py once the size of the hardened macro is known (see macro_placement.py).
+        f.write(f"export MACRO_PLACEMENT_TCL = {design_dir}/{macro_placement.PLACEMENT_FILE}\n")
+        f.write(f"-include {design_dir}/{macro_placement.AREA_FILE}\n")
+
+    if estimated_area:
+        # Written by run-flow.py after synthesis (see die_estimate.py).
+        f.write(f"-include {design_dir}/{die_estimate.ESTIMATE_FILE}\n")
+
     if manual_area_enabled:
         die_area = manual_area_cfg.get("DIE_AREA", [])
         core_area = manual_area_cfg.get("CORE_AREA", [])
@@ -47,19 +72,23 @@ with open('../build/config.mk', 'w') as f:
         f.write("export PLACE_PINS_ARGS = -annealing\n")
 
     if macro_enabled:
-        f.write(f"export BLOCKS ?= {macro_cfg['macro_names']}\n")
+        f.write(f"export BLOCKS ?= {' '.join(block_names(setup))}\n")
         f.write("export SYNTH_HIERARCHICAL = 1\n")
 
     f.write(f"export VERILOG_FILES = $(sort $(wildcard ./designs/src/{design_nickname}/*.v))\n")
     f.write(f"export SDC_FILE      = ./designs/{platform}/{design_nickname}/constraint.sdc\n")
     f.write(f"export GND_NETS_VOLTAGES      =\n")
     f.write(f"export PWR_NETS_VOLTAGES      =\n")
+    return f.getvalue()
 
 # -----------------------------------------------------------------------------
 # Write to constraint.sdc
 # -----------------------------------------------------------------------------
 
-with open('../build/constraint.sdc', 'w') as f:
+def render_constraint_sdc(setup):
+    constraint_sdc = setup.get("constraint_sdc", {})
+
+    f = io.StringIO()
     clk_period = constraint_sdc.get("clk_period", 475)
     clk_io_pct = constraint_sdc.get("clk_io_pct", 0.3)
     f.write("set clk_name  clk\n")
@@ -72,29 +101,96 @@ with open('../build/constraint.sdc', 'w') as f:
     f.write("set_input_delay  [expr $clk_period * $clk_io_pct] -clock $clk_name $non_clock_inputs\n")
     f.write("set_output_delay [expr $clk_period * $clk_io_pct] -clock $clk_name [all_outputs]\n")
 
+    tree_options = reset_tree.parse_reset_tree(setup)
+    if tree_options:
+        # The tree registers are single-cycle register-to-register paths, timed like the
+        # data paths by the constraints above: no false path or multicycle exception.
+        # The fanout bound is structural, the kept stage hierarchy stops synthesis from
+        # merging the registers, and an SDC max fanout can only be set on ports or the
+        # whole design, so none is written.
+        f.write(f"\n# Pipelined {tree_options['group']} tree of {' '.join(tree_options['ports'])} "
+                f"(generate_files reset_tree): the ports only drive\n")
+        f.write(f"# the root register and every tree register drives at most {tree_options['fanout']} loads, "
+                f"the paths are\n")
+        f.write(f"# timed by the constraints above. The added latency is reported in {reset_tree.REPORT_FILE}.\n")
+    return f.getvalue()
+
 # -----------------------------------------------------------------------------
 # Write to generate_files
 # -----------------------------------------------------------------------------
 
-with open('../build/generate_files', 'w') as f:
+def render_generate_files(setup):
+    generate_files = setup.get("generate_files", [])
+
+    f = io.StringIO()
     for entry in generate_files:
         f.write(f"submodules = {entry['submodules']}\n")
         f.write(f"connection = {entry['connection']}\n")
         if 'top_submodule' in entry:
             f.write(f"top_submodule = {entry['top_submodule']}\n")
+    return f.getvalue()
 
 # -----------------------------------------------------------------------------
 # Conditionally write block.mk (only if macro_enabled)
 # -----------------------------------------------------------------------------
 
-if macro_enabled:
-    with open('../build/block.mk', 'w') as f:
-        f.write(f"export PLATFORM = {macro_cfg['PLATFORM']}\n")
-        f.write(f"export CORE_UTILIZATION = {macro_cfg['CORE_UTILIZATION']}\n")  # Always keep this in block.mk
-        f.write(f"export CORE_ASPECT_RATIO = {macro_cfg['CORE_ASPECT_RATIO']}\n")
-        f.write(f"export CORE_MARGIN = {macro_cfg['CORE_MARGIN']}\n")
-        f.write(f"export PLACE_DENSITY = {macro_cfg['PLACE_DENSITY']}\n")
-        if macro_add_annealing:
-            f.write("export PLACE_PINS_ARGS = -annealing\n")
-        f.write(f"export VERILOG_FILES = $(sort $(wildcard ./designs/src/{design_nickname}/*.v))\n")
-        f.write(f"export SDC_FILE      = ./designs/{platform}/{design_nickname}/constraint.sdc\n")
+def render_block_mk(setup):
+    config = setup["config_mk"]
+    platform = config["PLATFORM"]
+    design_nickname = config["DESIGN_NICKNAME"]
+    macro_cfg = setup.get("macro_config", {})
+    macro_add_annealing = macro_cfg.get("add_place_pins_args", False)
+
+    if not macro_cfg.get("enable", False):
+        return
+
+    f = io.StringIO()
+    f.write(f"export PLATFORM = {macro_cfg['PLATFORM']}\n")
+    f.write(f"export CORE_UTILIZATION = {macro_cfg['CORE_UTILIZATION']}\n")  # Always keep this in block.mk
+    f.write(f"export CORE_ASPECT_RATIO = {macro_cfg['CORE_ASPECT_RATIO']}\n")
+    f.write(f"export CORE_MARGIN = {macro_cfg['CORE_MARGIN']}\n")
+    f.write(f"export PLACE_DENSITY = {macro_cfg['PLACE_DENSITY']}\n")
+    if macro_add_annealing:
+        f.write("export PLACE_PINS_ARGS = -annealing\n")
+    f.write(f"export VERILOG_FILES = $(sort $(wildcard ./designs/src/{design_nickname}/*.v))\n")
+    f.write(f"export SDC_FILE      = ./designs/{platform}/{design_nickname}/constraint.sdc\n")
+    return f.getvalue()
+
+RENDERERS = {
+    "config.mk": render_config_mk,
+    "constraint.sdc": render_constraint_sdc,
+    "generate_files": render_generate_files,
+    "block.mk": render_block_mk
+}
+
+def render_outputs(setup, outputs=OUTPUTS):
+    """Render the requested outputs, returns a dict of file name to contents (None if not applicable)."""
+    return {name: RENDERERS[name](setup) for name in outputs}
+
+def write_outputs(rendered, out_dir=OUT_DIR):
+    """Write rendered outputs into out_dir, skipping the ones that are not applicable."""
+    # Ensure build directory exists
+    os.makedirs(out_dir, exist_ok=True)
+
+    for name, contents in rendered.items():
+        if contents is None:
+            continue
+        with open(os.path.join(out_dir, name), 'w') as f:
+            f.write(contents)
+
+def main(argv):
+    """Write the requested outputs (all of them by default) from setup.json into the build directory."""
+    outputs = argv or OUTPUTS
+    unknown = [name for name in outputs if name not in RENDERERS]
+    if unknown:
+        print(f"Error: unknown output(s) {', '.join(unknown)}, expected one of {', '.join(OUTPUTS)}")
+        sys.exit(1)
+
+    # Load setup.json
+    with open(SETUP_FILE, 'r') as f:
+        setup = json.load(f)
+
+    write_outputs(render_outputs(setup, outputs))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
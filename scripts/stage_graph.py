@@ -0,0 +1,194 @@
+"""
+Dependency-tracked stage graph with incremental re-execution.
+
+A stage declares the files it reads (inputs), the configuration values it
+depends on (values) and the files it writes (outputs). Dependencies between
+stages are inferred from matching output and input paths. A stage is skipped
+when the fingerprint of its inputs and values matches the last successful run
+and its outputs are still intact. Independent stages run concurrently.
+"""
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+STATE_FILE = ".stage_state.json"
+
+_print_lock = threading.Lock()
+
+def log(message):
+    """Print a line without interleaving it with messages from concurrent stages."""
+    with _print_lock:
+        print(message, flush=True)
+
+def stage(name, action, inputs=(), outputs=(), values=None, always=False):
+    """
+    Declare a stage.
+
+    -name - Unique stage name
+    -action - Callable taking no arguments, returns True on success
+    -inputs - Files read by the stage
+    -outputs - Files written by the stage
+    -values - JSON-serializable configuration the stage depends on
+    -always - Run the stage even if its fingerprint is unchanged
+    """
+    return {
+        "name": name,
+        "action": action,
+        "inputs": [os.path.abspath(path) for path in inputs],
+        "outputs": [os.path.abspath(path) for path in outputs],
+        "values": values,
+        "always": always
+    }
+
+class FileHasher:
+    """Content hashes of files, memoized on (size, mtime) for the lifetime of a run."""
+
+    def __init__(self):
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def hash(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            cached = self._memo.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        value = digest.hexdigest()
+        with self._lock:
+            self._memo[path] = (stamp, value)
+        return value
+
+def load_state(state_dir):
+    path = os.path.join(state_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state_dir, state):
+    os.makedirs(state_dir, exist_ok=True)
+    path = os.path.join(state_dir, STATE_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def fingerprint(stage_def, hasher):
+    """Hash the stage inputs (by content) and configuration values."""
+    digest = hashlib.sha256()
+    for path in sorted(stage_def["inputs"]):
+        digest.update(f"{path}={hasher.hash(path)}\n".encode())
+    digest.update(json.dumps(stage_def["values"], sort_keys=True).encode())
+    return digest.hexdigest()
+
+def _outputs_intact(stage_def, record, hasher):
+    recorded = record.get("outputs", {})
+    for path in stage_def["outputs"]:
+        if path not in recorded or hasher.hash(path) != recorded[path]:
+            return False
+    return True
+
+def resolve_dependencies(stages):
+    """Map each stage name to the names of the stages producing its inputs."""
+    producers = {}
+    for stage_def in stages:
+        for path in stage_def["outputs"]:
+            if path in producers:
+                raise ValueError(f"Output {path} is produced by both "
+                                 f"'{producers[path]}' and '{stage_def['name']}'")
+            producers[path] = stage_def["name"]
+
+    deps = {}
+    for stage_def in stages:
+        deps[stage_def["name"]] = sorted({producers[path] for path in stage_def["inputs"]
+                                          if path in producers and producers[path] != stage_def["name"]})
+    return deps
+
+def run_stages(stages, state_dir, force=False, max_workers=None):
+    """
+    Run the stage graph. Returns a dict mapping stage names to one of
+    "ran", "skipped", "failed" or "blocked" (a dependency failed).
+    """
+    by_name = {stage_def["name"]: stage_def for stage_def in stages}
+    deps = resolve_dependencies(stages)
+    state = load_state(state_dir)
+    state_lock = threading.Lock()
+    hasher = FileHasher()
+    status = {}
+
+    def execute(stage_def):
+        name = stage_def["name"]
+        digest = fingerprint(stage_def, hasher)
+        record = state.get(name, {})
+        if (not force and not stage_def["always"] and record.get("fingerprint") == digest
+                and _outputs_intact(stage_def, record, hasher)):
+            log(f"[{name}] up to date, skipped")
+            return "skipped"
+
+        log(f"[{name}] running")
+        if not stage_def["action"]():
+            with state_lock:
+                state.pop(name, None)
+            return "failed"
+
+        missing = [path for path in stage_def["outputs"] if not os.path.exists(path)]
+        if missing:
+            log(f"[{name}] Error: expected outputs not produced: {', '.join(missing)}")
+            with state_lock:
+                state.pop(name, None)
+            return "failed"
+
+        with state_lock:
+            state[name] = {
+                "fingerprint": digest,
+                "outputs": {path: hasher.hash(path) for path in stage_def["outputs"]}
+            }
+            save_state(state_dir, state)
+        return "ran"
+
+    pending = {stage_def["name"] for stage_def in stages}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            # Block stages whose dependencies failed, submit the ones that are ready.
+            for name in sorted(pending):
+                dep_status = [status.get(dep) for dep in deps[name]]
+                if any(s in ("failed", "blocked") for s in dep_status):
+                    status[name] = "blocked"
+                    pending.discard(name)
+                    log(f"[{name}] blocked by a failed dependency")
+                elif all(s in ("ran", "skipped") for s in dep_status):
+                    pending.discard(name)
+                    running[pool.submit(execute, by_name[name])] = name
+
+            if not running:
+                # Remaining stages wait on each other, the graph has a cycle.
+                for name in sorted(pending):
+                    status[name] = "blocked"
+                    log(f"[{name}] Error: dependency cycle")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    status[name] = future.result()
+                except Exception as e:
+                    log(f"[{name}] Error: {e}")
+                    status[name] = "failed"
+
+    with state_lock:
+        save_state(state_dir, state)
+    return status
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Design-space exploration over the setup.json knobs.
+
+Usage: python3 sweep.py --param clk_period=400,475,550 --param PLACE_DENSITY=0.4:0.7:0.1
+                        [--param dimensions=2x2,4x4] [--random N [--seed S]] [-j N]
+                        [--prune-margin 0.05 | --no-prune] [-- RUN_FLOW_OPTIONS]
+
+A parameter is one of the short names in PARAMETERS or a dotted setup.json path
+(constraint_sdc.clk_io_pct), its values a comma-separated list, a lo:hi:step
+range, or with --random a lo:hi interval sampled uniformly. dimensions take
+ROWSxCOLS values and are applied to a copy of the systolic array YAML.
+
+The grid (or --random samples of it) is expanded into design variants v000,
+v001, ... under <sweep-dir>/, each with its own setup, build directory and ORFS
+nickname (<nickname>_<variant>), and run in parallel by batch_runner.py.
+
+Every variant is scored by area (die area once floorplanned, the synthesized
+area before that) and throughput (PEs per achieved clock period, the period
+minus the worst setup slack). While the variants run, the cheap estimates after
+synthesis and floorplan are compared with the finished variants and with the
+other variants at the same step: a variant dominated by one of them (no better
+in both, worse by more than the margin in one) is stopped. Stopping a variant
+interrupts make, except with the pool executor where the make run inside the
+container finishes on its own. The Pareto front of the finished variants is
+printed and the results are written to <sweep-dir>/sweep.json.
+"""
+import argparse
+import copy
+import itertools
+import json
+import os
+import random
+import sys
+
+import yaml
+
+import batch_runner
+import orfs_metrics
+import pipeline
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SWEEP_DIR = os.path.join(SCRIPT_DIR, "../build/sweep")
+RESULT_FILE = "sweep.json"
+
+# Short parameter names and their setup.json locations.
+PARAMETERS = {
+    "clk_period": ("constraint_sdc", "clk_period"),
+    "clk_io_pct": ("constraint_sdc", "clk_io_pct"),
+    "PLACE_DENSITY": ("config_mk", "PLACE_DENSITY"),
+    "CORE_UTILIZATION": ("config_mk", "CORE_UTILIZATION"),
+    "CORE_ASPECT_RATIO": ("config_mk", "CORE_ASPECT_RATIO"),
+    "dimensions": None
+}
+
+# Metric preferences, the die area only exists from the floorplan on.
+AREA_METRICS = ["design__die__area", "design__instance__area"]
+SLACK_METRICS = ["timing__setup__ws"]
+
+def parse_value(text):
+    """A parameter value: ROWSxCOLS dimensions, a number, or JSON text."""
+    text = text.strip()
+    if "x" in text.lower() and all(part.isdigit() for part in text.lower().split("x")):
+        return [int(part) for part in text.lower().split("x")]
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def parse_param(text, random_mode):
+    """NAME=VALUES into (name, list of values) or (name, (lo, hi)) for a random interval."""
+    name, sep, values = text.partition("=")
+    if not sep or not values:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUES, got {text!r}")
+    if name not in PARAMETERS and "." not in name:
+        raise argparse.ArgumentTypeError(f"unknown parameter {name!r}, expected one of "
+                                         f"{', '.join(PARAMETERS)} or a dotted setup.json path")
+    if ":" in values and "," not in values:
+        bounds = [parse_value(value) for value in values.split(":")]
+        if len(bounds) == 2 and random_mode:
+            return name, tuple(bounds)
+        if len(bounds) != 3:
+            raise argparse.ArgumentTypeError(f"expected lo:hi:step for {name}, got {values!r}")
+        lo, hi, step = bounds
+        count = int(round((hi - lo) / step)) + 1
+        return name, [round(lo + index * step, 9) for index in range(count)]
+    return name, [parse_value(value) for value in values.split(",")]
+
+def expand(params, samples=None, seed=None):
+    """Variant parameter dicts, the full grid or samples random points without repetition."""
+    names = [name for name, _ in params]
+    if samples is None:
+        for name, values in params:
+            if isinstance(values, tuple):
+                print(f"Error: {name} is an interval, only valid with --random")
+                return None
+        return [dict(zip(names, combination)) for combination in itertools.product(*(v for _, v in params))]
+
+    rng = random.Random(seed)
+    variants = []
+    seen = set()
+    for _ in range(samples * 10):
+        if len(variants) == samples:
+            break
+        point = {}
+        for name, values in params:
+            if isinstance(values, tuple):
+                lo, hi = values
+                point[name] = rng.randint(lo, hi) if isinstance(lo, int) and isinstance(hi, int) \
+                    else round(rng.uniform(lo, hi), 3)
+            else:
+                point[name] = rng.choice(values)
+        key = json.dumps(point, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            variants.append(point)
+    return variants
+
+def apply_variant(base_setup, point, name, job_dir, src_dir=pipeline.SRC_DIR):
+    """The setup of a variant, writing its systolic array YAML into job_dir when dimensions are swept."""
+    setup = copy.deepcopy(base_setup)
+    config = setup.setdefault("config_mk", {})
+    config["DESIGN_NICKNAME"] = f"{config['DESIGN_NICKNAME']}_{name}"
+    for param, value in point.items():
+        if param == "dimensions":
+            continue
+        section, key = PARAMETERS.get(param) or param.split(".", 1)
+        setup.setdefault(section, {})[key] = value
+
+    if "dimensions" in point:
+        array_yaml = pipeline.frontend_files(base_setup, src_dir)["array_yaml"]
+        with open(array_yaml, "r") as f:
+            array_config = yaml.safe_load(f)
+        # The array netlist follows dimensions, the array instances are kept consistent with it.
+        array_config["dimensions"] = list(point["dimensions"])
+        for instance in array_config.get("instances", []):
+            if "array" in instance:
+                instance["array"] = list(point["dimensions"])
+        variant_yaml = os.path.join(job_dir, "systolic_array.yaml")
+        with open(variant_yaml, "w") as f:
+            yaml.safe_dump(array_config, f, sort_keys=False)
+        generate_files = setup.setdefault("generate_files", [{}])
+        generate_files[0]["array_yaml"] = os.path.abspath(variant_yaml)
+    return setup
+
+def pe_count(setup, src_dir=pipeline.SRC_DIR):
+    array_yaml = pipeline.frontend_files(setup, src_dir)["array_yaml"]
+    with open(array_yaml, "r") as f:
+        rows, cols = yaml.safe_load(f)["dimensions"][:2]
+    return rows * cols
+
+def _fresh(path, since):
+    """path exists and was written by the current run of the variant."""
+    try:
+        return os.path.getmtime(path) >= since
+    except OSError:
+        return False
+
+def variant_point(job, final=False):
+    """
+    Area and throughput of a variant at the latest step it reached in its current
+    run: "final" (with final=True), "floorplan" or "synth". None before synthesis.
+    """
+    dirs = orfs_metrics.design_dirs(job["platform"], job["nickname"])
+    since = job.get("started_at", 0)
+    area = slack = None
+    if final:
+        metrics = orfs_metrics.load_metrics(dirs["logs"])
+        for stage in orfs_metrics.LATEST_STAGES:
+            area = orfs_metrics.stage_metric(metrics, stage, AREA_METRICS)
+            if area is not None:
+                slack = orfs_metrics.stage_metric(metrics, stage, SLACK_METRICS)
+                break
+        stage = "final"
+    elif _fresh(os.path.join(dirs["logs"], "2_1_floorplan.json"), since):
+        metrics = orfs_metrics.load_step_metrics(dirs["logs"], "2_1_floorplan")
+        area = orfs_metrics.stage_metric(metrics, "floorplan", AREA_METRICS)
+        slack = orfs_metrics.stage_metric(metrics, "floorplan", SLACK_METRICS)
+        stage = "floorplan"
+    elif _fresh(os.path.join(dirs["reports"], "synth_stat.txt"), since):
+        area = orfs_metrics.synth_area(dirs["reports"])
+        stage = "synth"
+    if area is None:
+        return None
+    # Timing is assumed met until a slack is reported.
+    period = job["clk_period"] - (slack or 0)
+    return {"stage": stage, "area": area, "period": period,
+            "throughput": job["pes"] / period if period > 0 else 0.0}
+
+def dominates(a, b, margin=0.0):
+    """a is no worse than b in area and throughput, and better by more than margin in one."""
+    if a["area"] > b["area"] or a["throughput"] < b["throughput"]:
+        return False
+    return a["area"] * (1 + margin) < b["area"] or a["throughput"] > b["throughput"] * (1 + margin)
+
+def pareto_front(points):
+    """Names of the non-dominated points of {name: point}."""
+    return sorted(name for name, point in points.items()
+                  if not any(dominates(other, point) for other_name, other in points.items()
+                             if other_name != name))
+
+def make_monitor(jobs, margin):
+    """Pruning monitor for batch_runner.run_jobs."""
+    def finished_point(job):
+        if "final_point" not in job:
+            job["final_point"] = variant_point(job, final=True)
+        return job["final_point"]
+
+    def monitor(job):
+        point = variant_point(job)
+        job["point"] = point
+        if point is None:
+            return None
+        for other in jobs:
+            if other is job or other.get("pruned"):
+                continue
+            if other.get("returncode") == 0:
+                other_point = finished_point(other)
+            elif other.get("returncode") is None and other.get("point") and \
+                    other["point"]["stage"] == point["stage"]:
+                other_point = other["point"]
+            else:
+                continue
+            if other_point and dominates(other_point, point, margin):
+                return (f"{point['stage']} estimate (area {point['area']:.1f}, period {point['period']:.1f}) "
+                        f"dominated by {other['name']}")
+        return None
+    return monitor
+
+def print_results(results, front):
+    params = sorted({param for result in results for param in result["params"]})
+    header = " ".join(f"{param:>16}" for param in params)
+    print(f"{'variant':<8} {header} {'status':<8} {'step':<9} {'area':>12} {'period':>9} {'throughput':>11}  pareto")
+    for result in results:
+        values = " ".join(f"{json.dumps(result['params'].get(param)):>16}" for param in params)
+        point = result["point"] or {}
+        metrics = (f"{point['area']:12.1f} {point['period']:9.1f} {point['throughput']:11.5f}" if point
+                   else f"{'-':>12} {'-':>9} {'-':>11}")
+        mark = "*" if result["name"] in front else ""
+        print(f"{result['name']:<8} {values} {result['status']:<8} {point.get('stage', '-'):<9} {metrics}  {mark}")
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    run_flow_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, run_flow_args = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description="Sweep setup.json knobs and report the Pareto front.",
+                                     epilog="Options after -- are passed on to run-flow.py.")
+    parser.add_argument("--base", default=pipeline.SETUP_FILE, help="setup the variants start from")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUES",
+                        help="swept parameter, repeatable")
+    parser.add_argument("--random", type=int, default=None, metavar="N", help="run N random points instead of the grid")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random search")
+    parser.add_argument("--sweep-dir", default=SWEEP_DIR, help="directory receiving the variants")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="maximum number of concurrent variants")
+    parser.add_argument("--cpus-per-job", type=int, default=None, help="NUM_CORES given to every variant")
+    parser.add_argument("--max-memory", type=int, default=None, help="memory budget in MB of the running variants")
+    parser.add_argument("--job-memory", type=int, default=batch_runner.DEFAULT_JOB_MEMORY_MB,
+                        help="memory estimate in MB of a variant")
+    parser.add_argument("--prune-margin", type=float, default=0.05,
+                        help="relative margin by which a variant must be dominated to be stopped")
+    parser.add_argument("--no-prune", action="store_true", help="run every variant to the end")
+    args = parser.parse_args(argv)
+
+    try:
+        params = [parse_param(text, args.random is not None) for text in args.param]
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    if not params:
+        parser.error("no --param given")
+    points = expand(params, args.random, args.seed)
+    if not points:
+        sys.exit(1)
+
+    base_setup = pipeline.load_setup(args.base)
+    sweep_dir = os.path.abspath(args.sweep_dir)
+    setup_files = []
+    for index, point in enumerate(points):
+        name = f"v{index:03d}"
+        job_dir = os.path.join(sweep_dir, name)
+        os.makedirs(job_dir, exist_ok=True)
+        setup_file = os.path.join(job_dir, "setup.json")
+        with open(setup_file, "w") as f:
+            json.dump(apply_variant(base_setup, point, name, job_dir), f, indent=2)
+        setup_files.append(setup_file)
+
+    jobs = batch_runner.prepare_jobs(setup_files, sweep_dir, args.job_memory)
+    if jobs is None:
+        sys.exit(1)
+    for job, point in zip(jobs, points):
+        setup = pipeline.load_setup(job["setup"])
+        job["params"] = point
+        job["platform"] = setup["config_mk"]["PLATFORM"]
+        job["clk_period"] = setup.get("constraint_sdc", {}).get("clk_period", 475)
+        job["pes"] = pe_count(setup)
+
+    max_jobs, cpus_per_job, max_memory = batch_runner.resolve_limits(len(jobs), args.jobs, args.cpus_per_job,
+                                                                     args.max_memory)
+    print(f"Sweeping {len(jobs)} variants, {max_jobs} at a time with {cpus_per_job} CPUs each")
+
+    monitor = None if args.no_prune else make_monitor(jobs, args.prune_margin)
+    batch_runner.run_jobs(jobs, run_flow_args, max_jobs, cpus_per_job, max_memory, monitor=monitor)
+
+    results = []
+    finished = {}
+    for job in jobs:
+        if job.get("pruned"):
+            status, point = "pruned", job.get("point")
+        elif job.get("returncode") == 0:
+            status, point = "ok", job.get("final_point") or variant_point(job, final=True)
+            if point:
+                finished[job["name"]] = point
+        else:
+            status, point = "failed", variant_point(job)
+        results.append({"name": job["name"], "nickname": job["nickname"], "params": job["params"],
+                        "status": status, "point": point, "pruned": job.get("pruned")})
+    front = pareto_front(finished)
+    for result in results:
+        result["pareto"] = result["name"] in front
+
+    print_results(results, front)
+    with open(os.path.join(sweep_dir, RESULT_FILE), "w") as f:
+        json.dump({"base": os.path.abspath(args.base), "params": {name: list(values) for name, values in params},
+                   "variants": results}, f, indent=2)
+    print(f"Pareto front: {', '.join(front) if front else 'empty'}, results in {os.path.join(sweep_dir, RESULT_FILE)}")
+    if any(result["status"] == "failed" for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -8,246 +8,629 @@ import json
 import re
 import os
 import sys
+from array import array
 
-def generate_systolic_array_json(yaml_file, pe_config_file, json_file):
-    """
-        Generate a JSON description of the systolic array based on the YAML configuration file and the PE module configuration.
+import connection_dsl
+import link_registers
 
-        Parameters:
+# Kinds of nets in an ArrayNetlist. A net is stored as its kind and NET_ARGS integers,
+# its name is only formatted when the netlist is serialized (see ArrayNetlist.net_name).
+NET_TOP = 0     # top-level port of the YAML: (index in top_port_names)
+NET_EDGE = 1    # edge port of a row or column: (slot, row or column index)
+NET_RESULT = 2  # result port of a PE: (slot, PE index i*cols+j)
+NET_LINK = 3    # link between two PEs: (stem index, i, j, i2, j2)
+NET_NAMED = 4   # net named after a PE port, e.g. clk: (slot)
+NET_TEMPLATE = 5  # top-level port of the YAML connections, e.g. left_in_rsc{i}: (template, field values)
+NET_TREE = 6    # register output of the reset tree, e.g. rst_tree_2_5: (port index, level, index)
+NET_GATHER = 7  # result port of a PE collected by the result network: (slot, PE index i*cols+j)
+NET_STREAM = 8  # edge port of a row or column behind the edge skew: (slot, row or column index)
+NET_CONST = 9   # constant driving a PE input, e.g. 1'b1 on the rdy of a registered link: (value)
+NET_REGISTERED = 10  # register output of a registered link inside a tile: (stem index, i, j, i2, j2)
+NET_ARGS = 5
 
-        -yaml_file - Path to the YAML file containing high-level configuration
-        -pe_config_file - Path to the JSON file containing PE module port definitions
-        -json_file - Path to the output JSON file
-    """
-    # Load YAML configuration
-    with open(yaml_file, 'r') as f:
-        config = yaml.safe_load(f)
-    
-    # Load PE module configuration
-    with open(pe_config_file, 'r') as f:
-        pe_config = json.load(f)
-    
-    # Initialize JSON structure
-    json_data = {
-        "top_module": config["top_module"],
-        "top_ports": {},
-        "instances": {}
-    }
-    
-    # Process top ports
-    for port in config.get("top_ports", []):
-        json_data["top_ports"][port["name"]] = {
-            "direction": port["direction"],
-            "width": port["width"]
-        }
-    
-    # Get dimensions from YAML
-    dimensions = config["dimensions"]
-    rows, cols = dimensions[0], dimensions[1]
-    
-    # Extract port names and info from PE config
-    pe_ports = pe_config["ports"]
-    
-    # Copy all fields from the original port definitions
-    def create_port_copy(port_info):
-        return {key: value for key, value in port_info.items()}
-    
-    # Standard port groupings
-    port_groups = {
+# Link wire names by port suffix, e.g. data_PE_0_0_to_PE_0_1.
+LINK_STEMS = {"_dat": "data", "_vld": "val", "_rdy": "rdy"}
+
+def group_pe_ports(pe_ports):
+    """Group the PE ports by the standard naming conventions (left_in, right_out, up_in, down_out, result_out)."""
+    return {
         "left": [name for name in pe_ports if name.startswith("left_in")],
         "right": [name for name in pe_ports if name.startswith("right_out")],
         "up": [name for name in pe_ports if name.startswith("up_in")],
         "down": [name for name in pe_ports if name.startswith("down_out")],
         "result": [name for name in pe_ports if name.startswith("result_out")]
     }
-    
-    # Basic control ports
-    control_ports = ["clk", "rst"]
-    
-    # Add top-level ports for the systolic array
-    for i in range(rows):
-        # Left edge input ports
-        for port in port_groups["left"]:
-            suffix = port.split("_rsc")[1] if "_rsc" in port else ""
-            port_info = create_port_copy(pe_ports[port])
-            
-            # Create port with index
-            port_name = f"{port.split('_rsc')[0]}_rsc{i}{suffix}"
-            json_data["top_ports"][port_name] = port_info
-        
-        # Right edge output ports
-        for port in port_groups["right"]:
-            suffix = port.split("_rsc")[1] if "_rsc" in port else ""
-            port_info = create_port_copy(pe_ports[port])
-            
-            # Correction: ensure the directions are correct.
-            # The previous inversion logic was incorrect: 
-            # for output ports, dat and vld should remain as output, 
-            # while rdy should remain as input.
-            # port_info["direction"] = "input" if port_info["direction"] == "output" else "output"
-            
-            port_name = f"{port.split('_rsc')[0]}_rsc{i}{suffix}"
-            json_data["top_ports"][port_name] = port_info
-    
-    for j in range(cols):
-        # Top edge input ports
-        for port in port_groups["up"]:
-            suffix = port.split("_rsc")[1] if "_rsc" in port else ""
-            port_info = create_port_copy(pe_ports[port])
-            
-            port_name = f"{port.split('_rsc')[0]}_rsc{j}{suffix}"
-            json_data["top_ports"][port_name] = port_info
-        
-        # Bottom edge output ports
-        for port in port_groups["down"]:
-            suffix = port.split("_rsc")[1] if "_rsc" in port else ""
-            port_info = create_port_copy(pe_ports[port])
-            
-            # Correction: ensure the directions are correct.
-            #The previous inversion logic was incorrect: for output ports, 
-            # dat and vld should remain as output, while rdy should remain as input.
-            # port_info["direction"] = "input" if port_info["direction"] == "output" else "output"
-            
-            port_name = f"{port.split('_rsc')[0]}_rsc{j}{suffix}"
-            json_data["top_ports"][port_name] = port_info
-    
-    # Add result ports
-    for port in port_groups["result"]:
-        if port.endswith("_dat") or port.endswith("_vld") or port.endswith("_rdy"):
-            # Create separate dat, vld, and rdy ports for each PE
-            for k in range(rows * cols):
-                port_info = create_port_copy(pe_ports[port])
-                json_data["top_ports"][f"{port}{k}"] = port_info
-    
-    # Process instances
-    # Look for array instances in the YAML
+
+def split_port_name(port):
+    """Split a handshake port name into its channel prefix and suffix, e.g. left_in_rsc_dat -> (left_in, _dat)."""
+    if "_rsc" in port:
+        prefix, suffix = port.split("_rsc", 1)
+        return prefix, suffix
+    return port, ""
+
+def load_array_config(yaml_file):
+    """Load the high-level systolic array configuration from a YAML file."""
+    with open(yaml_file, 'r') as f:
+        return yaml.safe_load(f)
+
+class ArrayNetlist:
+    """
+    Compact netlist of a systolic array of rows x cols PEs.
+
+    - PE ports are interned into slots (their index in the PE declaration order),
+      with the port info of the PE shared by all instances and top-level ports
+    - nets are integer IDs into the net_kind and net_args arrays
+    - connections holds the net ID of every (row, col, slot), -1 when unconnected
+    - the edge, result and named nets are named after the PE ports, net_ports when the
+      instances are not PEs but tiles of PEs (see build_tiled_netlists)
+    - the template nets of the YAML connections are named by templates, a str.format
+      string and the port info of the nets (see connection_dsl.py)
+    - reset_tree, when set, drives the reset of the instances through registers (see
+      reset_tree.py), the tree nets are named by it
+    - result_network, when set, collects the results of the instances (see
+      result_network.py), the result nets are then internal and named by it
+    - edge_skew, when set, streams the edges of the rows and columns through skew
+      FIFOs (see edge_skew.py), the edge nets are then internal and named by it
+    - link_registers, when set, registers the links of some channels between the PEs
+      of a tile (see link_registers.py), the register outputs are named by it
+
+    JSON (to_json) and Verilog (generate_top.iter_top_verilog_netlist) are only
+    produced when the netlist is serialized.
+    """
+
+    def __init__(self, top_module, rows, cols, module_name, pe_ports, top_ports=(), net_ports=None,
+                 instance_prefix="PE"):
+        self.top_module = top_module
+        self.rows = rows
+        self.cols = cols
+        self.module_name = module_name
+        self.instance_prefix = instance_prefix
+        self.port_names = [sys.intern(name) for name in pe_ports]
+        self.port_info = [pe_ports[name] for name in self.port_names]
+        self.slot_of = {name: slot for slot, name in enumerate(self.port_names)}
+        # Ports the edge, result and named nets are named after, by slot: the PE ports,
+        # also when the instances are tiles of PEs (see build_tiled_netlists).
+        if net_ports is None:
+            self.net_port_names, self.net_port_info = self.port_names, self.port_info
+        else:
+            self.net_port_names = [sys.intern(name) for name in net_ports]
+            self.net_port_info = [net_ports[name] for name in self.net_port_names]
+        self.top_port_names = [port["name"] for port in top_ports]
+        self.top_port_info = [{"direction": port["direction"], "width": port["width"]} for port in top_ports]
+
+        self.net_kind = array("B")
+        self.net_args = array("i")
+        self.top_ports = array("i")
+        self.connections = array("i", [-1]) * (rows * cols * len(self.port_names))
+        self.link_stems = []
+        self._stem_index = {}
+        self.templates = []
+        # Connection order of the slots of a PE, by (i > 0, j > 0), see iter_connections.
+        self.slot_orders = {}
+        self.reset_tree = None
+        self.result_network = None
+        self.edge_skew = None
+        self.link_registers = None
+
+        # Per-slot name formats of the edge and result ports.
+        self._edge_format = []
+        for name in self.net_port_names:
+            prefix, suffix = split_port_name(name)
+            self._edge_format.append(f"{prefix}_rsc{{}}{suffix}")
+
+    def add_net(self, kind, a=0, b=0, c=0, d=0, e=0):
+        """Append a net and return its ID."""
+        self.net_kind.append(kind)
+        self.net_args.extend((a, b, c, d, e))
+        return len(self.net_kind) - 1
+
+    def add_nets(self, kind, args, top_ports=False):
+        """
+        Append nets of one kind from a buffer of NET_ARGS C ints per net, also as top-level
+        ports if top_ports. Returns the ID of the first.
+        """
+        first = len(self.net_kind)
+        self.net_args.frombytes(args)
+        self.net_kind.extend(array("B", [kind]) * (len(self.net_args) // NET_ARGS - first))
+        if top_ports:
+            self.top_ports.extend(range(first, len(self.net_kind)))
+        return first
+
+    def add_top_port(self, kind, *args):
+        """Append a net that is also a top-level port and return its ID."""
+        net = self.add_net(kind, *args)
+        self.top_ports.append(net)
+        return net
+
+    def stem(self, name):
+        """Interned index of a link name stem."""
+        if name not in self._stem_index:
+            self._stem_index[name] = len(self.link_stems)
+            self.link_stems.append(name)
+        return self._stem_index[name]
+
+    def connect(self, i, j, slot, net):
+        self.connections[(i * self.cols + j) * len(self.port_names) + slot] = net
+
+    def net_name(self, net):
+        """Format the name of a net."""
+        kind = self.net_kind[net]
+        base = net * NET_ARGS
+        if kind == NET_LINK:
+            stem, i, j, i2, j2 = self.net_args[base:base + NET_ARGS]
+            return f"{self.link_stems[stem]}_PE_{i}_{j}_to_PE_{i2}_{j2}"
+        a, b = self.net_args[base], self.net_args[base + 1]
+        if kind == NET_EDGE:
+            return self._edge_format[a].format(b)
+        if kind == NET_RESULT:
+            return f"{self.net_port_names[a]}{b}"
+        if kind == NET_NAMED:
+            return self.net_port_names[a]
+        if kind == NET_TEMPLATE:
+            return self.templates[a][0].format(*self.net_args[base + 1:base + NET_ARGS])
+        if kind == NET_TREE:
+            return self.reset_tree.net_name(self.reset_tree.ports[a], b, self.net_args[base + 2])
+        if kind == NET_GATHER:
+            return self.result_network.net_name(self.net_port_names[a], b)
+        if kind == NET_STREAM:
+            return self.edge_skew.net_name(self.net_port_names[a], b)
+        if kind == NET_CONST:
+            return f"1'b{a}"
+        if kind == NET_REGISTERED:
+            return self.link_registers.net_name(self.link_stems[a], b, *self.net_args[base + 2:base + NET_ARGS])
+        return self.top_port_names[a]
+
+    def net_info(self, net):
+        """Port info of a top-level port net (shared, not copied)."""
+        if self.net_kind[net] == NET_TOP:
+            return self.top_port_info[self.net_args[net * NET_ARGS]]
+        if self.net_kind[net] == NET_TEMPLATE:
+            return self.templates[self.net_args[net * NET_ARGS]][1]
+        return self.net_port_info[self.net_args[net * NET_ARGS]]
+
+    def is_top_port(self, net):
+        return self.net_kind[net] in (NET_TOP, NET_EDGE, NET_RESULT, NET_TEMPLATE)
+
+    def instance_name(self, i, j):
+        return f"{self.instance_prefix}_{i}_{j}"
+
+    def iter_connections(self, i, j):
+        """(slot, net) of the connected ports of PE (i, j), in the order they were made."""
+        base = (i * self.cols + j) * len(self.port_names)
+        connections = self.connections
+        for slot in self.slot_orders[(i > 0, j > 0)]:
+            net = connections[base + slot]
+            if net >= 0:
+                yield slot, net
+
+    def generated_reports(self):
+        """Reports of the reset tree, the edge skew, the result network and the link registers, by their JSON key."""
+        reports = {}
+        if self.reset_tree is not None:
+            reports["reset_tree"] = self.reset_tree.report()
+        if self.edge_skew is not None:
+            reports["edge_skew"] = self.edge_skew.report()
+        if self.result_network is not None:
+            reports["result_network"] = self.result_network.report()
+        if self.link_registers is not None:
+            reports["link_registers"] = self.link_registers.report()
+        return reports
+
+    def iter_generated_instances(self):
+        """
+        (instance name, instance data) of the reset tree registers, the edge skew, the result
+        collectors and the link registers.
+        """
+        if self.reset_tree is not None:
+            yield from self.reset_tree.iter_stages()
+        if self.edge_skew is not None:
+            yield from self.edge_skew.iter_instances(self)
+        if self.result_network is not None:
+            yield from self.result_network.iter_instances(self)
+        if self.link_registers is not None:
+            yield from self.link_registers.iter_instances(self)
+
+    def to_json(self):
+        """
+        Serialize to the JSON description of the systolic array (see generate_systolic_array_json).
+        Open ports are connected to "". The generated instances of a reset tree, an edge
+        skew and a result network come first, their reports are stored under their own keys.
+        """
+        json_data = {
+            "top_module": self.top_module,
+            "top_ports": {self.net_name(net): self.net_info(net) for net in self.top_ports},
+            "instances": {}
+        }
+        json_data.update(self.generated_reports())
+        json_data["instances"].update(self.iter_generated_instances())
+        for i in range(self.rows):
+            for j in range(self.cols):
+                connect = {self.port_names[slot]: self.net_name(net) for slot, net in self.iter_connections(i, j)}
+                if len(connect) < len(self.port_names):
+                    connect.update((name, "") for name in self.port_names if name not in connect)
+                json_data["instances"][self.instance_name(i, j)] = {
+                    "module": self.module_name,
+                    "connect": connect
+                }
+        return json_data
+
+def array_module_name(config, pe_config):
+    """Module of the array instances: the module of the YAML array instance, else the PE submodule."""
+    module_name = pe_config["submodule"]
     for instance in config.get("instances", []):
         if "array" in instance:
             module_name = instance["module"]
-            array_dims = instance["array"]
-            array_rows, array_cols = array_dims[0], array_dims[1]
-            
-            # Create PE instances in the array
-            for i in range(array_rows):
-                for j in range(array_cols):
-                    pe_name = f"PE_{i}_{j}"
-                    json_data["instances"][pe_name] = {
-                        "module": module_name,
-                        "connect": {}
-                    }
-    
-    # Process connections
-    # Create internal wires for PE connections
+    return module_name
+
+def _port_groups(netlist):
+    """The standard port groups (see group_pe_ports) and the result ports of the PEs, as net port slots."""
+    names = netlist.net_port_names
+    slot_of = {name: slot for slot, name in enumerate(names)}
+    port_groups = {group: [slot_of[name] for name in group_names]
+                   for group, group_names in group_pe_ports(names).items()}
+    result_slots = [slot for slot in port_groups["result"] if names[slot].endswith(("_dat", "_vld", "_rdy"))]
+    return port_groups, result_slots
+
+def _add_array_ports(netlist, rows, cols, port_groups, result_slots):
+    """
+    Add the top-level ports of a rows x cols PE array: the YAML ports, then the edges
+    by row and by column, then the results. Returns the nets as dicts keyed by name,
+    by (slot, row or column) and by (slot, PE index).
+    """
+    named_nets = {}
+    for index, name in enumerate(netlist.top_port_names):
+        named_nets[name] = netlist.add_top_port(NET_TOP, index)
+    edge_nets = {}
+    for groups, count in ((("left", "right"), rows), (("up", "down"), cols)):
+        for index in range(count):
+            for group in groups:
+                for slot in port_groups[group]:
+                    edge_nets[slot, index] = netlist.add_top_port(NET_EDGE, slot, index)
+    result_nets = {}
+    for slot in result_slots:
+        for k in range(rows * cols):
+            result_nets[slot, k] = netlist.add_top_port(NET_RESULT, slot, k)
+    return named_nets, edge_nets, result_nets
+
+def _link_pairs(netlist, port_groups, first, second):
+    """
+    Pair the ports of two facing sides by name stem (data, val, rdy, or the port
+    name): returns a list of (stem index, (first side slots, second side slots)).
+    """
+    pairs = {}
+    for side, group in enumerate((first, second)):
+        for slot in port_groups[group]:
+            name = netlist.net_port_names[slot]
+            _, suffix = split_port_name(name)
+            stem = netlist.stem(LINK_STEMS.get(suffix, name))
+            pairs.setdefault(stem, ([], []))[side].append(slot)
+    return list(pairs.items())
+
+def build_array_netlist(config, pe_config):
+    """
+        Build the compact netlist of the systolic array from the YAML configuration and the PE module configuration.
+
+        Parameters:
+
+        -config - High-level configuration loaded from the YAML file
+        -pe_config - PE module port definitions, as produced by parse_verilog.generate_submodule_configs
+
+        Returns an ArrayNetlist of the YAML dimensions, compiled from the connections: section
+        of the YAML when it has one (see connection_dsl.py), else the standard grid of
+        build_grid_netlist. None on an error in the connections.
+    """
+    if config.get("connections"):
+        return connection_dsl.build_connection_netlist(config, pe_config)
+    return build_grid_netlist(config, pe_config)
+
+def _unlinked_pairs(first, second):
+    """
+    Pair the nets of first and second connected to the same PE ports, an open port
+    being the net -1. Returns the pairs that are not both links, after checking
+    that the links have the same stem and PE indices, or None when the connections
+    do not pair the nets one to one or two paired links differ.
+    """
+    stem_of = {stem: index for index, stem in enumerate(second.link_stems)}
+    stems = [stem_of.get(stem, -1) for stem in first.link_stems]
+    numpy = connection_dsl.numpy
+    if numpy is not None:
+        nets = [numpy.frombuffer(netlist.connections, dtype=numpy.intc) for netlist in (first, second)]
+        if not numpy.array_equal(nets[0] < 0, nets[1] < 0):
+            return None
+        connected = nets[0] >= 0
+        a, b = nets[0][connected], nets[1][connected]
+        # Each net must map to one net of the other netlist, both ways.
+        forward = numpy.full(len(first.net_kind), -1, dtype=numpy.intc)
+        backward = numpy.full(len(second.net_kind), -1, dtype=numpy.intc)
+        forward[a], backward[b] = b, a
+        if not (numpy.array_equal(forward[a], b) and numpy.array_equal(backward[b], a)):
+            return None
+        a = numpy.flatnonzero(forward >= 0)
+        b = forward[a]
+        links = (numpy.frombuffer(first.net_kind, dtype=numpy.uint8)[a] == NET_LINK) & \
+            (numpy.frombuffer(second.net_kind, dtype=numpy.uint8)[b] == NET_LINK)
+        args_a = numpy.frombuffer(first.net_args, dtype=numpy.intc).reshape(-1, NET_ARGS)[a[links]]
+        args_b = numpy.frombuffer(second.net_args, dtype=numpy.intc).reshape(-1, NET_ARGS)[b[links]]
+        if args_a.size and not (numpy.array_equal(numpy.asarray(stems, dtype=numpy.intc)[args_a[:, 0]], args_b[:, 0])
+                                and numpy.array_equal(args_a[:, 1:], args_b[:, 1:])):
+            return None
+        return list(zip(a[~links].tolist(), b[~links].tolist()))
+    pairs = set(zip(first.connections, second.connections))
+    pairs.discard((-1, -1))
+    if any(a < 0 or b < 0 for a, b in pairs) or \
+            len({a for a, _ in pairs}) != len(pairs) or len({b for _, b in pairs}) != len(pairs):
+        return None
+    unlinked = []
+    for a, b in pairs:
+        if first.net_kind[a] == NET_LINK and second.net_kind[b] == NET_LINK:
+            args_a = first.net_args[a * NET_ARGS:(a + 1) * NET_ARGS]
+            args_b = second.net_args[b * NET_ARGS:(b + 1) * NET_ARGS]
+            if stems[args_a[0]] != args_b[0] or args_a[1:] != args_b[1:]:
+                return None
+        else:
+            unlinked.append((a, b))
+    return unlinked
+
+def same_connections(first, second):
+    """
+    Whether two netlists of the same PEs serialize to the same top-level ports and
+    PE connections, compared on their arrays rather than on their JSON: the
+    connections must pair every net of first with a single net of second, and the
+    paired nets must have the same name. Links are compared on their stem and PE
+    indices, only the names of the top-level ports and the other nets are formatted.
+    """
+    if (first.rows, first.cols, first.module_name, first.port_names) != \
+            (second.rows, second.cols, second.module_name, second.port_names):
+        return False
+    top_names = [{net: netlist.net_name(net) for net in netlist.top_ports} for netlist in (first, second)]
+    if {name: first.net_info(net) for net, name in top_names[0].items()} != \
+            {name: second.net_info(net) for net, name in top_names[1].items()}:
+        return False
+    pairs = _unlinked_pairs(first, second)
+    if pairs is None:
+        return False
+    names_a, names_b = top_names
+    for a, b in pairs:
+        if (names_a[a] if a in names_a else first.net_name(a)) != (names_b[b] if b in names_b else second.net_name(b)):
+            return False
+    return True
+
+# Verdicts of is_standard_grid, by fingerprint of the YAML and the PE ports.
+_standard_grids = {}
+
+def is_standard_grid(config, pe_config, feature):
+    """
+    Whether the YAML describes the standard grid of build_grid_netlist, which feature
+    (e.g. "a tiled array") is built on: it has no connections: section, or its rules
+    compile to the same top-level ports and PE connections. Prints an error otherwise.
+    The verdict is kept for the run by a fingerprint of the YAML and the PE ports, the
+    pipeline asks again for every feature.
+    """
+    if not config.get("connections"):
+        return True
+    key = json.dumps([config, pe_config["submodule"], pe_config["ports"]], sort_keys=True, default=str)
+    if key not in _standard_grids:
+        netlist = connection_dsl.build_connection_netlist(config, pe_config)
+        if netlist is None:
+            return False
+        _standard_grids[key] = same_connections(netlist, build_grid_netlist(config, pe_config))
+    if not _standard_grids[key]:
+        print(f"Error: {feature} is the standard grid of PEs, the connections: section of the YAML "
+              f"describes another array")
+        return False
+    return True
+
+def build_grid_netlist(config, pe_config):
+    """
+        Build the compact netlist of the standard grid of PEs from the YAML configuration and the PE module
+        configuration.
+
+        Parameters:
+
+        -config - High-level configuration loaded from the YAML file
+        -pe_config - PE module port definitions, as produced by parse_verilog.generate_submodule_configs
+
+        Returns an ArrayNetlist of the YAML dimensions. PEs are connected left to right
+        (right_out -> left_in) and top to bottom (down_out -> up_in), the array edges and
+        the result ports of every PE go to top-level ports.
+    """
+    rows, cols = config["dimensions"][0], config["dimensions"][1]
+    pe_ports = pe_config["ports"]
+    module_name = array_module_name(config, pe_config)
+
+    netlist = ArrayNetlist(config["top_module"], rows, cols, module_name, pe_ports, config.get("top_ports", []))
+    slot_of = netlist.slot_of
+
+    # Standard port groupings, as slots
+    port_groups, result_slots = _port_groups(netlist)
+
+    # Top-level ports: the YAML ports, then the edges by row and by column, then the results.
+    named_nets, edge_nets, result_nets = _add_array_ports(netlist, rows, cols, port_groups, result_slots)
+
+    # Basic control ports, connected to the top-level port of the same name
+    control_slots = [slot_of[name] for name in ("clk", "rst") if name in slot_of]
+    control_nets = [named_nets.get(netlist.port_names[slot]) for slot in control_slots]
+    control_nets = [netlist.add_net(NET_NAMED, slot) if net is None else net
+                    for slot, net in zip(control_slots, control_nets)]
+
+    horizontal = _link_pairs(netlist, port_groups, "right", "left")
+    vertical = _link_pairs(netlist, port_groups, "down", "up")
+
     for i in range(rows):
         for j in range(cols):
-            # Basic connections for all PEs
-            for ctrl_port in control_ports:
-                json_data["instances"][f"PE_{i}_{j}"]["connect"][ctrl_port] = ctrl_port
-            
-            # Skip rightmost column for horizontal connections
+            for slot, net in zip(control_slots, control_nets):
+                netlist.connect(i, j, slot, net)
+
             if j < cols - 1:
-                # Horizontal connections (right to left)
-                for port in port_groups["right"]:
-                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
-                    
-                    if suffix == "_dat":
-                        wire_name = f"data_PE_{i}_{j}_to_PE_{i}_{j+1}"
-                    elif suffix == "_vld":
-                        wire_name = f"val_PE_{i}_{j}_to_PE_{i}_{j+1}"
-                    elif suffix == "_rdy":
-                        wire_name = f"rdy_PE_{i}_{j}_to_PE_{i}_{j+1}"
-                    else:
-                        wire_name = f"{port}_PE_{i}_{j}_to_PE_{i}_{j+1}"
-                    
-                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = wire_name
-                
-                # Connect to the left inputs of the next PE
-                for port in port_groups["left"]:
-                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
-                    
-                    if suffix == "_dat":
-                        wire_name = f"data_PE_{i}_{j}_to_PE_{i}_{j+1}"
-                    elif suffix == "_vld":
-                        wire_name = f"val_PE_{i}_{j}_to_PE_{i}_{j+1}"
-                    elif suffix == "_rdy":
-                        wire_name = f"rdy_PE_{i}_{j}_to_PE_{i}_{j+1}"
-                    else:
-                        wire_name = f"{port}_PE_{i}_{j}_to_PE_{i}_{j+1}"
-                    
-                    json_data["instances"][f"PE_{i}_{j+1}"]["connect"][port] = wire_name
+                for stem, (right_slots, left_slots) in horizontal:
+                    net = netlist.add_net(NET_LINK, stem, i, j, i, j + 1)
+                    for slot in right_slots:
+                        netlist.connect(i, j, slot, net)
+                    for slot in left_slots:
+                        netlist.connect(i, j + 1, slot, net)
             else:
-                # Right edge
-                for port in port_groups["right"]:
-                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
-                    prefix = port.split("_rsc")[0] if "_rsc" in port else port
-                    top_port_name = f"{prefix}_rsc{i}{suffix}"
-                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = top_port_name
-            
-            # Skip bottom row for vertical connections
+                for slot in port_groups["right"]:
+                    netlist.connect(i, j, slot, edge_nets[slot, i])
+
             if i < rows - 1:
-                # Vertical connections (down to up)
-                for port in port_groups["down"]:
-                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
-                    
-                    if suffix == "_dat":
-                        wire_name = f"data_PE_{i}_{j}_to_PE_{i+1}_{j}"
-                    elif suffix == "_vld":
-                        wire_name = f"val_PE_{i}_{j}_to_PE_{i+1}_{j}"
-                    elif suffix == "_rdy":
-                        wire_name = f"rdy_PE_{i}_{j}_to_PE_{i+1}_{j}"
-                    else:
-                        wire_name = f"{port}_PE_{i}_{j}_to_PE_{i+1}_{j}"
-                    
-                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = wire_name
-                
-                # Connect to the up inputs of the PE below
-                for port in port_groups["up"]:
-                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
-                    
-                    if suffix == "_dat":
-                        wire_name = f"data_PE_{i}_{j}_to_PE_{i+1}_{j}"
-                    elif suffix == "_vld":
-                        wire_name = f"val_PE_{i}_{j}_to_PE_{i+1}_{j}"
-                    elif suffix == "_rdy":
-                        wire_name = f"rdy_PE_{i}_{j}_to_PE_{i+1}_{j}"
-                    else:
-                        wire_name = f"{port}_PE_{i}_{j}_to_PE_{i+1}_{j}"
-                    
-                    json_data["instances"][f"PE_{i+1}_{j}"]["connect"][port] = wire_name
+                for stem, (down_slots, up_slots) in vertical:
+                    net = netlist.add_net(NET_LINK, stem, i, j, i + 1, j)
+                    for slot in down_slots:
+                        netlist.connect(i, j, slot, net)
+                    for slot in up_slots:
+                        netlist.connect(i + 1, j, slot, net)
             else:
-                # Bottom edge
-                for port in port_groups["down"]:
-                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
-                    prefix = port.split("_rsc")[0] if "_rsc" in port else port
-                    top_port_name = f"{prefix}_rsc{j}{suffix}"
-                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = top_port_name
-            
-            # Left edge
+                for slot in port_groups["down"]:
+                    netlist.connect(i, j, slot, edge_nets[slot, j])
+
             if j == 0:
-                for port in port_groups["left"]:
-                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
-                    prefix = port.split("_rsc")[0] if "_rsc" in port else port
-                    top_port_name = f"{prefix}_rsc{i}{suffix}"
-                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = top_port_name
-            
-            # Top edge
+                for slot in port_groups["left"]:
+                    netlist.connect(i, j, slot, edge_nets[slot, i])
             if i == 0:
-                for port in port_groups["up"]:
-                    suffix = port.split("_rsc")[1] if "_rsc" in port else ""
-                    prefix = port.split("_rsc")[0] if "_rsc" in port else port
-                    top_port_name = f"{prefix}_rsc{j}{suffix}"
-                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = top_port_name
-            
-            # Add result connections - Use the PE index to connect to the corresponding top-level port.
+                for slot in port_groups["up"]:
+                    netlist.connect(i, j, slot, edge_nets[slot, j])
+
             pe_index = i * cols + j
-            for port in port_groups["result"]:
-                if port.endswith("_dat"):
-                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = f"{port}{pe_index}"
-                elif port.endswith("_vld"):
-                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = f"{port}{pe_index}"
-                elif port.endswith("_rdy"):
-                    json_data["instances"][f"PE_{i}_{j}"]["connect"][port] = f"{port}{pe_index}"
-    
+            for slot in result_slots:
+                netlist.connect(i, j, slot, result_nets[slot, pe_index])
+
+    # Connection order of a PE: the up ports are connected from the PE above, the
+    # left ports from the PE to the left, then its own ports in the order above.
+    for has_up in (False, True):
+        for has_left in (False, True):
+            order = []
+            for slots in ((port_groups["up"] if has_up else []), (port_groups["left"] if has_left else []),
+                          control_slots, port_groups["right"], port_groups["down"],
+                          ([] if has_left else port_groups["left"]), ([] if has_up else port_groups["up"]),
+                          result_slots):
+                order.extend(slot for slot in slots if slot not in order)
+            netlist.slot_orders[has_up, has_left] = order
+    return netlist
+
+def tile_module_name(module_name):
+    """Module name of the tiles of a tiled array of module_name PEs."""
+    return f"{module_name}_tile"
+
+def tile_shape(tile_size):
+    """Rows and columns of PEs of a tile, tile_size being K (a KxK tile) or (R, C)."""
+    if isinstance(tile_size, int):
+        return tile_size, tile_size
+    return tuple(tile_size)
+
+def build_tiled_netlists(config, pe_config, tile_size, tile_module=None, always_ready=()):
+    """
+        Build the two levels of a tiled systolic array: a tile module of R x C PEs,
+        hardened as one macro, and the top module of (rows/R) x (cols/C) tiles.
+
+        Parameters:
+
+        -config - High-level configuration loaded from the YAML file
+        -pe_config - PE module port definitions, as produced by parse_verilog.generate_submodule_configs
+        -tile_size - Tile size K (a KxK tile) or (R, C), which must divide the dimensions
+        -tile_module - Module name of the tile (default: see tile_module_name)
+        -always_ready - Input channels the PE accepts on every cycle, whose links within
+                        the tile are registered wires without a handshake (see link_registers.py).
+                        The PE schedule must prove it, with the constant_outputs of pe_config
+                        (see parse_verilog.constant_outputs)
+
+        Returns (tile, top) ArrayNetlists, or None when the dimensions are not multiples of
+        the tile size, the connections of the YAML are not the standard grid (see
+        is_standard_grid) or an always_ready channel is not proven. The tile is an R x C array with the control ports of the PE (clk,
+        rst), its edge and result ports numbered within the tile. The top has the ports and net names of
+        the flat array of build_grid_netlist: tile (ti, tj) is the instance TILE_ti_tj, and
+        its PE_a_b is PE_<ti*R+a>_<tj*C+b> of the flat array, the links between tiles keep
+        their flat names and their handshake. The top has R*C times fewer instances and
+        about R*C/(R+C)*2 times fewer internal nets than the flat array.
+    """
+    rows, cols = config["dimensions"][0], config["dimensions"][1]
+    kr, kc = tile_shape(tile_size)
+    if rows % kr or cols % kc:
+        print(f"Error: the array dimensions {rows}x{cols} are not multiples of the tile size {kr}x{kc}")
+        return None
+    pe_ports = pe_config["ports"]
+    module_name = array_module_name(config, pe_config)
+    tile_module = tile_module or tile_module_name(module_name)
+
+    if not is_standard_grid(config, pe_config, "a tiled array"):
+        return None
+    tile_ports = [{"name": name, "direction": pe_ports[name]["direction"], "width": pe_ports[name]["width"]}
+                  for name in ("clk", "rst") if name in pe_ports]
+    tile_config = dict(config, top_module=tile_module, dimensions=[kr, kc], top_ports=tile_ports)
+    tile = build_grid_netlist(tile_config, pe_config)
+    if always_ready and link_registers.attach(tile, always_ready, pe_config.get("constant_outputs", {})) is None:
+        return None
+
+    # The ports of the tile are the "PE" ports of the top, its nets are named after the PE ports.
+    tile_port_table = {tile.net_name(net): tile.net_info(net) for net in tile.top_ports}
+    top = ArrayNetlist(config["top_module"], rows // kr, cols // kc, tile_module, tile_port_table,
+                       config.get("top_ports", []), net_ports=pe_ports, instance_prefix="TILE")
+    port_groups, result_slots = _port_groups(top)
+    named_nets, edge_nets, result_nets = _add_array_ports(top, rows, cols, port_groups, result_slots)
+    group_of = {slot: group for group, slots in port_groups.items() for slot in slots}
+    stem_of = {}
+    for first, second in (("right", "left"), ("down", "up")):
+        for stem, sides in _link_pairs(top, port_groups, first, second):
+            for slots in sides:
+                for slot in slots:
+                    stem_of[slot] = stem
+
+    # What every tile port is within the tile: (kind, PE slot or top port index, index within the tile).
+    roles = [(tile.net_kind[net], tile.net_args[net * NET_ARGS], tile.net_args[net * NET_ARGS + 1])
+             for net in tile.top_ports]
+    links = {}
+
+    def link(*args):
+        # Links between tiles are made once, from whichever side comes first.
+        if args not in links:
+            links[args] = top.add_net(NET_LINK, *args)
+        return links[args]
+
+    def tile_net(ti, tj, kind, a, b):
+        if kind == NET_TOP:
+            name = tile.top_port_names[a]
+            if name not in named_nets:
+                named_nets[name] = top.add_net(NET_NAMED, tile.slot_of[name])
+            return named_nets[name]
+        if kind == NET_RESULT:
+            return result_nets[a, ((ti * kr + b // kc) * cols + tj * kc + b % kc)]
+        group = group_of[a]
+        i, j = ti * kr + b, tj * kc + b
+        if group == "left":
+            return edge_nets[a, i] if tj == 0 else link(stem_of[a], i, tj * kc - 1, i, tj * kc)
+        if group == "right":
+            return edge_nets[a, i] if tj == top.cols - 1 else link(stem_of[a], i, tj * kc + kc - 1, i, tj * kc + kc)
+        if group == "up":
+            return edge_nets[a, j] if ti == 0 else link(stem_of[a], ti * kr - 1, j, ti * kr, j)
+        return edge_nets[a, j] if ti == top.rows - 1 else link(stem_of[a], ti * kr + kr - 1, j, ti * kr + kr, j)
+
+    for ti in range(top.rows):
+        for tj in range(top.cols):
+            for slot, role in enumerate(roles):
+                top.connect(ti, tj, slot, tile_net(ti, tj, *role))
+
+    # Tile ports are connected in their declaration order.
+    order = list(range(len(roles)))
+    for key in ((False, False), (False, True), (True, False), (True, True)):
+        top.slot_orders[key] = order
+    return tile, top
+
+def generate_systolic_array_json(config, pe_config):
+    """
+        Generate a JSON description of the systolic array based on the YAML configuration and the PE module configuration.
+
+        Parameters:
+
+        -config - High-level configuration loaded from the YAML file
+        -pe_config - PE module port definitions, as produced by parse_verilog.generate_submodule_configs
+
+        Returns the JSON description as a dictionary (see build_array_netlist), or None on an
+        error in the connections.
+    """
+    netlist = build_array_netlist(config, pe_config)
+    return netlist.to_json() if netlist is not None else None
+
+def write_systolic_array_json(json_data, json_file):
+    """Write the JSON description of the systolic array to json_file."""
     # Ensure that the target directory exists.
     os.makedirs(os.path.dirname(json_file), exist_ok=True)
     
@@ -286,5 +669,10 @@ if __name__ == "__main__":
         print(f"Error: PE configuration file does not exist: {pe_config_file}")
         sys.exit(1)
     
-    # Generate the JSON file.
-    generate_systolic_array_json(yaml_file, pe_config_file, json_file) 
\ No newline at end of file
+    # Load the configurations and generate the JSON file.
+    with open(pe_config_file, 'r') as f:
+        pe_config = json.load(f)
+    json_data = generate_systolic_array_json(load_array_config(yaml_file), pe_config)
+    if json_data is None:
+        sys.exit(1)
+    write_systolic_array_json(json_data, json_file)
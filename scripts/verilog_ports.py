@@ -0,0 +1,567 @@
+"""
+Streaming, token-based extraction of module port tables from Verilog.
+
+The file is read line by line and tokenized with comments and strings removed.
+For every module the header (parameter list and port list) and the declaration
+region of the body are parsed. Once all ports are known the rest of the module
+is skipped with cheap substring tests until `endmodule`, so large bodies of
+assignments, always blocks and instances are never tokenized. Only the lines
+that may hold a `reg` declaration are, while a non-ANSI output port is not yet
+known to be a reg: the declaration can come after the first always block.
+
+Supported: ANSI and non-ANSI headers, `input`/`output`/`inout`, net types
+(`wire`, `reg`, `logic`, ...), `signed`, packed ranges with parameterized bounds
+such as `[WIDTH-1:0]` (resolved from parameter defaults when possible), and
+simple `define macros. A macro not defined earlier in the file is kept as an
+opaque token, so a width depending on it stays unresolved.
+"""
+import ast
+import re
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<line_comment>//.*)
+  | (?P<block_comment>/\*)
+  | (?P<string>"(?:\\.|[^"\\])*"?)
+  | (?P<number>(?:\d[\d_]*\s*)?'[sS]?[bBoOdDhH]\s*[0-9a-fA-FxXzZ?_]+|'[01xXzZ]|\d[\d_]*(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_$]*|\\\S+)
+  | (?P<system>\$[A-Za-z0-9_$]+)
+  | (?P<directive>`[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op><<<|>>>|<<|>>|\*\*|==|!=|<=|>=|&&|\|\||::|.)
+""", re.VERBOSE)
+
+DIRECTIONS = {"input", "output", "inout"}
+NET_TYPES = {"wire", "reg", "logic", "tri", "wand", "wor", "var", "bit", "integer", "int"}
+# Widths of types that carry an implicit range.
+IMPLICIT_WIDTHS = {"integer": 32, "int": 32}
+OTHER_DECLARATIONS = {"wire", "logic", "tri", "wand", "wor", "integer", "int", "bit", "real",
+                      "realtime", "time", "genvar", "event", "supply0", "supply1", "specparam",
+                      "defparam", "var"}
+# Directives followed by a macro name on the same line.
+_NAMED_DIRECTIVES = {"ifdef", "ifndef", "elsif", "undef"}
+# Directives whose whole line is skipped.
+_LINE_DIRECTIVES = {"timescale", "include", "default_nettype", "resetall", "celldefine",
+                    "endcelldefine", "line", "pragma", "begin_keywords", "end_keywords",
+                    "unconnected_drive", "nounconnected_drive"}
+# Directives without arguments, dropped from the token stream.
+_BARE_DIRECTIVES = {"else", "endif", "undefineall"}
+
+class Lexer:
+    """Token stream over an iterable of source lines."""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._tokens = []
+        self._pos = 0
+        self._in_comment = False
+        self.defines = {}
+
+    def _tokenize(self, line):
+        tokens = []
+        pos = 0
+        if self._in_comment:
+            end = line.find("*/")
+            if end < 0:
+                return tokens
+            pos = end + 2
+            self._in_comment = False
+
+        length = len(line)
+        while pos < length:
+            match = _TOKEN.match(line, pos)
+            kind = match.lastgroup
+            text = match.group(kind)
+            pos = match.end()
+            if kind in ("ws", "line_comment", "string"):
+                continue
+            if kind == "block_comment":
+                end = line.find("*/", pos)
+                if end < 0:
+                    self._in_comment = True
+                    break
+                pos = end + 2
+                continue
+            if kind == "directive":
+                name = text[1:]
+                if name == "define":
+                    body = self._tokenize_define(line[pos:])
+                    if body:
+                        self.defines[body[0]] = body[1:]
+                    break
+                if name in _LINE_DIRECTIVES:
+                    break
+                if name in _NAMED_DIRECTIVES:
+                    # Conditional compilation is not evaluated, skip the macro name.
+                    match = _TOKEN.match(line, pos)
+                    while match and match.lastgroup == "ws":
+                        match = _TOKEN.match(line, match.end())
+                    if match:
+                        pos = match.end()
+                    continue
+                if name in self.defines:
+                    tokens.extend(self.defines[name])
+                elif name not in _BARE_DIRECTIVES:
+                    # An undefined macro stays an opaque token, so that expressions using it are unresolved.
+                    tokens.append(text)
+                continue
+            tokens.append(text)
+        return tokens
+
+    def _tokenize_define(self, text):
+        # Tokenize the macro body with a separate comment state, a `define never opens a comment.
+        in_comment = self._in_comment
+        body = self._tokenize(text)
+        self._in_comment = in_comment
+        return body
+
+    def next(self):
+        """Return the next token, or None at the end of the input."""
+        while self._pos >= len(self._tokens):
+            line = next(self._lines, None)
+            if line is None:
+                return None
+            self._tokens = self._tokenize(line)
+            self._pos = 0
+        token = self._tokens[self._pos]
+        self._pos += 1
+        return token
+
+    def skip_to(self, *keywords):
+        """
+        Discard tokens up to and including the first of keywords, and return it (None
+        at the end of the input). Lines that cannot contain a keyword, a comment or
+        string delimiter or a directive are skipped untokenized.
+        """
+        while self._pos < len(self._tokens):
+            token = self._tokens[self._pos]
+            self._pos += 1
+            if token in keywords:
+                return token
+        for line in self._lines:
+            if (not self._in_comment and not any(keyword in line for keyword in keywords) and "/*" not in line
+                    and '"' not in line and "`" not in line):
+                continue
+            self._tokens = self._tokenize(line)
+            self._pos = 0
+            while self._pos < len(self._tokens):
+                token = self._tokens[self._pos]
+                self._pos += 1
+                if token in keywords:
+                    return token
+        self._tokens = []
+        self._pos = 0
+        return None
+
+################################################################################
+# Constant expressions (parameter values and range bounds)
+################################################################################
+
+_BASES = {"b": 2, "o": 8, "d": 10, "h": 16}
+_ALLOWED_OPS = {"+", "-", "*", "/", "%", "**", "<<", ">>", "(", ")", "&", "|", "^", "~"}
+
+def _clog2(value):
+    return max(0, (int(value) - 1).bit_length())
+
+def _number_value(token):
+    """Value of a Verilog number literal, or None if it contains x/z bits."""
+    if "'" not in token:
+        try:
+            return int(token.replace("_", ""))
+        except ValueError:
+            return None
+    digits = token.split("'", 1)[1].lstrip("sS")
+    if len(digits) == 1:
+        return None if digits in "xXzZ" else int(digits)
+    base = _BASES[digits[0].lower()]
+    digits = digits[1:].strip().replace("_", "")
+    try:
+        return int(digits, base)
+    except ValueError:
+        return None
+
+def evaluate(tokens, params):
+    """Evaluate a constant expression given as tokens, returns an int or None if unresolved."""
+    parts = []
+    for token in tokens:
+        if token == "$clog2":
+            parts.append("clog2")
+        elif token in _ALLOWED_OPS:
+            parts.append("//" if token == "/" else token)
+        elif token[0].isdigit() or token[0] == "'":
+            value = _number_value(token)
+            if value is None:
+                return None
+            parts.append(str(value))
+        elif token in params and params[token] is not None:
+            parts.append(f"({params[token]})")
+        else:
+            return None
+    if not parts:
+        return None
+    expression = " ".join(parts)
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        return None
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id != "clog2":
+            return None
+    try:
+        value = eval(compile(tree, "<verilog>", "eval"), {"__builtins__": {}}, {"clog2": _clog2})
+    except (ArithmeticError, TypeError, ValueError):
+        return None
+    return int(value)
+
+def _split_top_level(tokens, separator):
+    """Split tokens on separator outside of brackets, parentheses and braces."""
+    pieces = [[]]
+    depth = 0
+    for token in tokens:
+        if token in ("(", "[", "{"):
+            depth += 1
+        elif token in (")", "]", "}"):
+            depth -= 1
+        if token == separator and depth == 0:
+            pieces.append([])
+        else:
+            pieces[-1].append(token)
+    return pieces
+
+def _range_width(range_tokens, params):
+    """Width of a packed range [msb:lsb] as an int, or as a Verilog expression string if unresolved."""
+    bounds = _split_top_level(range_tokens, ":")
+    if len(bounds) != 2:
+        # A single bound such as [N] in SystemVerilog declares N elements.
+        value = evaluate(range_tokens, params)
+        return value if value is not None else "".join(range_tokens)
+    msb_tokens, lsb_tokens = bounds
+    msb = evaluate(msb_tokens, params)
+    lsb = evaluate(lsb_tokens, params)
+    if msb is not None and lsb is not None:
+        return abs(msb - lsb) + 1
+    msb_text = "".join(msb_tokens)
+    if lsb == 0:
+        if msb_tokens[-2:] == ["-", "1"]:
+            return "".join(msb_tokens[:-2])
+        return f"{msb_text}+1"
+    return f"({msb_text})-({''.join(lsb_tokens)})+1"
+
+def _combine_widths(widths):
+    if len(widths) == 1:
+        return widths[0]
+    if all(isinstance(width, int) for width in widths):
+        total = 1
+        for width in widths:
+            total *= width
+        return total
+    return "*".join(f"({width})" if not isinstance(width, int) else str(width) for width in widths)
+
+################################################################################
+# Declarations
+################################################################################
+
+def _read_until(lexer, terminators):
+    """Read tokens up to a terminator at nesting depth 0, returns (tokens, terminator)."""
+    tokens = []
+    depth = 0
+    while True:
+        token = lexer.next()
+        if token is None:
+            return tokens, None
+        if depth == 0 and token in terminators:
+            return tokens, token
+        if token in ("(", "[", "{"):
+            depth += 1
+        elif token in (")", "]", "}"):
+            depth -= 1
+        tokens.append(token)
+
+def _parse_decl_prefix(tokens, decl):
+    """
+    Parse direction, type, signedness and packed ranges at the start of tokens into decl.
+    Returns the index of the first token after the prefix.
+    """
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token in DIRECTIONS:
+            decl.update(direction=token, type=None, signed=False, ranges=[])
+        elif token in NET_TYPES:
+            decl["type"] = token
+        elif token in ("signed", "unsigned"):
+            decl["signed"] = token == "signed"
+        elif token == "[":
+            depth = 1
+            end = index + 1
+            while end < len(tokens) and depth:
+                if tokens[end] == "[":
+                    depth += 1
+                elif tokens[end] == "]":
+                    depth -= 1
+                end += 1
+            decl["ranges"].append(tokens[index + 1:end - 1])
+            index = end
+            continue
+        else:
+            break
+        index += 1
+    return index
+
+def _port_entry(decl, params):
+    if decl["ranges"]:
+        width = _combine_widths([_range_width(r, params) for r in decl["ranges"]])
+    else:
+        width = IMPLICIT_WIDTHS.get(decl["type"], 1)
+    entry = {
+        "direction": decl["direction"],
+        "type": "reg" if decl["type"] == "reg" else "wire",
+        "width": width
+    }
+    if decl["signed"]:
+        entry["signed"] = True
+    return entry
+
+def _parse_parameters(tokens, params):
+    """Record `NAME = value` assignments from a parameter declaration or parameter port list."""
+    for item in _split_top_level(tokens, ","):
+        if "=" not in item:
+            continue
+        eq = item.index("=")
+        names = [t for t in item[:eq] if t[0].isalpha() or t[0] == "_"]
+        if names:
+            params[names[-1]] = evaluate(item[eq + 1:], params)
+
+def _parse_header_ports(tokens, ports, header_names, params):
+    """Parse the module port list. Returns True for an ANSI header."""
+    ansi = False
+    decl = {"direction": None, "type": None, "signed": False, "ranges": []}
+    for item in _split_top_level(tokens, ","):
+        if not item:
+            continue
+        start = _parse_decl_prefix(item, decl)
+        if start >= len(item):
+            continue
+        name = item[start]
+        if decl["direction"]:
+            ansi = True
+            ports[name] = _port_entry(decl, params)
+        elif item[0] == ".":
+            # Explicitly named port expression .name(expr).
+            header_names.append(item[1])
+        else:
+            header_names.append(name)
+    return ansi
+
+def _parse_body(lexer, ports, header_names, params):
+    """Parse body declarations until all header ports are declared and the declarations end."""
+    pending = set(header_names) - set(ports)
+    while True:
+        token = lexer.next()
+        if token is None or token == "endmodule":
+            return
+        if token in ("function", "task"):
+            lexer.skip_to("end" + token)
+            continue
+        if token in DIRECTIONS or token == "reg":
+            tokens, _ = _read_until(lexer, {";"})
+            decl = {"direction": token if token in DIRECTIONS else None,
+                    "type": "reg" if token == "reg" else None, "signed": False, "ranges": []}
+            start = _parse_decl_prefix(tokens, decl)
+            for item in _split_top_level(tokens[start:], ","):
+                if not item:
+                    continue
+                name = item[0]
+                if decl["direction"]:
+                    if name in ports:
+                        if decl["type"] == "reg":
+                            ports[name]["type"] = "reg"
+                    else:
+                        ports[name] = _port_entry(decl, params)
+                    pending.discard(name)
+                elif name in ports:
+                    # Standalone reg declarations update the type of existing ports.
+                    ports[name]["type"] = "reg"
+            continue
+        if token in ("parameter", "localparam"):
+            tokens, _ = _read_until(lexer, {";"})
+            _parse_parameters(tokens, params)
+            continue
+        if token in OTHER_DECLARATIONS:
+            _read_until(lexer, {";"})
+            continue
+        # Any other item ends the declaration region.
+        if not pending:
+            _skip_body(lexer, ports)
+            return
+
+def _skip_body(lexer, ports):
+    """
+    Skip the rest of the module up to endmodule, reading only the standalone reg
+    declarations that still make an output port a reg.
+    """
+    outputs = {name for name, port in ports.items() if port["direction"] == "output" and port["type"] != "reg"}
+    while outputs:
+        if lexer.skip_to("reg", "endmodule") != "reg":
+            return
+        tokens, _ = _read_until(lexer, {";"})
+        decl = {"direction": None, "type": "reg", "signed": False, "ranges": []}
+        start = _parse_decl_prefix(tokens, decl)
+        for item in _split_top_level(tokens[start:], ","):
+            if item and item[0] in outputs:
+                ports[item[0]]["type"] = "reg"
+                outputs.discard(item[0])
+    lexer.skip_to("endmodule")
+
+def _parse_module(lexer):
+    params = {}
+    ports = {}
+    header_names = []
+    ansi = False
+
+    token = lexer.next()
+    if token in ("automatic", "static"):
+        token = lexer.next()
+    if token == "#":
+        if lexer.next() == "(":
+            tokens, _ = _read_until(lexer, {")"})
+            _parse_parameters(tokens, params)
+        token = lexer.next()
+    if token == "(":
+        tokens, _ = _read_until(lexer, {")"})
+        ansi = _parse_header_ports(tokens, ports, header_names, params)
+        token = lexer.next()
+    if token != ";":
+        _read_until(lexer, {";"})
+
+    if ansi or not header_names:
+        lexer.skip_to("endmodule")
+    else:
+        _parse_body(lexer, ports, header_names, params)
+    return ports
+
+def extract_ports(lines):
+    """
+    Extract the ports of every module in the Verilog source given as an iterable of lines.
+    Returns {module_name: {port_name: {"direction", "type", "width"[, "signed"]}}}.
+    """
+    lexer = Lexer(lines)
+    modules = {}
+    while True:
+        token = lexer.next()
+        if token is None:
+            return modules
+        if token in ("module", "macromodule"):
+            name = lexer.next()
+            if name is None:
+                return modules
+            modules[name] = _parse_module(lexer)
+
+def extract_ports_from_file(file_path):
+    """Extract module ports from a Verilog file, streaming it line by line."""
+    with open(file_path, "r", errors="replace") as f:
+        return extract_ports(f)
+
+################################################################################
+# Constant outputs
+################################################################################
+
+def _is_identifier(token):
+    return token[0].isalpha() or token[0] in "_\\"
+
+def extract_drivers(lines):
+    """
+    Extract the continuous assignments and the instances with named port connections
+    of every module, unlike extract_ports the whole body is tokenized. Returns
+    {module_name: {"assigns": {net: tokens}, "instances": [(module, {port: tokens})]}}.
+    Assignments to a part of a net and positional connections are left out.
+    """
+    lexer = Lexer(lines)
+    modules = {}
+    current = None
+    names = []
+    while True:
+        token = lexer.next()
+        if token is None:
+            return modules
+        if token in ("module", "macromodule"):
+            name = lexer.next()
+            if name is None:
+                return modules
+            current = modules[name] = {"assigns": {}, "instances": []}
+            # The header ends at the first semicolon outside of its parentheses.
+            _read_until(lexer, {";"})
+            names = []
+        elif current is None:
+            continue
+        elif token == "endmodule":
+            current = None
+        elif token == "assign":
+            tokens, _ = _read_until(lexer, {";"})
+            for item in _split_top_level(tokens, ","):
+                if len(item) > 2 and item[1] == "=":
+                    current["assigns"][item[0]] = item[2:]
+            names = []
+        elif token == "#" and names:
+            # Parameter values of an instance, between its module and instance names.
+            if lexer.next() == "(":
+                _read_until(lexer, {")"})
+        elif token == "(" and len(names) >= 2:
+            tokens, _ = _read_until(lexer, {")"})
+            if tokens and tokens[0] == ".":
+                connect = {}
+                for item in _split_top_level(tokens, ","):
+                    if len(item) >= 4 and item[0] == "." and item[2] == "(" and item[-1] == ")":
+                        connect[item[1]] = item[3:-1]
+                current["instances"].append((names[-2], connect))
+            names = []
+        elif _is_identifier(token):
+            names.append(token)
+        else:
+            names = []
+
+def _constant_value(drivers, ports, module, tokens, bindings, depth):
+    """
+    Value of the expression tokens in module when it is a constant, a net assigned or
+    bound to one, or an output of an instance driven by one. None otherwise.
+    """
+    if depth > 64 or len(tokens) != 1:
+        return None
+    token = tokens[0]
+    if not _is_identifier(token):
+        return _number_value(token)
+    if token in bindings:
+        return bindings[token](depth + 1)
+    module_drivers = drivers.get(module)
+    if module_drivers is None:
+        return None
+    if token in module_drivers["assigns"]:
+        return _constant_value(drivers, ports, module, module_drivers["assigns"][token], bindings, depth + 1)
+    for submodule, connect in module_drivers["instances"]:
+        submodule_ports = ports.get(submodule, {})
+        for port, expression in connect.items():
+            if expression != [token] or submodule_ports.get(port, {}).get("direction") != "output":
+                continue
+            # The inputs of the instance evaluate their connection in this module.
+            inputs = {name: (lambda depth, expression=expression:
+                             _constant_value(drivers, ports, module, expression, bindings, depth))
+                      for name, expression in connect.items()
+                      if submodule_ports.get(name, {}).get("direction") == "input"}
+            return _constant_value(drivers, ports, submodule, [port], inputs, depth + 1)
+    return None
+
+def constant_outputs(drivers, ports, module):
+    """
+    Output ports of module tied to a constant, through continuous assignments and the
+    outputs of its instances down the hierarchy, as {port: value}. drivers and ports
+    are the tables of extract_drivers and extract_ports of the files holding the
+    hierarchy. An output driven by any logic, a register or an unknown module is not
+    constant, nor one whose value depends on the inputs of module.
+    """
+    values = {}
+    for port, info in ports.get(module, {}).items():
+        if info["direction"] != "output":
+            continue
+        value = _constant_value(drivers, ports, module, [port], {}, 0)
+        if value is not None:
+            values[port] = value
+    return values
@@ -0,0 +1,7 @@
+"""The scripts of the flow are flat modules, importable once scripts/ is on the path."""
+import os
+import sys
+
+SCRIPTS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../scripts"))
+
+sys.path.insert(0, SCRIPTS_DIR)
@@ -0,0 +1,66 @@
+import copy
+
+import pytest
+
+import connection_dsl
+import systolic_array_generator
+from bench_connection_dsl import topology_connections
+from bench_generate_top import synthetic_array_config, synthetic_connections, synthetic_pe_config
+
+NUMPY = [False, True] if connection_dsl.numpy is not None else [False]
+
+def grid_config(rows, cols, connections):
+    config = synthetic_array_config(rows, cols)
+    config["connections"] = connections
+    return config
+
+@pytest.fixture
+def no_numpy(monkeypatch):
+    monkeypatch.setattr(connection_dsl, "numpy", None)
+
+@pytest.mark.parametrize("use_numpy", NUMPY)
+def test_grid_rules_compile_to_the_grid(use_numpy):
+    pe_config = synthetic_pe_config()
+    config = grid_config(4, 3, synthetic_connections())
+    compiled = connection_dsl.build_connection_netlist(config, pe_config, use_numpy)
+    grid = systolic_array_generator.build_grid_netlist(config, pe_config)
+    assert compiled.to_json() == grid.to_json()
+    assert systolic_array_generator.same_connections(compiled, grid)
+
+@pytest.mark.parametrize("topology", ["diagonal", "broadcast", "chain"])
+def test_other_topologies_are_not_the_grid(topology):
+    pe_config = synthetic_pe_config()
+    config = grid_config(4, 4, topology_connections(topology))
+    compiled = connection_dsl.build_connection_netlist(config, pe_config)
+    assert not systolic_array_generator.same_connections(
+        compiled, systolic_array_generator.build_grid_netlist(config, pe_config))
+
+def test_comparison_without_numpy(no_numpy):
+    pe_config = synthetic_pe_config()
+    config = grid_config(4, 4, synthetic_connections())
+    grid = systolic_array_generator.build_grid_netlist(config, pe_config)
+    assert systolic_array_generator.same_connections(connection_dsl.build_connection_netlist(config, pe_config), grid)
+    config["connections"] = topology_connections("diagonal")
+    assert not systolic_array_generator.same_connections(
+        connection_dsl.build_connection_netlist(config, pe_config), grid)
+
+def test_moved_link_is_detected():
+    pe_config = synthetic_pe_config()
+    config = grid_config(4, 4, synthetic_connections())
+    compiled = connection_dsl.build_connection_netlist(config, pe_config)
+    grid = systolic_array_generator.build_grid_netlist(config, pe_config)
+    # Same connections, but one link named after other PEs.
+    link = next(net for net in range(len(compiled.net_kind))
+                if compiled.net_kind[net] == systolic_array_generator.NET_LINK)
+    compiled.net_args[link * systolic_array_generator.NET_ARGS + 4] += 1
+    assert not systolic_array_generator.same_connections(compiled, grid)
+
+def test_is_standard_grid_reports_the_feature(capsys):
+    pe_config = synthetic_pe_config()
+    config = grid_config(3, 3, synthetic_connections())
+    assert systolic_array_generator.is_standard_grid(config, pe_config, "a tiled array")
+    other = copy.deepcopy(config)
+    other["connections"] = topology_connections("chain")
+    for _ in range(2):
+        assert not systolic_array_generator.is_standard_grid(other, pe_config, "a tiled array")
+        assert "Error: a tiled array is the standard grid" in capsys.readouterr().out
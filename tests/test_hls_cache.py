@@ -0,0 +1,63 @@
+import os
+
+import hls_cache
+
+def write_sources(hls_dir, text="void pe() {}\n"):
+    for name in hls_cache.HLS_INPUT_FILES:
+        (hls_dir / name).write_text(f"{name}: {text}")
+
+def write_rtl(hls_dir, text):
+    rtl = hls_dir / hls_cache.HLS_ARTIFACTS[0][0]
+    rtl.parent.mkdir(parents=True, exist_ok=True)
+    rtl.write_text(text)
+
+def test_key_covers_sources_and_tool_version(tmp_path):
+    write_sources(tmp_path)
+    key = hls_cache.compute_cache_key(tmp_path, "catapult 2024.1")
+    assert hls_cache.compute_cache_key(tmp_path, "catapult 2024.1") == key
+    assert hls_cache.compute_cache_key(tmp_path, "catapult 2024.2") != key
+    (tmp_path / "pe.cpp").write_text("void pe() { return; }\n")
+    assert hls_cache.compute_cache_key(tmp_path, "catapult 2024.1") != key
+
+def test_tool_version_override(monkeypatch):
+    monkeypatch.setenv("HLS_TOOL_VERSION", " catapult 2024.1 \n")
+    assert hls_cache.get_tool_version("exit 1") == "catapult 2024.1"
+    monkeypatch.delenv("HLS_TOOL_VERSION")
+    assert hls_cache.get_tool_version("echo; echo 'catapult 2024.2'; echo banner") == "catapult 2024.2"
+    assert hls_cache.get_tool_version("exit 1") == "unknown"
+
+def test_store_and_lookup(tmp_path):
+    hls_dir, cache_dir, src_dir = tmp_path / "hls", tmp_path / "cache", tmp_path / "src"
+    hls_dir.mkdir()
+    write_sources(hls_dir)
+    write_rtl(hls_dir, "module pe; endmodule\n")
+    key = hls_cache.compute_cache_key(hls_dir, "v1")
+    assert not hls_cache.lookup(cache_dir, key, src_dir)
+    hls_cache.store(cache_dir, key, hls_dir, "v1")
+    assert hls_cache.lookup(cache_dir, key, src_dir)
+    assert (src_dir / "concat_rtl.v").read_text() == "module pe; endmodule\n"
+
+def test_incomplete_entry_is_dropped(tmp_path):
+    hls_dir, cache_dir = tmp_path / "hls", tmp_path / "cache"
+    hls_dir.mkdir()
+    write_rtl(hls_dir, "module pe; endmodule\n")
+    hls_cache.store(cache_dir, "k", hls_dir, "v1")
+    os.remove(cache_dir / "k" / "concat_rtl.v")
+    assert not hls_cache.lookup(cache_dir, "k", tmp_path / "src")
+    assert not (cache_dir / "k").exists()
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    hls_dir, cache_dir = tmp_path / "hls", tmp_path / "cache"
+    hls_dir.mkdir()
+    for age, key in enumerate(["new", "mid", "old"]):
+        write_rtl(hls_dir, "x" * 100)
+        hls_cache.store(cache_dir, key, hls_dir, "v1")
+        entry = cache_dir / key / hls_cache.ENTRY_FILE
+        os.utime(entry, (1000 - age * 100, 1000 - age * 100))
+    size = sum(hls_cache._entry_size(cache_dir / key) for key in ("new", "mid", "old"))
+    # Room for two entries: the oldest goes.
+    assert hls_cache.evict(cache_dir, size - 1) == ["old"]
+    # A used entry becomes the most recent one.
+    assert hls_cache.lookup(cache_dir, "mid", tmp_path / "src")
+    assert hls_cache.evict(cache_dir, 1, keep="new") == ["mid"]
+    assert sorted(os.listdir(cache_dir)) == ["new"]
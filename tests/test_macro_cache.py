@@ -0,0 +1,59 @@
+import os
+
+import hls_cache
+import macro_cache
+
+BLOCK_MK = "export DESIGN_NAME = pe\nexport VERILOG_FILES = designs/src/{nickname}/concat_rtl.v\n"
+SDC = "create_clock -period 5 [get_ports clk]\n"
+
+def key(tmp_path, nickname="array_4x4", rtl_text="module pe; endmodule\n", sdc=SDC, image="orfs:1"):
+    rtl = tmp_path / "concat_rtl.v"
+    rtl.write_text(rtl_text)
+    return macro_cache.compute_key("nangate45", nickname, "pe", [rtl], BLOCK_MK.format(nickname=nickname), sdc,
+                                   image)
+
+def harden(block_dir, text="x"):
+    block_dir.mkdir(parents=True, exist_ok=True)
+    for name in macro_cache.artifact_names("pe"):
+        (block_dir / name).write_text(text)
+
+def test_key_ignores_the_nickname_only(tmp_path):
+    base = key(tmp_path)
+    assert key(tmp_path, nickname="array_8x8") == base
+    assert key(tmp_path, rtl_text="module pe(input a); endmodule\n") != base
+    assert key(tmp_path, sdc="create_clock -period 4 [get_ports clk]\n") != base
+    assert key(tmp_path, image="orfs:2") != base
+
+def test_store_and_lookup(tmp_path):
+    cache_dir = tmp_path / "cache"
+    built = macro_cache.block_results_dir(tmp_path / "flow", "nangate45", "array_4x4", "pe")
+    harden(tmp_path / built)
+    (tmp_path / built / "6_final.v").write_text("netlist")
+    assert macro_cache.store(cache_dir, "k1", "pe", tmp_path / built)
+    assert macro_cache.current_key(tmp_path / built) == "k1"
+
+    other = tmp_path / macro_cache.block_results_dir(tmp_path / "flow", "nangate45", "array_8x8", "pe")
+    assert not macro_cache.lookup(cache_dir, "k2", other)
+    assert macro_cache.lookup(cache_dir, "k1", other)
+    assert sorted(os.listdir(other)) == sorted(macro_cache.artifact_names("pe", tmp_path / built) +
+                                               [macro_cache.STAMP_FILE])
+    assert macro_cache.current_key(other) == "k1"
+
+def test_incomplete_block_is_not_stored(tmp_path):
+    block_dir = tmp_path / "block"
+    harden(block_dir)
+    os.remove(block_dir / "pe.lef")
+    assert not macro_cache.store(tmp_path / "cache", "k", "pe", block_dir)
+    assert not (tmp_path / "cache" / "k").exists()
+
+def test_eviction_keeps_the_recent_entries(tmp_path):
+    cache_dir = tmp_path / "cache"
+    for age, name in enumerate(["new", "old"]):
+        harden(tmp_path / name, name * 100)
+        macro_cache.store(cache_dir, name, "pe", tmp_path / name)
+        os.utime(cache_dir / name / hls_cache.ENTRY_FILE, (1000 - age * 100, 1000 - age * 100))
+    size = hls_cache._entry_size(cache_dir / "new")
+    # Storing a third entry evicts the least recently used one.
+    harden(tmp_path / "third", "t" * 100)
+    macro_cache.store(cache_dir, "third", "pe", tmp_path / "third", max_bytes=2 * size + 100)
+    assert sorted(name for name in os.listdir(cache_dir) if not name.startswith(".")) == ["new", "third"]
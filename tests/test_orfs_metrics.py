@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+import orfs_metrics
+import results_store
+
+FLOW_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "flow")
+
+@pytest.mark.parametrize("line, expected", [
+    ("tns max -1.25", ("tns", "max", "-1.25")),
+    ("tns -1.25", ("tns", "", "-1.25")),
+    ("worst slack max -0.12", ("worst slack", "max", "-0.12")),
+    ("wns min 3.5e-2", ("wns", "min", "3.5e-2")),
+])
+def test_slack_lines(line, expected):
+    assert orfs_metrics._SLACK.findall(line) == [expected]
+
+def test_report_values_skip_hold():
+    reports_dir = orfs_metrics.design_dirs("nangate45", "pe_array", flow_dir=FLOW_DIR)["reports"]
+    values = orfs_metrics.report_values(reports_dir)
+    assert values["tns"] == (-1.25, "6_finish.rpt")
+    assert values["wns"] == (-0.12, "6_finish.rpt")
+    assert values["worst_slack"] == (-0.12, "6_finish.rpt")
+    assert values["design_area"] == (1100.0, "6_finish.rpt")
+    assert values["utilization"] == (35.0, "6_finish.rpt")
+
+def test_collect_into_store(tmp_path):
+    record = orfs_metrics.collect("nangate45", "pe_array", flow_dir=FLOW_DIR)
+    conn = results_store.connect(str(tmp_path / "results.db"))
+    run_id = results_store.store_run(conn, record, "ab" * 32, status="ok")
+
+    run, = results_store.find_runs(conn, nickname="pe_array", setup_sha256="abab")
+    assert run["id"] == run_id and run["status"] == "ok" and not run["final"]
+    # The reports win over the metrics JSON, which only fills what they lack.
+    assert run["wns"] == -0.12
+    assert run["tns"] == -1.25
+    assert run["design_area"] == 1100.0
+    assert run["utilization"] == 35.0
+    assert run["report"] == "6_finish.rpt"
+    assert run["synth_area"] == 1234.5
+    assert run["die_area"] == 40000.0
+    assert run["elapsed_s"] == pytest.approx(5.4 + 2.1 + 62.5)
+    assert run["peak_memory_kb"] == 524288
+
+    steps = {step["step"]: step for step in results_store.run_steps(conn, run_id)}
+    assert sorted(steps) == ["1_1_yosys", "2_1_floorplan", "6_report"]
+    assert steps["1_1_yosys"]["elapsed_s"] == pytest.approx(5.4)
+    assert steps["1_1_yosys"]["cpu_s"] == pytest.approx(3.35)
+    assert steps["2_1_floorplan"]["peak_memory_kb"] == 153600
+    assert results_store.run_metrics(conn, run_id)["finish__timing__setup__ws"] == -0.4
+
+    # Collecting the same key again replaces the run.
+    results_store.store_run(conn, record, "ab" * 32)
+    assert len(results_store.find_runs(conn, nickname="pe_array")) == 1
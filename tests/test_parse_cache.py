@@ -0,0 +1,67 @@
+import json
+import os
+
+import parse_cache
+import verilog_ports
+
+def counting_parser(calls):
+    def parse(path):
+        calls.append(os.path.basename(path))
+        return verilog_ports.extract_ports_from_file(path)
+    return parse
+
+def write_module(path, width):
+    path.write_text(f"module pe(input [{width - 1}:0] a, output b);\nendmodule\n")
+
+def test_unchanged_files_are_not_parsed_again(tmp_path):
+    rtl = tmp_path / "pe.v"
+    write_module(rtl, 8)
+    calls = []
+    first = parse_cache.parse_files([rtl], tmp_path, parse=counting_parser(calls))
+    assert first[rtl]["pe"]["a"]["width"] == 8
+    assert parse_cache.parse_files([rtl], tmp_path, parse=counting_parser(calls)) == first
+    assert calls == ["pe.v"]
+
+def test_touched_file_is_matched_by_hash(tmp_path):
+    rtl = tmp_path / "pe.v"
+    write_module(rtl, 8)
+    calls = []
+    parse_cache.parse_files([rtl], tmp_path, parse=counting_parser(calls))
+    os.utime(rtl, ns=(1, 1))
+    parse_cache.parse_files([rtl], tmp_path, parse=counting_parser(calls))
+    assert calls == ["pe.v"]
+    # The refreshed stat is saved, the next run trusts it again.
+    assert parse_cache.load_index(tmp_path)[str(rtl)]["mtime_ns"] == 1
+
+def test_changed_file_is_parsed_again(tmp_path):
+    rtl = tmp_path / "pe.v"
+    write_module(rtl, 8)
+    calls = []
+    parse_cache.parse_files([rtl], tmp_path, parse=counting_parser(calls))
+    write_module(rtl, 16)
+    os.utime(rtl, ns=(2, 2))
+    result = parse_cache.parse_files([rtl], tmp_path, parse=counting_parser(calls))
+    assert result[rtl]["pe"]["a"]["width"] == 16 and calls == ["pe.v", "pe.v"]
+
+def test_verify_and_parser_version_force_a_parse(tmp_path):
+    rtl = tmp_path / "pe.v"
+    write_module(rtl, 8)
+    calls = []
+    parse_cache.parse_files([rtl], tmp_path, parse=counting_parser(calls))
+    parse_cache.parse_files([rtl], tmp_path, verify=True, parse=counting_parser(calls))
+    assert calls == ["pe.v", "pe.v"]
+
+    index_path = tmp_path / parse_cache.INDEX_FILE
+    index = json.loads(index_path.read_text())
+    index["parser_version"] = parse_cache.PARSER_VERSION - 1
+    index_path.write_text(json.dumps(index))
+    parse_cache.parse_files([rtl], tmp_path, parse=counting_parser(calls))
+    assert calls == ["pe.v", "pe.v", "pe.v"]
+
+def test_corrupt_index_is_rebuilt(tmp_path):
+    rtl = tmp_path / "pe.v"
+    write_module(rtl, 8)
+    (tmp_path / parse_cache.INDEX_FILE).write_text("{not json")
+    calls = []
+    assert parse_cache.parse_files([rtl], tmp_path, parse=counting_parser(calls))[rtl]["pe"]["b"]["width"] == 1
+    assert calls == ["pe.v"]
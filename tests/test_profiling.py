@@ -0,0 +1,32 @@
+import time
+
+import pytest
+
+import profiling
+
+def test_run_process_lines_and_exit_code():
+    lines = []
+    assert profiling.run_process("echo one; echo two >&2; exit 3", on_line=lines.append) == 3
+    assert lines == ["one\n", "two\n"]
+
+def test_failing_callback_kills_and_reaps_the_child(tmp_path):
+    marker = tmp_path / "done"
+
+    def fail(line):
+        raise RuntimeError(line)
+
+    profiler = profiling.Profiler()
+    action = profiler.wrap("stage", lambda: profiling.run_process(f"echo started; sleep 0.2; touch {marker}",
+                                                                  on_line=fail))
+    with pytest.raises(RuntimeError):
+        action()
+    # The child was reaped, and killed before it could finish.
+    assert len(profiler.stages["stage"]["children"]) == 1
+    time.sleep(0.4)
+    assert not marker.exists()
+
+def test_children_are_recorded_on_the_stage():
+    profiler = profiling.Profiler()
+    action = profiler.wrap("stage", lambda: profiling.run_process("true") == 0)
+    assert action()
+    assert [child["cmd"] for child in profiler.stages["stage"]["children"]] == ["true"]
@@ -0,0 +1,29 @@
+import pytest
+
+import reset_tree
+import systolic_array_generator
+from bench_generate_top import synthetic_array_config, synthetic_pe_config
+
+def tiled_top(n, k):
+    _, top = systolic_array_generator.build_tiled_netlists(synthetic_array_config(n, n), synthetic_pe_config(), (k, k))
+    return top
+
+@pytest.mark.parametrize("group", reset_tree.GROUPS)
+def test_leaf_loads_are_bounded(group):
+    netlist = systolic_array_generator.build_grid_netlist(synthetic_array_config(9, 13), synthetic_pe_config())
+    tree = reset_tree.attach(netlist, {"fanout": 4, "group": group, "ports": ["rst"]})
+    report = tree.report()
+    assert report["max_leaf_load"] <= 4 and report["leaf_load_unit"] == "PE" and report["tile_load"] is None
+    assert all(size <= 4 * above for above, size in zip(report["levels"], report["levels"][1:]))
+
+@pytest.mark.parametrize("group", reset_tree.GROUPS)
+def test_tiles_report_their_load(group):
+    tree = reset_tree.attach(tiled_top(8, 2), {"fanout": 4, "group": group, "ports": ["rst"]}, (2, 2))
+    report = tree.report()
+    assert report["leaf_load_unit"] == "tile" and report["tile_load"] == 4
+
+def test_tile_above_the_fanout_is_refused(capsys):
+    top = tiled_top(8, 4)
+    assert reset_tree.attach(top, {"fanout": 8, "group": "tile", "ports": ["rst"]}, (4, 4)) is None
+    assert "16 PEs of a 4x4 tile" in capsys.readouterr().out
+    assert top.reset_tree is None
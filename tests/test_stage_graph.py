@@ -0,0 +1,93 @@
+import os
+
+import orfs_pool
+import profiling
+import stage_graph
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+def copy_stage(name, src, dst, calls, values=None, always=False):
+    def action():
+        calls.append(name)
+        write(dst, src.read_text())
+        return True
+    return stage_graph.stage(name, action, inputs=[src], outputs=[dst], values=values, always=always)
+
+def test_fingerprint_covers_contents_and_values(tmp_path):
+    src = tmp_path / "in.txt"
+    write(src, "a")
+    hasher = stage_graph.FileHasher()
+    digest = stage_graph.fingerprint(stage_graph.stage("s", None, inputs=[src], values={"k": 1}), hasher)
+    # Touching the file without changing it keeps the fingerprint.
+    os.utime(src, (1, 1))
+    assert stage_graph.fingerprint(stage_graph.stage("s", None, inputs=[src], values={"k": 1}), hasher) == digest
+    assert stage_graph.fingerprint(stage_graph.stage("s", None, inputs=[src], values={"k": 2}), hasher) != digest
+    write(src, "b")
+    assert stage_graph.fingerprint(stage_graph.stage("s", None, inputs=[src], values={"k": 1}), hasher) != digest
+
+def test_unchanged_stages_are_skipped(tmp_path):
+    src, mid, out, state = tmp_path / "src.txt", tmp_path / "mid.txt", tmp_path / "out.txt", tmp_path / "state"
+    write(src, "a")
+    calls = []
+
+    def stages(values=None):
+        return [copy_stage("first", src, mid, calls, values), copy_stage("second", mid, out, calls)]
+
+    assert stage_graph.run_stages(stages(), state) == {"first": "ran", "second": "ran"}
+    assert stage_graph.run_stages(stages(), state) == {"first": "skipped", "second": "skipped"}
+    assert calls == ["first", "second"]
+
+    # A changed value reruns the stage, its unchanged output keeps the next one skipped.
+    assert stage_graph.run_stages(stages({"k": 1}), state) == {"first": "ran", "second": "skipped"}
+    # A changed input reruns the stage and the stages reading its output.
+    write(src, "b")
+    assert stage_graph.run_stages(stages({"k": 1}), state) == {"first": "ran", "second": "ran"}
+    assert out.read_text() == "b"
+    # A modified output reruns the stage that wrote it.
+    write(out, "edited")
+    assert stage_graph.run_stages(stages({"k": 1}), state) == {"first": "skipped", "second": "ran"}
+    assert out.read_text() == "b"
+    assert stage_graph.run_stages(stages({"k": 1}), state, force=True) == {"first": "ran", "second": "ran"}
+
+def test_failed_stage_blocks_its_dependents(tmp_path):
+    src, mid, out, state = tmp_path / "src.txt", tmp_path / "mid.txt", tmp_path / "out.txt", tmp_path / "state"
+    write(src, "a")
+    calls = []
+    failing = stage_graph.stage("first", lambda: False, inputs=[src], outputs=[mid])
+    status = stage_graph.run_stages([failing, copy_stage("second", mid, out, calls)], state)
+    assert status == {"first": "failed", "second": "blocked"} and calls == []
+    # Nothing is recorded for the failed stage, it runs again next time.
+    status = stage_graph.run_stages([copy_stage("first", src, mid, calls), copy_stage("second", mid, out, calls)],
+                                    state)
+    assert status == {"first": "ran", "second": "ran"}
+
+def test_orfs_stage_on_the_local_executor(tmp_path):
+    # A stand-in ORFS checkout: env.sh and a flow/Makefile writing the synth checkpoint.
+    orfs_root = tmp_path / "orfs"
+    write(orfs_root / "env.sh", "export ORFS_ENV=1\n")
+    write(orfs_root / "flow" / "designs" / "nangate45" / "pe" / "config.mk", "export DESIGN_NAME = pe\n")
+    checkpoint = orfs_root / "flow" / "results" / "nangate45" / "pe" / "base" / "1_synth.v"
+    write(orfs_root / "flow" / "Makefile",
+          "synth:\n"
+          "\t@test \"$$ORFS_ENV\" = 1\n"
+          f"\t@mkdir -p {checkpoint.parent}\n"
+          f"\t@cat $(DESIGN_CONFIG) > {checkpoint}\n")
+    executor = orfs_pool.LocalExecutor(orfs_root)
+    runs = []
+
+    def synth():
+        with executor.acquire() as slot:
+            command = executor.command(slot, orfs_pool.make_command("nangate45", "pe", "synth"))
+            runs.append(command)
+            return profiling.run_process(command) == 0
+
+    config = orfs_root / "flow" / "designs" / "nangate45" / "pe" / "config.mk"
+    stages = [stage_graph.stage("orfs_synth", synth, inputs=[config], outputs=[checkpoint])]
+    assert stage_graph.run_stages(stages, tmp_path / "state") == {"orfs_synth": "ran"}
+    assert checkpoint.read_text() == "export DESIGN_NAME = pe\n"
+    assert stage_graph.run_stages(stages, tmp_path / "state") == {"orfs_synth": "skipped"}
+    write(config, "export DESIGN_NAME = pe2\n")
+    assert stage_graph.run_stages(stages, tmp_path / "state") == {"orfs_synth": "ran"}
+    assert len(runs) == 2
@@ -0,0 +1,56 @@
+import parse_verilog
+import verilog_ports
+
+def ports_of(source):
+    return verilog_ports.extract_ports(source.splitlines(True))
+
+def test_defined_macro_width():
+    ports = ports_of("`define W 8\nmodule pe(input [`W-1:0] p, output q);\nendmodule\n")
+    assert ports["pe"]["p"]["width"] == 8
+
+def test_undefined_macro_width_is_unresolved():
+    ports = ports_of("module pe(input [`W-1:0] p, output q);\nendmodule\n")
+    assert ports["pe"]["p"]["width"] == "`W"
+    assert ports["pe"]["q"]["width"] == 1
+
+def test_conditional_directives_keep_declarations():
+    ports = ports_of("module pe(a, b, c);\n"
+                     "  input a;\n"
+                     "`ifdef WIDE\n"
+                     "  input [15:0] b;\n"
+                     "`else\n"
+                     "  input [7:0] b;\n"
+                     "`endif\n"
+                     "  output c;\n"
+                     "  assign c = a;\n"
+                     "endmodule\n")
+    assert {name: port["direction"] for name, port in ports["pe"].items()} == {
+        "a": "input", "b": "input", "c": "output"}
+
+def test_late_reg_declaration():
+    ports = ports_of("module pe(clk, y);\n  input clk;\n  output [3:0] y;\n"
+                     "  always @(posedge clk) y <= 4'd1;\n  reg [3:0] y;\nendmodule\n")
+    assert ports["pe"]["y"]["type"] == "reg"
+
+def test_unresolved_pe_port_is_reported(tmp_path, capsys):
+    (tmp_path / "pe.v").write_text("module pe(input clk, input [`W-1:0] left_in_rsc_dat);\nendmodule\n")
+    assert parse_verilog.generate_submodule_configs(["pe.v"], "pe", str(tmp_path)) is None
+    output = capsys.readouterr().out
+    assert "left_in_rsc_dat" in output and "`W" in output
+
+def test_constant_outputs_follow_the_hierarchy():
+    source = ("module core(input clk, output ready, output busy);\n"
+              "  assign ready = 1'b1;\n"
+              "  reg busy;\n"
+              "  always @(posedge clk) busy <= ~busy;\n"
+              "endmodule\n"
+              "module pe(input clk, output left_in_rsc_rdy, output up_in_rsc_rdy, output echo);\n"
+              "  wire core_ready;\n"
+              "  core #(.W(2)) u_core (.clk(clk), .ready(core_ready), .busy(up_in_rsc_rdy));\n"
+              "  assign left_in_rsc_rdy = core_ready;\n"
+              "  assign echo = clk;\n"
+              "endmodule\n")
+    lines = source.splitlines(True)
+    drivers = verilog_ports.extract_drivers(lines)
+    assert verilog_ports.constant_outputs(drivers, verilog_ports.extract_ports(lines), "pe") == {
+        "left_in_rsc_rdy": 1}